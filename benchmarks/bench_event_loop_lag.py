@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк: задержка event loop при записи данных 200 одновременных пользователей
+
+Каждый симулированный пользователь несколько раз записывает прием пищи
+(дневник + строка журнала еды с fsync), параллельно работает периодический
+сброс кэша. Зонд раз в 5 мс засыпает через asyncio.sleep и меряет, насколько
+позже запланированного loop его разбудил - на столько же опоздал бы ответ
+любому другому пользователю бота.
+
+Режимы:
+- sync:  log_meal / flush_user_data прямо в обработчике (как раньше)
+- async: log_meal_async / flush_user_data_async (пул потоков хранилища)
+
+Медленный диск имитируется задержкой в os.fsync.
+
+Запуск: python benchmarks/bench_event_loop_lag.py [задержка fsync, мс]
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import user_data
+from utils.user_data import (
+    log_meal, log_meal_async, flush_user_data, flush_user_data_async, clear_user_data_cache
+)
+from utils.user_locks import user_lock
+
+USERS = 200
+MEALS_PER_USER = 5
+PROBE_INTERVAL = 0.005
+FLUSH_INTERVAL = 0.2
+DAY = '2099-01-01'
+
+
+def percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+async def probe(lags: list, stop: asyncio.Event) -> None:
+    """Зонд задержки: насколько позже запланированного просыпается корутина"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + PROBE_INTERVAL
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+async def simulate_user(user_id: str, use_async: bool) -> None:
+    for meal in range(MEALS_PER_USER):
+        await asyncio.sleep(random.uniform(0, 0.05))  # Пользователь думает, GPT отвечает
+        entry = [f'Блюдо {meal}', 350, 20, 12, 40]
+        async with user_lock(user_id):
+            if use_async:
+                await log_meal_async(user_id, DAY, entry)
+            else:
+                log_meal(user_id, DAY, entry)
+
+
+async def flusher(use_async: bool, stop: asyncio.Event) -> None:
+    """Периодический сброс кэша, как flush_user_data_job"""
+    while not stop.is_set():
+        await asyncio.sleep(FLUSH_INTERVAL)
+        if use_async:
+            await flush_user_data_async()
+        else:
+            flush_user_data()
+
+
+async def run_mode(use_async: bool) -> dict:
+    lags, stop = [], asyncio.Event()
+    background = [asyncio.create_task(probe(lags, stop)), asyncio.create_task(flusher(use_async, stop))]
+
+    started = time.perf_counter()
+    await asyncio.gather(*[simulate_user(f'bench_{i}', use_async) for i in range(USERS)])
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await asyncio.gather(*background)
+    return {
+        'elapsed': elapsed,
+        'p50': percentile(lags, 0.5) * 1000,
+        'p99': percentile(lags, 0.99) * 1000,
+        'max': max(lags) * 1000 if lags else 0.0,
+    }
+
+
+def main(fsync_delay_ms: float) -> None:
+    real_fsync = os.fsync
+
+    def slow_fsync(fd):
+        time.sleep(fsync_delay_ms / 1000)
+        return real_fsync(fd)
+
+    os.fsync = slow_fsync
+    print(f"🧪 {USERS} пользователей x {MEALS_PER_USER} приемов пищи, задержка fsync {fsync_delay_ms} мс\n")
+    try:
+        for use_async in (False, True):
+            with tempfile.TemporaryDirectory() as tmp:
+                user_data.DATA_DIR = tmp
+                clear_user_data_cache(flush=False)
+                random.seed(0)
+                result = asyncio.run(run_mode(use_async))
+                clear_user_data_cache(flush=False)
+
+            name = 'async (пул потоков)' if use_async else 'sync (в event loop)'
+            print(f"{name:<20} задержка loop: p50 {result['p50']:6.1f} мс, p99 {result['p99']:7.1f} мс, "
+                  f"max {result['max']:7.1f} мс   всего {result['elapsed']:.2f} с")
+    finally:
+        os.fsync = real_fsync
+
+
+if __name__ == '__main__':
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 2.0)
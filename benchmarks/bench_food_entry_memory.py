@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк: память и время подсчета БЖУ для записей-списков и FoodEntry
+
+История за 3 года (4 приема пищи в день, 50 повторяющихся блюд) разбирается
+из строк журнала, как при чтении партиций:
+- списки:    записи как пришли из JSON, подсчет с проверками len() на каждую запись
+- FoodEntry: один разбор при загрузке (общие строки названий), подсчет по полям
+
+Запуск: python benchmarks/bench_food_entry_memory.py
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import json_codec
+from utils.food_entry import decode_entries
+
+DAYS = 3 * 365
+MEALS_PER_DAY = 4
+DISHES = [f'Блюдо номер {i}' for i in range(50)]
+REPEATS = 20
+
+
+def make_lines() -> list:
+    """Строки журнала: каждая запись - отдельный JSON, как в партициях"""
+    lines = []
+    for meal in range(DAYS * MEALS_PER_DAY):
+        entry = [DISHES[meal % len(DISHES)], 350, 20, 12, 40] if meal % 3 else [DISHES[meal % len(DISHES)], 350, 20]
+        lines.append(json_codec.dumps(entry))
+    return lines
+
+
+def measure(build) -> tuple:
+    tracemalloc.start()
+    entries = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return entries, size
+
+
+def sum_lists(entries: list) -> tuple:
+    """Старый подсчет: ветвление по длине записи"""
+    calories = protein = fat = carbs = 0
+    for food_entry in entries:
+        if len(food_entry) >= 2:
+            calories += food_entry[1]
+            if len(food_entry) >= 3 and food_entry[2] is not None:
+                protein += food_entry[2]
+            if len(food_entry) >= 4 and food_entry[3] is not None:
+                fat += food_entry[3]
+            if len(food_entry) >= 5 and food_entry[4] is not None:
+                carbs += food_entry[4]
+    return calories, protein, fat, carbs
+
+
+def sum_entries(entries: list) -> tuple:
+    """Подсчет по полям FoodEntry"""
+    calories = protein = fat = carbs = 0
+    for food_entry in entries:
+        calories += food_entry.kcal
+        if food_entry.protein is not None:
+            protein += food_entry.protein
+        if food_entry.fat is not None:
+            fat += food_entry.fat
+        if food_entry.carbs is not None:
+            carbs += food_entry.carbs
+    return calories, protein, fat, carbs
+
+
+def timed(func, entries) -> float:
+    started = time.perf_counter()
+    for _ in range(REPEATS):
+        result = func(entries)
+    return (time.perf_counter() - started) / REPEATS * 1000, result
+
+
+if __name__ == '__main__':
+    lines = make_lines()
+    print(f"🧪 {len(lines)} записей ({DAYS} дней по {MEALS_PER_DAY} приема пищи)\n")
+
+    lists, lists_size = measure(lambda: [json_codec.loads(line) for line in lines])
+    entries, entries_size = measure(lambda: decode_entries(json_codec.loads(line) for line in lines))
+
+    lists_ms, lists_total = timed(sum_lists, lists)
+    entries_ms, entries_total = timed(sum_entries, entries)
+    assert lists_total == entries_total
+
+    print(f"списки     память {lists_size / 1024:7.1f} КБ ({lists_size / len(lines):5.1f} байт/запись)   "
+          f"подсчет БЖУ {lists_ms:5.2f} мс")
+    print(f"FoodEntry  память {entries_size / 1024:7.1f} КБ ({entries_size / len(lines):5.1f} байт/запись)   "
+          f"подсчет БЖУ {entries_ms:5.2f} мс")
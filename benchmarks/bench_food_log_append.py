@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Микро-бенчмарк: стоимость записи и чтения дня лога еды в зависимости от длины истории
+
+Старая схема перезаписывает и перечитывает весь food_log.json, поэтому
+запрос дорожает с возрастом аккаунта. Журнал дописывает одну строку,
+а чтение дня открывает только партицию его месяца.
+
+Запуск: python benchmarks/bench_food_log_append.py
+"""
+import os
+import sys
+import json
+import time
+import datetime
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.food_journal import FoodJournalStore
+
+HISTORY_DAYS = (30, 365, 1095)
+MEALS_PER_DAY = 4
+APPENDS = 100
+TODAY = '2099-01-01'
+# День из истории, который читают analyze_daily_nutrition и /food
+READ_DAY = '2098-12-31'
+
+
+def make_history(days: int) -> dict:
+    first = datetime.date(2099, 1, 1) - datetime.timedelta(days=days)
+    return {
+        (first + datetime.timedelta(days=day)).isoformat():
+            [[f'Блюдо {meal}', 350, 20, 12, 40] for meal in range(MEALS_PER_DAY)]
+        for day in range(days)
+    }
+
+
+def legacy_read_day(path: str) -> list:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f).get(READ_DAY, [])
+
+
+def legacy_append(path: str, entry: list) -> int:
+    """Старая схема: прочитать весь лог, дописать, атомарно перезаписать"""
+    with open(path, 'r', encoding='utf-8') as f:
+        food_log = json.load(f)
+    food_log.setdefault(TODAY, []).append(entry)
+    data = json.dumps(food_log, ensure_ascii=False, indent=2).encode('utf-8')
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+    return len(data)
+
+
+def run(days: int) -> None:
+    history = make_history(days)
+    entry = ['Гречка с котлетой', 480, 35, 18, 40]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, 'food_log.json')
+        with open(legacy_path, 'w', encoding='utf-8') as f:
+            json.dump(history, f, ensure_ascii=False, indent=2)
+
+        started = time.perf_counter()
+        legacy_bytes = sum(legacy_append(legacy_path, entry) for _ in range(APPENDS))
+        legacy_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for _ in range(APPENDS):
+            legacy_read_day(legacy_path)
+        legacy_read = time.perf_counter() - started
+
+        store = FoodJournalStore(lambda uid: (os.path.join(tmp, 'food_log'), ()))
+        store.replace('bench_user', history)
+
+        # Холодное чтение: индекс партиции каждый раз строится с нуля
+        started = time.perf_counter()
+        for _ in range(APPENDS):
+            store.clear()
+            store.get_entries('bench_user', READ_DAY)
+        journal_read = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for _ in range(APPENDS):
+            store.append('bench_user', TODAY, entry)
+        journal_time = time.perf_counter() - started
+        journal_bytes = os.path.getsize(os.path.join(tmp, 'food_log', TODAY[:7] + '.jsonl'))
+
+    print(f"{days:>5} дней  запись: food_log.json {legacy_time / APPENDS * 1000:6.2f} мс "
+          f"({legacy_bytes // APPENDS:>6} байт), журнал {journal_time / APPENDS * 1000:5.2f} мс "
+          f"({journal_bytes // APPENDS:>3} байт)   "
+          f"чтение дня: food_log.json {legacy_read / APPENDS * 1000:6.2f} мс, "
+          f"партиция {journal_read / APPENDS * 1000:5.2f} мс")
+
+
+if __name__ == '__main__':
+    print(f"🧪 {APPENDS} записей приема пищи при разной длине истории\n")
+    for days in HISTORY_DAYS:
+        run(days)
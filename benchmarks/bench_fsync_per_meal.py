@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Микро-бенчмарк: сколько fsync стоит запись одного приема пищи
+
+Сравнивает старую схему (каждый сеттер перечитывает и перезаписывает все
+шесть документов пользователя) с записью только измененного документа
+через save_user_document и дописыванием строки в журнал еды.
+
+Запуск: python benchmarks/bench_fsync_per_meal.py
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import user_data
+from utils.user_data import DOCUMENT_TYPES, save_user_document, flush_user_data, clear_user_data_cache
+
+MEALS = 200
+TODAY = '2025-01-01'
+
+
+class FsyncCounter:
+    """Подменяет os.fsync и считает вызовы"""
+
+    def __init__(self):
+        self.calls = 0
+        self._original = os.fsync
+
+    def __enter__(self):
+        def counting_fsync(fd):
+            self.calls += 1
+            return self._original(fd)
+        os.fsync = counting_fsync
+        return self
+
+    def __exit__(self, *exc):
+        os.fsync = self._original
+
+
+def read_all_documents(user_id: str) -> dict:
+    """Старый load_user_data: все шесть JSON-файлов пользователя"""
+    documents = {}
+    for data_type, file_path in user_data.get_user_files(user_id).items():
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                documents[data_type] = json.load(f)
+        except FileNotFoundError:
+            documents[data_type] = {}
+    return documents
+
+
+def legacy_log_meal(user_id: str, meal_no: int) -> None:
+    """Старая схема: save_user_diary и save_user_food_log - по полному циклу перечитать/перезаписать"""
+    for data_type in ('diary', 'food_log'):
+        documents = read_all_documents(user_id)
+        if data_type == 'diary':
+            documents['diary'][TODAY] = documents['diary'].get(TODAY, 0) + 100
+        else:
+            documents['food_log'].setdefault(TODAY, []).append([f'Блюдо {meal_no}', 100])
+        for doc_type in DOCUMENT_TYPES:
+            user_data._write_document_to_disk(user_id, doc_type, documents.get(doc_type, {}))
+
+
+def document_log_meal(user_id: str, meal_no: int) -> None:
+    """Новая схема: пишем дневник и одну строку журнала еды"""
+    diary = user_data.get_user_diary(user_id)
+    diary[TODAY] = diary.get(TODAY, 0) + 100
+    save_user_document(user_id, 'diary', diary)
+
+    user_data.append_food_entry(user_id, TODAY, [f'Блюдо {meal_no}', 100])
+
+    # Сбрасываем после каждого приема пищи - худший случай для write-back кэша
+    flush_user_data(user_id)
+
+
+def run(name: str, log_meal) -> None:
+    with tempfile.TemporaryDirectory() as data_dir:
+        user_data.DATA_DIR = data_dir
+        clear_user_data_cache(flush=False)
+
+        with FsyncCounter() as counter:
+            started = time.perf_counter()
+            for meal_no in range(MEALS):
+                log_meal('bench_user', meal_no)
+            elapsed = time.perf_counter() - started
+
+        clear_user_data_cache(flush=False)
+
+    print(f"{name:<28} fsync/прием пищи: {counter.calls / MEALS:5.1f}   "
+          f"время/прием пищи: {elapsed / MEALS * 1000:6.2f} мс")
+
+
+if __name__ == '__main__':
+    print(f"🧪 Запись {MEALS} приемов пищи одного пользователя\n")
+    run('Все шесть документов', legacy_log_meal)
+    run('save_user_document', document_log_meal)
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк: кэш оценок GPT на потоке сообщений о еде
+
+Сообщения выбираются из 2000 описаний по закону Ципфа (популярные блюда
+пишут чаще), регистр и пробелы варьируются. Показывает долю попаданий
+(= запросов к GPT, которых не было) и время обращения к кэшу. Для
+сравнения: ответ GPT на описание блюда - 1.5-3 с.
+
+Запуск: python benchmarks/bench_gpt_cache.py
+"""
+import os
+import sys
+import random
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.gpt_cache import NutritionCache
+
+DISHES = 2000
+MESSAGES = 20000
+NUTRITION = {'calories': 450, 'protein': 30, 'fat': 15, 'carbs': 40}
+
+
+def message_stream() -> list:
+    random.seed(1)
+    weights = [1 / rank for rank in range(1, DISHES + 1)]
+    dishes = random.choices(range(DISHES), weights=weights, k=MESSAGES)
+    variants = ['блюдо номер {}', 'Блюдо номер {}', 'блюдо  номер {} ', 'блюдо номер {}.']
+    return [random.choice(variants).format(dish) for dish in dishes]
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = NutritionCache(os.path.join(tmp, 'gpt_cache.sqlite3'), 30 * 24 * 3600, 50000)
+        get_time = put_time = 0.0
+        for text in message_stream():
+            started = time.perf_counter()
+            found = cache.get(text, 'gpt-4o-mini', 'v1')
+            get_time += time.perf_counter() - started
+            if found is None:
+                started = time.perf_counter()
+                cache.put(text, 'gpt-4o-mini', 'v1', NUTRITION)
+                put_time += time.perf_counter() - started
+        cache.close()
+
+    stats = cache.stats
+    print(f"🧪 {MESSAGES} сообщений, {DISHES} разных блюд (распределение Ципфа)\n")
+    print(f"попаданий: {stats['hits']} ({stats['hits'] / MESSAGES:.0%}) - столько запросов к GPT не понадобилось")
+    print(f"обращение к кэшу: {get_time / MESSAGES * 1e6:.0f} мкс, запись: {put_time / stats['writes'] * 1e6:.0f} мкс")
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк: вечерний всплеск запросов к GPT с планировщиком и без
+
+Модель OpenAI: квота 600 запросов в минуту (ведро на 10 запросов, чтобы
+всплеск упирался в лимит за секунды, а не за минуту), ответ за 0.2 с. Сверх квоты -
+429, после которого ask_gpt ждет 2/4/8 с (здесь в 10 раз меньше), три попытки.
+Без планировщика 80 одновременных запросов получают 429 и теряются после
+трех попыток; с планировщиком каждый ждет своей квоты в очереди.
+
+Запуск: python benchmarks/bench_gpt_scheduler.py
+"""
+import os
+import sys
+import asyncio
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.gpt_scheduler import GPTScheduler, TokenBucket
+
+REQUESTS = 80
+USERS = 20
+LATENCY = 0.2
+BACKOFF_SCALE = 0.1
+
+
+class RateLimited(Exception):
+    pass
+
+
+class FakeOpenAI:
+    """Сервер с квотой 10 запросов в секунду и ведром на 10 запросов"""
+
+    def __init__(self):
+        self.quota = TokenBucket(600)
+        self.quota.capacity = self.quota.level = 10
+        self.rejected = 0
+
+    async def create(self):
+        if self.quota.wait_time(1) > 0:
+            self.rejected += 1
+            raise RateLimited()
+        self.quota.take(1)
+        await asyncio.sleep(LATENCY)
+
+
+async def ask(api: FakeOpenAI, scheduler, user_id: str) -> bool:
+    for attempt in range(3):
+        try:
+            if scheduler is None:
+                await api.create()
+            else:
+                async with scheduler.slot('gpt-4o-mini', 1, user_id):
+                    await api.create()
+            return True
+        except RateLimited:
+            if attempt < 2:
+                await asyncio.sleep(2 ** (attempt + 1) * BACKOFF_SCALE)
+    return False
+
+
+async def burst(use_scheduler: bool) -> None:
+    api = FakeOpenAI()
+    scheduler = None
+    if use_scheduler:
+        scheduler = GPTScheduler(8, {'gpt-4o-mini': {'rpm': 600, 'tpm': 10 ** 6}})
+        requests, _ = scheduler.buckets('gpt-4o-mini')
+        requests.capacity = requests.level = 10
+
+    latencies = []
+
+    async def timed(user_id):
+        started = time.perf_counter()
+        ok = await ask(api, scheduler, user_id)
+        latencies.append((time.perf_counter() - started, ok))
+
+    await asyncio.gather(*(timed(str(i % USERS)) for i in range(REQUESTS)))
+    done = sorted(latency for latency, ok in latencies if ok)
+    p50 = done[len(done) // 2] if done else 0
+    p95 = done[int(len(done) * 0.95)] if done else 0
+    title = 'с планировщиком' if use_scheduler else 'без планировщика'
+    print(f"{title:18} выполнено {len(done)}/{REQUESTS}, ответов 429: {api.rejected:3}, "
+          f"p50 {p50:.2f} с, p95 {p95:.2f} с")
+
+
+if __name__ == '__main__':
+    print(f"🧪 {REQUESTS} запросов от {USERS} пользователей одновременно, квота 10 запросов/с\n")
+    asyncio.run(burst(False))
+    asyncio.run(burst(True))
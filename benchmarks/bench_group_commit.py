@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк: пропускная способность записи приемов пищи в режимах STORAGE_DURABILITY
+
+Потоки хранилища (как пул STORAGE_THREADS) записывают приемы пищи 200
+пользователей через log_meal: строка журнала еды + дневник в кэше.
+
+- strict:  fsync на каждую запись - пропускная способность упирается в задержку fsync
+- group:   записи разных пользователей синхронизируются общим сбросом группы
+           (syncfs на Linux)
+- relaxed: без fsync
+
+Медленный диск имитируется задержкой в os.fsync и syncfs (по умолчанию 2 мс);
+вызовы выполняются по очереди, как сброс кэша одного устройства.
+С задержкой 0 меряется настоящий диск.
+
+Запуск: python benchmarks/bench_group_commit.py [задержка fsync, мс]
+"""
+import os
+import sys
+import time
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import user_data
+from utils.user_data import log_meal, clear_user_data_cache
+
+USERS = 200
+MESSAGES = 2000
+THREADS = (4, 16)
+MODES = ('strict', 'group', 'relaxed')
+DAY = '2099-01-01'
+
+
+def run(mode: str, threads: int) -> float:
+    """Сообщений в секунду"""
+    with tempfile.TemporaryDirectory() as tmp:
+        user_data.DATA_DIR = tmp
+        user_data.STORAGE_DURABILITY = mode
+        clear_user_data_cache(flush=False)
+
+        # Каталоги пользователей создаем заранее - меряем только запись
+        for i in range(USERS):
+            user_data.get_user_files(f'bench_{i}')
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            for message in range(MESSAGES):
+                pool.submit(log_meal, f'bench_{message % USERS}', DAY, [f'Блюдо {message}', 350, 20])
+        elapsed = time.perf_counter() - started
+
+        clear_user_data_cache(flush=False)
+    return MESSAGES / elapsed
+
+
+def main(fsync_delay_ms: float) -> None:
+    real_fsync, real_syncfs = os.fsync, user_data._group_commit._syncfs
+    disk = threading.Lock()
+
+    def slow_fsync(fd):
+        with disk:
+            time.sleep(fsync_delay_ms / 1000)
+            return real_fsync(fd)
+
+    def slow_syncfs(path):
+        with disk:
+            time.sleep(fsync_delay_ms / 1000)
+        return real_syncfs(path)
+
+    if fsync_delay_ms:
+        os.fsync = slow_fsync
+        if real_syncfs is not None:
+            user_data._group_commit._syncfs = slow_syncfs
+    print(f"🧪 {MESSAGES} приемов пищи {USERS} пользователей, задержка fsync {fsync_delay_ms} мс\n")
+    try:
+        for threads in THREADS:
+            for mode in MODES:
+                groups_before = dict(user_data._group_commit.stats)
+                throughput = run(mode, threads)
+                stats = user_data._group_commit.stats
+                details = ''
+                if mode == 'group':
+                    groups = stats['groups'] - groups_before['groups']
+                    writes = stats['writes'] - groups_before['writes']
+                    details = f"   ({writes / max(groups, 1):.1f} записей на группу)"
+                print(f"потоков {threads:>2}  {mode:<8} {throughput:8.0f} сообщений/с{details}")
+            print()
+    finally:
+        os.fsync, user_data._group_commit._syncfs = real_fsync, real_syncfs
+
+
+if __name__ == '__main__':
+    main(float(sys.argv[1]) if len(sys.argv) > 1 else 2.0)
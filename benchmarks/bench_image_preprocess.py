@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк: фото для GPT Vision - самый большой размер из Telegram как есть
+против наименьшего подходящего размера, уменьшенного и перекодированного
+(utils/image_preprocess.py)
+
+Фото синтетические, похожие на снимок тарелки (пятна, градиенты, шум),
+сохранены как у Telegram: 1280x960 и 800x600, JPEG quality 87. На фото:
+- байты скачивания из Telegram и байты запроса (base64);
+- время подготовки (Pillow);
+- оценка времени передачи (скачивание + отправка) при BANDWIDTH_MBIT;
+- токены фото в запросе.
+
+Нужен Pillow. Запуск: python benchmarks/bench_image_preprocess.py
+"""
+import io
+import os
+import sys
+import time
+import base64
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import image_preprocess
+from utils.image_preprocess import prepare_image
+from utils.prompt_builder import image_tokens
+
+PHOTOS = 20
+BANDWIDTH_MBIT = 20
+
+
+def make_photo(seed: int, size):
+    from PIL import Image, ImageDraw, ImageFilter
+
+    rng = random.Random(seed)
+    width, height = 1280, 960
+    image = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y, r = rng.randrange(width), rng.randrange(height), rng.randrange(20, 200)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=color)
+    image = image.filter(ImageFilter.GaussianBlur(3))
+    noise = Image.effect_noise((width, height), 24).convert('RGB')
+    image = Image.blend(image, noise, 0.15)
+
+    buffer = io.BytesIO()
+    image.resize(size, Image.LANCZOS).save(buffer, 'JPEG', quality=87)
+    return buffer.getvalue()
+
+
+def transfer_ms(download: int, upload: int) -> float:
+    return (download + upload) * 8 / (BANDWIDTH_MBIT * 1e6) * 1000
+
+
+def measure(name, originals, prepare):
+    download = upload = seconds = tokens = 0
+    for data in originals:
+        start = time.perf_counter()
+        prepared = prepare(data)
+        seconds += time.perf_counter() - start
+        download += len(data)
+        upload += len(base64.b64encode(prepared.data))
+        tokens += image_tokens(prepared.detail, prepared.width, prepared.height)
+    n = len(originals)
+    prep_ms = seconds / n * 1000
+    total_ms = prep_ms + transfer_ms(download / n, upload / n)
+    print(f"{name:32} {download / n / 1024:7.0f} КБ  {upload / n / 1024:7.0f} КБ  "
+          f"{prep_ms:6.1f} мс  {total_ms:6.0f} мс  {tokens / n:5.0f}")
+
+
+if __name__ == '__main__':
+    import logging
+    logging.disable(logging.INFO)
+
+    if image_preprocess.Image is None:
+        print("⏭ Пропуск: нужен Pillow (pip install -r requirements.txt)")
+        sys.exit(0)
+
+    largest = [make_photo(seed, (1280, 960)) for seed in range(PHOTOS)]
+    adequate = [make_photo(seed, (800, 600)) for seed in range(PHOTOS)]
+
+    def as_is(data):
+        return image_preprocess.PreparedImage(data, 'image/jpeg', 1280, 960, 'high')
+
+    print(f"🧪 {PHOTOS} фото, передача {BANDWIDTH_MBIT} Мбит/с\n")
+    print(f"{'':32} {'скачано':>10} {'запрос':>10} {'подгот.':>9} {'всего':>9} {'токены':>6}")
+    measure("photo[-1] 1280x960 как есть", largest, as_is)
+    for edge, detail, fmt in ((768, 'auto', 'jpeg'), (768, 'auto', 'webp'), (512, 'auto', 'jpeg')):
+        image_preprocess.PHOTO_MAX_EDGE, image_preprocess.PHOTO_DETAIL = edge, detail
+        image_preprocess.PHOTO_FORMAT = fmt
+        measure(f"800x600 -> {edge}px {fmt} q{image_preprocess.PHOTO_QUALITY}", adequate, prepare_image)
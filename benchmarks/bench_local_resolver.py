@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк: локальный расчет калорий против запроса к GPT
+
+Набор типичных сообщений о еде: простые продукты ("банан", "2 яйца")
+и блюда, которые должны уйти в GPT. Показывает долю сообщений без GPT
+и время локального ответа; для сравнения - медиана ответа GPT ~1.5-3 с.
+
+Запуск: python benchmarks/bench_local_resolver.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.local_resolver import resolve_locally, get_local_resolver_stats
+
+MESSAGES = [
+    'банан', 'яблоко', '2 яйца', 'кефир 200 мл', 'стакан кефира', '200г гречки',
+    'рис 150 г', 'творог 5% 200г', '1 ст.л. арахисовой пасты', 'кофе латте 250 мл',
+    'стакан сока апельсинового', '3 мандарина', 'куриная грудка', 'пиво светлое 0,5 л',
+    'гречка с котлетой', 'борщ со сметаной', 'творог', 'шаурма', 'салат оливье',
+    'омлет из двух яиц', 'паста карбонара', 'кофе с молоком', 'пицца 2 куска', 'бутерброд с сыром',
+]
+REPEATS = 1000
+
+
+if __name__ == '__main__':
+    import logging
+    logging.disable(logging.INFO)
+
+    local = [text for text in MESSAGES if resolve_locally(text)]
+    started = time.perf_counter()
+    for _ in range(REPEATS):
+        for text in MESSAGES:
+            resolve_locally(text)
+    per_message = (time.perf_counter() - started) / (REPEATS * len(MESSAGES)) * 1e6
+
+    print(f"🧪 {len(MESSAGES)} сообщений о еде\n")
+    print(f"без GPT: {len(local)} из {len(MESSAGES)} ({len(local) / len(MESSAGES):.0%}): {', '.join(local)}")
+    print(f"время разбора: {per_message:.0f} мкс на сообщение")
+    print(f"bypass_ratio: {get_local_resolver_stats()['bypass_ratio']:.2f}")
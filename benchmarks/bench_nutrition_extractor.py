@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк: разбор БЖУ из текстового ответа GPT - каскад регулярных выражений
+против одного прохода (utils/nutrition_extractor.py)
+
+Ответы из tests/mock_gpt.py и форматы из тестов извлечения БЖУ
+(tests/test_nutrition_extractor.py). Прежний разбор - эталонная копия в
+tests/legacy_nutrition.py; результаты обоих разборов сверяются.
+
+Логирование INFO отключено: прежний разбор писал в лог каждый ответ, в
+работающем боте он медленнее, чем здесь.
+
+Запуск: python benchmarks/bench_nutrition_extractor.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.legacy_nutrition import extract_nutrition_smart as legacy_extract
+from tests.test_nutrition_extractor import RESPONSES, FIXED
+from utils.nutrition_extractor import extract_nutrition
+
+ROUNDS = 2000
+
+
+def per_call_us(extract) -> float:
+    best = float('inf')
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            for response in RESPONSES:
+                extract(response)
+        best = min(best, (time.perf_counter() - start) / (ROUNDS * len(RESPONSES)))
+    return best * 1e6
+
+
+if __name__ == '__main__':
+    import logging
+    logging.disable(logging.INFO)
+
+    for response in RESPONSES:
+        expected = FIXED[response] if response in FIXED else legacy_extract(response)
+        assert extract_nutrition(response) == expected, response
+
+    legacy_us, single_us = per_call_us(legacy_extract), per_call_us(extract_nutrition)
+
+    print(f"🧪 {len(RESPONSES)} ответов GPT, {ROUNDS} повторов, результаты совпадают "
+          f"(кроме {len(FIXED)} исправленных)\n")
+    print(f"каскад регулярных выражений  {legacy_us:7.1f} мкс на ответ")
+    print(f"один проход                  {single_us:7.1f} мкс на ответ")
+    print(f"\nразбор быстрее в {legacy_us / single_us:.1f} раза")
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк: память 1000 пользователей с фото, ожидающими подтверждения
+
+Раньше base64 фото лежал в context.user_data['pending_photo_base64'] до
+ответа пользователя. Теперь в user_data только id, фото - в
+utils/pending_photos.py: в памяти не больше PENDING_PHOTO_MAX_MEMORY,
+остальное на диске.
+
+Для каждого варианта (tracemalloc):
+- память процесса под user_data и хранилище;
+- размер user_data в pickle (так их сохранял бы PicklePersistence).
+
+Фото - base64 размера после подготовки (utils/image_preprocess.py) и
+размера photo[-1] до нее.
+
+Запуск: python benchmarks/bench_pending_photos.py
+"""
+import os
+import sys
+import pickle
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import PENDING_PHOTO_MAX_MEMORY
+from utils.pending_photos import PendingPhotoStore
+
+USERS = 1000
+ANALYSIS = {'success': True, 'description': 'Гречка с котлетой', 'calories': 470,
+            'protein': 25.0, 'fat': 20.2, 'carbs': 47.0}
+DISH = {'description': 'Гречка с котлетой', 'kcal': 470, 'protein': 25.0, 'fat': 20.2, 'carbs': 47.0}
+
+
+def photo(i: int, size: int) -> str:
+    return (f'{i:06d}' * (size // 6 + 1))[:size]
+
+
+def in_user_data(size: int):
+    return {str(i): {'pending_photo_dish': dict(DISH), 'pending_photo_base64': photo(i, size)}
+            for i in range(USERS)}
+
+
+def in_store(size: int, spill_dir: str):
+    store = PendingPhotoStore(3600, USERS * 2, PENDING_PHOTO_MAX_MEMORY, spill_dir)
+    user_data = {}
+    for i in range(USERS):
+        user_id = str(i)
+        photo_id = store.put(user_id, photo(i, size), 'image/jpeg', 'high', ANALYSIS)
+        user_data[user_id] = {'pending_photo_dish': dict(DISH), 'pending_photo_id': photo_id}
+    return user_data, store
+
+
+def measure(build):
+    tracemalloc.start()
+    kept = build()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    user_data = kept[0] if isinstance(kept, tuple) else kept
+    return memory, len(pickle.dumps(user_data))
+
+
+if __name__ == '__main__':
+    import logging
+    logging.disable(logging.INFO)
+
+    print(f"🧪 {USERS} пользователей с фото в ожидании, "
+          f"PENDING_PHOTO_MAX_MEMORY={PENDING_PHOTO_MAX_MEMORY // (1024 * 1024)} МБ\n")
+    print(f"{'':40} {'память':>10} {'pickle user_data':>17}")
+    for label, size in (("после подготовки, 64 КБ base64", 64 * 1024), ("photo[-1], 242 КБ base64", 242 * 1024)):
+        with tempfile.TemporaryDirectory() as spill_dir:
+            before = measure(lambda: in_user_data(size))
+            after = measure(lambda: in_store(size, spill_dir))
+            disk = sum(os.path.getsize(os.path.join(spill_dir, name)) for name in os.listdir(spill_dir))
+        print(f"{label}:")
+        print(f"  {'в context.user_data':38} {before[0] / 2 ** 20:7.1f} МБ {before[1] / 2 ** 20:14.2f} МБ")
+        print(f"  {'pending_photos':38} {after[0] / 2 ** 20:7.1f} МБ {after[1] / 2 ** 20:14.2f} МБ"
+              f"   + {disk / 2 ** 20:.0f} МБ на диске")
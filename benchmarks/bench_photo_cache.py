@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк: кэш анализа фото на потоке фото пользователей
+
+Каждый пользователь снимает несколько блюд; часть фото - повторы (переслал
+еще раз) или кадры того же блюда, у которых dHash отличается на 1-4 бита.
+Показывает долю фото, не дошедших до GPT Vision (ответ - 3-8 с), и время
+обращения к кэшу. Хэши синтетические, Pillow не нужен.
+
+Запуск: python benchmarks/bench_photo_cache.py
+"""
+import os
+import sys
+import random
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.photo_cache import PhotoAnalysisCache
+
+USERS = 500
+PHOTOS = 20000
+REPEAT_SHARE = 0.15  # доля фото, повторяющих одно из недавних
+RESULT = {'success': True, 'description': 'блюдо', 'calories': 450}
+
+
+def photo_stream() -> list:
+    random.seed(1)
+    recent = {}
+    stream = []
+    for _ in range(PHOTOS):
+        user = str(random.randrange(USERS))
+        photos = recent.setdefault(user, [])
+        if photos and random.random() < REPEAT_SHARE:
+            photo_hash = random.choice(photos)
+            for _ in range(random.randint(0, 4)):
+                photo_hash ^= 1 << random.randrange(64)
+        else:
+            photo_hash = random.getrandbits(64)
+            photos.append(photo_hash)
+        stream.append((user, photo_hash))
+    return stream
+
+
+if __name__ == '__main__':
+    cache = PhotoAnalysisCache(12 * 3600, 6, 20, 1000)
+    get_time = 0.0
+    for user, photo_hash in photo_stream():
+        started = time.perf_counter()
+        found = cache.get(user, photo_hash)
+        get_time += time.perf_counter() - started
+        if found is None:
+            cache.put(user, photo_hash, None, RESULT)
+
+    stats = cache.stats
+    print(f"🧪 {PHOTOS} фото от {USERS} пользователей, {REPEAT_SHARE:.0%} - повторы и похожие кадры\n")
+    print(f"попаданий: {stats['hits']} ({stats['hits'] / PHOTOS:.1%}) - столько запросов к GPT Vision не понадобилось")
+    print(f"обращение к кэшу: {get_time / PHOTOS * 1e6:.1f} мкс")
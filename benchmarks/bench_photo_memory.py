@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк: память и время приема фото - временный файл против скачивания в память
+
+Прежний путь: download_to_drive('temp_{user_id}.jpg'), чтение файла,
+base64, удаление файла - все копии фото живут до конца анализа. Новый:
+download_photo (bytearray) -> prepare_image -> base64, исходные байты
+освобождаются до запроса к GPT (utils/image_preprocess.py).
+
+Для каждого пути по tracemalloc:
+- пик памяти на одно фото (скачивание + base64 + сообщения запроса);
+- память, удерживаемая фото на время анализа (пока ждем GPT).
+
+Подготовка без Pillow (фото как есть), чтобы сравнивать только копии
+буферов; размер фото - как у 1280x960 из Telegram.
+
+Запуск: python benchmarks/bench_photo_memory.py
+"""
+import os
+import sys
+import time
+import base64
+import asyncio
+import tempfile
+import tracemalloc
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import image_preprocess
+from utils.image_preprocess import download_photo, prepare_image
+from utils.prompt_builder import build_food_photo_messages
+
+PHOTO_BYTES = 180 * 1024
+ROUNDS = 50
+PAYLOAD = os.urandom(PHOTO_BYTES)
+
+
+def telegram_photo():
+    """PhotoSize: скачанные данные - новый объект, как ответ сети"""
+    async def download_to_drive(file_name):
+        with open(file_name, 'wb') as f:
+            f.write(bytes(PAYLOAD))
+
+    async def download_as_bytearray():
+        return bytearray(PAYLOAD)
+
+    async def get_file():
+        return SimpleNamespace(download_to_drive=download_to_drive,
+                               download_as_bytearray=download_as_bytearray, file_size=PHOTO_BYTES)
+    return SimpleNamespace(width=1280, height=960, file_size=PHOTO_BYTES, get_file=get_file)
+
+
+async def temp_file_pipeline(photo, user_id='1'):
+    file = await photo.get_file()
+    file_name = f'temp_{user_id}.jpg'
+    await file.download_to_drive(file_name)
+    with open(file_name, 'rb') as f:
+        img_bytes = f.read()
+    img_b64 = base64.b64encode(img_bytes).decode()
+    os.remove(file_name)
+    messages = build_food_photo_messages(img_b64)
+    return img_bytes, img_b64, messages
+
+
+async def in_memory_pipeline(photo):
+    img_bytes = await download_photo(photo)
+    image = prepare_image(img_bytes, (photo.width, photo.height))
+    del img_bytes
+    img_b64 = base64.b64encode(image.data).decode('ascii')
+    mime_type, detail = image.mime_type, image.detail
+    del image
+    messages = build_food_photo_messages(img_b64, mime_type=mime_type, detail=detail)
+    return img_b64, messages
+
+
+def measure(pipeline):
+    peaks, held, seconds = [], [], 0.0
+    for _ in range(ROUNDS):
+        photo = telegram_photo()
+        tracemalloc.start()
+        start = time.perf_counter()
+        kept = asyncio.run(pipeline(photo))
+        seconds += time.perf_counter() - start
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peaks.append(peak)
+        held.append(current)
+        del kept
+    return max(peaks), sorted(held)[len(held) // 2], seconds / ROUNDS * 1000
+
+
+if __name__ == '__main__':
+    import logging
+    logging.disable(logging.INFO)
+    image_preprocess.Image = None
+
+    os.chdir(tempfile.mkdtemp())
+    print(f"🧪 фото {PHOTO_BYTES // 1024} КБ, {ROUNDS} повторов\n")
+    print(f"{'':24} {'пик на фото':>12} {'держим в анализе':>17} {'время':>8}")
+    for name, pipeline in (("временный файл", temp_file_pipeline), ("в памяти", in_memory_pipeline)):
+        peak, held, ms = measure(pipeline)
+        print(f"{name:24} {peak / 1024:9.0f} КБ {held / 1024:14.0f} КБ {ms:6.2f} мс")
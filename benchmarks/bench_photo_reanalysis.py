@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк: токены запроса при уточнении фото
+
+- фото заново:  фото + полный промпт анализа фото + уточнение (GPT_VISION_MODEL)
+- текстом:      уточнение как новое описание блюда (прежний путь, GPT_TEXT_MODEL);
+                разбор с фото теряется, поэтому описание - блюдо целиком
+- уточнение:    прошлый разбор + уточнение (reanalyze_food_photo, GPT_TEXT_MODEL);
+                фото - только если вместо разбора GPT задал вопрос
+
+Токены входа - estimate_request_tokens без max_tokens ответа.
+
+Запуск: python benchmarks/bench_photo_reanalysis.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import GPT_TEXT_MODEL, GPT_VISION_MODEL
+from utils.prompt_builder import (
+    build_food_photo_messages, build_food_text_messages, build_photo_correction_messages,
+    estimate_request_tokens, JSON_ANSWER_FORMAT,
+)
+
+IMAGE = 'A' * 64 * 1024
+
+
+def item(name, grams, kcal, protein, fat, carbs):
+    return {'name': name, 'grams': grams, 'kcal': kcal, 'protein': protein, 'fat': fat, 'carbs': carbs}
+
+
+# прошлый разбор, уточнение пользователя, описание блюда целиком
+CASES = [
+    ({'items': [item('Гречка отварная', 200, 264, 9.0, 2.6, 42.0), item('Котлета куриная', 100, 206, 16.0, 17.6, 5.0)]},
+     'гречки было 150г', 'гречка 150г с куриной котлетой 100г'),
+    ({'items': [item('Творог 5%', 200, 242, 34.0, 10.0, 6.0), item('Банан', 120, 108, 1.8, 0.4, 25.0),
+                item('Арахисовая паста', 15, 88, 3.8, 7.5, 3.0)]},
+     'пасты была столовая ложка с горкой', 'творог 5% 200г с бананом и 25г арахисовой пасты'),
+    ({'items': [item('Салат с тунцом', 250, 400, 20.0, 30.0, 12.0)]},
+     'без майонеза', 'салат с тунцом без майонеза 250г'),
+    ({'items': [item('Шаурма с курицей', 350, 700, 35.0, 35.0, 60.0)]},
+     'это была маленькая шаурма', 'маленькая шаурма с курицей'),
+    ({'question': 'Каша на воде или на молоке?'}, 'на молоке', 'овсянка на молоке'),
+]
+
+
+def input_tokens(messages) -> int:
+    return estimate_request_tokens(messages, 0)
+
+
+def photo_again(analysis, correction, description):
+    messages = build_food_photo_messages(IMAGE, structured=True, detail='high')
+    messages[-1]['content'][0]['text'] += f'\nУточнение пользователя: "{correction}"'
+    return messages, GPT_VISION_MODEL
+
+
+def as_text(analysis, correction, description):
+    return build_food_text_messages(description, JSON_ANSWER_FORMAT), GPT_TEXT_MODEL
+
+
+def reanalysis(analysis, correction, description):
+    image = None if analysis.get('items') else IMAGE
+    messages = build_photo_correction_messages(analysis, correction, image, detail='high', structured=True)
+    return messages, GPT_VISION_MODEL if image else GPT_TEXT_MODEL
+
+
+if __name__ == '__main__':
+    import logging
+    logging.disable(logging.INFO)
+
+    print(f"🧪 {len(CASES)} уточнений ({len(CASES) - 1} с разбором, 1 ответ на вопрос)\n")
+    print(f"{'':14} {'токенов входа':>14} {'с разбором':>11}   модель")
+    for name, build in (("фото заново", photo_again), ("текстом", as_text), ("уточнение", reanalysis)):
+        built = [build(*case) for case in CASES]
+        tokens = [input_tokens(messages) for messages, _ in built]
+        models = sorted({model for _, model in built[:-1]})
+        print(f"{name:14} {sum(tokens) / len(tokens):11.0f} {sum(tokens[:-1]) / (len(tokens) - 1):11.0f}"
+              f"      {', '.join(models)}")
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк: размер промпта и полнота выбора строк справочника
+
+Описания блюд взяты из тестов (tests/). Для каждого указаны строки
+справочника, которые должны попасть в промпт; полнота (recall) - доля
+найденных из них. Для сравнения - промпт со всем справочником.
+
+Запуск: python benchmarks/bench_prompt_retrieval.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.food_index import food_index
+from utils.prompt_builder import build_food_text_messages, estimate_tokens
+
+ANSWER_FORMAT = "Ответь в формате: X ккал, Y г белка, Z г жиров, W г углеводов"
+
+# описание -> строки справочника, нужные для расчета
+CASES = {
+    'гречка с котлетой': ['Гречка отварная'],
+    'борщ': ['Борщ'],
+    'рис с курицей': ['Рис отварной', 'Куриная грудка'],
+    'творог с бананом': ['Творог 9%', 'Творог 5%', 'банан'],
+    'Творог с пастой': ['Творог 5%', 'Арахисовая паста'],
+    'Овсянка на молоке': ['Овсянка на молоке'],
+    'салат с курицей и овощами': ['Куриная грудка'],
+    'омлет': ['Яйцо куриное'],
+    'блюдо с куриной грудкой': ['Куриная грудка'],
+    'макароны с котлетами': ['Макароны'],
+    'морковь по-корейски с рыбой': ['Морковь по-корейски'],
+    'греческий салат с сыром фета и майонезом': ['Греческий салат', 'Майонез 67%'],
+    'овощной салат с майонезом': ['Майонез 67%', 'Майонез легкий 20-30%'],
+    'салат с тунцом: консервированный тунец в масле, огурцы, сухарики, вареное яйцо, майонез': [
+        'Салат с тунцом', 'Тунец консервированный в масле', 'Огурец', 'Яйцо куриное', 'Майонез 67%'
+    ],
+    'два блюда: макароны с котлетами, морковь по-корейски с рыбой': ['Макароны', 'Морковь по-корейски'],
+    'творог 5% с бананом и арахисовой пастой': ['Творог 5%', 'банан', 'Арахисовая паста'],
+    'бутерброды с красной икрой': ['Бутерброд с красной икрой', 'Красная икра (лосось)'],
+    'шаурма с курицей': ['Шаурма с курицей'],
+    'бокал пива и картофель фри': ['Пиво светлое 4-5%', 'Картофель фри'],
+    'чебурек с мясом': ['Чебурек с мясом'],
+}
+
+
+def prompt_tokens(description: str, mode: str) -> int:
+    messages = build_food_text_messages(description, ANSWER_FORMAT, mode=mode)
+    return estimate_tokens(messages[0]['content']) + estimate_tokens(messages[-1]['content'][0]['text'])
+
+
+def recall(k: int) -> float:
+    found = expected = 0
+    for description, wanted in CASES.items():
+        rows = {row.name for row in food_index.search(description, k)}
+        found += len(rows & set(wanted))
+        expected += len(wanted)
+    return found / expected
+
+
+if __name__ == '__main__':
+    import logging
+    logging.disable(logging.INFO)
+
+    full = sum(prompt_tokens(description, 'full') for description in CASES) / len(CASES)
+    print(f"🧪 {len(CASES)} описаний блюд из тестов\n")
+    print(f"весь справочник   {full:6.0f} токенов на запрос, полнота 100%")
+
+    import utils.prompt_builder as prompt_builder
+    for k in (3, 5, 10, 15):
+        prompt_builder.PROMPT_TOP_K = k
+        tokens = sum(prompt_tokens(description, 'retrieval') for description in CASES) / len(CASES)
+        print(f"top-{k:<2}            {tokens:6.0f} токенов на запрос ({full / tokens:.1f}x меньше), "
+              f"полнота {recall(k) * 100:5.1f}%")
+
+    started = time.perf_counter()
+    for _ in range(100):
+        for description in CASES:
+            food_index.search(description, 10)
+    print(f"\nпоиск по индексу: {(time.perf_counter() - started) / (100 * len(CASES)) * 1e6:.0f} мкс на описание")
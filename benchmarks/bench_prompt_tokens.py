@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк: токены запроса к GPT для описания блюда
+
+- раньше:    справочник посередине промпта, после описания блюда - общий
+             префикс у запросов короткий, кэш провайдера не срабатывает
+- full:      справочник в системном префиксе, который кэшируется целиком
+- retrieval: в запросе только строки справочника, относящиеся к блюду
+
+Оплачиваемые токены с кэшем считаются по тарифу OpenAI: закэшированная
+часть префикса (кратно 128 токенам, от 1024) стоит вдвое дешевле.
+
+Запуск: python benchmarks/bench_prompt_tokens.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data.calorie_database import CALORIE_DATABASE
+from utils.prompt_builder import build_food_text_messages, estimate_tokens, CALORIE_RULES
+
+DISHES = [
+    'гречка с котлетой',
+    'борщ со сметаной и хлебом',
+    'творог 5% с бананом и арахисовой пастой',
+    'шаурма с курицей',
+    'овсянка на молоке с яблоком',
+    'рис с куриной грудкой и огурцом',
+    'два бутерброда с красной икрой',
+    'бокал красного вина и сыр',
+]
+ANSWER_FORMAT = "Ответь в формате: X ккал, Y г белка, Z г жиров, W г углеводов"
+
+
+def legacy_prompt(description: str) -> str:
+    return (f'Рассчитай калорийность и белок блюда: "{description}"\n\n'
+            f'Используй следующие справочные данные:\n{CALORIE_DATABASE}\n{CALORIE_RULES}\n{ANSWER_FORMAT}')
+
+
+def billed(prefix_tokens: int, total_tokens: int) -> float:
+    """Токены с учетом скидки на закэшированный префикс"""
+    cached = prefix_tokens // 128 * 128 if prefix_tokens >= 1024 else 0
+    return total_tokens - cached / 2
+
+
+def measure(mode: str) -> tuple:
+    total = cached_total = 0
+    for dish in DISHES:
+        messages = build_food_text_messages(dish, ANSWER_FORMAT, mode=mode)
+        prefix = estimate_tokens(messages[0]['content'])
+        tokens = prefix + estimate_tokens(messages[-1]['content'][0]['text'])
+        total += tokens
+        cached_total += billed(prefix, tokens)
+    return total / len(DISHES), cached_total / len(DISHES)
+
+
+if __name__ == '__main__':
+    import logging
+    logging.disable(logging.INFO)
+
+    legacy = sum(estimate_tokens(legacy_prompt(dish)) for dish in DISHES) / len(DISHES)
+    prefix_len = len('Рассчитай калорийность и белок блюда: "')
+    legacy_prefix = estimate_tokens(legacy_prompt('')[:prefix_len])
+
+    print(f"🧪 {len(DISHES)} описаний блюд, токены на запрос (оценка)\n")
+    print(f"раньше     {legacy:7.0f} токенов   с кэшем {billed(legacy_prefix, legacy):7.0f}")
+    for mode in ('full', 'retrieval'):
+        tokens, with_cache = measure(mode)
+        print(f"{mode:10} {tokens:7.0f} токенов   с кэшем {with_cache:7.0f}")
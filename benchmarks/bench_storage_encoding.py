@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк: размер на диске и время записи/чтения на 1000 записей лога еды
+
+Документы:
+- json indent=2:  старый формат save_user_data
+- json compact:   стандартный json без отступов
+- json_codec:     компактный формат хранилища (orjson/msgspec, если установлены)
+
+Партиции журнала (один месяц, 1000 записей):
+- jsonl и замороженные .jsonl.gz / .jsonl.zst (zstd - если установлен zstandard)
+
+Запуск: python benchmarks/bench_storage_encoding.py
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import json_codec
+from utils.food_journal import FoodJournal, COLD_CODECS
+
+ENTRIES = 1000
+REPEATS = 50
+
+
+def make_food_log() -> dict:
+    """1000 записей: 4 приема пищи в день, даты в пределах одного месяца по кругу"""
+    food_log = {}
+    for i in range(ENTRIES):
+        date = f'2025-01-{i // 4 % 31 + 1:02d}'
+        food_log.setdefault(date, []).append([f'Гречка с котлетой {i}', 480, 35, 18, 40])
+    return food_log
+
+
+def timed(func) -> float:
+    """Среднее время одного вызова, мс"""
+    started = time.perf_counter()
+    for _ in range(REPEATS):
+        func()
+    return (time.perf_counter() - started) / REPEATS * 1000
+
+
+def bench_documents(tmp: str, food_log: dict) -> None:
+    formats = {
+        'json indent=2': (lambda: json.dumps(food_log, ensure_ascii=False, indent=2).encode('utf-8'), json.loads),
+        'json compact': (lambda: json.dumps(food_log, ensure_ascii=False, separators=(',', ':')).encode('utf-8'),
+                         json.loads),
+        f'json_codec ({json_codec.BACKEND})': (lambda: json_codec.dumps(food_log), json_codec.loads),
+    }
+    print("Документ food_log:")
+    for name, (dumps, loads) in formats.items():
+        path = os.path.join(tmp, 'doc.json')
+
+        def save():
+            with open(path, 'wb') as f:
+                f.write(dumps())
+
+        def load():
+            with open(path, 'rb') as f:
+                return loads(f.read())
+
+        save_ms = timed(save)
+        load_ms = timed(load)
+        assert load() == food_log
+        print(f"  {name:<22} {os.path.getsize(path):>7} байт   запись {save_ms:6.3f} мс   чтение {load_ms:6.3f} мс")
+
+
+def bench_partitions(tmp: str, food_log: dict) -> None:
+    print("\nПартиция журнала (чтение - открытие с построением индекса и весь месяц):")
+    variants = [('jsonl', None)] + [(f'jsonl + {codec}', codec) for codec in COLD_CODECS]
+    for name, codec in variants:
+        path = os.path.join(tmp, f'{name.replace(" ", "").replace("+", "_")}.jsonl')
+        journal = FoodJournal(path)
+        journal.replace(food_log)
+        if codec:
+            journal.freeze(codec)
+        on_disk = journal.frozen_path or path
+
+        read_ms = timed(lambda: FoodJournal(path).to_dict())
+        assert FoodJournal(path).to_dict() == food_log
+        print(f"  {name:<22} {os.path.getsize(on_disk):>7} байт   чтение {read_ms:6.3f} мс")
+
+
+if __name__ == '__main__':
+    print(f"🧪 {ENTRIES} записей лога еды, среднее по {REPEATS} повторам\n")
+    food_log = make_food_log()
+    with tempfile.TemporaryDirectory() as tmp:
+        bench_documents(tmp, food_log)
+        bench_partitions(tmp, food_log)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк: разбор ответа GPT - текст с регулярными выражениями против JSON по схеме
+
+Ответы из tests/mock_gpt.py и те же расчеты в виде JSON (NUTRITION_SCHEMA):
+- время разбора одного ответа (extract_nutrition_smart / read_nutrition_answer);
+- длина ответа в токенах - ее оплачиваем и ее ждем при генерации (без
+  tiktoken - оценка по символам, она завышает JSON: ключ вроде "protein" -
+  один токен).
+
+Запуск: python benchmarks/bench_structured_output.py
+"""
+import os
+import sys
+import json
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.mock_gpt import MockGPTResponses
+from utils.calorie_calculator import extract_nutrition_smart
+from utils.structured_output import read_nutrition_answer
+from utils.prompt_builder import estimate_tokens
+
+ROUNDS = 2000
+
+
+def item(name, grams, kcal, protein, fat, carbs):
+    return {'name': name, 'grams': grams, 'kcal': kcal, 'protein': protein, 'fat': fat, 'carbs': carbs}
+
+
+def answer(items, kcal, protein, fat, carbs):
+    return json.dumps({'items': items, 'total': {'kcal': kcal, 'protein': protein, 'fat': fat, 'carbs': carbs},
+                       'question': None}, ensure_ascii=False, separators=(',', ':'))
+
+
+# Те же расчеты, что в MockGPTResponses.PHOTO_RESPONSES
+JSON_RESPONSES = {
+    'творог_банан': answer([item('Творог 9%', 150, 240, 24, 13.5, 3), item('Банан', 100, 90, 1.5, 0.3, 23),
+                            item('Арахисовая паста', 20, 120, 5, 10, 4)], 450, 30.5, 23.8, 30),
+    'омлет': answer([item('Яйца', 120, 155, 12, 11, 1), item('Сыр', 30, 110, 7, 9, 0),
+                     item('Помидор', 50, 10, 0.5, 0, 2), item('Масло для жарки', 5, 50, 0, 6, 0)], 325, 19.5, 26, 3),
+    'салат_курица': answer([item('Куриная грудка', 100, 165, 31, 3.6, 0), item('Листья салата', 50, 8, 0.7, 0, 1.5),
+                            item('Огурцы', 80, 13, 0.6, 0, 3), item('Помидоры', 60, 11, 0.5, 0, 2.4),
+                            item('Оливковое масло', 15, 120, 0, 14, 0)], 317, 32.8, 17.6, 6.9),
+}
+
+
+def per_call_us(parse, responses) -> float:
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for response in responses:
+            parse(response)
+    return (time.perf_counter() - start) / (ROUNDS * len(responses)) * 1e6
+
+
+if __name__ == '__main__':
+    import logging
+    logging.disable(logging.INFO)
+
+    prose = [MockGPTResponses.PHOTO_RESPONSES[name] for name in JSON_RESPONSES]
+    structured = list(JSON_RESPONSES.values())
+
+    for name, text in zip(JSON_RESPONSES, prose):
+        parsed = read_nutrition_answer(JSON_RESPONSES[name])
+        assert parsed['calories'] == extract_nutrition_smart(text)['calories'], name
+
+    text_us, json_us = per_call_us(extract_nutrition_smart, prose), per_call_us(read_nutrition_answer, structured)
+    text_tokens = sum(estimate_tokens(text) for text in prose) / len(prose)
+    json_tokens = sum(estimate_tokens(text) for text in structured) / len(structured)
+
+    print(f"🧪 {len(prose)} ответа GPT по фото, {ROUNDS} повторов\n")
+    print(f"текст + регулярные выражения  {text_us:7.1f} мкс на ответ   ~{text_tokens:4.0f} токенов ответа")
+    print(f"JSON по схеме                 {json_us:7.1f} мкс на ответ   ~{json_tokens:4.0f} токенов ответа")
+    print(f"\nразбор быстрее в {text_us / json_us:.1f} раза, длина ответа {json_tokens / text_tokens - 1:+.0%}")
@@ -16,7 +16,7 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 # КРИТИЧЕСКОЕ ИСПРАВЛЕНИЕ: Блокируем старые методы OpenAI
 import openai_safe
 
-from config import TELEGRAM_BOT_TOKEN, SCHEDULE
+from config import TELEGRAM_BOT_TOKEN, SCHEDULE, USER_CACHE_FLUSH_INTERVAL, OPENAI_PREWARM
 from handlers.commands import (
     start_command, help_command, goal_command, 
     weight_command, burn_command, left_command,
@@ -70,6 +70,59 @@ async def send_evening_summary_message(context):
         logger.error(f"Error in send_evening_summary_message: {e}")
 
 
+async def flush_user_data_job(context):
+    """Периодический сброс кэша пользовательских данных на диск и компакция журналов еды"""
+    from utils.user_data import (
+        flush_user_data_async, evict_expired_user_data, compact_food_logs_async, run_in_storage_thread
+    )
+    from utils.user_locks import get_lock_metrics
+
+    try:
+        # Запись на диск идет в пуле потоков хранилища - event loop не ждет fsync
+        flushed = await flush_user_data_async()
+        evicted = await run_in_storage_thread(evict_expired_user_data)
+        compacted = await compact_food_logs_async()
+        if flushed or evicted or compacted:
+            logger.debug(f"💾 User data cache: flushed {flushed}, evicted {evicted}, compacted {compacted}")
+
+        lock_metrics = get_lock_metrics()
+        if lock_metrics['contended']:
+            logger.debug(f"🔒 User locks: {lock_metrics}")
+    except Exception as e:
+        logger.error(f"Error in flush_user_data_job: {e}")
+
+
+async def freeze_food_logs_job(context):
+    """Ночное сжатие партиций лога еды за прошлые месяцы"""
+    from utils.user_data import freeze_cold_food_logs_async
+
+    try:
+        frozen = await freeze_cold_food_logs_async()
+        if frozen:
+            logger.info(f"🧊 Сжато партиций лога еды: {frozen}")
+    except Exception as e:
+        logger.error(f"Error in freeze_food_logs_job: {e}")
+
+
+async def on_startup(application):
+    """Открываем соединения с OpenAI до первого сообщения пользователя"""
+    from utils.openai_pool import prewarm_openai_pools
+
+    if OPENAI_PREWARM:
+        warmed = await prewarm_openai_pools()
+        logger.info(f"🔥 Прогрето пулов соединений OpenAI: {warmed}")
+
+
+async def on_shutdown(application):
+    """Сохраняем несброшенные данные пользователей при остановке бота"""
+    from utils.user_data import flush_user_data_async
+    from utils.openai_pool import close_openai_pools
+
+    flushed = await flush_user_data_async()
+    logger.info(f"💾 Кэш пользовательских данных сброшен при остановке ({flushed} польз.)")
+    await close_openai_pools()
+
+
 def setup_scheduled_jobs(application):
     """Настройка автоматических заданий"""
     job_queue = application.job_queue
@@ -96,6 +149,24 @@ def setup_scheduled_jobs(application):
         name='evening_summary'
     )
     
+    # Сброс кэша пользовательских данных на диск
+    job_queue.run_repeating(
+        flush_user_data_job,
+        interval=USER_CACHE_FLUSH_INTERVAL,
+        first=USER_CACHE_FLUSH_INTERVAL,
+        name='flush_user_data'
+    )
+
+    # Сжатие логов еды прошлых месяцев (FOOD_LOG_COLD_COMPRESSION)
+    job_queue.run_daily(
+        freeze_food_logs_job,
+        time=datetime.time(
+            hour=SCHEDULE['freeze_food_logs']['hour'],
+            minute=SCHEDULE['freeze_food_logs']['minute']
+        ),
+        name='freeze_food_logs'
+    )
+
     logger.info(f"📅 Scheduled jobs set up: morning {morning_time}, evening {evening_time}")
 
 
@@ -103,7 +174,13 @@ def main():
     """Главная функция запуска бота"""
     try:
         # Создаем приложение
-        application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+        application = (
+            Application.builder()
+            .token(TELEGRAM_BOT_TOKEN)
+            .post_init(on_startup)
+            .post_shutdown(on_shutdown)
+            .build()
+        )
         
         # Добавляем обработчики команд
         application.add_handler(CommandHandler("start", start_command))
@@ -62,6 +62,115 @@ logger.info(f"📊 Конфигурация: dotenv={'✅' if dotenv_available e
 # Папка для данных
 DATA_DIR = os.getenv('DATA_DIR', 'bot_data')
 
+# Хранилище пользовательских данных: 'json' (файлы в DATA_DIR) или 'sqlite'
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'json')
+SQLITE_PATH = os.getenv('SQLITE_PATH', os.path.join(DATA_DIR, 'bot_data.sqlite3'))
+
+# Кэш пользовательских данных в памяти процесса
+USER_CACHE_MAX_USERS = int(os.getenv('USER_CACHE_MAX_USERS', '1000'))  # LRU: максимум пользователей в кэше
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', '3600'))  # Секунды до перечитывания/вытеснения записи
+USER_CACHE_FLUSH_INTERVAL = int(os.getenv('USER_CACHE_FLUSH_INTERVAL', '5'))  # Период сброса на диск (сек)
+
+# Надежность записи на диск:
+# strict  - fsync после каждой записи (по умолчанию)
+# group   - group commit: записи разных пользователей за GROUP_COMMIT_WINDOW_MS
+#           синхронизируются вместе - на Linux 5.8+ одним syncfs на файловую систему
+#           (сбрасывает и чужие измененные файлы этой ФС), иначе одним fsync на путь;
+#           вызов возвращается после синхронизации
+# relaxed - без fsync: данные переживают падение процесса, но не отключение питания
+STORAGE_DURABILITY = os.getenv('STORAGE_DURABILITY', 'strict')
+GROUP_COMMIT_WINDOW_MS = float(os.getenv('GROUP_COMMIT_WINDOW_MS', '2'))
+
+# Сжатие партиций лога еды за прошлые месяцы: none, gzip или zstd (нужен пакет zstandard)
+FOOD_LOG_COLD_COMPRESSION = os.getenv('FOOD_LOG_COLD_COMPRESSION', 'none')
+
+# Потоки для дискового ввода-вывода: обработчики не блокируют event loop на fsync
+STORAGE_THREADS = int(os.getenv('STORAGE_THREADS', '4'))
+
+# Справочник калорийности в запросах к GPT:
+# retrieval - в запрос попадают только PROMPT_TOP_K строк справочника, найденных по блюду
+# full      - весь справочник в неизменном системном префиксе (провайдер кэширует его)
+PROMPT_REFERENCE_MODE = os.getenv('PROMPT_REFERENCE_MODE', 'retrieval')
+PROMPT_TOP_K = int(os.getenv('PROMPT_TOP_K', '10'))
+
+# Модели OpenAI: текстовые описания и анализ фото
+GPT_TEXT_MODEL = os.getenv('GPT_TEXT_MODEL', 'gpt-4o-mini')
+GPT_VISION_MODEL = os.getenv('GPT_VISION_MODEL', 'gpt-4o')
+
+# Пулы HTTP-соединений с OpenAI: отдельно для текста и для фото.
+# OPENAI_HTTP2: auto - если установлен h2 (pip install httpx[http2]), on, off
+OPENAI_HTTP2 = os.getenv('OPENAI_HTTP2', 'auto')
+OPENAI_POOL_KEEPALIVE = float(os.getenv('OPENAI_POOL_KEEPALIVE', '120'))  # Секунды простоя соединения
+OPENAI_CONNECT_TIMEOUT = float(os.getenv('OPENAI_CONNECT_TIMEOUT', '10'))
+OPENAI_TEXT_MAX_CONNECTIONS = int(os.getenv('OPENAI_TEXT_MAX_CONNECTIONS', '20'))
+OPENAI_TEXT_TIMEOUT = float(os.getenv('OPENAI_TEXT_TIMEOUT', '30'))  # Секунды на запрос
+OPENAI_VISION_MAX_CONNECTIONS = int(os.getenv('OPENAI_VISION_MAX_CONNECTIONS', '10'))
+OPENAI_VISION_TIMEOUT = float(os.getenv('OPENAI_VISION_TIMEOUT', '60'))
+OPENAI_PREWARM = os.getenv('OPENAI_PREWARM', '1') == '1'  # Открывать соединения при запуске
+
+# Допуск запросов к GPT: одновременные запросы процесса и лимиты OpenAI на модель
+# (запросы и токены в минуту - по тарифу аккаунта, https://platform.openai.com/settings/organization/limits)
+GPT_MAX_CONCURRENT = int(os.getenv('GPT_MAX_CONCURRENT', '8'))
+GPT_RATE_LIMITS = {
+    GPT_TEXT_MODEL: {'rpm': int(os.getenv('GPT_TEXT_RPM', '500')), 'tpm': int(os.getenv('GPT_TEXT_TPM', '200000'))},
+    GPT_VISION_MODEL: {'rpm': int(os.getenv('GPT_VISION_RPM', '500')), 'tpm': int(os.getenv('GPT_VISION_TPM', '30000'))},
+}
+
+# Повторы запросов к GPT: пауза - случайная в [база, 3 * предыдущая] (или Retry-After),
+# все попытки укладываются в GPT_REQUEST_DEADLINE. После GPT_BREAKER_THRESHOLD подряд
+# ошибок недоступности запросы GPT_BREAKER_RESET секунд сразу завершаются ошибкой
+GPT_RETRY_BASE_DELAY = float(os.getenv('GPT_RETRY_BASE_DELAY', '1'))  # Секунды
+GPT_RETRY_MAX_DELAY = float(os.getenv('GPT_RETRY_MAX_DELAY', '20'))
+GPT_REQUEST_DEADLINE = float(os.getenv('GPT_REQUEST_DEADLINE', '120'))
+GPT_BREAKER_THRESHOLD = int(os.getenv('GPT_BREAKER_THRESHOLD', '5'))
+GPT_BREAKER_RESET = float(os.getenv('GPT_BREAKER_RESET', '30'))
+
+# Потоковые ответы GPT: разбор показывается по мере генерации,
+# сообщение Telegram правится не чаще раза в STREAM_EDIT_INTERVAL секунд
+GPT_STREAMING = os.getenv('GPT_STREAMING', '1') == '1'
+STREAM_EDIT_INTERVAL = float(os.getenv('STREAM_EDIT_INTERVAL', '1.5'))
+
+# Ответ GPT в JSON по схеме (response_format=json_schema) вместо текста с разбором
+# регулярными выражениями; текстовый ответ по-прежнему разбирается как запасной вариант
+GPT_STRUCTURED_OUTPUT = os.getenv('GPT_STRUCTURED_OUTPUT', '1') == '1'
+
+# Общий для всех пользователей кэш оценок GPT: описание блюда -> калории и БЖУ.
+# Ключ включает модель и версию промпта; GPT_CACHE_MAX_ENTRIES=0 отключает кэш
+GPT_CACHE_PATH = os.getenv('GPT_CACHE_PATH', os.path.join(DATA_DIR, 'gpt_cache.sqlite3'))
+GPT_CACHE_TTL = int(os.getenv('GPT_CACHE_TTL', str(30 * 24 * 3600)))  # Секунды
+GPT_CACHE_MAX_ENTRIES = int(os.getenv('GPT_CACHE_MAX_ENTRIES', '50000'))  # LRU по времени обращения
+# Брать оценки, прогретые из истории приемов пищи (warm_gpt_cache.py), если нет ответа GPT на текущий промпт.
+# В истории есть и старые промпты, и анализ фото, и локальный расчет, поэтому по умолчанию выключено
+GPT_CACHE_USE_HISTORY = os.getenv('GPT_CACHE_USE_HISTORY', '0') == '1'
+
+# Кэш анализа фото в памяти: повтор или почти такое же фото того же пользователя
+# (расстояние Хэмминга dHash не больше PHOTO_CACHE_MAX_DISTANCE) не идет в GPT Vision.
+# Без Pillow узнаются только точные повторы; PHOTO_CACHE_PER_USER=0 отключает кэш
+PHOTO_CACHE_WINDOW = int(os.getenv('PHOTO_CACHE_WINDOW', str(12 * 3600)))  # Секунды
+PHOTO_CACHE_MAX_DISTANCE = int(os.getenv('PHOTO_CACHE_MAX_DISTANCE', '6'))  # Из 64 бит
+PHOTO_CACHE_PER_USER = int(os.getenv('PHOTO_CACHE_PER_USER', '20'))
+PHOTO_CACHE_MAX_USERS = int(os.getenv('PHOTO_CACHE_MAX_USERS', '1000'))  # LRU по пользователям
+
+# Подготовка фото для GPT Vision: уменьшение до PHOTO_MAX_EDGE по длинной стороне
+# (0 - без уменьшения), перекодирование в PHOTO_FORMAT (jpeg/webp) с PHOTO_QUALITY
+# без EXIF. PHOTO_DETAIL - detail запроса: low (85 токенов, фото до 512px),
+# high или auto (low для фото не больше 512px, иначе high). Без Pillow фото
+# отправляется как есть, но из Telegram скачивается наименьший подходящий размер
+PHOTO_MAX_EDGE = int(os.getenv('PHOTO_MAX_EDGE', '768'))
+PHOTO_FORMAT = os.getenv('PHOTO_FORMAT', 'jpeg').lower()
+PHOTO_QUALITY = int(os.getenv('PHOTO_QUALITY', '80'))
+PHOTO_DETAIL = os.getenv('PHOTO_DETAIL', 'auto').lower()
+# Фото скачивается в память; больше PHOTO_MAX_BYTES - не скачиваем и не анализируем
+PHOTO_MAX_BYTES = int(os.getenv('PHOTO_MAX_BYTES', str(5 * 1024 * 1024)))
+
+# Фото, ожидающие подтверждения или уточнения: живут PENDING_PHOTO_TTL, не больше
+# PENDING_PHOTO_MAX_ENTRIES фото; сверх PENDING_PHOTO_MAX_MEMORY байт старые фото
+# сбрасываются на диск в PENDING_PHOTO_DIR
+PENDING_PHOTO_TTL = int(os.getenv('PENDING_PHOTO_TTL', '1800'))  # Секунды
+PENDING_PHOTO_MAX_ENTRIES = int(os.getenv('PENDING_PHOTO_MAX_ENTRIES', '5000'))
+PENDING_PHOTO_MAX_MEMORY = int(os.getenv('PENDING_PHOTO_MAX_MEMORY', str(16 * 1024 * 1024)))  # Байты
+PENDING_PHOTO_DIR = os.getenv('PENDING_PHOTO_DIR', os.path.join(DATA_DIR, 'pending_photos'))
+
 # Уровень логирования
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
 
@@ -72,6 +181,7 @@ LOG_FILE = os.getenv('LOG_FILE', 'bot.log')
 SCHEDULE = {
     'morning_weight': {'hour': 3, 'minute': 0},  # 6:00 МСК
     'evening_summary': {'hour': 18, 'minute': 0},  # 21:00 МСК
+    'freeze_food_logs': {'hour': 0, 'minute': 30},  # 3:30 МСК - сжатие логов еды прошлых месяцев
 }
 
 # Лимиты валидации
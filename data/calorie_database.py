@@ -2,6 +2,8 @@
 """
 База данных калорийности продуктов
 """
+import re
+from typing import NamedTuple, Optional, List
 
 # Расширенная база данных калорийности и белка продуктов (на 100г)
 CALORIE_DATABASE = """
@@ -167,3 +169,66 @@ TYPICAL_PORTIONS = {
     'груша': 180,
     'виноград_гроздь': 150,
 }
+
+
+class FoodRow(NamedTuple):
+    """Строка справочника: продукт и значения на 100г (для диапазонов - середина)"""
+    name: str
+    kcal: float
+    protein: Optional[float]
+    fat: Optional[float]
+    carbs: Optional[float]
+    category: str
+    text: str  # исходная строка справочника, с примечаниями о порциях
+
+
+_NUMBER = r'(\d+(?:[.,]\d+)?)(?:\s*-\s*(\d+(?:[.,]\d+)?))?'
+_KCAL = re.compile(_NUMBER + r'\s*ккал')
+_PROTEIN = re.compile(_NUMBER + r'\s*г белка')
+_FAT = re.compile(_NUMBER + r'\s*г жиров')
+_CARBS = re.compile(_NUMBER + r'\s*г углеводов')
+
+
+def _value(pattern, text: str) -> Optional[float]:
+    match = pattern.search(text)
+    if not match:
+        return None
+    low = float(match.group(1).replace(',', '.'))
+    high = float(match.group(2).replace(',', '.')) if match.group(2) else low
+    return (low + high) / 2
+
+
+def parse_calorie_database(database: str) -> List[FoodRow]:
+    """Разбираем текстовый справочник в строки FoodRow
+
+    Строка "- Арбуз = 25ккал, ...; дыня = 35ккал, ..." дает два продукта,
+    примечания без "=" (например, "- ВАЖНО: ...") пропускаются.
+    """
+    rows = []
+    category = ''
+    for line in database.strip().splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if not line.startswith('-'):
+            category = line.rstrip(':')
+            continue
+        for part in line[1:].split(';'):
+            name, sep, values = part.partition('=')
+            kcal = _value(_KCAL, values)
+            if not sep or kcal is None:
+                continue
+            rows.append(FoodRow(
+                name=name.strip(),
+                kcal=kcal,
+                protein=_value(_PROTEIN, values),
+                fat=_value(_FAT, values),
+                carbs=_value(_CARBS, values),
+                category=category,
+                text=part.strip(),
+            ))
+    return rows
+
+
+# Разбирается один раз при импорте
+CALORIE_ROWS = parse_calorie_database(CALORIE_DATABASE)
@@ -13,12 +13,11 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 
 from utils.user_data import (
-    get_user_profile, save_user_profile, get_user_diary,
-    save_user_diary, get_user_weights, save_user_weights,
-    get_user_food_log, save_user_food_log, get_user_burned,
-    save_user_burned, load_user_data, save_user_data,
-    get_user_saved_meals, save_user_saved_meals, remove_saved_meal
+    get_user_profile_async, get_user_diary_async, get_user_weights_async,
+    get_user_burned_async, save_user_document_async, log_meal_async,
+    save_user_data_async, get_user_saved_meals_async, remove_saved_meal_async
 )
+from utils.user_locks import user_lock
 from utils.calorie_calculator import calculate_bmr_tdee, get_calories_left_message
 
 
@@ -76,9 +75,9 @@ async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TY
 
 async def handle_check_left(query, user_id, today):
     """Показать остаток калорий"""
-    profile = get_user_profile(user_id)
-    diary = get_user_diary(user_id)
-    burned = get_user_burned(user_id)
+    profile = await get_user_profile_async(user_id)
+    diary = await get_user_diary_async(user_id)
+    burned = await get_user_burned_async(user_id)
 
     left_message = get_calories_left_message(profile, diary, burned, today)
 
@@ -92,36 +91,41 @@ async def handle_check_left(query, user_id, today):
 async def handle_goal_selection(query, context, user_id, goal_data):
     """Обработка выбора цели"""
     goal = goal_data.replace('goal_', '')
-    profile = get_user_profile(user_id)
 
-    # Проверяем, есть ли все необходимые данные для расчета
-    required_fields = ['weight', 'height', 'age', 'sex']
-    if not all(field in profile for field in required_fields):
+    async with user_lock(user_id):
+        profile = await get_user_profile_async(user_id)
+
+        # Проверяем, есть ли все необходимые данные для расчета
+        required_fields = ['weight', 'height', 'age', 'sex']
+        profile_complete = all(field in profile for field in required_fields)
+
+        if profile_complete:
+            # Рассчитываем калории
+            calc_result = calculate_bmr_tdee(
+                weight=profile['weight'],
+                height=profile['height'],
+                age=profile['age'],
+                sex=profile['sex'],
+                goal=goal
+            )
+
+            # Обновляем профиль
+            profile.update(calc_result)
+            profile['target_calories'] = calc_result['target']
+            # Сбрасываем флаг пользовательского лимита, так как теперь используется автоматический расчет
+            profile['custom_limit'] = False
+            # Удаляем registration_step, так как регистрация завершена
+            if 'registration_step' in profile:
+                del profile['registration_step']
+            await save_user_document_async(user_id, 'profile', profile)
+
+    if not profile_complete:
         await query.edit_message_text(
             '❌ Для автоматического расчета калорий нужно заполнить профиль.\n'
             'Используйте /start для регистрации.'
         )
         return
 
-    # Рассчитываем калории
-    calc_result = calculate_bmr_tdee(
-        weight=profile['weight'],
-        height=profile['height'],
-        age=profile['age'],
-        sex=profile['sex'],
-        goal=goal
-    )
-
-    # Обновляем профиль
-    profile.update(calc_result)
-    profile['target_calories'] = calc_result['target']
-    # Сбрасываем флаг пользовательского лимита, так как теперь используется автоматический расчет
-    profile['custom_limit'] = False
-    # Удаляем registration_step, так как регистрация завершена
-    if 'registration_step' in profile:
-        del profile['registration_step']
-    save_user_profile(user_id, profile)
-
     goal_names = {
         'deficit': '🔥 Похудение (дефицит 20%)',
         'maintain': '⚖️ Поддержание веса',
@@ -150,9 +154,10 @@ async def handle_goal_selection(query, context, user_id, goal_data):
 async def handle_save_weight(query, context, user_id, weight_data, today):
     """Сохранение веса из двусмысленного ввода"""
     weight = float(weight_data.replace('save_weight_', ''))
-    weights = get_user_weights(user_id)
-    weights[today] = weight
-    save_user_weights(user_id, weights)
+    async with user_lock(user_id):
+        weights = await get_user_weights_async(user_id)
+        weights[today] = weight
+        await save_user_document_async(user_id, 'weights', weights)
 
     try:
         await query.edit_message_text(f'✅ Вес {weight} кг записан!')
@@ -167,20 +172,12 @@ async def handle_save_calories(query, context, user_id, calories_data, today):
     calories = int(float(calories_data.replace('save_calories_', '')))
 
     # Сохраняем как съеденные калории
-    diary = get_user_diary(user_id)
-    food_log = get_user_food_log(user_id)
-    profile = get_user_profile(user_id)
-
-    diary[today] = diary.get(today, 0) + calories
-    save_user_diary(user_id, diary)
-
-    if today not in food_log:
-        food_log[today] = []
-    food_log[today].append([f'Еда ({calories} ккал)', calories])
-    save_user_food_log(user_id, food_log)
+    async with user_lock(user_id):
+        diary = await log_meal_async(user_id, today, [f'Еда ({calories} ккал)', calories])
+        burned = await get_user_burned_async(user_id)
+    profile = await get_user_profile_async(user_id)
 
     # Рассчитываем остаток
-    burned = get_user_burned(user_id)
     left_message = get_calories_left_message(profile, diary, burned, today)
 
     try:
@@ -194,9 +191,10 @@ async def handle_save_calories(query, context, user_id, calories_data, today):
 async def handle_use_yesterday_weight(query, context, user_id, weight_data, today):
     """Использование вчерашнего веса"""
     weight = float(weight_data.replace('use_yesterday_weight_', ''))
-    weights = get_user_weights(user_id)
-    weights[today] = weight
-    save_user_weights(user_id, weights)
+    async with user_lock(user_id):
+        weights = await get_user_weights_async(user_id)
+        weights[today] = weight
+        await save_user_document_async(user_id, 'weights', weights)
 
     try:
         await query.edit_message_text(f'✅ Вес {weight} кг записан (как вчера)!')
@@ -216,7 +214,8 @@ async def handle_confirm_reset(query, context, user_id):
         'food_log': {},
         'burned': {}
     }
-    save_user_data(user_id, empty_data)
+    async with user_lock(user_id):
+        await save_user_data_async(user_id, empty_data)
 
     try:
         await query.edit_message_text(
@@ -227,7 +226,9 @@ async def handle_confirm_reset(query, context, user_id):
             '✅ Профиль сброшен!\n\nИспользуйте /start для новой регистрации.'
         )
 
-    # Очищаем состояние
+    # Очищаем состояние (и отложенное фото, если было)
+    from .photo_handler import forget_pending_photo
+    await forget_pending_photo(context)
     context.user_data.clear()
 
 
@@ -290,7 +291,7 @@ async def handle_edit_photo(query, context, user_id):
 async def handle_add_saved_meal(query, context, user_id, meal_data, today):
     """Добавление сохраненного блюда в дневник"""
     meal_key = meal_data.replace('add_meal_', '')
-    saved_meals = get_user_saved_meals(user_id)
+    saved_meals = await get_user_saved_meals_async(user_id)
     
     if meal_key not in saved_meals:
         try:
@@ -307,20 +308,12 @@ async def handle_add_saved_meal(query, context, user_id, meal_data, today):
     carbs = meal.get('carbs')
     
     # Добавляем в дневник
-    diary = get_user_diary(user_id)
-    food_log = get_user_food_log(user_id)
-    
-    diary[today] = diary.get(today, 0) + calories
-    save_user_diary(user_id, diary)
-    
-    if today not in food_log:
-        food_log[today] = []
-    food_log[today].append([name, calories, protein, fat, carbs])
-    save_user_food_log(user_id, food_log)
+    async with user_lock(user_id):
+        diary = await log_meal_async(user_id, today, [name, calories, protein, fat, carbs])
+        burned = await get_user_burned_async(user_id)
     
     # Рассчитываем остаток
-    profile = get_user_profile(user_id)
-    burned = get_user_burned(user_id)
+    profile = await get_user_profile_async(user_id)
     left_message = get_calories_left_message(profile, diary, burned, today)
     
     # Формируем сообщение
@@ -345,11 +338,12 @@ async def handle_add_saved_meal(query, context, user_id, meal_data, today):
 async def handle_delete_saved_meal(query, user_id, meal_data):
     """Удаление сохраненного блюда"""
     meal_key = meal_data.replace('delete_meal_', '')
-    saved_meals = get_user_saved_meals(user_id)
+    saved_meals = await get_user_saved_meals_async(user_id)
     
     if meal_key in saved_meals:
         meal_name = saved_meals[meal_key].get('name', meal_key)
-        remove_saved_meal(user_id, meal_key)
+        async with user_lock(user_id):
+            await remove_saved_meal_async(user_id, meal_key)
         
         try:
             await query.edit_message_text(f'🗑️ Блюдо "{meal_name}" удалено.')
@@ -17,9 +17,9 @@ sys.path.append(str(Path(__file__).parent.parent))
 import openai_safe
 
 from utils.user_data import (
-    get_user_profile, save_user_profile, get_user_diary, save_user_diary,
-    get_user_burned, get_user_food_log, save_user_food_log, save_user_burned,
-    get_user_saved_meals, save_user_saved_meals, add_saved_meal, remove_saved_meal
+    get_user_profile_async, save_user_profile_async, get_user_diary_async, save_user_diary_async,
+    get_user_burned_async, get_food_entries_async, set_food_entries_async, save_user_burned_async,
+    get_user_saved_meals_async, add_saved_meal_async, run_in_storage_thread
 )
 from utils.calorie_calculator import calculate_bmr_tdee, get_calories_left_message, get_macro_analysis_command
 from config import VALIDATION_LIMITS
@@ -28,7 +28,7 @@ from config import VALIDATION_LIMITS
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Команда /start - регистрация или приветствие"""
     user_id = str(update.effective_user.id)
-    profile = get_user_profile(user_id)
+    profile = await get_user_profile_async(user_id)
 
     # Проверяем, есть ли уже полный профиль пользователя
     required_fields = ['weight', 'height', 'age', 'sex']
@@ -72,7 +72,7 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             profile['registration_step'] = 'goal'
             context.user_data['step'] = 'goal'
 
-        save_user_profile(user_id, profile)
+        await save_user_profile_async(user_id, profile)
     else:
         # Если профиль уже есть и полный, показываем информацию
         await show_user_status(update, user_id)
@@ -81,16 +81,15 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def show_user_status(update: Update, user_id: str):
     """Показывает статус пользователя"""
-    profile = get_user_profile(user_id)
-    diary = get_user_diary(user_id)
-    burned = get_user_burned(user_id)
+    profile = await get_user_profile_async(user_id)
+    diary = await get_user_diary_async(user_id)
+    burned = await get_user_burned_async(user_id)
     today = datetime.date.today().isoformat()
 
     # Инициализируем дневник на сегодня, если записи ещё нет
     if today not in diary:
         diary[today] = 0
-        from ..utils.user_data import save_user_diary
-        save_user_diary(user_id, diary)
+        await save_user_diary_async(user_id, diary)
 
     eaten_today = diary.get(today, 0)
     burned_today = burned.get(today, 0)
@@ -246,9 +245,9 @@ async def burn_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def left_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Команда /left - остаток калорий"""
     user_id = str(update.effective_user.id)
-    profile = get_user_profile(user_id)
-    diary = get_user_diary(user_id)
-    burned = get_user_burned(user_id)
+    profile = await get_user_profile_async(user_id)
+    diary = await get_user_diary_async(user_id)
+    burned = await get_user_burned_async(user_id)
     today = datetime.date.today().isoformat()
 
     left_message = get_calories_left_message(profile, diary, burned, today)
@@ -261,17 +260,15 @@ async def clear_today_command(update: Update, context: ContextTypes.DEFAULT_TYPE
     today = datetime.date.today().isoformat()
 
     # Очищаем данные за сегодня
-    diary = get_user_diary(user_id)
-    food_log = get_user_food_log(user_id)
-    burned = get_user_burned(user_id)
+    diary = await get_user_diary_async(user_id)
+    burned = await get_user_burned_async(user_id)
 
     diary[today] = 0
-    food_log[today] = []
     burned[today] = 0
 
-    save_user_diary(user_id, diary)
-    save_user_food_log(user_id, food_log)
-    save_user_burned(user_id, burned)
+    await save_user_diary_async(user_id, diary)
+    await set_food_entries_async(user_id, today, [])
+    await save_user_burned_async(user_id, burned)
 
     await update.message.reply_text('✅ Записи за сегодня очищены!')
 
@@ -293,7 +290,7 @@ async def reset_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def limit_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Команда /limit - установка собственного лимита калорий"""
     user_id = str(update.effective_user.id)
-    profile = get_user_profile(user_id)
+    profile = await get_user_profile_async(user_id)
 
     # Проверяем аргументы
     if context.args:
@@ -302,7 +299,7 @@ async def limit_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             if 800 <= new_limit <= 5000:  # Разумные пределы
                 profile['target_calories'] = new_limit
                 profile['custom_limit'] = True  # Помечаем как пользовательский лимит
-                save_user_profile(user_id, profile)
+                await save_user_profile_async(user_id, profile)
 
                 await update.message.reply_text(
                     f'✅ Установлен собственный лимит: {new_limit} ккал/день\n\n'
@@ -345,8 +342,7 @@ async def food_log_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     today = datetime.date.today().isoformat()
 
     try:
-        food_log = get_user_food_log(user_id)
-        today_foods = food_log.get(today, [])
+        today_foods = await get_food_entries_async(user_id, today)
 
         if not today_foods:
             await update.message.reply_text('📝 Сегодня пока ничего не записано.')
@@ -361,35 +357,21 @@ async def food_log_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         total_carbs = 0
 
         for i, food_entry in enumerate(today_foods, 1):
-            if len(food_entry) >= 5:  # Новый формат с полными БЖУ
-                name, calories, protein, fat, carbs = food_entry[0], food_entry[1], food_entry[2], food_entry[3], food_entry[4]
-
-                nutrition_parts = [f'{calories} ккал']
-                if protein:
-                    nutrition_parts.append(f'{protein:.1f}г белка')
-                    total_protein += protein
-                if fat:
-                    nutrition_parts.append(f'{fat:.1f}г жиров')
-                    total_fat += fat
-                if carbs:
-                    nutrition_parts.append(f'{carbs:.1f}г углеводов')
-                    total_carbs += carbs
-
-                nutrition_text = ', '.join(nutrition_parts)
-
-            elif len(food_entry) >= 3:  # Старый формат только с белком
-                name, calories, protein = food_entry[0], food_entry[1], food_entry[2]
-                nutrition_text = f'{calories} ккал'
-                if protein:
-                    nutrition_text += f', {protein:.1f}г белка'
-                    total_protein += protein
-
-            elif len(food_entry) >= 2:  # Старый формат без белка
-                name, calories = food_entry[0], food_entry[1]
-                nutrition_text = f'{calories} ккал'
-            else:
-                logging.warning(f"Неправильный формат записи в дневнике: {food_entry}")
-                continue
+            # Записи уже приведены к FoodEntry: у старых форматов БЖУ - None
+            name, calories, protein, fat, carbs = food_entry
+
+            nutrition_parts = [f'{calories} ккал']
+            if protein:
+                nutrition_parts.append(f'{protein:.1f}г белка')
+                total_protein += protein
+            if fat:
+                nutrition_parts.append(f'{fat:.1f}г жиров')
+                total_fat += fat
+            if carbs:
+                nutrition_parts.append(f'{carbs:.1f}г углеводов')
+                total_carbs += carbs
+
+            nutrition_text = ', '.join(nutrition_parts)
 
             total_calories += calories
             message_lines.append(f'{i}. {name}: {nutrition_text}')
@@ -416,8 +398,7 @@ async def evening_summary_function(context, user_id):
     """Функция для автоматического вечернего обзора"""
     today = datetime.date.today().isoformat()
 
-    food_log = get_user_food_log(user_id)
-    today_foods = food_log.get(today, [])
+    today_foods = await get_food_entries_async(user_id, today)
 
     if not today_foods:
         message = '🌙 **Вечерний обзор**\n\n📝 Сегодня ничего не записано в дневник.'
@@ -428,17 +409,9 @@ async def evening_summary_function(context, user_id):
         total_protein = 0
 
         for food_entry in today_foods:
-            if len(food_entry) >= 3:  # Новый формат с белком
-                name, calories, protein = food_entry[0], food_entry[1], food_entry[2]
-            elif len(food_entry) >= 2:  # Старый формат без белка
-                name, calories = food_entry[0], food_entry[1]
-                protein = 0
-            else:
-                continue
-
-            total_calories += calories
-            if protein:
-                total_protein += protein
+            total_calories += food_entry.kcal
+            if food_entry.protein:
+                total_protein += food_entry.protein
 
         message_lines.append(f'🔥 Всего калорий: {total_calories} ккал')
         if total_protein > 0:
@@ -447,9 +420,9 @@ async def evening_summary_function(context, user_id):
         message_lines.append(f'\n📝 Записей в дневнике: {len(today_foods)}')
 
         # Добавляем остаток калорий
-        profile = get_user_profile(user_id)
-        diary = get_user_diary(user_id)
-        burned = get_user_burned(user_id)
+        profile = await get_user_profile_async(user_id)
+        diary = await get_user_diary_async(user_id)
+        burned = await get_user_burned_async(user_id)
         left_message = get_calories_left_message(profile, diary, burned, today)
         message_lines.append(f'\n{left_message}')
 
@@ -490,7 +463,7 @@ async def macros_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     try:
         # Получаем полный анализ макронутриентов
-        analysis = get_macro_analysis_command(user_id)
+        analysis = await run_in_storage_thread(get_macro_analysis_command, user_id)
 
         # Добавляем кнопки для дополнительных действий
         keyboard = [
@@ -516,7 +489,7 @@ async def macros_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def meals_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Команда /meals - показать сохраненные блюда"""
     user_id = str(update.effective_user.id)
-    saved_meals = get_user_saved_meals(user_id)
+    saved_meals = await get_user_saved_meals_async(user_id)
     
     if not saved_meals:
         await update.message.reply_text(
@@ -574,9 +547,8 @@ async def savemeal_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # Пытаемся сохранить последнее добавленное блюдо
-    food_log = get_user_food_log(user_id)
     today = datetime.date.today().isoformat()
-    today_foods = food_log.get(today, [])
+    today_foods = await get_food_entries_async(user_id, today)
     
     if not today_foods:
         await update.message.reply_text(
@@ -589,12 +561,7 @@ async def savemeal_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # Берем последнее блюдо
-    last_food = today_foods[-1]
-    meal_name = last_food[0]
-    calories = last_food[1] if len(last_food) > 1 else 0
-    protein = last_food[2] if len(last_food) > 2 else None
-    fat = last_food[3] if len(last_food) > 3 else None
-    carbs = last_food[4] if len(last_food) > 4 else None
+    meal_name, calories, protein, fat, carbs = today_foods[-1]
     
     # Сохраняем блюдо
     meal_data = {
@@ -604,7 +571,7 @@ async def savemeal_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         'carbs': carbs
     }
     
-    add_saved_meal(user_id, meal_name, meal_data)
+    await add_saved_meal_async(user_id, meal_name, meal_data)
     
     # Формируем сообщение
     nutrition_parts = [f'{calories} ккал']
@@ -627,7 +594,7 @@ async def savemeal_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def deletemeal_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Команда /deletemeal - удалить сохраненное блюдо"""
     user_id = str(update.effective_user.id)
-    saved_meals = get_user_saved_meals(user_id)
+    saved_meals = await get_user_saved_meals_async(user_id)
     
     if not saved_meals:
         await update.message.reply_text('📭 У вас нет сохраненных блюд.')
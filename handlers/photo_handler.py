@@ -2,8 +2,9 @@
 """
 Обработчик фото еды
 """
+import asyncio
 import base64
-import os
+import time
 import datetime
 import logging
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
@@ -18,38 +19,115 @@ sys.path.append(str(Path(__file__).parent.parent))
 import openai_safe
 
 from utils.user_data import (
-    get_user_profile, get_user_diary, save_user_diary,
-    get_user_food_log, save_user_food_log, get_user_burned
+    get_user_profile_async, get_user_burned_async, log_meal_async
 )
-from utils.photo_processor import analyze_food_photo
+from utils.user_locks import user_lock
+from utils.photo_processor import analyze_food_photo, reanalyze_food_photo
+from utils.photo_cache import photo_cache, dhash
+from utils.pending_photos import pending_photos
+from utils.image_preprocess import pick_photo_size, download_photo, prepare_image, hold_photo, PhotoTooLarge
+from utils.progress_message import ProgressMessage
+from utils.structured_output import preview_nutrition_json
+from utils.prompt_builder import describe_photo_breakdown
+from config import GPT_STREAMING
 from utils.calorie_calculator import get_calories_left_message
 
 
+async def remember_pending_photo(context, user_id: str, img_b64: str, mime_type: str,
+                                 detail, analysis: dict) -> None:
+    """Фото ждет ответа пользователя: в user_data - только id из pending_photos"""
+    await pending_photos.discard_async(context.user_data.get('pending_photo_id'))
+    context.user_data['pending_photo_id'] = await pending_photos.put_async(user_id, img_b64, mime_type,
+                                                                           detail, analysis)
+
+
+async def forget_pending_photo(context) -> None:
+    await pending_photos.discard_async(context.user_data.pop('pending_photo_id', None))
+
+
+async def show_photo_result(message, context, result: dict, title: str = '📸 **Распознано:**') -> None:
+    """Результат анализа фото с кнопками подтверждения и уточнения"""
+    description = result['description']
+    kcal = result['calories']
+    protein = result.get('protein')
+    fat = result.get('fat')
+    carbs = result.get('carbs')
+
+    keyboard = [
+        [InlineKeyboardButton('✅ Подтвердить', callback_data='confirm_photo')],
+        [InlineKeyboardButton('✏️ Уточнить', callback_data='edit_photo')]
+    ]
+
+    # Формируем текст с полными БЖУ
+    nutrition_parts = [f'🔥 **Калории:** {kcal} ккал']
+    if protein is not None:
+        nutrition_parts.append(f'🥩 **Белок:** {protein:.1f} г')
+    if fat is not None:
+        nutrition_parts.append(f'🧈 **Жиры:** {fat:.1f} г')
+    if carbs is not None:
+        nutrition_parts.append(f'🍞 **Углеводы:** {carbs:.1f} г')
+
+    nutrition_text = '\n'.join(nutrition_parts)
+
+    await message.edit_text(
+        f'{title}\n{description}\n\n{nutrition_text}\n\nВерно?',
+        reply_markup=InlineKeyboardMarkup(keyboard),
+        parse_mode='Markdown'
+    )
+
+    # Сохраняем данные для подтверждения
+    context.user_data['pending_photo_dish'] = {
+        'description': description,
+        'kcal': kcal,
+        'protein': protein,
+        'fat': fat,
+        'carbs': carbs
+    }
+
+
 async def handle_photo_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик фото еды"""
     user_id = str(update.effective_user.id)
     today = datetime.date.today().isoformat()
+    started = time.monotonic()
 
     try:
-        # Получаем файл фото
-        file = await update.message.photo[-1].get_file()
-        file_name = f'temp_{user_id}.jpg'
-
-        # Загружаем файл
-        await file.download_to_drive(file_name)
-
-        # Конвертируем в base64
-        with open(file_name, 'rb') as f:
-            img_b64 = base64.b64encode(f.read()).decode()
-
-        # Удаляем временный файл
-        os.remove(file_name)
+        # Получаем файл фото: наименьший размер, которого достаточно для GPT Vision
+        photo = pick_photo_size(update.message.photo)
+        file_unique_id = getattr(photo, 'file_unique_id', None)
+
+        # Скачиваем сразу в память - без временного файла на диске
+        img_bytes = await download_photo(photo)
+
+        # Уменьшаем и перекодируем без EXIF, затем в base64
+        size = (getattr(photo, 'width', 0) or 0, getattr(photo, 'height', 0) or 0)
+        image = await asyncio.to_thread(prepare_image, img_bytes, size)
+        del img_bytes  # исходное фото больше не нужно
+        photo_hash = await asyncio.to_thread(dhash, image.data) if photo_cache.enabled else None
+        img_b64 = base64.b64encode(image.data).decode('ascii')
+        mime_type, detail = image.mime_type, image.detail
+        del image  # на время анализа в памяти остается только base64
 
         # Отправляем сообщение о начале анализа
         analyzing_msg = await update.message.reply_text('🔍 Анализирую фото...')
 
-        # Анализируем фото через GPT
-        result = await analyze_food_photo(img_b64)
+        with hold_photo(len(img_b64)):
+            # Повтор или почти такое же фото - результат из кэша, без GPT Vision
+            result = photo_cache.get(user_id, photo_hash, file_unique_id)
+            if result is not None:
+                logging.info(f"📸 Фото пользователя {user_id} уже анализировалось - результат из кэша")
+            else:
+                async def on_queued(position: int):
+                    await analyzing_msg.edit_text(f'🔍 Анализирую фото... ⏳ в очереди, перед ним: {position}')
+
+                # Анализируем фото через GPT; разбор показываем по мере генерации
+                progress = ProgressMessage('🔍 Анализирую фото...', message=analyzing_msg, started=started,
+                                           render=preview_nutrition_json)
+                result = await analyze_food_photo(img_b64, user_id=user_id, on_queued=on_queued,
+                                                  on_text=progress.update if GPT_STREAMING else None,
+                                                  mime_type=mime_type, detail=detail)
+                if result.get('success'):
+                    photo_cache.put(user_id, photo_hash, file_unique_id, result)
 
         if 'error' in result:
             error_msg = result["error"]
@@ -69,58 +147,26 @@ async def handle_photo_message(update: Update, context: ContextTypes.DEFAULT_TYP
         if 'question' in result:
             # GPT задал уточняющий вопрос
             await analyzing_msg.edit_text(result['question'])
-            context.user_data['pending_photo_base64'] = img_b64
+            await remember_pending_photo(context, user_id, img_b64, mime_type, detail, result)
             context.user_data['waiting_for_photo_clarification'] = True
             return
 
         if result.get('success'):
-            # Успешно проанализировали
-            description = result['description']
-            kcal = result['calories']
-            protein = result.get('protein')
-            fat = result.get('fat')
-            carbs = result.get('carbs')
-
-            # Предлагаем подтвердить или уточнить
-            keyboard = [
-                [InlineKeyboardButton('✅ Подтвердить', callback_data='confirm_photo')],
-                [InlineKeyboardButton('✏️ Уточнить', callback_data='edit_photo')]
-            ]
-
-            # Формируем текст с полными БЖУ
-            nutrition_parts = [f'🔥 **Калории:** {kcal} ккал']
-            if protein is not None:
-                nutrition_parts.append(f'🥩 **Белок:** {protein:.1f} г')
-            if fat is not None:
-                nutrition_parts.append(f'🧈 **Жиры:** {fat:.1f} г')
-            if carbs is not None:
-                nutrition_parts.append(f'🍞 **Углеводы:** {carbs:.1f} г')
-
-            nutrition_text = '\n'.join(nutrition_parts)
-
-            await analyzing_msg.edit_text(
-                f'📸 **Распознано:**\n{description}\n\n{nutrition_text}\n\nВерно?',
-                reply_markup=InlineKeyboardMarkup(keyboard),
-                parse_mode='Markdown'
-            )
-
-            # Сохраняем данные для подтверждения
-            dish_data = {
-                'description': description,
-                'kcal': kcal,
-                'protein': protein,
-                'fat': fat,
-                'carbs': carbs
-            }
-
-            context.user_data['pending_photo_dish'] = dish_data
-            context.user_data['pending_photo_base64'] = img_b64
+            # Успешно проанализировали - предлагаем подтвердить или уточнить
+            await show_photo_result(analyzing_msg, context, result)
+            await remember_pending_photo(context, user_id, img_b64, mime_type, detail, result)
 
         else:
             await analyzing_msg.edit_text(
                 '❌ Не удалось проанализировать фото.\n\nОпишите блюдо текстом для расчета калорий.'
             )
 
+    except PhotoTooLarge as e:
+        logging.warning(f"⚠️ Фото пользователя {user_id} не скачано: {e}")
+        await update.message.reply_text(
+            '❌ Фото слишком большое.\n\nОтправьте его как обычное фото (не файлом) или опишите блюдо текстом.'
+        )
+
     except Exception as e:
         error_type = type(e).__name__
         error_msg = str(e)
@@ -166,8 +212,9 @@ async def handle_photo_confirmation(update, context, user_id, confirm: bool):
     today = datetime.date.today().isoformat()
 
     if confirm:
-        # Подтверждение распознанного блюда
-        dish_data = context.user_data.get('pending_photo_dish', {})
+        # Подтверждение распознанного блюда. Забираем его сразу: повторное
+        # нажатие кнопки, пока идет запись, не должно добавить блюдо дважды
+        dish_data = context.user_data.pop('pending_photo_dish', None) or {}
         description = dish_data.get('description', 'Блюдо с фото')
         kcal = dish_data.get('kcal', 0)
         protein = dish_data.get('protein')
@@ -175,23 +222,14 @@ async def handle_photo_confirmation(update, context, user_id, confirm: bool):
         carbs = dish_data.get('carbs')
 
         if kcal:
-            # Сохраняем данные
-            diary = get_user_diary(user_id)
-            food_log = get_user_food_log(user_id)
-            profile = get_user_profile(user_id)
-
-            diary[today] = diary.get(today, 0) + kcal
-            save_user_diary(user_id, diary)
-
-            if today not in food_log:
-                food_log[today] = []
-            # Добавляем запись с полными БЖУ
+            # Сохраняем данные: запись с полными БЖУ
             log_entry = [description, kcal, protein, fat, carbs]
-            food_log[today].append(log_entry)
-            save_user_food_log(user_id, food_log)
+            async with user_lock(user_id):
+                diary = await log_meal_async(user_id, today, log_entry)
+                burned = await get_user_burned_async(user_id)
+            profile = await get_user_profile_async(user_id)
 
             # Рассчитываем остаток
-            burned = get_user_burned(user_id)
             left_message = get_calories_left_message(profile, diary, burned, today)
 
             # Формируем сообщение с полными БЖУ
@@ -213,33 +251,65 @@ async def handle_photo_confirmation(update, context, user_id, confirm: bool):
             reply_markup = None
 
         # Очищаем временные данные
-        context.user_data.pop('pending_photo_dish', None)
-        context.user_data.pop('pending_photo_base64', None)
+        await forget_pending_photo(context)
 
         return response_text, reply_markup
 
     else:
         # Запрос уточнения
         context.user_data['waiting_for_photo_clarification'] = True
-        return 'Опишите что на фото (текстом):', None
+        return 'Что уточнить? Например: "гречки было 150г" или "без майонеза"', None
 
 
 async def handle_photo_clarification(update, context, user_id, clarification_text):
-    """Обработка уточнения по фото"""
-    # Здесь можно добавить логику повторного анализа с учетом уточнения
-    # Пока что просто используем текстовое описание
-    from .text_handler import handle_food_input
-
-    today = datetime.date.today().isoformat()
-    diary = get_user_diary(user_id)
-    food_log = get_user_food_log(user_id)
-    profile = get_user_profile(user_id)
+    """Обработка уточнения по фото: пересчет прошлого разбора с поправкой пользователя
 
-    await handle_food_input(update, context, clarification_text, user_id, today, diary, food_log, profile)
-
-    # Сбрасываем флаги
+    В GPT уходит короткий запрос - прошлый разбор и уточнение (reanalyze_food_photo);
+    фото берется из pending_photos, только если разбора нет (GPT задал вопрос).
+    Если фото уже забыто (PENDING_PHOTO_TTL), уточнение считается описанием блюда.
+    """
     context.user_data['waiting_for_photo_clarification'] = False
-    context.user_data.pop('pending_photo_base64', None)
+    photo_id = context.user_data.get('pending_photo_id')
+    pending = await pending_photos.get_async(photo_id, user_id)
+    has_breakdown = pending is not None and bool(describe_photo_breakdown(pending.analysis))
+    img_b64 = None
+    if pending is not None and not has_breakdown:
+        img_b64 = await pending_photos.image_async(photo_id, user_id)
+
+    if not has_breakdown and img_b64 is None:
+        from .text_handler import handle_food_input
+
+        today = datetime.date.today().isoformat()
+        profile = await get_user_profile_async(user_id)
+
+        await handle_food_input(update, context, clarification_text, user_id, today, profile)
+        await forget_pending_photo(context)
+        return
+
+    progress_msg = await update.message.reply_text('🔍 Пересчитываю с уточнением...')
+
+    async def on_queued(position: int):
+        await progress_msg.edit_text(f'🔍 Пересчитываю с уточнением... ⏳ в очереди, перед ним: {position}')
+
+    progress = ProgressMessage('🔍 Пересчитываю с уточнением...', message=progress_msg,
+                               started=time.monotonic(), render=preview_nutrition_json)
+    result = await reanalyze_food_photo(pending.analysis, clarification_text, img_b64, user_id=user_id,
+                                        on_queued=on_queued, on_text=progress.update if GPT_STREAMING else None,
+                                        mime_type=pending.mime_type, detail=pending.detail)
+
+    if result.get('success'):
+        await show_photo_result(progress_msg, context, result, '📸 **С уточнением:**')
+        # Следующее уточнение пересчитывает уже исправленный разбор
+        pending_photos.update_analysis(photo_id, result)
+    elif 'question' in result:
+        await progress_msg.edit_text(result['question'])
+        pending_photos.update_analysis(photo_id, dict(pending.analysis, question=result['question']))
+        context.user_data['waiting_for_photo_clarification'] = True
+    else:
+        logging.warning(f"⚠️ Не удалось уточнить фото пользователя {user_id}: {result.get('error')}")
+        await progress_msg.edit_text(
+            '❌ Не удалось пересчитать с уточнением.\n\nОпишите блюдо текстом для расчета калорий.'
+        )
 
 # Алиас для совместимости
 handle_photo = handle_photo_message
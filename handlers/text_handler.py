@@ -4,6 +4,7 @@
 """
 import datetime
 import logging
+import time
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes
 
@@ -16,18 +17,22 @@ sys.path.append(str(Path(__file__).parent.parent))
 import openai_safe
 
 from utils.user_data import (
-    get_user_profile, save_user_profile, get_user_diary,
-    save_user_diary, get_user_weights, save_user_weights,
-    get_user_food_log, save_user_food_log, get_user_burned, save_user_burned,
-    add_saved_meal
+    get_user_profile_async, get_user_diary_async, get_user_weights_async,
+    get_user_burned_async, save_user_document_async,
+    log_meal_async, add_saved_meal_async
 )
+from utils.user_locks import user_lock
 from utils.calorie_calculator import (
-    create_calorie_prompt, ask_gpt, extract_nutrition_smart,
+    create_calorie_messages, ask_gpt,
     validate_calorie_result, get_calories_left_message,
     calculate_bmr_tdee
 )
+from utils.local_resolver import resolve_locally
+from utils.gpt_cache import get_cached_nutrition_async, cache_nutrition_async
+from utils.progress_message import ProgressMessage
+from utils.structured_output import RESPONSE_FORMAT, read_nutrition_answer, preview_nutrition_json
 from utils.error_handler import format_error_message, log_detailed_error
-from config import VALIDATION_LIMITS
+from config import VALIDATION_LIMITS, GPT_STREAMING, STREAM_EDIT_INTERVAL, GPT_STRUCTURED_OUTPUT
 
 
 async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -38,10 +43,9 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
     today = datetime.date.today().isoformat()
 
     # Получаем данные пользователя
-    profile = get_user_profile(user_id)
-    diary = get_user_diary(user_id)
-    weights = get_user_weights(user_id)
-    food_log = get_user_food_log(user_id)
+    profile = await get_user_profile_async(user_id)
+    diary = await get_user_diary_async(user_id)
+    weights = await get_user_weights_async(user_id)
 
     # Проверяем, есть ли сохраненный шаг регистрации в профиле
     if not step and profile and 'registration_step' in profile:
@@ -50,8 +54,11 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     # Инициализируем дневник на сегодня, если записи ещё нет
     if today not in diary:
-        diary[today] = 0
-        save_user_diary(user_id, diary)
+        async with user_lock(user_id):
+            diary = await get_user_diary_async(user_id)
+            if today not in diary:
+                diary[today] = 0
+                await save_user_document_async(user_id, 'diary', diary)
 
     # === РЕГИСТРАЦИЯ НОВОГО ПОЛЬЗОВАТЕЛЯ ===
     if step == 'weight':
@@ -78,14 +85,20 @@ async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE
         await handle_save_meal_nutrition(update, context, text, user_id)
         return
 
+    # === УТОЧНЕНИЕ ФОТО ===
+    elif context.user_data.get('waiting_for_photo_clarification'):
+        from .photo_handler import handle_photo_clarification
+        await handle_photo_clarification(update, context, user_id, text)
+        return
+
     # === ОБРАБОТКА ЕДЫ ===
     elif step == 'food' or step is None:
-        await handle_food_input(update, context, text, user_id, today, diary, food_log, profile)
+        await handle_food_input(update, context, text, user_id, today, profile)
         return
 
     # === СПЕЦИАЛЬНЫЕ СОСТОЯНИЯ ===
     elif context.user_data.get('waiting_for_clarification'):
-        await handle_food_clarification(update, context, text, user_id, today, diary, food_log, profile)
+        await handle_food_clarification(update, context, text, user_id, today, profile)
         return
 
     # Если не попали ни в один case
@@ -102,7 +115,7 @@ async def handle_weight_input(update, context, text, profile, user_id):
         if limits['min'] <= weight <= limits['max']:
             profile['weight'] = weight
             profile['registration_step'] = 'height'
-            save_user_profile(user_id, profile)
+            await save_user_document_async(user_id, 'profile', profile)
             await update.message.reply_text('Теперь введи свой рост (см):')
             context.user_data['step'] = 'height'
         else:
@@ -119,7 +132,7 @@ async def handle_height_input(update, context, text, profile, user_id):
         if limits['min'] <= height <= limits['max']:
             profile['height'] = height
             profile['registration_step'] = 'age'
-            save_user_profile(user_id, profile)
+            await save_user_document_async(user_id, 'profile', profile)
             await update.message.reply_text('Теперь введи свой возраст:')
             context.user_data['step'] = 'age'
         else:
@@ -136,7 +149,7 @@ async def handle_age_input(update, context, text, profile, user_id):
         if limits['min'] <= age <= limits['max']:
             profile['age'] = age
             profile['registration_step'] = 'sex'
-            save_user_profile(user_id, profile)
+            await save_user_document_async(user_id, 'profile', profile)
             await update.message.reply_text('Укажи пол (муж/жен):')
             context.user_data['step'] = 'sex'
         else:
@@ -154,7 +167,7 @@ async def handle_sex_input(update, context, text, profile, user_id):
 
     profile['sex'] = sex
     profile['registration_step'] = 'goal'
-    save_user_profile(user_id, profile)
+    await save_user_document_async(user_id, 'profile', profile)
 
     # Теперь спрашиваем о цели
     keyboard = [
@@ -176,8 +189,10 @@ async def handle_daily_weight(update, context, text, weights, user_id, today):
         weight = float(text.replace(',', '.'))
         limits = VALIDATION_LIMITS['weight']
         if limits['min'] <= weight <= limits['max']:
-            weights[today] = weight
-            save_user_weights(user_id, weights)
+            async with user_lock(user_id):
+                weights = await get_user_weights_async(user_id)
+                weights[today] = weight
+                await save_user_document_async(user_id, 'weights', weights)
             logging.info(f"User {user_id} recorded weight: {weight} kg on {today}")
             await update.message.reply_text(f'✅ Вес {weight} кг записан!')
             context.user_data['step'] = None
@@ -192,9 +207,10 @@ async def handle_burn_calories(update, context, text, user_id, today):
     try:
         burned_calories = int(text)
         if 0 <= burned_calories <= 5000:  # Разумные пределы
-            burned = get_user_burned(user_id)
-            burned[today] = burned_calories
-            save_user_burned(user_id, burned)
+            async with user_lock(user_id):
+                burned = await get_user_burned_async(user_id)
+                burned[today] = burned_calories
+                await save_user_document_async(user_id, 'burned', burned)
             await update.message.reply_text(f'✅ Записано: потрачено {burned_calories} ккал')
             context.user_data['step'] = None
         else:
@@ -233,7 +249,8 @@ async def handle_save_meal_nutrition(update, context, text, user_id):
             'carbs': carbs
         }
         
-        add_saved_meal(user_id, meal_name, meal_data)
+        async with user_lock(user_id):
+            await add_saved_meal_async(user_id, meal_name, meal_data)
         
         # Формируем сообщение
         nutrition_parts = [f'{calories} ккал']
@@ -303,8 +320,51 @@ def parse_manual_calories(text):
     return None, None
 
 
-async def handle_food_input(update, context, text, user_id, today, diary, food_log, profile):
+async def save_meal_and_reply(update, user_id, today, profile, text, kcal, protein, fat, carbs, note=''):
+    """Записываем блюдо в дневник и отвечаем с БЖУ и остатком калорий"""
+    # Сохраняем в формате: [название, калории, белки, жиры, углеводы].
+    # Дневник перечитываем под блокировкой: пока ждали GPT, пользователь
+    # мог записать другое блюдо
+    async with user_lock(user_id):
+        diary = await log_meal_async(user_id, today, [text, kcal, protein, fat, carbs])
+        burned = await get_user_burned_async(user_id)
+
+    # Рассчитываем остаток калорий
+    left_message = get_calories_left_message(profile, diary, burned, today)
+
+    # Формируем сообщение с информацией о питании
+    nutrition_parts = [f'{kcal} ккал']
+    if protein:
+        nutrition_parts.append(f'{protein:.1f}г белка')
+    if fat:
+        nutrition_parts.append(f'{fat:.1f}г жиров')
+    if carbs:
+        nutrition_parts.append(f'{carbs:.1f}г углеводов')
+
+    nutrition_text = ', '.join(nutrition_parts)
+
+    await update.message.reply_text(
+        f'Блюдо: {text}, {nutrition_text}{note}. {left_message}.',
+        reply_markup=InlineKeyboardMarkup([
+            [InlineKeyboardButton('Сколько осталось калорий?', callback_data='check_left')]
+        ])
+    )
+
+
+def queue_notifier(update):
+    """Сообщение о месте в очереди, если запросу к GPT пришлось ждать квоту"""
+    async def on_queued(position: int):
+        await update.message.reply_text(
+            f'⏳ Сейчас много запросов, ваше сообщение в очереди (перед ним: {position}). '
+            f'Ответ придет автоматически.'
+        )
+    return on_queued
+
+
+async def handle_food_input(update, context, text, user_id, today, profile):
     """Обработка описания еды"""
+    started = time.monotonic()
+
     # Проверяем, не ввел ли пользователь просто число (возможный вес или калории)
     if await handle_ambiguous_number(update, context, text):
         return
@@ -314,18 +374,12 @@ async def handle_food_input(update, context, text, user_id, today, diary, food_l
     if food_name and manual_calories:
         # Пользователь сам указал калории - не обращаемся к GPT
         try:
-            # Сохраняем данные напрямую
-            diary[today] += manual_calories
-            save_user_diary(user_id, diary)
-
-            if today not in food_log:
-                food_log[today] = []
-            # При ручном вводе БЖУ неизвестны
-            food_log[today].append([food_name, manual_calories, None, None, None])
-            save_user_food_log(user_id, food_log)
+            # Сохраняем данные напрямую (при ручном вводе БЖУ неизвестны)
+            async with user_lock(user_id):
+                diary = await log_meal_async(user_id, today, [food_name, manual_calories, None, None, None])
+                burned = await get_user_burned_async(user_id)
 
             # Рассчитываем остаток калорий
-            burned = get_user_burned(user_id)
             left_message = get_calories_left_message(profile, diary, burned, today)
 
             await update.message.reply_text(
@@ -344,25 +398,50 @@ async def handle_food_input(update, context, text, user_id, today, diary, food_l
             await update.message.reply_text(error_msg)
             return
 
-    # Обрабатываем как описание еды через GPT
+    # Обрабатываем как описание еды: известные продукты - по справочнику, остальное через GPT
     try:
-        prompt = create_calorie_prompt(text)
-        messages = [{'role': 'user', 'content': [{'type': 'text', 'text': prompt}]}]
+        local = resolve_locally(text)
+        if local:
+            await save_meal_and_reply(
+                update, user_id, today, profile, text, local['calories'],
+                local['protein'], local['fat'], local['carbs'],
+                note=f" (по справочнику: {local['product']}, {local['grams']}г)"
+            )
+            return
 
-        response = await ask_gpt(messages)
+        # Это описание уже оценивал GPT (для любого пользователя)
+        cached = await get_cached_nutrition_async(text)
+        if cached:
+            await save_meal_and_reply(update, user_id, today, profile, text, round(cached['calories']),
+                                      cached['protein'], cached['fat'], cached['carbs'])
+            return
+
+        messages = create_calorie_messages(text)
+
+        # Если GPT отвечает долго - показываем разбор по мере генерации,
+        # быстрый ответ приходит сразу итоговым сообщением
+        progress = ProgressMessage('🔍 Считаю калории...', reply=update.message.reply_text,
+                                   started=started, min_delay=STREAM_EDIT_INTERVAL,
+                                   render=preview_nutrition_json)
+        try:
+            response = await ask_gpt(messages, user_id=user_id, on_queued=queue_notifier(update),
+                                     on_text=progress.update if GPT_STREAMING else None,
+                                     response_format=RESPONSE_FORMAT if GPT_STRUCTURED_OUTPUT else None)
+        finally:
+            await progress.delete()
         logging.info(f"GPT response for food: {response}")
 
+        # Калории и БЖУ из JSON-ответа (или из текста, если ответ не JSON)
+        nutrition = read_nutrition_answer(response)
+
         # Проверяем, задал ли GPT вопрос
-        if "ВОПРОС:" in response:
-            question = response.replace("ВОПРОС:", "").strip()
-            await update.message.reply_text(question)
+        if nutrition['question']:
+            await update.message.reply_text(nutrition['question'])
             # Сохраняем исходное описание для дальнейшей обработки
             context.user_data['pending_food_description'] = text
             context.user_data['waiting_for_clarification'] = True
             return
 
-        # Извлекаем калории и белок
-        nutrition = extract_nutrition_smart(response)
         if not nutrition['calories']:
             await update.message.reply_text('Не удалось распознать калории. Попробуйте описать блюдо подробнее.')
             return
@@ -373,37 +452,8 @@ async def handle_food_input(update, context, text, user_id, today, diary, food_l
         fat = nutrition.get('fat')
         carbs = nutrition.get('carbs')
 
-        # Сохраняем данные
-        diary[today] += kcal
-        save_user_diary(user_id, diary)
-
-        if today not in food_log:
-            food_log[today] = []
-        # Сохраняем в формате: [название, калории, белки, жиры, углеводы]
-        food_log[today].append([text, kcal, protein, fat, carbs])
-        save_user_food_log(user_id, food_log)
-
-        # Рассчитываем остаток калорий
-        burned = get_user_burned(user_id)
-        left_message = get_calories_left_message(profile, diary, burned, today)
-
-        # Формируем сообщение с информацией о питании
-        nutrition_parts = [f'{kcal} ккал']
-        if protein:
-            nutrition_parts.append(f'{protein:.1f}г белка')
-        if fat:
-            nutrition_parts.append(f'{fat:.1f}г жиров')
-        if carbs:
-            nutrition_parts.append(f'{carbs:.1f}г углеводов')
-
-        nutrition_text = ', '.join(nutrition_parts)
-
-        await update.message.reply_text(
-            f'Блюдо: {text}, {nutrition_text}. {left_message}.',
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton('Сколько осталось калорий?', callback_data='check_left')]
-            ])
-        )
+        await cache_nutrition_async(text, {'calories': kcal, 'protein': protein, 'fat': fat, 'carbs': carbs})
+        await save_meal_and_reply(update, user_id, today, profile, text, kcal, protein, fat, carbs)
 
     except Exception as e:
         log_detailed_error(e, "при обработке описания еды через GPT", str(user_id),
@@ -446,7 +496,7 @@ async def handle_ambiguous_number(update, context, text):
     return False
 
 
-async def handle_food_clarification(update, context, text, user_id, today, diary, food_log, profile):
+async def handle_food_clarification(update, context, text, user_id, today, profile):
     """Обработка уточнений по еде"""
     original_description = context.user_data.get('pending_food_description', '')
     clarification = text
@@ -467,55 +517,32 @@ async def handle_food_clarification(update, context, text, user_id, today, diary
     try:
         # Получаем финальное описание
         description_messages = [{'role': 'user', 'content': [{'type': 'text', 'text': description_prompt}]}]
-        final_description = await ask_gpt(description_messages)
+        final_description = await ask_gpt(description_messages, user_id=user_id, on_queued=queue_notifier(update))
         logging.info(f"GPT final description: {final_description}")
 
-        # Рассчитываем калории для финального описания
-        prompt = create_calorie_prompt(final_description, is_clarification=True)
-        messages = [{'role': 'user', 'content': [{'type': 'text', 'text': prompt}]}]
-        response = await ask_gpt(messages)
-
-        nutrition = extract_nutrition_smart(response)
-        if not nutrition['calories']:
-            await update.message.reply_text('Не удалось распознать калории. Попробуйте ещё раз.')
-            return
-
-        kcal = validate_calorie_result(final_description, nutrition['calories'])
-        protein = nutrition.get('protein')
-        fat = nutrition.get('fat')
-        carbs = nutrition.get('carbs')
-
-        # Сохраняем результат
-        diary[today] += kcal
-        save_user_diary(user_id, diary)
-
-        if today not in food_log:
-            food_log[today] = []
-        # Сохраняем в формате: [название, калории, белки, жиры, углеводы]
-        food_log[today].append([final_description, kcal, protein, fat, carbs])
-        save_user_food_log(user_id, food_log)
-
-        # Рассчитываем остаток калорий
-        burned = get_user_burned(user_id)
-        left_message = get_calories_left_message(profile, diary, burned, today)
-
-        # Формируем сообщение с информацией о питании
-        nutrition_parts = [f'{kcal} ккал']
-        if protein:
-            nutrition_parts.append(f'{protein:.1f}г белка')
-        if fat:
-            nutrition_parts.append(f'{fat:.1f}г жиров')
-        if carbs:
-            nutrition_parts.append(f'{carbs:.1f}г углеводов')
-
-        nutrition_text = ', '.join(nutrition_parts)
-
-        await update.message.reply_text(
-            f'Блюдо: {final_description}, {nutrition_text}. {left_message}.',
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton('Сколько осталось калорий?', callback_data='check_left')]
-            ])
-        )
+        # Рассчитываем калории для финального описания (или берем готовую оценку)
+        cached = await get_cached_nutrition_async(final_description)
+        if cached:
+            await save_meal_and_reply(update, user_id, today, profile, final_description,
+                                      round(cached['calories']), cached['protein'], cached['fat'], cached['carbs'])
+        else:
+            messages = create_calorie_messages(final_description, is_clarification=True)
+            response = await ask_gpt(messages, user_id=user_id,
+                                     response_format=RESPONSE_FORMAT if GPT_STRUCTURED_OUTPUT else None)
+
+            nutrition = read_nutrition_answer(response)
+            if not nutrition['calories']:
+                await update.message.reply_text('Не удалось распознать калории. Попробуйте ещё раз.')
+                return
+
+            kcal = validate_calorie_result(final_description, nutrition['calories'])
+            protein = nutrition.get('protein')
+            fat = nutrition.get('fat')
+            carbs = nutrition.get('carbs')
+
+            await cache_nutrition_async(final_description,
+                                        {'calories': kcal, 'protein': protein, 'fat': fat, 'carbs': carbs})
+            await save_meal_and_reply(update, user_id, today, profile, final_description, kcal, protein, fat, carbs)
 
     except Exception as e:
         log_detailed_error(e, "при обработке уточнения еды", str(user_id),
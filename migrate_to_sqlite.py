@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Одноразовый перенос данных из каталога bot_data (JSON-файлы) в SQLite
+
+Запуск:
+    python migrate_to_sqlite.py [--data-dir bot_data] [--db bot_data/bot_data.sqlite3]
+
+Повторный запуск безопасен: документы каждого пользователя заменяются целиком.
+После переноса установите STORAGE_BACKEND=sqlite в .env.
+"""
+import os
+import sys
+import json
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import config
+from utils import sqlite_storage
+from utils.user_data import DOCUMENT_TYPES
+from utils.food_journal import read_food_log
+
+
+def read_json_tree_user(user_dir: str) -> dict:
+    """Читаем документы пользователя; отсутствующие и битые файлы - пустые"""
+    user_data = {}
+    for data_type in DOCUMENT_TYPES:
+        if data_type == 'food_log':
+            continue
+        file_path = os.path.join(user_dir, f'{data_type}.json')
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                user_data[data_type] = json.load(f)
+        except FileNotFoundError:
+            user_data[data_type] = {}
+        except json.JSONDecodeError as e:
+            print(f"⚠️ Пропущен поврежденный файл {file_path}: {e}")
+            user_data[data_type] = {}
+
+    # Лог еды - партиции food_log/ или еще не перенесенные в них старые файлы
+    food_log = read_food_log(*(os.path.join(user_dir, name) for name in ('food_log', 'food_log.jsonl', 'food_log.json')))
+    user_data['food_log'] = _storable_food_log(food_log)
+    return user_data
+
+
+def _storable_food_log(food_log) -> dict:
+    """Отбрасываем только записи, которые нельзя положить в таблицу food_entries"""
+    if not isinstance(food_log, dict):
+        return {}
+
+    result = {}
+    for date, entries in food_log.items():
+        if not isinstance(entries, list):
+            continue
+        result[date] = [
+            entry[:5] for entry in entries
+            if isinstance(entry, list) and len(entry) >= 2
+            and isinstance(entry[0], str) and isinstance(entry[1], (int, float))
+        ]
+    return result
+
+
+def migrate(data_dir: str) -> int:
+    """Переносим всех пользователей. Возвращает количество перенесенных"""
+    if not os.path.isdir(data_dir):
+        print(f"❌ Каталог с данными не найден: {data_dir}")
+        return 0
+
+    migrated = 0
+    for entry in sorted(os.listdir(data_dir)):
+        user_dir = os.path.join(data_dir, entry)
+        if not entry.startswith('user_') or not os.path.isdir(user_dir):
+            continue
+
+        user_id = entry[5:]  # убираем префикс 'user_'
+        user_data = read_json_tree_user(user_dir)
+        sqlite_storage.save_user_data(user_id, user_data)
+
+        meals = sum(len(foods) for foods in user_data['food_log'].values())
+        print(f"✅ {user_id}: дней в дневнике {len(user_data['diary'])}, записей еды {meals}")
+        migrated += 1
+
+    return migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Перенос данных бота из JSON-файлов в SQLite')
+    parser.add_argument('--data-dir', default=config.DATA_DIR, help='каталог с папками user_*')
+    parser.add_argument('--db', default=config.SQLITE_PATH, help='путь к файлу SQLite')
+    args = parser.parse_args()
+
+    sqlite_storage.SQLITE_PATH = args.db
+    print(f"🗄️ Перенос {args.data_dir} -> {args.db}")
+
+    migrated = migrate(args.data_dir)
+    sqlite_storage.close_connection()
+
+    print(f"\n🎉 Перенесено пользователей: {migrated}")
+    if migrated:
+        print("💡 Установите STORAGE_BACKEND=sqlite в .env и перезапустите бота")
+
+
+if __name__ == '__main__':
+    main()
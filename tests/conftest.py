@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""
+Общие фикстуры тестов
+"""
+import os
+import pytest
+from types import SimpleNamespace
+
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import user_data
+from utils.user_data import clear_user_data_cache
+
+
+@pytest.fixture
+def temp_data_dir(tmp_path, monkeypatch):
+    """Изолируем данные и кэш пользователей каждого теста"""
+    clear_user_data_cache(flush=False)
+    monkeypatch.setattr(user_data, 'DATA_DIR', str(tmp_path))
+    yield tmp_path
+    clear_user_data_cache(flush=False)
+
+
+@pytest.fixture
+def make_update():
+    """Update Telegram с текстом сообщения; ответы бота складываются в replies"""
+    def make(user_id: int, text: str, replies: list):
+        async def reply_text(message, **kwargs):
+            replies.append(message)
+
+        return SimpleNamespace(
+            effective_user=SimpleNamespace(id=user_id),
+            message=SimpleNamespace(text=text, reply_text=reply_text)
+        )
+    return make
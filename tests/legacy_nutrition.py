@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+Прежний разбор ответа GPT каскадом регулярных выражений
+
+Копия extract_nutrition_smart и extract_*_smart из utils/calorie_calculator.py
+до перехода на utils/nutrition_extractor.py - эталон, с которым
+tests/test_nutrition_extractor.py и benchmarks/bench_nutrition_extractor.py
+сравнивают результаты и скорость нового разбора.
+"""
+import re
+import logging
+from typing import Optional, Dict
+
+
+def extract_calories_smart(response_text: str) -> Optional[int]:
+    """Умное извлечение калорий из ответа GPT"""
+    response_text = response_text.strip()
+    logging.info(f"Extracting calories from: {response_text}")
+
+    # Если это просто число
+    if response_text.replace('.', '').replace(',', '').isdigit():
+        return int(float(response_text.replace(',', '.')))
+
+    # Ищем число после ключевых слов (в порядке приоритета)
+    patterns = [
+        r'итого:?\s*(\d+(?:[.,]\d+)?)\s*ккал',  # итого: 450 ккал
+        r'всего\s+(\d+(?:[.,]\d+)?)\s*ккал',  # всего 450 ккал
+        r'итого:?\s*(\d+(?:[.,]\d+)?)',  # итого: 450
+        r'всего:?\s*(\d+(?:[.,]\d+)?)',  # всего: 450
+        r'общая\s+калорийность:?\s*(\d+(?:[.,]\d+)?)',
+        r'калорийность:?\s*(\d+(?:[.,]\d+)?)',
+        r'калории:?\s*(\d+(?:[.,]\d+)?)',  # калории: 450
+        r'(\d+(?:[.,]\d+)?)\s*ккал',  # 450 ккал
+        r'(\d+(?:[.,]\d+)?)\s*калори[йяе]',  # 450 калорий
+        r'=\s*(\d+(?:[.,]\d+)?)',
+        r'составляет?\s*(\d+(?:[.,]\d+)?)',
+        r'примерно\s*(\d+(?:[.,]\d+)?)',
+        r'около\s*(\d+(?:[.,]\d+)?)'
+    ]
+
+    for pattern in patterns:
+        matches = re.findall(pattern, response_text, re.IGNORECASE)
+        if matches:
+            # Берем последнее найденное значение (обычно итоговое)
+            result = int(float(matches[-1].replace(',', '.')))
+            logging.info(f"Found calories using pattern '{pattern}': {result}")
+            return result
+
+    # Если ничего не нашли в паттернах, берем все числа
+    numbers = [int(x) for x in re.findall(r'\d+', response_text) if int(x) > 10]
+    if numbers:
+        # Выбираем наиболее вероятное итоговое значение
+        result = max(numbers) if len(numbers) == 1 else numbers[-1]
+        logging.info(f"Using fallback number extraction: {result}")
+        return result
+
+    logging.warning(f"Could not extract calories from: {response_text}")
+    return None
+
+
+def extract_protein_smart(response_text: str) -> Optional[float]:
+    """Умное извлечение белка из ответа GPT"""
+    response_text = response_text.strip()
+    logging.info(f"Extracting protein from: {response_text[:200]}")
+
+    # Ищем белок в различных форматах (от более специфичных к менее специфичным)
+    # ВАЖНО: [ \t] вместо \s чтобы НЕ матчить через переносы строк
+    patterns = [
+        r'белки:?[ \t]*(\d+(?:[.,]\d+)?)[ \t]*г',  # белки: 30г или Белки: 30 г
+        r'белок[а-я]*:?[ \t]*(\d+(?:[.,]\d+)?)[ \t]*г',
+        r'(\d+(?:[.,]\d+)?)г[ \t]*белка',  # 32.5г белка (без пробела)
+        r'(\d+(?:[.,]\d+)?)[ \t]+г[ \t]*белка',  # 30 г белка (с пробелом)
+        r'(\d+(?:[.,]\d+)?)[ \t]+г[ \t]*белк',
+        r'белк[а-я]*[ \t]+(\d+(?:[.,]\d+)?)[ \t]*г',  # более строгий паттерн
+        r'(\d+(?:[.,]\d+)?)[ \t]*грамм[ \t]*белка',  # 25 грамм белка
+        r'(?:^|[,.\s])[ \t]*б:?[ \t]*(\d+(?:[.,]\d+)?)[ \t]*г',  # б: 35г (с началом строки или разделителем)
+        r'protein:?[ \t]*(\d+(?:[.,]\d+)?)',
+        r'(\d+(?:[.,]\d+)?)[ \t]*g[ \t]*protein'
+    ]
+
+    all_matches = []
+    for pattern in patterns:
+        matches = re.findall(pattern, response_text, re.IGNORECASE)
+        if matches:
+            all_matches.extend([(float(m.replace(',', '.')), pattern) for m in matches])
+
+    if all_matches:
+        # Берем ПОСЛЕДНЕЕ найденное значение (обычно это итоговое)
+        result, pattern = all_matches[-1]
+        logging.info(f"Found protein using pattern '{pattern}': {result}г (из {len(all_matches)} найденных)")
+        return result
+
+    logging.warning(f"Could not extract protein from: {response_text[:200]}")
+    return None
+
+
+def extract_fat_smart(response_text: str) -> Optional[float]:
+    """Умное извлечение жиров из ответа GPT"""
+    if not response_text:
+        logging.info("📊 ЖИРЫ: Пустой текст")
+        return None
+
+    logging.info(f"📊 ЖИРЫ: Поиск в тексте длиной {len(response_text)}")
+
+    # Ищем жиры в различных форматах (от более специфичных к менее специфичным)
+    # ВАЖНО: [ \t] вместо \s чтобы НЕ матчить через переносы строк
+    patterns = [
+        r'жиры:?[ \t]*(\d+(?:[.,]\d+)?)[ \t]*г',  # жиры: 18г или Жиры: 18 г
+        r'жир[а-я]*:?[ \t]*(\d+(?:[.,]\d+)?)[ \t]*г',
+        r'(\d+(?:[.,]\d+)?)г[ \t]*жир[а-я]*',  # 26.4г жира (без пробела между числом и г)
+        r'(\d+(?:[.,]\d+)?)[ \t]+г[ \t]*жир[а-я]*',  # 18 г жиров (с пробелом)
+        r'жир[а-я]*[ \t]+(\d+(?:[.,]\d+)?)[ \t]*г',  # жиры 18 г
+        r'жирность[ \t]+(\d+(?:[.,]\d+)?)[ \t]*грамм',  # жирность 10 грамм
+        r'(?:^|[,.\s])[ \t]*ж:?[ \t]*(\d+(?:[.,]\d+)?)[ \t]*г',  # ж: 16г (с началом строки или разделителем)
+        r'fat:?[ \t]*(\d+(?:[.,]\d+)?)',
+        r'(\d+(?:[.,]\d+)?)[ \t]*g[ \t]*fat',
+        r'липид[а-я]*:?[ \t]*(\d+(?:[.,]\d+)?)'
+    ]
+
+    all_matches = []
+    for pattern in patterns:
+        matches = re.findall(pattern, response_text, re.IGNORECASE)
+        if matches:
+            all_matches.extend([(float(m.replace(',', '.')), pattern) for m in matches])
+
+    if all_matches:
+        # Берем ПОСЛЕДНЕЕ найденное значение (обычно это итоговое)
+        result, pattern = all_matches[-1]
+        logging.info(f"📊 ЖИРЫ: Найдено {result}г по паттерну '{pattern}' (из {len(all_matches)} найденных)")
+        return result
+
+    logging.warning(f"📊 ЖИРЫ: НЕ НАЙДЕНО в тексте")
+    return None
+
+
+def extract_carbs_smart(response_text: str) -> Optional[float]:
+    """Умное извлечение углеводов из ответа GPT"""
+    if not response_text:
+        logging.info("📊 УГЛЕВОДЫ: Пустой текст")
+        return None
+
+    logging.info(f"📊 УГЛЕВОДЫ: Поиск в тексте длиной {len(response_text)}")
+
+    # Ищем углеводы в различных форматах (от более специфичных к менее специфичным)
+    # ВАЖНО: [ \t] вместо \s чтобы НЕ матчить через переносы строк
+    patterns = [
+        r'углеводы:?[ \t]*(\d+(?:[.,]\d+)?)[ \t]*г',  # углеводы: 6г или Углеводы: 6 г
+        r'углевод[а-я]*:?[ \t]*(\d+(?:[.,]\d+)?)[ \t]*г',
+        r'(\d+(?:[.,]\d+)?)г[ \t]*углеводов?',  # 29.2г углеводов (без пробела)
+        r'(\d+(?:[.,]\d+)?)[ \t]+г[ \t]*углеводов?',  # 6 г углеводов (с пробелом)
+        r'углевод[а-я]*[ \t]+(\d+(?:[.,]\d+)?)[ \t]*г',  # углеводы 6 г
+        r'углеводов[ \t]+(\d+(?:[.,]\d+)?)[ \t]*грамм',  # углеводов 20 грамм
+        r'(?:^|[,.\s])[ \t]*у:?[ \t]*(\d+(?:[.,]\d+)?)[ \t]*г',  # у: 45г (с началом строки или разделителем)
+        r'carbs?:?[ \t]*(\d+(?:[.,]\d+)?)',
+        r'(\d+(?:[.,]\d+)?)[ \t]*g[ \t]*carbs?',
+        r'carbohydrates?:?[ \t]*(\d+(?:[.,]\d+)?)',
+        r'(\d+(?:[.,]\d+)?)[ \t]*g[ \t]*carbohydrates?',
+        r'сахар[а-я]*:?[ \t]*(\d+(?:[.,]\d+)?)'
+    ]
+
+    all_matches = []
+    for pattern in patterns:
+        matches = re.findall(pattern, response_text, re.IGNORECASE)
+        if matches:
+            all_matches.extend([(float(m.replace(',', '.')), pattern) for m in matches])
+
+    if all_matches:
+        # Берем ПОСЛЕДНЕЕ найденное значение (обычно это итоговое)
+        result, pattern = all_matches[-1]
+        logging.info(f"📊 УГЛЕВОДЫ: Найдено {result}г по паттерну '{pattern}' (из {len(all_matches)} найденных)")
+        return result
+
+    logging.warning(f"📊 УГЛЕВОДЫ: НЕ НАЙДЕНО в тексте")
+    return None
+
+
+def extract_nutrition_smart(response_text: str) -> Dict[str, Optional[float]]:
+    """Извлекает полные БЖУ и калории из ответа GPT"""
+    logging.info(f"📊 ИЗВЛЕЧЕНИЕ БЖУ из ответа длиной {len(response_text)} символов")
+    logging.info(f"📊 Первые 500 символов ответа: {response_text[:500]}")
+
+    # КРИТИЧНО: Ищем секцию "ИТОГО" для извлечения финальных значений
+    itogo_match = re.search(r'ИТОГО:?\s*(.+?)(?=\n\n|\Z)', response_text, re.IGNORECASE | re.DOTALL)
+    
+    if itogo_match:
+        itogo_text = itogo_match.group(1)
+        logging.info(f"📊 Найдена секция ИТОГО: {itogo_text[:200]}")
+        
+        # Пытаемся извлечь полный формат из секции ИТОГО
+        # ИСПРАВЛЕНО: учитываем что между числом и "г" может не быть пробела (13.5г белка)
+        full_patterns = [
+            # Формат: 1016 ккал, 13.5г белка, 72г жира, 47г углеводов
+            r'(\d+(?:[.,]\d+)?)\s*ккал.*?(\d+(?:[.,]\d+)?)г?\s*белка.*?(\d+(?:[.,]\d+)?)г?\s*жир.*?(\d+(?:[.,]\d+)?)г?\s*углевод',
+            # Формат с пробелами: 1016 ккал, 13.5 г белка, 72 г жиров, 47 г углеводов
+            r'(\d+(?:[.,]\d+)?)\s*ккал.*?(\d+(?:[.,]\d+)?)\s*г\s*белка.*?(\d+(?:[.,]\d+)?)\s*г\s*жиров?.*?(\d+(?:[.,]\d+)?)\s*г\s*углеводов?',
+        ]
+        
+        for full_pattern in full_patterns:
+            full_match = re.search(full_pattern, itogo_text, re.IGNORECASE | re.DOTALL)
+            if full_match:
+                logging.info(f"📊 Найден полный формат БЖУ в ИТОГО: {full_match.groups()}")
+                result = {
+                    'calories': int(float(full_match.group(1).replace(',', '.'))),
+                    'protein': float(full_match.group(2).replace(',', '.')),
+                    'fat': float(full_match.group(3).replace(',', '.')),
+                    'carbs': float(full_match.group(4).replace(',', '.'))
+                }
+                logging.info(f"📊 Результат из ИТОГО: {result}")
+                return result
+        
+        # Извлекаем из секции ИТОГО по отдельности
+        logging.info(f"📊 Полный формат не найден в ИТОГО, извлекаем по отдельности")
+        calories = extract_calories_smart(itogo_text)
+        protein = extract_protein_smart(itogo_text)
+        fat = extract_fat_smart(itogo_text)
+        carbs = extract_carbs_smart(itogo_text)
+        
+        if calories:  # Если хоть калории нашли в ИТОГО
+            logging.info(f"📊 Извлечено из ИТОГО: калории={calories}, белки={protein}, жиры={fat}, углеводы={carbs}")
+            result = {
+                'calories': calories,
+                'protein': protein,
+                'fat': fat,
+                'carbs': carbs
+            }
+            logging.info(f"📊 Финальный результат из ИТОГО: {result}")
+            return result
+
+    # Если секции ИТОГО нет, ищем полный формат по всему тексту
+    logging.info(f"📊 Секция ИТОГО не найдена, ищем полный формат по всему тексту")
+    full_patterns = [
+        # Формат без пробела перед г: 1016 ккал, 13.5г белка
+        r'(\d+(?:[.,]\d+)?)\s*ккал.*?(\d+(?:[.,]\d+)?)г?\s*белка.*?(\d+(?:[.,]\d+)?)г?\s*жир.*?(\d+(?:[.,]\d+)?)г?\s*углевод',
+        # Формат с пробелом перед г: 1016 ккал, 13.5 г белка
+        r'(\d+(?:[.,]\d+)?)\s*ккал.*?(\d+(?:[.,]\d+)?)\s*г\s*белка.*?(\d+(?:[.,]\d+)?)\s*г\s*жиров?.*?(\d+(?:[.,]\d+)?)\s*г\s*углеводов?',
+    ]
+    
+    # Ищем ВСЕ вхождения полного формата по всем паттернам
+    all_matches = []
+    for full_pattern in full_patterns:
+        matches = list(re.finditer(full_pattern, response_text, re.IGNORECASE | re.DOTALL))
+        all_matches.extend(matches)
+    
+    if all_matches:
+        # Берем ПОСЛЕДНЕЕ вхождение (обычно это итоговое значение)
+        last_match = all_matches[-1]
+        logging.info(f"📊 Найдено {len(all_matches)} полных форматов, берем последний: {last_match.groups()}")
+        result = {
+            'calories': int(float(last_match.group(1).replace(',', '.'))),
+            'protein': float(last_match.group(2).replace(',', '.')),
+            'fat': float(last_match.group(3).replace(',', '.')),
+            'carbs': float(last_match.group(4).replace(',', '.'))
+        }
+        logging.info(f"📊 Результат последнего полного формата: {result}")
+        return result
+
+    # Если полный формат не найден, извлекаем по отдельности
+    logging.info(f"📊 Полный формат не найден, извлекаем по частям")
+    calories = extract_calories_smart(response_text)
+    protein = extract_protein_smart(response_text)
+    fat = extract_fat_smart(response_text)
+    carbs = extract_carbs_smart(response_text)
+
+    logging.info(f"📊 Извлечение по отдельности: калории={calories}, белки={protein}, жиры={fat}, углеводы={carbs}")
+
+    result = {
+        'calories': calories,
+        'protein': protein,
+        'fat': fat,
+        'carbs': carbs
+    }
+    logging.info(f"📊 Финальный результат извлечения: {result}")
+    return result
+
@@ -78,17 +78,18 @@ def mock_gpt_analyze_photo(image_base64: str) -> Dict[str, Any]:
     }
 
 
-def mock_ask_gpt(messages: List[Dict]) -> str:
+def mock_ask_gpt(messages: List[Dict], **kwargs) -> str:
     """
     Мок для ask_gpt без реальных API вызовов
     """
     # Анализируем сообщения чтобы понять что тестируется
     if messages and len(messages) > 0:
-        content = str(messages[0].get('content', ''))
+        # Системный префикс со справочником одинаков для всех блюд - смотрим на запрос пользователя
+        content = str(messages[-1].get('content', ''))
         
         # Если это анализ фото (есть image_url)
-        if isinstance(messages[0].get('content'), list):
-            for item in messages[0]['content']:
+        if isinstance(messages[-1].get('content'), list):
+            for item in messages[-1]['content']:
                 if item.get('type') == 'image_url':
                     return MockGPTResponses.PHOTO_RESPONSES["творог_банан"]
         
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Тесты записи лога еды FoodEntry и разбора старых форматов
+"""
+import os
+import pytest
+
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.food_entry import FoodEntry, decode_entries
+from utils.user_data import append_food_entry, set_food_entries, get_food_entries
+from utils.calorie_calculator import analyze_daily_nutrition
+
+
+pytestmark = pytest.mark.usefixtures('temp_data_dir')
+
+
+def test_legacy_formats_are_decoded_once():
+    entries = decode_entries([
+        ['Каша', 300],
+        ['Суп', 200, 12],
+        ['Омлет', 250, 18, 20, 2],
+        ['Без калорий'],
+        [None, 100],
+    ])
+
+    assert entries == [
+        FoodEntry('Каша', 300),
+        FoodEntry('Суп', 200, 12),
+        FoodEntry('Омлет', 250, 18, 20, 2),
+    ]
+    assert entries[0].protein is None and entries[2].carbs == 2
+    # Индексы работают как у старых списков
+    assert entries[1][0] == 'Суп' and entries[1][1] == 200
+
+
+def test_repeated_names_share_one_string():
+    first, second = decode_entries([[''.join(['Греч', 'ка']), 300], [''.join(['Гре', 'чка']), 300]])
+    assert first.name is second.name
+
+
+def test_fat_and_carbs_are_stored():
+    """Жиры и углеводы больше не теряются при валидации записи"""
+    append_food_entry('u1', '2025-01-01', ['Омлет', 250, 18.4, 20.2, 2.1])
+    append_food_entry('u1', '2025-01-01', ['Салат', 90, None, 7, 5])
+    set_food_entries('u1', '2025-01-02', [['Каша', 300, 10, -5, 50]])
+
+    assert get_food_entries('u1', '2025-01-01') == [
+        FoodEntry('Омлет', 250, 18, 20, 2),
+        FoodEntry('Салат', 90, None, 7, 5),
+    ]
+    # Некорректные жиры отбрасываются, остальное сохраняется
+    assert get_food_entries('u1', '2025-01-02') == [FoodEntry('Каша', 300, 10, None, 50)]
+
+
+def test_nutrition_analysis_mixes_formats():
+    set_food_entries('u2', '2025-01-01', [['Каша', 300], ['Суп', 200, 12], ['Омлет', 250, 18, 20, 2]])
+
+    nutrition = analyze_daily_nutrition('u2', '2025-01-01')
+
+    assert nutrition['total_calories'] == 750
+    assert nutrition['total_protein'] == 30
+    assert nutrition['total_fat'] == 20
+    assert nutrition['total_carbs'] == 2
+    assert nutrition['foods_count'] == 3
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
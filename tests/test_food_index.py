@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Тесты разбора справочника калорийности и поиска строк по описанию блюда
+"""
+import os
+import pytest
+
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data.calorie_database import CALORIE_ROWS, FoodRow, parse_calorie_database
+from utils.food_index import FoodIndex, food_index, russian_stem
+
+
+def names(rows):
+    return [row.name for row in rows]
+
+
+def test_reference_is_parsed_into_rows():
+    rows = parse_calorie_database("""
+МОЛОЧНЫЕ ПРОДУКТЫ:
+- Творог 5% = 121ккал, 17г белка, 5г жиров, 3г углеводов
+- Арбуз = 25ккал, 0.6г белка; дыня = 35ккал, 0.6г белка
+
+САЛАТЫ:
+- Греческий салат = 120-150ккал/100г, 4г белка, 11г жиров (порция ~350-500ккал!)
+- ВАЖНО: Салаты с майонезом калорийнее
+""")
+
+    assert rows[0] == FoodRow('Творог 5%', 121, 17, 5, 3, 'МОЛОЧНЫЕ ПРОДУКТЫ',
+                              'Творог 5% = 121ккал, 17г белка, 5г жиров, 3г углеводов')
+    assert names(rows) == ['Творог 5%', 'Арбуз', 'дыня', 'Греческий салат']
+    assert rows[2].kcal == 35 and rows[2].fat is None
+    # Диапазон - середина, примечания остаются в тексте строки
+    assert rows[3].kcal == 135 and rows[3].category == 'САЛАТЫ'
+    assert 'порция' in rows[3].text
+
+
+def test_builtin_reference_rows():
+    assert len(CALORIE_ROWS) > 100
+    assert all(row.kcal is not None and row.category for row in CALORIE_ROWS)
+
+
+def test_stems_ignore_case_endings():
+    assert russian_stem('котлетой') == russian_stem('котлеты') == russian_stem('котлета')
+    assert russian_stem('тунец') == russian_stem('тунцом')
+    assert russian_stem('огурцы') == russian_stem('Огурец')
+
+
+def test_search_finds_every_ingredient():
+    rows = names(food_index.search('рис с курицей и огурцами', k=10))
+    assert 'Рис отварной' in rows and 'Куриная грудка' in rows and 'Огурец' in rows
+    assert 'Пиво светлое 4-5%' not in rows
+
+
+def test_search_ranks_specific_rows_first():
+    index = FoodIndex(CALORIE_ROWS)
+    assert names(index.search('салат с тунцом', k=1)) == ['Салат с тунцом']
+    assert index.search('рататуй', k=10) == []
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
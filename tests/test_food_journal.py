@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+Тесты журнала приемов пищи (append-only JSONL, партиции по месяцам)
+"""
+import os
+import json
+import pytest
+
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import user_data
+from utils.food_entry import FoodEntry
+from utils.food_journal import FoodJournal, FoodJournalStore, read_food_log
+from utils.user_data import (
+    get_user_food_log, save_user_food_log, append_food_entry, set_food_entries,
+    get_food_entries, clear_user_data_cache, get_user_files, load_user_data,
+    compact_food_logs, save_user_data, freeze_cold_food_logs
+)
+
+
+pytestmark = pytest.mark.usefixtures('temp_data_dir')
+
+
+def user_dir(user_id):
+    return os.path.dirname(get_user_files(user_id)['food_log'])
+
+
+def journal_path(user_id, month='2025-01'):
+    return os.path.join(user_dir(user_id), 'food_log', f'{month}.jsonl')
+
+
+def read_records(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_append_does_not_rewrite_history():
+    """Новая запись дописывается в конец, старые байты не трогаются"""
+    for day in range(1, 31):
+        append_food_entry('u1', f'2025-01-{day:02d}', ['Каша', 300, 10])
+    path = journal_path('u1')
+    with open(path, 'rb') as f:
+        before = f.read()
+
+    append_food_entry('u1', '2025-01-31', ['Суп', 200])
+
+    with open(path, 'rb') as f:
+        after = f.read()
+    assert after.startswith(before)
+    assert after[len(before):].count(b'\n') == 1
+
+
+def test_day_reads_use_index(tmp_path):
+    """Чтение дня не разбирает чужие строки"""
+    journal = FoodJournal(str(tmp_path / 'log.jsonl'))
+    journal.append('2025-01-01', ['А', 100])
+    journal.append('2025-01-02', ['Б', 200])
+    journal.append('2025-01-01', ['В', 300])
+
+    reopened = FoodJournal(journal.path)
+    assert reopened.dates() == ['2025-01-01', '2025-01-02']
+
+    # Портим строку другого дня уже после построения индекса: день 01 ее не читает
+    with open(journal.path, 'r+b') as f:
+        lines = f.read().split(b'\n')
+        f.seek(len(lines[0]) + 1)
+        f.write(b'#' * len(lines[1]))
+    assert reopened.get('2025-01-01') == [['А', 100], ['В', 300]]
+
+
+def test_set_replaces_day_and_empty_set_deletes(tmp_path):
+    journal = FoodJournal(str(tmp_path / 'log.jsonl'))
+    journal.append('2025-01-01', ['А', 100])
+    journal.set('2025-01-01', [['Б', 50]])
+    journal.append('2025-01-01', ['В', 70])
+    journal.append('2025-01-02', ['Г', 10])
+    journal.set('2025-01-02', [])
+
+    reopened = FoodJournal(journal.path)
+    assert reopened.to_dict() == {'2025-01-01': [['Б', 50], ['В', 70]]}
+
+
+def test_torn_tail_is_truncated(tmp_path):
+    """Недописанная при сбое строка отбрасывается, журнал продолжает работать"""
+    journal = FoodJournal(str(tmp_path / 'log.jsonl'))
+    journal.append('2025-01-01', ['А', 100])
+    with open(journal.path, 'ab') as f:
+        f.write('{"d":"2025-01-01","op":"add","e":["Б"'.encode('utf-8'))
+
+    reopened = FoodJournal(journal.path)
+    reopened.append('2025-01-01', ['В', 300])
+
+    assert FoodJournal(journal.path).get('2025-01-01') == [['А', 100], ['В', 300]]
+
+
+def test_compaction_keeps_content_and_shrinks_file(tmp_path):
+    journal = FoodJournal(str(tmp_path / 'log.jsonl'))
+    for i in range(50):
+        journal.set('2025-01-01', [['Блюдо', i]])
+    journal.append('2025-01-02', ['Суп', 200])
+    content = journal.to_dict()
+    size = os.path.getsize(journal.path)
+
+    assert journal.compact()
+
+    assert journal.to_dict() == content
+    assert FoodJournal(journal.path).to_dict() == content
+    assert os.path.getsize(journal.path) < size
+    assert len(read_records(journal.path)) == 2
+    assert not journal.compact()
+
+
+def test_store_compacts_only_journals_with_garbage(tmp_path):
+    store = FoodJournalStore(lambda uid: (str(tmp_path / uid), ()))
+    for i in range(10):
+        store.set_entries('busy', '2025-01-01', [['Блюдо', i]])
+    store.append('quiet', '2025-01-01', ['Суп', 200])
+
+    assert store.compact(min_garbage=5) == 1
+    assert len(read_records(str(tmp_path / 'busy' / '2025-01.jsonl'))) == 1
+    assert store.get_entries('busy', '2025-01-01') == [['Блюдо', 9]]
+
+
+def test_store_does_not_evict_journal_in_use(tmp_path):
+    store = FoodJournalStore(lambda uid: (str(tmp_path / uid), ()), max_open=1)
+    with store.journal('slow', '2025-01') as journal:
+        # Пока журнал в работе, другие пользователи не вытесняют его
+        store.append('other', '2025-02-01', ['Чай', 5])
+        with store.journal('slow', '2025-01') as same:
+            assert same is journal
+        journal.append('2025-01-01', ['Суп', 200])
+
+    store.append('other', '2025-02-02', ['Чай', 5])  # теперь вытесняется
+    assert store.stats['partitions_opened'] == 3
+    assert store.get_entries('slow', '2025-01-01') == [['Суп', 200]]
+
+
+def test_store_bounds_known_users(tmp_path):
+    store = FoodJournalStore(lambda uid: (str(tmp_path / uid), ()), max_open=2)
+    for i in range(5):
+        store.append(f'u{i}', '2025-01-01', ['Суп', 200])
+
+    assert len(store._journals) == 2 and len(store._ready) == 2
+    assert store.get_entries('u0', '2025-01-01') == [['Суп', 200]]
+
+
+def test_legacy_food_log_json_is_split_into_partitions():
+    """Старый food_log.json раскладывается по месяцам при первом обращении"""
+    legacy = get_user_files('old')['food_log']
+    with open(legacy, 'w', encoding='utf-8') as f:
+        json.dump({'2024-12-31': [['Оливье', 500]], '2025-01-01': [['Каша', 300, 10]]}, f)
+
+    assert get_food_entries('old', '2025-01-01') == [FoodEntry('Каша', 300, 10)]
+    assert not os.path.exists(legacy)
+    assert sorted(os.listdir(os.path.join(user_dir('old'), 'food_log'))) == ['2024-12.jsonl', '2025-01.jsonl']
+    assert read_food_log(journal_path('old', '2024-12')) == {'2024-12-31': [['Оливье', 500]]}
+
+
+def test_single_journal_is_split_into_partitions():
+    """Журнал food_log.jsonl без партиций тоже переносится"""
+    journal = FoodJournal(os.path.join(user_dir('j'), 'food_log.jsonl'))
+    journal.append('2025-01-01', ['Каша', 300])
+    journal.append('2025-02-01', ['Суп', 200])
+
+    assert dict(get_user_food_log('j')) == {'2025-01-01': [['Каша', 300]], '2025-02-01': [['Суп', 200]]}
+    assert not os.path.exists(journal.path)
+
+
+def test_day_read_opens_only_its_partition():
+    """Запрос за день не зависит от длины истории: открывается одна партиция"""
+    for month in range(1, 13):
+        append_food_entry('long', f'2024-{month:02d}-15', ['Каша', 300])
+    append_food_entry('long', '2025-01-01', ['Суп', 200])
+    clear_user_data_cache(flush=False)
+    opened = user_data._food_store.stats['partitions_opened']
+
+    assert get_food_entries('long', '2025-01-01') == [FoodEntry('Суп', 200)]
+    assert get_food_entries('long', '2025-03-01') == []
+    assert '2025-01-01' in get_user_food_log('long')
+    assert user_data._food_store.stats['partitions_opened'] - opened == 1
+
+
+def test_save_user_data_replaces_all_partitions():
+    append_food_entry('r', '2024-12-01', ['Каша', 300])
+    save_user_data('r', {'food_log': {'2025-01-01': [['Суп', 200]]}})
+
+    assert dict(get_user_food_log('r')) == {'2025-01-01': [['Суп', 200]]}
+    assert not os.path.exists(journal_path('r', '2024-12'))
+
+
+def test_view_is_compatible_with_legacy_callers():
+    """Старый код: food_log[today].append(...) + save_user_food_log"""
+    append_food_entry('u2', '2025-01-01', ['Каша', 300])
+
+    food_log = get_user_food_log('u2')
+    assert '2025-01-02' not in food_log
+    food_log['2025-01-02'] = []
+    food_log['2025-01-02'].append(['Суп', 200])
+    food_log['2025-01-01'].append(['Чай', 5])
+    save_user_food_log('u2', food_log)
+
+    # Дописанные записи уходят в журнал как add, без перезаписи дней
+    assert [r['op'] for r in read_records(journal_path('u2'))] == ['add', 'add', 'add']
+    assert dict(get_user_food_log('u2')) == {
+        '2025-01-01': [['Каша', 300], ['Чай', 5]],
+        '2025-01-02': [['Суп', 200]],
+    }
+    assert load_user_data('u2')['food_log'] == dict(get_user_food_log('u2'))
+
+
+def test_view_edits_and_deletions_become_set_records():
+    append_food_entry('u3', '2025-01-01', ['Каша', 300])
+    append_food_entry('u3', '2025-01-02', ['Суп', 200])
+
+    food_log = get_user_food_log('u3')
+    food_log['2025-01-01'][0][1] = 250
+    del food_log['2025-01-02']
+    save_user_food_log('u3', food_log)
+
+    assert dict(get_user_food_log('u3')) == {'2025-01-01': [['Каша', 250]]}
+
+
+def test_invalid_entries_are_rejected():
+    assert not append_food_entry('u4', '2025-01-01', ['Каша', None])
+    set_food_entries('u4', '2025-01-02', [['Суп', 200], [None, 5]])
+
+    assert dict(get_user_food_log('u4')) == {'2025-01-02': [['Суп', 200]]}
+    assert compact_food_logs() == 0
+
+
+def test_cold_partitions_are_frozen_and_thawed_on_write(monkeypatch):
+    """Прошлые месяцы сжимаются, читаются из сжатого файла и разворачиваются при записи"""
+    monkeypatch.setattr(user_data, 'FOOD_LOG_COLD_COMPRESSION', 'gzip')
+    for day in range(1, 29):
+        append_food_entry('cold', f'2024-12-{day:02d}', ['Каша', 300, 10])
+    append_food_entry('cold', '2025-01-01', ['Суп', 200])
+    history = dict(get_user_food_log('cold'))
+
+    assert freeze_cold_food_logs(today='2025-01-15') == 1
+    assert freeze_cold_food_logs(today='2025-01-15') == 0
+    plain, frozen = journal_path('cold', '2024-12'), journal_path('cold', '2024-12') + '.gz'
+    assert os.path.exists(frozen) and not os.path.exists(plain)
+    assert os.path.getsize(frozen) < 28 * len('{"d":"2024-12-01","op":"add","e":["Каша",300,10]}')
+    assert os.path.exists(journal_path('cold', '2025-01'))  # Текущий месяц не трогаем
+
+    clear_user_data_cache(flush=False)
+    assert get_food_entries('cold', '2024-12-05') == [FoodEntry('Каша', 300, 10)]
+    assert dict(get_user_food_log('cold')) == history
+    assert read_food_log(os.path.join(user_dir('cold'), 'food_log')) == history
+
+    append_food_entry('cold', '2024-12-31', ['Оливье', 500])
+    assert os.path.exists(plain) and not os.path.exists(frozen)
+    clear_user_data_cache(flush=False)
+    assert get_food_entries('cold', '2024-12-31') == [FoodEntry('Оливье', 500)]
+    assert len(get_user_food_log('cold')) == 30
+
+
+def test_freezing_is_disabled_by_default():
+    append_food_entry('warm', '2024-12-01', ['Каша', 300])
+    assert freeze_cold_food_logs(today='2025-01-15') == 0
+    assert os.path.exists(journal_path('warm', '2024-12'))
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
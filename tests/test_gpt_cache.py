@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+Тесты кэша оценок GPT по описанию блюда
+"""
+import os
+import json
+import asyncio
+import datetime
+import pytest
+from types import SimpleNamespace
+
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import warm_gpt_cache
+from tests.mock_gpt import MockGPTResponses
+from utils import gpt_cache
+from utils.gpt_cache import NutritionCache, get_gpt_cache_stats
+from utils.user_data import set_food_entries, get_food_entries
+from handlers import text_handler
+
+NUTRITION = {'calories': 480, 'protein': 35, 'fat': 16, 'carbs': 45}
+
+
+@pytest.fixture(autouse=True)
+def temp_data_dir(temp_data_dir, monkeypatch):
+    """Отдельный кэш оценок GPT каждого теста"""
+    monkeypatch.setattr(gpt_cache, 'nutrition_cache', NutritionCache(str(temp_data_dir / 'gpt_cache.sqlite3'), 3600, 100))
+    yield temp_data_dir
+    gpt_cache.nutrition_cache.close()
+
+
+def test_normalized_descriptions_share_entry(tmp_path):
+    cache = NutritionCache(str(tmp_path / 'cache.sqlite3'), 3600, 10)
+    cache.put('гречка с котлетой', 'gpt-4o-mini', 'v1', NUTRITION)
+
+    assert cache.get('  Гречка   с котлетой. ', 'gpt-4o-mini', 'v1') == NUTRITION
+    # Другая модель или версия промпта - другая оценка
+    assert cache.get('гречка с котлетой', 'gpt-4o', 'v1') is None
+    assert cache.get('гречка с котлетой', 'gpt-4o-mini', 'v2') is None
+    assert cache.stats['hits'] == 1 and cache.stats['misses'] == 2
+
+
+def test_entries_survive_restart(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = NutritionCache(path, 3600, 10)
+    cache.put('борщ', 'm', 'v', NUTRITION)
+    cache.close()
+
+    assert NutritionCache(path, 3600, 10).get('борщ', 'm', 'v') == NUTRITION
+
+
+def test_expired_entries_are_misses(tmp_path, monkeypatch):
+    cache = NutritionCache(str(tmp_path / 'cache.sqlite3'), 60, 10)
+    cache.put('борщ', 'm', 'v', NUTRITION)
+
+    real_time = gpt_cache.time.time
+    monkeypatch.setattr(gpt_cache.time, 'time', lambda: real_time() + 61)
+
+    assert cache.get('борщ', 'm', 'v') is None
+    assert cache.stats['expired'] == 1
+    assert len(cache) == 0
+
+
+def test_least_recently_used_are_evicted(tmp_path, monkeypatch):
+    cache = NutritionCache(str(tmp_path / 'cache.sqlite3'), 10 ** 6, 10)
+    clock = [1000.0]
+    monkeypatch.setattr(gpt_cache.time, 'time', lambda: clock[0])
+
+    for i in range(10):
+        clock[0] += 100
+        cache.put(f'блюдо {i}', 'm', 'v', NUTRITION)
+    clock[0] += 100
+    assert cache.get('блюдо 0', 'm', 'v')  # самое старое, но только что запрошено
+
+    clock[0] += 100
+    cache.put('блюдо 10', 'm', 'v', NUTRITION)
+
+    assert len(cache) <= 10
+    assert cache.stats['evictions'] >= 1
+    assert cache.contains('блюдо 0', 'm', 'v')
+    assert not cache.contains('блюдо 1', 'm', 'v')
+    assert cache.contains('блюдо 10', 'm', 'v')
+
+
+def test_repeated_description_skips_gpt(monkeypatch, make_update):
+    calls = []
+
+    async def counting_gpt(messages, max_retries=3, **kwargs):
+        calls.append(messages)
+        return MockGPTResponses.TEXT_RESPONSES['гречка котлета']
+
+    monkeypatch.setattr(text_handler, 'ask_gpt', counting_gpt)
+    replies = []
+
+    async def run():
+        await text_handler.handle_text_message(make_update(1, 'Гречка с котлетой', replies), SimpleNamespace(user_data={}))
+        await text_handler.handle_text_message(make_update(2, 'гречка с котлетой ', replies), SimpleNamespace(user_data={}))
+
+    asyncio.run(run())
+
+    today = datetime.date.today().isoformat()
+    assert len(calls) == 1
+    assert get_food_entries('1', today)[0][1:] == get_food_entries('2', today)[0][1:]
+    assert get_gpt_cache_stats()['hits'] == 1
+    assert get_gpt_cache_stats()['hit_ratio'] == 0.5
+
+
+def test_warming_from_history(monkeypatch):
+    set_food_entries('1', '2025-01-01', [['Гречка с котлетой', 480, 35, 16, 45], ['Шоколадка', 205]])
+    set_food_entries('2', '2025-01-02', [['гречка с котлетой', 500, 37, 18, 47]])
+    set_food_entries('2', '2025-01-03', [['Омлет', 250, 18, 20, 2]])
+
+    assert warm_gpt_cache.warm(min_count=2) == 1
+    # История - не ответ GPT на текущий промпт: без GPT_CACHE_USE_HISTORY не используется
+    assert gpt_cache.get_cached_nutrition('гречка с котлетой') is None
+
+    monkeypatch.setattr(gpt_cache, 'GPT_CACHE_USE_HISTORY', True)
+    assert gpt_cache.get_cached_nutrition('гречка с котлетой') == {
+        'calories': 490, 'protein': 36, 'fat': 17, 'carbs': 46
+    }
+    # Одна запись - мало для уверенности, ручной ввод без БЖУ не кэшируется
+    assert gpt_cache.get_cached_nutrition('омлет') is None
+    assert gpt_cache.get_cached_nutrition('шоколадка') is None
+    # Повторный прогрев ничего не меняет, ответ GPT на текущий промпт важнее истории
+    assert warm_gpt_cache.warm(min_count=2) == 0
+    gpt_cache.cache_nutrition('гречка с котлетой', {'calories': 520, 'protein': 38, 'fat': 19, 'carbs': 48})
+    assert gpt_cache.get_cached_nutrition('гречка с котлетой')['calories'] == 520
+
+
+
+def test_warming_does_not_touch_user_data(temp_data_dir):
+    user_dir = temp_data_dir / 'user_old'
+    user_dir.mkdir()
+    entries = [['Гречка с котлетой', 480, 35, 16, 45], ['Гречка с котлетой', 500, 37, 18, 47]]
+    (user_dir / 'food_log.json').write_text(json.dumps({'2024-12-31': entries}), encoding='utf-8')
+
+    assert warm_gpt_cache.warm(min_count=2) == 1
+    # Старый лог не перенесен в партиции - утилита только читает данные
+    assert sorted(os.listdir(user_dir)) == ['food_log.json']
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
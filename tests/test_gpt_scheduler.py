@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Тесты планировщика запросов к GPT: одновременные запросы, квоты, очередь
+"""
+import os
+import time
+import asyncio
+import pytest
+
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.gpt_scheduler import GPTScheduler
+
+LIMITS = {'mini': {'rpm': 6000, 'tpm': 10 ** 6}, '4o': {'rpm': 6000, 'tpm': 6000}}
+
+
+def test_concurrency_is_capped():
+    scheduler = GPTScheduler(2, LIMITS)
+    running = []
+    peak = []
+
+    async def request():
+        async with scheduler.slot('mini', 100):
+            running.append(1)
+            peak.append(len(running))
+            await asyncio.sleep(0.01)
+            running.pop()
+
+    async def run():
+        await asyncio.gather(*(request() for _ in range(6)))
+
+    asyncio.run(run())
+    assert max(peak) == 2
+    assert scheduler.in_flight == 0
+    assert scheduler.stats['admitted'] == 6 and scheduler.stats['queued'] == 4
+
+
+def test_users_are_served_round_robin():
+    scheduler = GPTScheduler(1, LIMITS)
+    order = []
+    positions = {}
+
+    async def request(user_id: str, name: str, release: asyncio.Event = None):
+        async def on_queued(position):
+            positions[name] = position
+
+        async with scheduler.slot('mini', 100, user_id, on_queued):
+            order.append(name)
+            if release is not None:
+                await release.wait()
+
+    async def run():
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(request('x', 'x1', release))]
+        await asyncio.sleep(0)
+        for name in ('a1', 'a2', 'a3'):
+            tasks.append(asyncio.create_task(request('a', name)))
+            await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(request('b', 'b1')))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    # Третий запрос пользователя a не задерживает первый запрос пользователя b
+    assert order == ['x1', 'a1', 'b1', 'a2', 'a3']
+    assert positions == {'a1': 0, 'a2': 1, 'a3': 2, 'b1': 1}
+
+
+def test_token_quota_is_not_exceeded():
+    scheduler = GPTScheduler(10, LIMITS)
+    started = []
+
+    async def request(user_id: str, model: str, tokens: int):
+        async with scheduler.slot(model, tokens, user_id):
+            started.append((model, time.monotonic()))
+
+    async def run():
+        begin = time.monotonic()
+        # 6000 токенов в минуту = 100 в секунду: после первого запроса в ведре 2985,
+        # второму не хватает 30 токенов - он ждет ~0.3 с
+        await asyncio.gather(request('a', '4o', 3015), request('b', '4o', 3015), request('c', 'mini', 100))
+        return begin
+
+    begin = asyncio.run(run())
+    waits = [at - begin for _, at in started]
+    assert [model for model, _ in started] == ['4o', 'mini', '4o']  # другая модель не ждет
+    assert waits[1] < 0.1
+    assert 0.3 <= waits[2] < 1.0
+
+
+def test_unused_tokens_are_returned():
+    scheduler = GPTScheduler(10, LIMITS)
+
+    async def run():
+        async with scheduler.slot('4o', 500) as ticket:
+            ticket.settle(120)
+
+    asyncio.run(run())
+    assert scheduler.buckets('4o')[1].level == pytest.approx(5880, abs=5)
+
+
+def test_cancelled_request_leaves_queue():
+    scheduler = GPTScheduler(1, LIMITS)
+
+    async def run():
+        release = asyncio.Event()
+
+        async def holder():
+            async with scheduler.slot('mini', 100):
+                await release.wait()
+
+        async def waiter():
+            async with scheduler.slot('mini', 100, 'b'):
+                pass
+
+        first = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(waiter())
+        await asyncio.sleep(0)
+        assert scheduler.queue_length == 1
+        queued.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        await first
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+
+    asyncio.run(run())
+    assert scheduler.queue_length == 0
+    assert scheduler.in_flight == 0
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Тесты потокового ответа GPT и сообщения, которое показывает его по мере генерации
+"""
+import os
+import asyncio
+import pytest
+from types import SimpleNamespace
+
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+openai = pytest.importorskip('openai')
+httpx = pytest.importorskip('httpx')
+
+from utils import openai_pool, retry_policy, calorie_calculator, progress_message
+from utils.openai_pool import OpenAIPool
+from utils.gpt_scheduler import GPTScheduler
+from utils.progress_message import ProgressMessage
+
+MESSAGES = [{'role': 'user', 'content': 'гречка с котлетой'}]
+ANSWER = ['Гречка 200г', ' - 220 ккал, ', 'котлета 100г - 250 ккал. ', 'Итого: 470 ккал']
+
+
+def chunk(text=None, usage=None):
+    choices = [SimpleNamespace(delta=SimpleNamespace(content=text))] if text is not None else []
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+class FakeStream:
+    """Поток частей ответа; error - исключение после заданного числа частей"""
+
+    def __init__(self, parts, error=None, fail_after=0):
+        self.parts = parts
+        self.error = error
+        self.fail_after = fail_after
+
+    async def __aiter__(self):
+        for i, part in enumerate(self.parts):
+            if self.error is not None and i == self.fail_after:
+                raise self.error
+            yield chunk(part)
+        if self.error is not None and self.fail_after >= len(self.parts):
+            raise self.error
+        yield chunk(usage=SimpleNamespace(prompt_tokens=100, completion_tokens=20, total_tokens=120,
+                                          prompt_tokens_details=None))
+
+
+class FakeClient:
+    """Клиент OpenAI, который по очереди выдает заданные потоки"""
+
+    def __init__(self, *streams):
+        self.streams = list(streams)
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        return self.streams.pop(0)
+
+
+@pytest.fixture
+def fake_api(monkeypatch):
+    """ask_gpt ходит в FakeClient, паузы не ждут"""
+    async def fake_sleep(delay):
+        pass
+
+    def install(*streams):
+        client = FakeClient(*streams)
+        pool = OpenAIPool('text', 'gpt-test', 4, 30)
+        pool._client = client
+        monkeypatch.setattr(calorie_calculator, 'get_pool', lambda has_image: pool)
+        return client
+
+    monkeypatch.setattr(calorie_calculator.asyncio, 'sleep', fake_sleep)
+    monkeypatch.setattr(calorie_calculator, 'gpt_scheduler',
+                        GPTScheduler(8, {'gpt-test': {'rpm': 10 ** 4, 'tpm': 10 ** 7}}))
+    monkeypatch.setattr(retry_policy, '_breakers', {})
+    return install
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeMessage:
+    def __init__(self):
+        self.edits = []
+        self.deleted = False
+
+    async def edit_text(self, text):
+        self.edits.append(text)
+
+    async def delete(self):
+        self.deleted = True
+
+
+def test_stream_yields_parts(fake_api):
+    client = fake_api(FakeStream(ANSWER))
+
+    async def collect():
+        return [part async for part in calorie_calculator.ask_gpt_stream(MESSAGES)]
+
+    assert asyncio.run(collect()) == ANSWER
+    assert client.calls[0]['stream'] is True
+    assert client.calls[0]['stream_options'] == {'include_usage': True}
+
+
+def test_on_text_gets_growing_answer(fake_api):
+    fake_api(FakeStream(ANSWER))
+    seen = []
+
+    async def on_text(text):
+        seen.append(text)
+
+    result = asyncio.run(calorie_calculator.ask_gpt(MESSAGES, on_text=on_text))
+    assert result == ''.join(ANSWER)
+    assert seen == [''.join(ANSWER[:i]) for i in range(1, len(ANSWER) + 1)]
+    # Итог разбирается так же, как ответ без потока
+    assert calorie_calculator.extract_nutrition_smart(result)['calories'] == 470
+
+
+def test_retry_only_before_first_part(fake_api):
+    down = openai.APIConnectionError(request=httpx.Request('POST', 'https://api.openai.com'))
+
+    client = fake_api(FakeStream(ANSWER, down, fail_after=0), FakeStream(ANSWER))
+    assert asyncio.run(calorie_calculator.ask_gpt(MESSAGES, on_text=lambda text: asyncio.sleep(0))) \
+        == ''.join(ANSWER)
+    assert len(client.calls) == 2
+
+    # Часть ответа уже показана - повтор начал бы его заново
+    client = fake_api(FakeStream(ANSWER, down, fail_after=2), FakeStream(ANSWER))
+    with pytest.raises(openai.APIConnectionError):
+        asyncio.run(calorie_calculator.ask_gpt(MESSAGES, on_text=lambda text: asyncio.sleep(0)))
+    assert len(client.calls) == 1
+
+
+def test_progress_message_throttles_edits(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(progress_message.time, 'monotonic', clock)
+    message = FakeMessage()
+    progress = ProgressMessage('🔍 Анализирую фото...', message=message, started=clock.now - 0.5, interval=1.5)
+
+    async def run():
+        for i, part in enumerate(['Гречка', 'Гречка 200г', 'Гречка 200г - 220', 'Гречка 200г - 220 ккал']):
+            clock.now += 0.5 if i else 0.3
+            await progress.update(part)
+
+    asyncio.run(run())
+    # Первая часть показывается сразу, дальше - не чаще раза в 1.5 с
+    assert message.edits == ['🔍 Анализирую фото...\n\nГречка ▌', '🔍 Анализирую фото...\n\nГречка 200г - 220 ккал ▌']
+    assert progress.first_feedback == pytest.approx(0.8)
+    assert progress_message.get_stream_stats()['first_feedback_p50'] is not None
+
+
+def test_quick_answer_skips_progress_message(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(progress_message.time, 'monotonic', clock)
+    sent = []
+
+    async def reply(text):
+        sent.append(text)
+        return FakeMessage()
+
+    async def run(delay):
+        progress = ProgressMessage('🔍 Считаю калории...', reply=reply, started=clock.now, min_delay=1.5)
+        clock.now += delay
+        await progress.update('Итого: 470 ккал')
+        message = progress.message
+        await progress.delete()
+        return message
+
+    assert asyncio.run(run(0.4)) is None and sent == []
+    message = asyncio.run(run(2.0))
+    assert sent == ['🔍 Считаю калории...\n\nИтого: 470 ккал ▌']
+    assert message.deleted
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Тесты group commit и режимов надежности записи (STORAGE_DURABILITY)
+"""
+import os
+import time
+import threading
+import pytest
+
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import user_data
+from utils.food_entry import FoodEntry
+from utils.user_data import GroupCommitWriter, append_food_entry, get_food_entries
+
+
+pytestmark = pytest.mark.usefixtures('temp_data_dir')
+
+
+def slow_recorder(synced: list, delay: float = 0.01):
+    def sync(path):
+        time.sleep(delay)
+        synced.append(path)
+    return sync
+
+
+def run_threads(target, count: int) -> list:
+    errors = []
+
+    def wrapper(i):
+        try:
+            target(i)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=wrapper, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+def test_concurrent_writes_share_groups():
+    """Записи, пришедшие во время fsync, синхронизируются следующей группой"""
+    synced = []
+    writer = GroupCommitWriter(window=0.005, fsync=slow_recorder(synced), syncfs=None)
+
+    def write(i):
+        writer.sync(f'/data/user_{i}.jsonl', '/data')
+        # После возврата путь уже синхронизирован
+        assert f'/data/user_{i}.jsonl' in synced
+
+    assert run_threads(write, 20) == []
+    assert writer.stats['writes'] == 20
+    assert writer.stats['groups'] < 20
+    # Общий каталог синхронизируется один раз на группу, а не на запись
+    assert synced.count('/data') == writer.stats['groups']
+
+
+def test_group_uses_one_syncfs_per_device(tmp_path):
+    files, syncfs_calls = [], []
+    for i in range(5):
+        path = tmp_path / f'{i}.jsonl'
+        path.write_text('x')
+        files.append(str(path))
+
+    writer = GroupCommitWriter(window=0.005, fsync=slow_recorder([]), syncfs=slow_recorder(syncfs_calls))
+    writer._last_group_writes = 2  # Как под нагрузкой: лидер выдерживает окно
+
+    assert run_threads(lambda i: writer.sync(files[i]), 5) == []
+    # Группа из нескольких файлов одного устройства - один syncfs вместо fsync каждого
+    assert syncfs_calls
+    assert writer.stats['fsyncs'] < 5
+
+
+def test_sync_error_is_raised_to_every_writer_of_group():
+    def failing_fsync(path):
+        time.sleep(0.01)
+        raise OSError('disk is gone')
+
+    writer = GroupCommitWriter(window=0.005, fsync=failing_fsync, syncfs=None)
+    assert len(run_threads(lambda i: writer.sync(f'/data/{i}'), 8)) == 8
+
+
+
+@pytest.mark.parametrize('syncfs', [True, False])
+def test_vanished_path_does_not_fail_group(tmp_path, syncfs):
+    """Файл, переименованный после записи, не роняет группу остальных писателей"""
+    kept, gone = tmp_path / 'kept.jsonl', tmp_path / 'gone.jsonl'
+    kept.write_text('x')
+    synced = []
+
+    def fsync(path):
+        user_data._fsync_path(path)
+        synced.append(path)
+
+    writer = GroupCommitWriter(window=0.05, fsync=fsync, syncfs=slow_recorder(synced) if syncfs else None)
+    writer._last_group_writes = 2  # Лидер ждет, пока к группе присоединится второй путь
+
+    assert run_threads(lambda i: writer.sync(str((kept, gone)[i])), 2) == []
+    assert str(tmp_path) in synced  # вместо исчезнувшего файла - его каталог
+    assert writer.stats['groups'] == 1
+
+
+@pytest.mark.parametrize('release, expected', [
+    ('6.1.0-18-amd64', True), ('5.8.0', True), ('5.4.0-150-generic', False), ('4.19.0', False), ('unknown', False),
+])
+def test_syncfs_only_on_kernels_reporting_errors(release, expected):
+    assert user_data._syncfs_reports_errors(release) is expected
+
+@pytest.mark.parametrize('mode, expected_fsyncs', [('strict', 3), ('relaxed', 0)])
+def test_durability_modes(monkeypatch, mode, expected_fsyncs):
+    calls = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(user_data, 'STORAGE_DURABILITY', mode)
+    monkeypatch.setattr(os, 'fsync', lambda fd: calls.append(fd) or real_fsync(fd))
+
+    append_food_entry('u1', '2025-01-01', ['Каша', 300])  # Новый файл: журнал + каталог
+    append_food_entry('u1', '2025-01-01', ['Суп', 200])
+
+    assert len(calls) == expected_fsyncs
+    assert get_food_entries('u1', '2025-01-01') == [FoodEntry('Каша', 300), FoodEntry('Суп', 200)]
+
+
+def test_group_mode_persists_documents(monkeypatch):
+    monkeypatch.setattr(user_data, 'STORAGE_DURABILITY', 'group')
+    groups = user_data._group_commit.stats['groups']
+
+    user_data.save_user_diary('u2', {'2025-01-01': 300})
+    assert user_data.flush_user_data('u2') == 1
+
+    with open(user_data.get_user_files('u2')['diary'], encoding='utf-8') as f:
+        assert '300' in f.read()
+    # Временный файл и каталог после переименования
+    assert user_data._group_commit.stats['groups'] - groups == 2
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
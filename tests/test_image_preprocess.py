@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Тесты подготовки фото перед GPT Vision: размер из Telegram, уменьшение,
+перекодирование без EXIF и detail запроса
+"""
+import io
+import os
+import base64
+import asyncio
+import pytest
+from types import SimpleNamespace
+
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import image_preprocess, user_data
+from utils.user_data import clear_user_data_cache
+from handlers import photo_handler
+from utils.image_preprocess import (
+    pick_photo_size, prepare_image, choose_detail, get_image_stats, download_photo, PhotoTooLarge
+)
+from utils.prompt_builder import image_tokens, estimate_request_tokens, build_food_photo_messages
+
+# Размеры, которые Telegram присылает для фото 1280x960 (по возрастанию)
+TELEGRAM_SIZES = [SimpleNamespace(width=w, height=h) for w, h in ((90, 67), (320, 240), (800, 600), (1280, 960))]
+
+
+def test_smallest_adequate_photo_size():
+    assert pick_photo_size(TELEGRAM_SIZES, 768) is TELEGRAM_SIZES[2]
+    assert pick_photo_size(TELEGRAM_SIZES, 512) is TELEGRAM_SIZES[2]
+    assert pick_photo_size(TELEGRAM_SIZES, 300) is TELEGRAM_SIZES[1]
+    # Ограничения нет или все размеры меньше - самый большой
+    assert pick_photo_size(TELEGRAM_SIZES, 0) is TELEGRAM_SIZES[-1]
+    assert pick_photo_size(TELEGRAM_SIZES, 2000) is TELEGRAM_SIZES[-1]
+
+
+def test_image_tokens_depend_on_detail_and_size():
+    assert image_tokens('low', 1280, 960) == 85
+    assert image_tokens('high', 1280, 960) == 765    # 1024x768 - 4 тайла
+    assert image_tokens('high', 768, 576) == 765
+    assert image_tokens('high', 512, 384) == 255     # 1 тайл
+    assert image_tokens('high', 2048, 4096) == 1105  # 768x1536 - 6 тайлов
+
+    low = build_food_photo_messages('AAAA', detail='low')
+    high = build_food_photo_messages('AAAA', detail='high')
+    assert low[1]['content'][1]['image_url']['detail'] == 'low'
+    assert estimate_request_tokens(high, 0) - estimate_request_tokens(low, 0) == 765 - 85
+
+
+def test_auto_detail(monkeypatch):
+    monkeypatch.setattr(image_preprocess, 'PHOTO_DETAIL', 'auto')
+    assert choose_detail(512, 384) == 'low'
+    assert choose_detail(768, 576) == 'high'
+    assert choose_detail(0, 0) == 'high'  # размер неизвестен
+    monkeypatch.setattr(image_preprocess, 'PHOTO_DETAIL', 'low')
+    assert choose_detail(768, 576) == 'low'
+
+
+def test_without_pillow_photo_is_sent_as_is(monkeypatch):
+    monkeypatch.setattr(image_preprocess, 'Image', None)
+    monkeypatch.setattr(image_preprocess, 'PHOTO_DETAIL', 'auto')
+    before = get_image_stats()['passthrough']
+
+    prepared = prepare_image(b'jpeg bytes', (320, 240))
+
+    assert prepared.data == b'jpeg bytes' and prepared.mime_type == 'image/jpeg'
+    assert prepared.detail == 'low'
+    assert get_image_stats()['passthrough'] == before + 1
+
+
+def make_photo(width, height):
+    Image = pytest.importorskip('PIL.Image')
+    image = Image.new('RGB', (width, height))
+    for x in range(0, width, 8):
+        for y in range(0, height, 8):
+            image.paste(((x * 7) % 256, (y * 3) % 256, (x + y) % 256), (x, y, x + 8, y + 8))
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Orientation: повернуть на 90°
+    exif[0x010F] = 'PhoneMaker'
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=95, exif=exif)
+    return buffer.getvalue()
+
+
+def test_photo_is_downscaled_without_exif(monkeypatch):
+    Image = pytest.importorskip('PIL.Image')
+    monkeypatch.setattr(image_preprocess, 'PHOTO_MAX_EDGE', 768)
+    monkeypatch.setattr(image_preprocess, 'PHOTO_DETAIL', 'auto')
+    original = make_photo(1280, 960)
+
+    prepared = prepare_image(original)
+
+    # Поворот из EXIF применен, сами метаданные не отправляются
+    assert (prepared.width, prepared.height) == (576, 768)
+    assert prepared.detail == 'high' and prepared.mime_type == 'image/jpeg'
+    assert len(prepared.data) < len(original)
+    with Image.open(io.BytesIO(prepared.data)) as image:
+        assert image.size == (576, 768)
+        assert not image.getexif()
+
+
+def test_webp_and_low_detail(monkeypatch):
+    pytest.importorskip('PIL.Image')
+    monkeypatch.setattr(image_preprocess, 'PHOTO_MAX_EDGE', 768)
+    monkeypatch.setattr(image_preprocess, 'PHOTO_DETAIL', 'low')
+    monkeypatch.setattr(image_preprocess, 'PHOTO_FORMAT', 'webp')
+
+    prepared = prepare_image(make_photo(1280, 960))
+
+    assert prepared.mime_type == 'image/webp' and prepared.detail == 'low'
+    assert max(prepared.width, prepared.height) == 512
+
+
+def photo_size(width, height, content=b'jpeg bytes', downloaded=None, file_size=None):
+    """PhotoSize Telegram, который скачивается в память"""
+    async def download_as_bytearray():
+        if downloaded is not None:
+            downloaded.append(width)
+        await asyncio.sleep(0)
+        return bytearray(content)
+
+    async def get_file():
+        return SimpleNamespace(download_as_bytearray=download_as_bytearray, file_size=file_size)
+    return SimpleNamespace(width=width, height=height, file_unique_id=f'f{width}-{content[:4]}',
+                           file_size=file_size, get_file=get_file)
+
+
+def make_update(photos, replies=None):
+    async def reply_text(message, **kwargs):
+        if replies is not None:
+            replies.append(message)
+
+        async def edit_text(text, **kwargs):
+            pass
+        return SimpleNamespace(edit_text=edit_text)
+
+    return SimpleNamespace(effective_user=SimpleNamespace(id=1),
+                           message=SimpleNamespace(photo=photos, reply_text=reply_text))
+
+
+@pytest.fixture
+def handler_env(tmp_path, monkeypatch):
+    """Обработчик фото без Pillow, кэша фото и реального GPT"""
+    clear_user_data_cache(flush=False)
+    monkeypatch.setattr(user_data, 'DATA_DIR', str(tmp_path))
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(photo_handler.photo_cache, 'per_user', 0)
+    monkeypatch.setattr(image_preprocess, 'Image', None)
+    monkeypatch.setattr(image_preprocess, 'PHOTO_MAX_EDGE', 768)
+    monkeypatch.setattr(image_preprocess, 'PHOTO_DETAIL', 'auto')
+    calls = []
+
+    async def fake_analysis(img_b64, **kwargs):
+        calls.append((img_b64, kwargs))
+        await asyncio.sleep(0.01)
+        return {'success': True, 'description': 'Омлет', 'calories': 300, 'protein': 20, 'fat': 22, 'carbs': 3}
+
+    monkeypatch.setattr(photo_handler, 'analyze_food_photo', fake_analysis)
+    yield calls
+    clear_user_data_cache(flush=False)
+
+
+def test_handler_downloads_adequate_size(handler_env):
+    downloaded = []
+    photos = [photo_size(w, h, downloaded=downloaded) for w, h in ((320, 240), (800, 600), (1280, 960))]
+
+    asyncio.run(photo_handler.handle_photo_message(make_update(photos), SimpleNamespace(user_data={})))
+
+    assert downloaded == [800]
+    assert handler_env[0][1]['detail'] == 'high' and handler_env[0][1]['mime_type'] == 'image/jpeg'
+
+
+def test_concurrent_photos_are_kept_in_memory(handler_env, tmp_path):
+    first, second = b'first photo', b'second photo'
+
+    async def run():
+        await asyncio.gather(
+            photo_handler.handle_photo_message(make_update([photo_size(800, 600, first)]), SimpleNamespace(user_data={})),
+            photo_handler.handle_photo_message(make_update([photo_size(800, 600, second)]), SimpleNamespace(user_data={})),
+        )
+
+    asyncio.run(run())
+
+    # Раньше оба фото писались в temp_1.jpg и одно подменяло другое
+    assert sorted(base64.b64decode(img_b64) for img_b64, _ in handler_env) == [first, second]
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.jpg')]
+    stats = get_image_stats()
+    assert stats['in_flight'] == 0 and stats['peak_in_flight'] >= 2 * len(base64.b64encode(first))
+
+
+def test_large_photo_is_not_downloaded(handler_env):
+    downloaded, replies = [], []
+    photo = photo_size(800, 600, downloaded=downloaded, file_size=20 * 1024 * 1024)
+
+    asyncio.run(photo_handler.handle_photo_message(make_update([photo], replies), SimpleNamespace(user_data={})))
+
+    assert downloaded == [] and not handler_env
+    assert 'слишком большое' in replies[0]
+    # Размер не указан заранее - проверяем скачанное
+    with pytest.raises(PhotoTooLarge):
+        asyncio.run(download_photo(photo_size(800, 600, content=b'x' * 2048), max_bytes=1024))
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
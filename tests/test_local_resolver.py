@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Тесты локального расчета калорий по справочнику (без запроса к GPT)
+"""
+import os
+import time
+import asyncio
+import datetime
+import pytest
+from types import SimpleNamespace
+
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import local_resolver
+from utils.food_entry import FoodEntry
+from utils.local_resolver import resolve_locally, get_local_resolver_stats
+from utils.user_data import get_food_entries
+from handlers import text_handler
+
+
+@pytest.fixture(autouse=True)
+def temp_data_dir(temp_data_dir, monkeypatch):
+    """Счетчики локального расчета каждого теста - с нуля"""
+    monkeypatch.setattr(local_resolver, '_stats', {'local': 0, 'gpt': 0})
+    yield temp_data_dir
+
+
+@pytest.mark.parametrize('text, product, grams, calories', [
+    ('банан', 'банан', 120, 115),
+    ('кефир 200 мл', 'Кефир', 200, 112),
+    ('2 яйца', 'Яйцо куриное', 110, 170),
+    ('два яйца', 'Яйцо куриное', 110, 170),
+    ('стакан кефира', 'Кефир', 200, 112),
+    ('200г гречки', 'Гречка отварная', 200, 264),
+    ('Творог 5% 200 г', 'Творог 5%', 200, 242),
+    ('1 ст.л. арахисовой пасты', 'Арахисовая паста', 15, 88),
+    ('пиво светлое 0,5 л', 'Пиво светлое 4-5%', 500, 210),
+])
+def test_known_foods_are_resolved(text, product, grams, calories):
+    result = resolve_locally(text)
+    assert (result['product'], result['grams'], result['calories']) == (product, grams, calories)
+
+
+def test_macros_are_scaled_by_weight():
+    assert resolve_locally('кефир 200 мл') == {
+        'product': 'Кефир', 'grams': 200, 'calories': 112, 'protein': 5.6, 'fat': 6.4, 'carbs': 8.0
+    }
+    # Для фруктов в справочнике только белок
+    assert resolve_locally('банан')['fat'] is None
+
+
+@pytest.mark.parametrize('text', [
+    'гречка с котлетой',      # несколько продуктов
+    'банан, яблоко',
+    'жареное яйцо',           # способ приготовления меняет калорийность
+    'творог',                 # три вида творога
+    'пиво',
+    'кефир',                  # вес неизвестен
+    'шаурма классическая 300г',  # в справочнике диапазон
+    '2 банана 100г',          # 100г на все или на штуку?
+    '100 яиц',
+    'рататуй 200 г',
+    'не ел банан',            # отрицание и исключения
+    'банан не съел',
+    'нет кефира',
+    'кефир без сахара 200 мл',
+])
+def test_uncertain_messages_go_to_gpt(text):
+    assert resolve_locally(text) is None
+
+
+def test_bypass_ratio():
+    for text in ('банан', '2 яйца', 'борщ', 'гречка с котлетой'):
+        resolve_locally(text)
+
+    assert get_local_resolver_stats() == {'local': 2, 'gpt': 2, 'bypass_ratio': 0.5}
+
+
+def test_resolution_is_fast():
+    started = time.perf_counter()
+    for _ in range(200):
+        resolve_locally('стакан кефира')
+    assert (time.perf_counter() - started) / 200 < 0.001
+
+
+def test_handler_skips_gpt_for_known_food(monkeypatch, make_update):
+    async def fail_gpt(messages, max_retries=3, **kwargs):
+        raise AssertionError('GPT не должен вызываться')
+
+    monkeypatch.setattr(text_handler, 'ask_gpt', fail_gpt)
+    replies = []
+    asyncio.run(text_handler.handle_text_message(make_update(5, '2 яйца', replies), SimpleNamespace(user_data={})))
+
+    today = datetime.date.today().isoformat()
+    assert get_food_entries('5', today) == [FoodEntry('2 яйца', 170, 14, 12, 0)]
+    assert 'по справочнику' in replies[0]
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Тесты однопроходного извлечения БЖУ: совпадение с прежним каскадом регулярных
+выражений и скорость (pytest-benchmark, если установлен)
+"""
+import os
+import time
+import importlib.util
+import pytest
+
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.mock_gpt import MockGPTResponses
+from tests.legacy_nutrition import extract_nutrition_smart as legacy_extract
+from utils.nutrition_extractor import extract_nutrition
+
+# Ответы из tests/mock_gpt.py и форматы из тестов извлечения БЖУ
+RESPONSES = [
+    *MockGPTResponses.PHOTO_RESPONSES.values(),
+    *MockGPTResponses.TEXT_RESPONSES.values(),
+    "Творог с бананом и арахисовой пастой. Итого: 450 ккал, 30 г белка, 15 г жиров, 25 г углеводов",
+    "Салат с курицей: 320 ккал, белки 28г, жиры 12г, углеводы 8г",
+    "Омлет с сыром и помидорами.\nКалорийность: 280 ккал\nБелки: 22 г\nЖиры: 18 г\nУглеводы: 6 г",
+    "Борщ с мясом - 350 калорий, 25 грамм белка, жирность 10 грамм, углеводов 20 грамм",
+    "Гречка с котлетой. Всего 480 ккал, б: 35г, ж: 16г, у: 45г",
+    "Рис с курицей и овощами\n• Калории: 420\n• Белок: 32 г\n• Ж: 8 г\n• У: 55 г",
+    "Салат: 200 ккал, белки 15г",
+    "Творог 159 ккал, 32.5г белка, 26.4г жира, 29.2г углеводов",
+    "ИТОГО: 456 ккал, 23.5г белка, 15.8г жира, 42.3г углеводов",
+    """На фото:
+1. Греческий салат ~350г - 806 ккал, 12г белка, 72г жира, 30г углеводов
+2. Бокал пива ~500мл - 210 ккал, 1.5г белка, 0г жира, 17г углеводов
+
+ИТОГО: 1016 ккал, 13.5г белка, 72г жира, 47г углеводов""",
+    """
+Котлеты ~100г: 300 ккал, 20г белка, 15г жиров, 5г углеводов
+Картофель ~100г: 82 ккал, 2г белка, 0.2г жиров, 18г углеводов
+Овощи ~50г: 18 ккал, 1.1г белка, 4.0г жиров, 2.0г углеводов
+
+ИТОГО: 400 ккал, 23.1 г белка, 19.2 г жиров, 25.0 г углеводов
+""",
+    """
+Порция творога 5% 150г даёт 121×1.5 = 182 ккал, 17г белка, 7.5г жиров, 4.5г углеводов
+Банан средний 120г: 96×1.2 = 115 ккал, 1.2г белка, 0.4г жиров, 26.4г углеводов
+
+Общая калорийность 415 ккал, 23.2 г белка, 17.9 г жиров, 34.1 г углеводов
+""",
+    """Куриная грудка ~120г: 165×1.2 = 198 ккал, 37г белка, 4г жиров, 0г углеводов
+ИТОГО: 198 ккал, 37г белка, 4г жиров, 0г углеводов""",
+    """На фото бутерброды с икрой.
+
+Калорийность на 100г: 400 ккал, 15г белка
+
+ИТОГО: 400 ккал, 15 г белка""",
+    "Итого: примерно 350",
+    "450",
+    "",
+    "Плов с бараниной. ИТОГО: 1 200 ккал, 40 г белка, 50 г жиров, 150 г углеводов",
+    "Пицца целиком: 2\u00a0150 ккал, белки 90г, жиры 95г, углеводы 230г",
+]
+
+# Где прежний разбор ошибался: "1 200 ккал" он читал как 200
+FIXED = {
+    RESPONSES[-2]: {'calories': 1200, 'protein': 40.0, 'fat': 50.0, 'carbs': 150.0},
+    RESPONSES[-1]: {'calories': 2150, 'protein': 90.0, 'fat': 95.0, 'carbs': 230.0},
+}
+
+
+@pytest.mark.parametrize('response', RESPONSES)
+def test_same_result_as_regex_cascade(response):
+    expected = FIXED[response] if response in FIXED else legacy_extract(response)
+    assert extract_nutrition(response) == expected
+
+
+def test_final_values_are_taken_from_itogo():
+    result = extract_nutrition(MockGPTResponses.PHOTO_RESPONSES['салат_курица'])
+    assert result == {'calories': 317, 'protein': 32.8, 'fat': 17.6, 'carbs': 6.9}
+
+
+def _per_call(extract, rounds: int = 200) -> float:
+    """Лучшее из пяти измерений среднего времени разбора одного ответа"""
+    best = float('inf')
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for response in RESPONSES:
+                extract(response)
+        best = min(best, (time.perf_counter() - start) / (rounds * len(RESPONSES)))
+    return best
+
+
+def test_single_pass_is_at_least_5x_faster():
+    assert _per_call(legacy_extract) >= 5 * _per_call(extract_nutrition)
+
+
+needs_benchmark = pytest.mark.skipif(importlib.util.find_spec('pytest_benchmark') is None,
+                                     reason='pytest-benchmark не установлен')
+
+
+def _parse_all(extract):
+    return [extract(response) for response in RESPONSES]
+
+
+@needs_benchmark
+def test_benchmark_regex_cascade(benchmark):
+    benchmark.group = 'nutrition-extractor'
+    benchmark(_parse_all, legacy_extract)
+
+
+@needs_benchmark
+def test_benchmark_single_pass(benchmark):
+    benchmark.group = 'nutrition-extractor'
+    result = benchmark(_parse_all, extract_nutrition)
+    assert result == _parse_all(legacy_extract)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Тесты пулов соединений с OpenAI
+"""
+import os
+import json
+import asyncio
+import pytest
+
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import openai_pool, calorie_calculator
+from utils.openai_pool import OpenAIPool, get_openai_pool_stats
+
+pytestmark = pytest.mark.skipif(not openai_pool.OPENAI_AVAILABLE, reason='openai не установлен')
+httpx = pytest.importorskip('httpx')
+
+COMPLETION = {
+    'id': 'chatcmpl-1', 'object': 'chat.completion', 'created': 0, 'model': 'test',
+    'choices': [{'index': 0, 'finish_reason': 'stop',
+                 'message': {'role': 'assistant', 'content': '450 ккал, 30 г белка, 15 г жиров, 40 г углеводов'}}],
+    'usage': {'prompt_tokens': 100, 'completion_tokens': 20, 'total_tokens': 120},
+}
+
+
+def mock_pool(name: str, model: str, timeout: float, requests: list, status: int = 200) -> OpenAIPool:
+    """Пул, клиент которого отвечает из памяти вместо сети"""
+    def handler(request):
+        requests.append((name, request))
+        if request.url.path.endswith('/chat/completions'):
+            return httpx.Response(status, json=COMPLETION)
+        return httpx.Response(status, json={'id': model, 'object': 'model', 'created': 0, 'owned_by': 'test'})
+
+    pool = OpenAIPool(name, model, 2, timeout)
+    pool._client = openai_pool.AsyncOpenAI(
+        api_key='test', max_retries=0, http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    )
+    return pool
+
+
+@pytest.fixture
+def requests(monkeypatch):
+    """Подменяем пулы на пулы без сети, возвращаем список отправленных запросов"""
+    sent = []
+    text_pool = mock_pool('text', 'text-model', 30, sent)
+    vision_pool = mock_pool('vision', 'vision-model', 60, sent)
+    monkeypatch.setattr(openai_pool, 'text_pool', text_pool)
+    monkeypatch.setattr(openai_pool, 'vision_pool', vision_pool)
+    monkeypatch.setattr(openai_pool, '_pools', (text_pool, vision_pool))
+    return sent
+
+
+def test_text_and_photo_use_separate_pools(requests):
+    text = [{'role': 'user', 'content': 'гречка'}]
+    photo = [{'role': 'user', 'content': [{'type': 'image_url', 'image_url': {'url': 'data:image/jpeg;base64,AA=='}}]}]
+
+    async def run():
+        await calorie_calculator.ask_gpt(text)
+        await calorie_calculator.ask_gpt(photo)
+
+    asyncio.run(run())
+
+    (text_pool, text_request), (vision_pool, vision_request) = requests
+    assert (text_pool, vision_pool) == ('text', 'vision')
+    assert json.loads(text_request.content)['model'] == 'text-model'
+    assert json.loads(vision_request.content)['model'] == 'vision-model'
+    # Таймаут запроса - из настроек пула, а не общий
+    assert text_request.extensions['timeout']['read'] == 30
+    assert vision_request.extensions['timeout']['read'] == 60
+    stats = get_openai_pool_stats()
+    assert stats['text']['requests'] == 1 and stats['vision']['requests'] == 1
+
+
+def test_saturation_is_counted():
+    pool = OpenAIPool('text', 'm', 2, 30)
+    pool._client = object()
+
+    async def request(release: asyncio.Event):
+        async with pool.acquire():
+            await release.wait()
+
+    async def run():
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(request(release)) for _ in range(3)]
+        await asyncio.sleep(0)
+        in_flight = pool.in_flight
+        release.set()
+        await asyncio.gather(*tasks)
+        return in_flight
+
+    assert asyncio.run(run()) == 3
+    assert pool.in_flight == 0
+    assert pool.stats['saturated'] == 1  # третьему запросу не хватило соединения
+    assert pool.stats['peak_in_flight'] == 3
+
+
+def test_prewarm_opens_connections(requests):
+    assert asyncio.run(openai_pool.prewarm_openai_pools()) == 2
+    assert [request.url.path for _, request in requests] == ['/v1/models/text-model', '/v1/models/vision-model']
+    assert get_openai_pool_stats()['text']['prewarm_ms'] is not None
+
+
+def test_prewarm_failure_does_not_raise():
+    pool = mock_pool('text', 'm', 30, [], status=401)
+    assert asyncio.run(pool.prewarm()) is False
+    assert pool.stats['prewarm_ms'] is None
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
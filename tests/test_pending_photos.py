@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Тесты хранилища фото, ожидающих подтверждения: TTL, лимиты, сброс на диск
+"""
+import os
+import asyncio
+import threading
+import pytest
+from types import SimpleNamespace
+
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import pending_photos as pending_module
+from utils.pending_photos import PendingPhotoStore
+from handlers import photo_handler
+
+IMAGE = 'A' * 1000
+ANALYSIS = {'success': True, 'description': 'Гречка с котлетой', 'calories': 470}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PendingPhotoStore(ttl=60, max_entries=10, max_memory=2500, spill_dir=str(tmp_path / 'pending'))
+
+
+def test_put_and_get(store):
+    photo_id = store.put('1', IMAGE, 'image/webp', 'low', ANALYSIS)
+
+    assert len(photo_id) <= 10
+    photo = store.get(photo_id, '1')
+    assert photo.mime_type == 'image/webp' and photo.detail == 'low'
+    assert photo.analysis == ANALYSIS
+    assert store.image(photo_id, '1') == IMAGE
+    # Чужое фото по id не отдается
+    assert store.get(photo_id, '2') is None and store.image(photo_id, '2') is None
+
+
+def test_expired_photos_are_forgotten(store, monkeypatch):
+    real_time = pending_module.time.time
+    photo_id = store.put('1', IMAGE)
+
+    monkeypatch.setattr(pending_module.time, 'time', lambda: real_time() + 61)
+    assert store.get(photo_id) is None
+    assert len(store) == 0 and store.memory_bytes() == 0
+    assert store.stats['expired'] == 1
+
+
+def test_old_photos_spill_to_disk(store, tmp_path):
+    ids = [store.put('1', str(i) * 1000) for i in range(4)]
+
+    # Лимит 2500 байт: в памяти два последних фото, два старых - на диске
+    assert store.memory_bytes() == 2000
+    assert store.stats['spilled'] == 2
+    assert sorted(os.listdir(tmp_path / 'pending')) == sorted(f'{photo_id}.b64' for photo_id in ids[:2])
+    assert store.image(ids[0]) == '0' * 1000
+    assert store.stats['loaded'] == 1
+
+    store.discard(ids[0])
+    assert not (tmp_path / 'pending' / f'{ids[0]}.b64').exists()
+    assert store.image(ids[0]) is None
+
+
+def test_number_of_photos_is_bounded(tmp_path):
+    store = PendingPhotoStore(ttl=60, max_entries=3, max_memory=10 ** 6, spill_dir=str(tmp_path))
+    ids = [store.put(str(i), IMAGE) for i in range(5)]
+
+    assert len(store) == 3 and store.stats['evicted'] == 2
+    assert store.get(ids[0]) is None and store.get(ids[-1]) is not None
+
+
+def test_stale_spill_files_are_removed(tmp_path):
+    spill_dir = tmp_path / 'pending'
+    spill_dir.mkdir()
+    (spill_dir / 'old.b64').write_text('stale')
+    store = PendingPhotoStore(ttl=60, max_entries=10, max_memory=0, spill_dir=str(spill_dir))
+
+    photo_id = store.put('1', IMAGE)
+
+    assert os.listdir(spill_dir) == [f'{photo_id}.b64']
+
+
+def test_user_data_keeps_only_photo_id(temp_data_dir, monkeypatch):
+    store = PendingPhotoStore(ttl=60, max_entries=10, max_memory=10 ** 6, spill_dir=str(temp_data_dir / 'pending'))
+    monkeypatch.setattr(photo_handler, 'pending_photos', store)
+    monkeypatch.setattr(photo_handler.photo_cache, 'per_user', 0)
+
+    async def fake_analysis(img_b64, **kwargs):
+        return dict(ANALYSIS, protein=20, fat=12, carbs=45)
+
+    async def get_file():
+        async def download_as_bytearray():
+            return bytearray(b'jpeg bytes')
+        return SimpleNamespace(download_as_bytearray=download_as_bytearray)
+
+    async def reply_text(message, **kwargs):
+        async def edit_text(text, **kwargs):
+            pass
+        return SimpleNamespace(edit_text=edit_text)
+
+    monkeypatch.setattr(photo_handler, 'analyze_food_photo', fake_analysis)
+    update = SimpleNamespace(effective_user=SimpleNamespace(id=1),
+                             message=SimpleNamespace(photo=[SimpleNamespace(get_file=get_file)],
+                                                     reply_text=reply_text))
+    context = SimpleNamespace(user_data={})
+
+    async def run():
+        await photo_handler.handle_photo_message(update, context)
+        first_id = context.user_data['pending_photo_id']
+        await photo_handler.handle_photo_message(update, context)
+        # Новое фото заменяет неподтвержденное старое
+        assert store.get(first_id) is None and len(store) == 1
+        assert not any(isinstance(value, str) and len(value) > 100 for value in context.user_data.values())
+        assert store.get(context.user_data['pending_photo_id'], '1').analysis['calories'] == 470
+
+        await photo_handler.handle_photo_confirmation(update, context, '1', confirm=True)
+
+    asyncio.run(run())
+
+    assert 'pending_photo_id' not in context.user_data and len(store) == 0
+
+
+
+def test_disk_io_runs_off_event_loop(store):
+    threads = []
+    real_spill = store._spill
+
+    def spill():
+        threads.append(threading.current_thread())
+        real_spill()
+
+    store._spill = spill
+
+    async def run():
+        photo_id = await store.put_async('1', IMAGE)
+        assert await store.image_async(photo_id, '1') == IMAGE
+        await store.discard_async(photo_id)
+        assert await store.get_async(photo_id) is None
+
+    asyncio.run(run())
+
+    assert threads and threading.main_thread() not in threads
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Тесты кэша анализа фото по перцептивному хэшу
+"""
+import os
+import io
+import asyncio
+import pytest
+from types import SimpleNamespace
+
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import photo_cache
+from utils.photo_cache import PhotoAnalysisCache, get_photo_cache_stats
+from handlers import photo_handler
+
+RESULT = {'success': True, 'description': 'Овсянка с бананом', 'calories': 350,
+          'protein': 10, 'fat': 6, 'carbs': 62}
+HASH = 0x0F0F_3C3C_5A5A_FFFF
+
+
+@pytest.fixture(autouse=True)
+def temp_data_dir(temp_data_dir, monkeypatch):
+    """Отдельный кэш фото каждого теста"""
+    monkeypatch.setattr(photo_cache, 'photo_cache', PhotoAnalysisCache(3600, 6, 20, 100))
+    monkeypatch.setattr(photo_handler, 'photo_cache', photo_cache.photo_cache)
+    monkeypatch.chdir(temp_data_dir)
+    yield temp_data_dir
+
+
+def test_similar_hash_hits_within_threshold():
+    cache = PhotoAnalysisCache(3600, 6, 20, 100)
+    cache.put('1', HASH, None, RESULT)
+
+    assert cache.get('1', HASH ^ 0b111111) == RESULT   # 6 бит - то же фото
+    assert cache.get('1', HASH ^ 0b1111111) is None    # 7 бит - другое
+    assert cache.stats['hits'] == 1 and cache.stats['misses'] == 1
+
+
+def test_near_duplicate_hash_hits_across_all_bits():
+    cache = PhotoAnalysisCache(3600, 6, 20, 100)
+    cache.put('1', HASH, 'file-a', RESULT)
+
+    near = HASH ^ (1 << 63) ^ (1 << 31) ^ 1  # 3 бита в разных концах 64-битного хэша
+    assert photo_cache.hamming_distance(HASH, near) == 3
+    assert cache.get('1', near, 'file-b') == RESULT
+    assert cache.get('1', near ^ 0xFF00, 'file-b') is None  # 11 бит
+
+
+def test_same_file_hits_without_hash():
+    cache = PhotoAnalysisCache(3600, 6, 20, 100)
+    cache.put('1', None, 'file-a', RESULT)
+
+    assert cache.get('1', None, 'file-a') == RESULT
+    assert cache.get('1', None, 'file-b') is None
+
+
+def test_cache_is_per_user_and_windowed(monkeypatch):
+    cache = PhotoAnalysisCache(60, 6, 20, 100)
+    cache.put('1', HASH, 'file-a', RESULT)
+
+    assert cache.get('2', HASH, 'file-a') is None
+
+    real_time = photo_cache.time.time
+    monkeypatch.setattr(photo_cache.time, 'time', lambda: real_time() + 61)
+    assert cache.get('1', HASH, 'file-a') is None
+
+
+def test_cache_is_bounded():
+    cache = PhotoAnalysisCache(3600, 0, 2, 2)
+    for i in range(3):
+        cache.put('1', i, None, RESULT)
+    assert cache.get('1', 0) is None  # вытеснено третьим фото
+    assert cache.get('1', 2) == RESULT
+
+    cache.put('2', HASH, None, RESULT)
+    cache.put('3', HASH, None, RESULT)
+    assert cache.stats['evictions'] == 1
+    assert cache.get('1', 2) is None  # самый давний пользователь
+
+
+def test_dhash_tolerates_recompression():
+    Image = pytest.importorskip('PIL.Image')
+    image = Image.new('RGB', (64, 48))
+    for x in range(64):
+        for y in range(48):
+            image.putpixel((x, y), (x * 4, y * 5, (x + y) * 2))
+
+    def encode(quality):
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=quality)
+        return buffer.getvalue()
+
+    original, recompressed = photo_cache.dhash(encode(95)), photo_cache.dhash(encode(40))
+    assert photo_cache.hamming_distance(original, recompressed) <= 6
+    assert photo_cache.dhash(b'not an image') is None
+
+
+def make_update(user_id: int, file_unique_id: str, replies: list):
+    async def download_as_bytearray():
+        return bytearray(b'jpeg bytes')
+
+    async def get_file():
+        return SimpleNamespace(download_as_bytearray=download_as_bytearray)
+
+    async def edit_text(message, **kwargs):
+        replies.append(message)
+
+    async def reply_text(message, **kwargs):
+        return SimpleNamespace(edit_text=edit_text)
+
+    photo = SimpleNamespace(file_unique_id=file_unique_id, get_file=get_file)
+    return SimpleNamespace(
+        effective_user=SimpleNamespace(id=user_id),
+        message=SimpleNamespace(photo=[photo], reply_text=reply_text)
+    )
+
+
+def test_repeated_photo_skips_gpt(monkeypatch):
+    calls = []
+
+    async def counting_analysis(img_b64, **kwargs):
+        calls.append(img_b64)
+        return dict(RESULT)
+
+    monkeypatch.setattr(photo_handler, 'analyze_food_photo', counting_analysis)
+    replies = []
+    context = SimpleNamespace(user_data={})
+
+    async def run():
+        await photo_handler.handle_photo_message(make_update(1, 'file-a', replies), context)
+        await photo_handler.handle_photo_message(make_update(1, 'file-a', replies), context)
+        await photo_handler.handle_photo_message(make_update(2, 'file-a', replies), SimpleNamespace(user_data={}))
+
+    asyncio.run(run())
+
+    assert len(calls) == 2  # второй пользователь не получает чужой результат
+    assert replies[0] == replies[1]
+    assert context.user_data['pending_photo_dish']['kcal'] == 350
+    assert get_photo_cache_stats()['hits'] == 1
+    assert not os.path.exists('temp_1.jpg')
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Тесты уточнения фото: пересчет прошлого разбора без повторного анализа фото
+"""
+import os
+import asyncio
+import pytest
+from types import SimpleNamespace
+
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import photo_processor
+from utils.pending_photos import PendingPhotoStore
+from utils.prompt_builder import (
+    build_photo_correction_messages, build_food_photo_messages, build_food_text_messages,
+    describe_photo_breakdown, estimate_request_tokens, JSON_ANSWER_FORMAT,
+)
+from handlers import photo_handler, text_handler
+
+IMAGE = 'A' * 40000
+ANALYSIS = {
+    'success': True, 'description': 'Овсянка с бананом', 'calories': 240,
+    'protein': 6.4, 'fat': 3.3, 'carbs': 47.0,
+    'items': [
+        {'name': 'Овсянка на воде', 'grams': 200, 'kcal': 150, 'protein': 5.0, 'fat': 3.0, 'carbs': 26.0},
+        {'name': 'Банан', 'grams': 100, 'kcal': 90, 'protein': 1.4, 'fat': 0.3, 'carbs': 21.0},
+    ],
+}
+CORRECTION_JSON = ('{"items": [{"name": "Овсянка на воде", "grams": 300, "kcal": 211, "protein": 7.0, '
+                   '"fat": 3.6, "carbs": 41.5}, {"name": "Банан", "grams": 100, "kcal": 90, '
+                   '"protein": 1.4, "fat": 0.3, "carbs": 21.0}], '
+                   '"total": {"kcal": 301, "protein": 8.4, "fat": 3.9, "carbs": 62.5}, "question": null}')
+
+
+def has_image(messages):
+    return any(part.get('type') == 'image_url' for part in messages[-1]['content'])
+
+
+def test_breakdown_lists_items():
+    breakdown = describe_photo_breakdown(ANALYSIS)
+
+    assert breakdown.splitlines()[0].startswith('- Овсянка на воде ~200г - 150 ккал')
+    assert describe_photo_breakdown({'question': 'Каша на воде или на молоке?'}) == ''
+
+
+def test_correction_is_text_only_and_smaller():
+    messages = build_photo_correction_messages(ANALYSIS, 'овсянки было 300г', structured=True)
+
+    assert not has_image(messages)
+    text = messages[-1]['content'][0]['text']
+    assert 'Банан ~100г' in text and 'овсянки было 300г' in text
+
+    correction = estimate_request_tokens(messages, 500)
+    assert correction < estimate_request_tokens(build_food_photo_messages(IMAGE, structured=True), 500)
+    assert correction < estimate_request_tokens(
+        build_food_text_messages('овсянка на воде 300г с бананом', JSON_ANSWER_FORMAT), 500)
+
+
+def test_photo_is_sent_only_without_breakdown():
+    messages = build_photo_correction_messages({'question': 'Каша на воде или на молоке?'}, 'на воде',
+                                               IMAGE, 'image/webp', 'low', structured=True)
+
+    assert has_image(messages)
+    assert messages[-1]['content'][1]['image_url'] == {'url': f'data:image/webp;base64,{IMAGE}', 'detail': 'low'}
+    assert 'Твой вопрос: Каша на воде или на молоке?' in messages[-1]['content'][0]['text']
+
+
+@pytest.fixture
+def store(temp_data_dir, monkeypatch):
+    store = PendingPhotoStore(ttl=60, max_entries=10, max_memory=10 ** 6, spill_dir=str(temp_data_dir / 'pending'))
+    monkeypatch.setattr(photo_handler, 'pending_photos', store)
+    return store
+
+
+def run_clarification(store, monkeypatch, analysis, text):
+    requests = []
+
+    async def fake_ask_gpt(messages, **kwargs):
+        requests.append(messages)
+        return CORRECTION_JSON
+
+    replies = []
+
+    async def reply_text(message, **kwargs):
+        replies.append(message)
+
+        async def edit_text(text, **kwargs):
+            replies.append(text)
+        return SimpleNamespace(edit_text=edit_text)
+
+    monkeypatch.setattr(photo_processor, 'ask_gpt', fake_ask_gpt)
+    photo_id = store.put('7', IMAGE, 'image/jpeg', 'high', analysis)
+    context = SimpleNamespace(user_data={'pending_photo_id': photo_id, 'waiting_for_photo_clarification': True})
+    update = SimpleNamespace(effective_user=SimpleNamespace(id=7),
+                             message=SimpleNamespace(text=text, reply_text=reply_text))
+
+    asyncio.run(text_handler.handle_text_message(update, context))
+    return requests, replies, context, photo_id
+
+
+def test_clarification_recalculates_previous_breakdown(store, monkeypatch):
+    requests, replies, context, photo_id = run_clarification(store, monkeypatch, ANALYSIS, 'овсянки было 300г')
+
+    assert len(requests) == 1 and not has_image(requests[0])
+    assert context.user_data['pending_photo_dish']['kcal'] == 301
+    assert not context.user_data['waiting_for_photo_clarification']
+    assert 'С уточнением' in replies[-1]
+    # Фото ждет подтверждения, следующее уточнение - от исправленного разбора
+    assert store.get(photo_id, '7').analysis['calories'] == 301
+
+
+def test_answer_to_question_uses_stored_photo(store, monkeypatch):
+    requests, _, context, _ = run_clarification(store, monkeypatch, {'question': 'Каша на воде или на молоке?'}, 'на воде')
+
+    assert has_image(requests[0])
+    assert context.user_data['pending_photo_dish']['kcal'] == 301
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
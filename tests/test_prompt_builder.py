@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Тесты сборки промптов: кэшируемый префикс, выбор строк справочника, учет токенов
+"""
+import os
+from types import SimpleNamespace
+import pytest
+
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data.calorie_database import CALORIE_DATABASE
+from utils import prompt_builder
+from utils.prompt_builder import (
+    build_food_text_messages, build_food_photo_messages, select_reference_lines,
+    estimate_tokens, record_usage, get_prompt_usage_stats
+)
+from utils.calorie_calculator import create_calorie_messages
+
+
+def test_static_prefix_is_identical_for_all_dishes(monkeypatch):
+    monkeypatch.setattr(prompt_builder, 'PROMPT_REFERENCE_MODE', 'full')
+    first = create_calorie_messages('гречка с котлетой')
+    second = create_calorie_messages('борщ со сметаной', is_clarification=True)
+
+    assert first[0]['role'] == 'system'
+    assert first[0] == second[0]
+    assert CALORIE_DATABASE in first[0]['content']
+    # Изменяемая часть только в конце запроса
+    assert 'гречка с котлетой' in first[-1]['content'][0]['text']
+    assert 'гречка с котлетой' not in first[0]['content']
+
+
+def test_retrieval_mode_sends_only_relevant_lines():
+    messages = create_calorie_messages('творог с бананом и арахисовой пастой')
+    system, user = messages[0]['content'], messages[-1]['content'][0]['text']
+
+    assert CALORIE_DATABASE not in system
+    assert 'Творог 5%' in user and 'банан' in user and 'Арахисовая паста' in user
+    assert 'МОЛОЧНЫЕ ПРОДУКТЫ:' in user
+    assert 'Шаурма' not in user and 'Пиво' not in user
+    assert estimate_tokens(system + user) * 3 < estimate_tokens(CALORIE_DATABASE + system)
+
+
+def test_unknown_dish_gets_no_reference_lines():
+    assert select_reference_lines('рататуй') == ''
+    user = build_food_text_messages('рататуй', 'ФОРМАТ', mode='retrieval')[-1]['content'][0]['text']
+    assert 'Справочные данные' not in user
+
+
+def test_photo_goes_after_cached_prefix():
+    messages = build_food_photo_messages('AAAA')
+
+    assert messages[0] == build_food_photo_messages('BBBB')[0]
+    assert CALORIE_DATABASE in messages[0]['content']
+    assert messages[-1]['content'][-1]['image_url']['url'].endswith('AAAA')
+
+
+def test_usage_counts_cached_tokens(monkeypatch):
+    monkeypatch.setattr(prompt_builder, '_usage_stats', dict.fromkeys(get_prompt_usage_stats(), 0))
+
+    record_usage('gpt-4o-mini', SimpleNamespace(
+        prompt_tokens=4200, completion_tokens=30,
+        prompt_tokens_details=SimpleNamespace(cached_tokens=4096)
+    ))
+    record_usage('gpt-4o-mini', SimpleNamespace(prompt_tokens=300, completion_tokens=20, prompt_tokens_details=None))
+    record_usage('gpt-4o-mini', None)
+
+    assert get_prompt_usage_stats() == {
+        'calls': 2, 'prompt_tokens': 4500, 'cached_tokens': 4096, 'completion_tokens': 50
+    }
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
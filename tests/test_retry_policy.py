@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Тесты повторных запросов к GPT: типы ошибок, Retry-After, джиттер, дедлайн, предохранитель
+"""
+import os
+import random
+import asyncio
+import pytest
+from types import SimpleNamespace
+
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+openai = pytest.importorskip('openai')
+httpx = pytest.importorskip('httpx')
+
+from utils import openai_pool, retry_policy, calorie_calculator
+from utils.openai_pool import OpenAIPool
+from utils.gpt_scheduler import GPTScheduler
+from utils.retry_policy import RetryPolicy, CircuitBreaker, CircuitOpenError
+
+MESSAGES = [{'role': 'user', 'content': 'гречка с котлетой'}]
+
+
+def request():
+    return httpx.Request('POST', 'https://api.openai.com/v1/chat/completions')
+
+
+def status_error(cls, status: int, headers: dict = None, code: str = None):
+    response = httpx.Response(status, headers=headers or {}, request=request())
+    return cls('error', response=response, body={'code': code, 'message': 'error'} if code else None)
+
+
+def completion(text: str):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+        usage=SimpleNamespace(prompt_tokens=100, completion_tokens=10, total_tokens=110,
+                              prompt_tokens_details=None)
+    )
+
+
+class FakeClient:
+    """Клиент OpenAI, который по очереди выдает заданные ответы и ошибки"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return completion(outcome)
+
+
+@pytest.fixture
+def fake_api(monkeypatch):
+    """ask_gpt ходит в FakeClient, паузы не ждут, предохранители и квоты - свои у теста"""
+    sleeps = []
+
+    async def fake_sleep(delay):
+        sleeps.append(delay)
+
+    def install(*outcomes):
+        client = FakeClient(*outcomes)
+        pool = OpenAIPool('text', 'gpt-test', 4, 30)
+        pool._client = client
+        monkeypatch.setattr(calorie_calculator, 'get_pool', lambda has_image: pool)
+        return client
+
+    monkeypatch.setattr(calorie_calculator.asyncio, 'sleep', fake_sleep)
+    monkeypatch.setattr(calorie_calculator, 'gpt_scheduler',
+                        GPTScheduler(8, {'gpt-test': {'rpm': 10 ** 4, 'tpm': 10 ** 7}}))
+    monkeypatch.setattr(retry_policy, '_breakers', {})
+    install.sleeps = sleeps
+    return install
+
+
+def test_rate_limit_honours_retry_after(fake_api):
+    client = fake_api(status_error(openai.RateLimitError, 429, {'retry-after-ms': '1500'}), '450 ккал')
+
+    assert asyncio.run(calorie_calculator.ask_gpt(MESSAGES)) == '450 ккал'
+    assert len(client.calls) == 2
+    assert fake_api.sleeps == [1.5]
+
+
+def test_permanent_errors_are_not_retried(fake_api):
+    client = fake_api(status_error(openai.BadRequestError, 400))
+    with pytest.raises(openai.BadRequestError):
+        asyncio.run(calorie_calculator.ask_gpt(MESSAGES))
+    assert len(client.calls) == 1
+
+    client = fake_api(status_error(openai.RateLimitError, 429, code='insufficient_quota'))
+    with pytest.raises(openai.RateLimitError):
+        asyncio.run(calorie_calculator.ask_gpt(MESSAGES))
+    assert len(client.calls) == 1
+    assert fake_api.sleeps == []
+
+
+def test_timeouts_retry_with_decorrelated_jitter(fake_api):
+    random.seed(3)
+    client = fake_api(openai.APITimeoutError(request=request()),
+                      status_error(openai.InternalServerError, 503), '450 ккал')
+
+    assert asyncio.run(calorie_calculator.ask_gpt(MESSAGES)) == '450 ккал'
+    assert len(client.calls) == 3
+    first, second = fake_api.sleeps
+    assert 1 <= first <= 3 and 1 <= second <= first * 3
+    # Таймаут попытки не больше таймаута пула
+    assert client.calls[0]['timeout'] <= 30
+
+
+def test_jitter_spreads_retries():
+    error = openai.APIConnectionError(request=request())
+    delays = {round(RetryPolicy(base_delay=1, max_delay=20).next_delay(error, 1), 3) for _ in range(20)}
+    assert len(delays) > 10  # повторы разных пользователей не совпадают
+
+    policy = RetryPolicy(max_attempts=10, base_delay=1, max_delay=5)
+    assert all(1 <= policy.next_delay(error, 1) <= 5 for _ in range(50))
+    assert policy.next_delay(error, 10) is None  # попытки кончились
+
+
+def test_deadline_stops_retries():
+    slow = status_error(openai.RateLimitError, 429, {'retry-after': '30'})
+    assert RetryPolicy(deadline=60).next_delay(slow, 1) == 30
+    assert RetryPolicy(deadline=20).next_delay(slow, 1) is None
+
+
+def test_circuit_breaker_fails_fast_and_recovers(fake_api, monkeypatch):
+    monkeypatch.setattr(retry_policy, '_breakers', {'gpt-test': CircuitBreaker(threshold=2, reset_after=30)})
+    down = openai.APIConnectionError(request=request())
+    client = fake_api(down, down, '450 ккал')
+
+    for _ in range(2):
+        with pytest.raises(openai.APIConnectionError):
+            asyncio.run(calorie_calculator.ask_gpt(MESSAGES, max_retries=1))
+
+    # API недоступен - запрос не отправляется
+    with pytest.raises(CircuitOpenError, match='overloaded'):
+        asyncio.run(calorie_calculator.ask_gpt(MESSAGES))
+    assert len(client.calls) == 2
+
+    # Через reset_after пробный запрос проходит и закрывает предохранитель
+    real_monotonic = retry_policy.time.monotonic
+    monkeypatch.setattr(retry_policy.time, 'monotonic', lambda: real_monotonic() + 31)
+    assert asyncio.run(calorie_calculator.ask_gpt(MESSAGES)) == '450 ккал'
+    assert retry_policy.get_retry_stats()['gpt-test']['state'] == 'closed'
+
+
+def test_rate_limits_do_not_open_breaker():
+    breaker = CircuitBreaker(threshold=1, reset_after=30)
+    breaker.record_failure(status_error(openai.RateLimitError, 429))
+    assert breaker.state == 'closed'
+    breaker.record_failure(status_error(openai.InternalServerError, 500))
+    assert breaker.state == 'open'
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Тесты SQLite-хранилища пользовательских данных и переноса из JSON
+"""
+import os
+import json
+import pytest
+
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import sqlite_storage
+from utils.user_data import UserDataCache, _read_user_data_from_disk
+from utils import user_data
+import migrate_to_sqlite
+
+
+@pytest.fixture(autouse=True)
+def temp_database(tmp_path, monkeypatch):
+    """Отдельная база для каждого теста"""
+    sqlite_storage.close_connection()
+    monkeypatch.setattr(sqlite_storage, 'SQLITE_PATH', str(tmp_path / 'test.sqlite3'))
+    yield
+    sqlite_storage.close_connection()
+
+
+SAMPLE_USER_DATA = {
+    'profile': {'weight': 70.5, 'height': 175, 'age': 30, 'sex': 'муж', 'target_calories': 2000},
+    'diary': {'2025-01-01': 1500, '2025-01-02': 900},
+    'weights': {'2025-01-01': 70.5},
+    'food_log': {
+        '2025-01-01': [['Гречка с котлетой', 480, 35], ['Кофе', 2]],
+        '2025-01-02': [['Творог', 240, 24.5, 13.5, 3]],
+    },
+    'burned': {'2025-01-01': 300},
+    'saved_meals': {
+        'творог с арбузом': {'name': 'Творог с арбузом', 'calories': 300, 'protein': 25.0, 'fat': None, 'carbs': None}
+    },
+}
+
+
+def test_round_trip_all_documents():
+    """Все шесть документов возвращаются в том же виде"""
+    sqlite_storage.save_user_data('42', SAMPLE_USER_DATA)
+
+    assert sqlite_storage.load_user_data('42') == SAMPLE_USER_DATA
+
+
+def test_save_single_document_keeps_others():
+    """Замена одного документа не трогает остальные"""
+    sqlite_storage.save_user_data('42', SAMPLE_USER_DATA)
+    sqlite_storage.save_user_document('42', 'diary', {'2025-01-03': 100})
+
+    loaded = sqlite_storage.load_user_data('42')
+    assert loaded['diary'] == {'2025-01-03': 100}
+    assert loaded['food_log'] == SAMPLE_USER_DATA['food_log']
+
+
+def test_food_entries_keep_order_and_legacy_length():
+    """Записи дня сохраняют порядок, старые короткие записи не удлиняются"""
+    food_log = {'2025-01-01': [['Б', 200], ['А', 100, 10], ['В', 300, 1, 2, 3]]}
+    sqlite_storage.save_user_document('7', 'food_log', food_log)
+
+    assert sqlite_storage.load_user_data('7')['food_log'] == food_log
+
+
+def test_food_log_store_reads_and_writes_single_days():
+    """Лог еды пишется по записи и читается по дню"""
+    store = sqlite_storage.FoodLogStore()
+    store.append('9', '2025-01-02', ['Суп', 200])
+    store.append('9', '2025-01-01', ['Каша', 300, 10])
+    store.append('9', '2025-01-02', ['Чай', 5])
+    store.set_entries('9', '2025-01-01', [])
+
+    assert store.get_dates('9') == ['2025-01-02']
+    assert store.get_entries('9', '2025-01-02') == [['Суп', 200], ['Чай', 5]]
+    assert 'food_log' not in sqlite_storage.load_user_data('9', include_food_log=False)
+
+
+def test_get_all_users_and_wal_mode():
+    """Пользователи регистрируются при обращении, база работает в WAL"""
+    sqlite_storage.load_user_data('1')
+    sqlite_storage.save_user_document('2', 'profile', {'weight': 80})
+
+    assert sqlite_storage.get_all_users() == ['1', '2']
+    mode = sqlite_storage.get_connection().execute('PRAGMA journal_mode').fetchone()[0]
+    assert mode == 'wal'
+
+
+def test_cache_on_top_of_sqlite():
+    """Кэш user_data работает поверх SQLite без изменений"""
+    cache = UserDataCache(loader=sqlite_storage.load_user_data,
+                          writer=sqlite_storage.save_user_document, max_users=10, ttl=0)
+    cache.put('5', {'burned': {'2025-01-01': 250}})
+    cache.flush()
+
+    assert sqlite_storage.load_user_data('5')['burned'] == {'2025-01-01': 250}
+
+
+def test_migration_from_json_tree(tmp_path, monkeypatch):
+    """Перенос каталога bot_data в SQLite дает то же, что читает JSON-хранилище"""
+    data_dir = tmp_path / 'bot_data'
+    user_dir = data_dir / 'user_100'
+    user_dir.mkdir(parents=True)
+    for data_type, data in SAMPLE_USER_DATA.items():
+        (user_dir / f'{data_type}.json').write_text(json.dumps(data, ensure_ascii=False), encoding='utf-8')
+    # Поврежденный файл другого пользователя не ломает перенос
+    (data_dir / 'user_200').mkdir()
+    (data_dir / 'user_200' / 'diary.json').write_text('{broken', encoding='utf-8')
+
+    assert migrate_to_sqlite.migrate(str(data_dir)) == 2
+
+    monkeypatch.setattr(user_data, 'DATA_DIR', str(data_dir))
+    migrated = sqlite_storage.load_user_data('100')
+    assert migrated.pop('food_log') == SAMPLE_USER_DATA['food_log']
+    assert migrated == _read_user_data_from_disk('100')
+    assert sqlite_storage.load_user_data('200')['diary'] == {}
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
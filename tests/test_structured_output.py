@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Тесты структурированного ответа GPT: JSON по схеме и запасной разбор текста
+"""
+import os
+import json
+import asyncio
+import pytest
+
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.mock_gpt import MockGPTResponses
+from utils import photo_processor, structured_output
+from utils.structured_output import (
+    RESPONSE_FORMAT, NUTRITION_SCHEMA, parse_nutrition_json, read_nutrition_answer,
+    preview_nutrition_json, get_structured_output_stats
+)
+from utils.prompt_builder import build_food_photo_messages, PHOTO_SYSTEM_PROMPT, PHOTO_SYSTEM_PROMPT_JSON
+
+TWO_DISHES = {
+    'items': [
+        {'name': 'Гречка', 'grams': 200, 'kcal': 220, 'protein': 8, 'fat': 2.2, 'carbs': 42},
+        {'name': 'Котлета', 'grams': 100, 'kcal': 250, 'protein': 17, 'fat': 18, 'carbs': 5},
+    ],
+    'total': {'kcal': 470, 'protein': 25, 'fat': 20.2, 'carbs': 47},
+    'question': None,
+}
+
+
+def test_schema_is_strict():
+    assert RESPONSE_FORMAT['json_schema']['strict'] is True
+    item = NUTRITION_SCHEMA['properties']['items']['items']
+    # В strict-режиме обязательны все поля объекта
+    assert set(item['required']) == set(item['properties'])
+    assert set(NUTRITION_SCHEMA['required']) == set(NUTRITION_SCHEMA['properties'])
+
+
+def test_json_answer_is_read_without_regexes(monkeypatch):
+    def fail(response):
+        raise AssertionError('JSON-ответ не должен разбираться регулярными выражениями')
+
+    monkeypatch.setattr(structured_output, 'extract_nutrition', fail)
+    answer = read_nutrition_answer(json.dumps(TWO_DISHES, ensure_ascii=False))
+
+    assert answer['calories'] == 470 and answer['protein'] == 25
+    assert answer['fat'] == 20.2 and answer['carbs'] == 47
+    assert answer['question'] is None
+    assert [item['name'] for item in answer['items']] == ['Гречка', 'Котлета']
+
+
+def test_missing_total_is_summed_from_items():
+    data = dict(TWO_DISHES, total={'kcal': 0, 'protein': 0, 'fat': 0, 'carbs': 0})
+    answer = read_nutrition_answer(json.dumps(data))
+    assert answer['calories'] == 470 and answer['protein'] == 25
+
+
+def test_question_and_prose_fallback():
+    question = {'items': [], 'total': {'kcal': 0, 'protein': 0, 'fat': 0, 'carbs': 0},
+                'question': 'Какой вес порции?'}
+    assert read_nutrition_answer(json.dumps(question, ensure_ascii=False))['question'] == 'Какой вес порции?'
+
+    before = get_structured_output_stats()['fallback']
+    answer = read_nutrition_answer(MockGPTResponses.TEXT_RESPONSES['гречка котлета'])
+    assert answer['calories'] == 480 and answer['items'] is None
+    assert read_nutrition_answer('ВОПРОС: Сколько грамм?')['question'] == 'Сколько грамм?'
+    assert get_structured_output_stats()['fallback'] == before + 2
+
+    assert parse_nutrition_json('{"items": [') is None
+    assert parse_nutrition_json('Итого: 480 ккал') is None
+
+
+def test_preview_shows_finished_items_only():
+    text = json.dumps(TWO_DISHES, ensure_ascii=False)
+    partial = text[:text.index('Котлета') + 20]
+
+    assert preview_nutrition_json(partial) == '• Гречка - 220 ккал'
+    assert preview_nutrition_json(text) == '• Гречка - 220 ккал\n• Котлета - 250 ккал\nИТОГО: 470 ккал'
+    assert preview_nutrition_json('Гречка 200г') == 'Гречка 200г'
+
+
+def test_photo_prompt_asks_for_json():
+    assert build_food_photo_messages('AAAA', structured=True)[0]['content'] == PHOTO_SYSTEM_PROMPT_JSON
+    assert build_food_photo_messages('AAAA', structured=False)[0]['content'] == PHOTO_SYSTEM_PROMPT
+    assert 'JSON' in PHOTO_SYSTEM_PROMPT_JSON and 'ИТОГО: [' not in PHOTO_SYSTEM_PROMPT_JSON
+
+
+def test_photo_analysis_from_json(monkeypatch):
+    calls = []
+
+    async def fake_ask_gpt(messages, **kwargs):
+        calls.append(kwargs)
+        return json.dumps(TWO_DISHES, ensure_ascii=False)
+
+    monkeypatch.setattr(photo_processor, 'GPT_STRUCTURED_OUTPUT', True)
+    monkeypatch.setattr(photo_processor, 'ask_gpt', fake_ask_gpt)
+    result = asyncio.run(photo_processor.analyze_food_photo('AAAA'))
+
+    assert calls[0]['response_format'] is RESPONSE_FORMAT
+    assert result['success'] and result['description'] == '  • Гречка\n  • Котлета'
+    assert result['protein'] == 25 and result['carbs'] == 47
+    assert 400 <= result['calories'] <= 500
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
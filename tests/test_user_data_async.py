@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Тесты асинхронного API хранилища (запись в пуле потоков, вне event loop)
+"""
+import os
+import time
+import asyncio
+import threading
+import pytest
+
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import user_data
+from utils.food_entry import FoodEntry
+from utils.user_data import (
+    get_user_diary, get_food_entries, get_user_saved_meals,
+    log_meal_async, get_user_diary_async, get_food_entries_async, set_food_entries_async,
+    add_saved_meal_async, flush_user_data_async
+)
+
+
+pytestmark = pytest.mark.usefixtures('temp_data_dir')
+
+
+def test_async_api_matches_sync_api():
+    async def run():
+        diary = await log_meal_async('u1', '2025-01-01', ['Каша', 300, 10])
+        await log_meal_async('u1', '2025-01-01', ['Суп', 200])
+        await set_food_entries_async('u1', '2025-01-02', [['Чай', 5]])
+        await add_saved_meal_async('u1', 'Омлет', {'calories': 250})
+        return diary, await get_user_diary_async('u1'), await get_food_entries_async('u1', '2025-01-01')
+
+    first_diary, diary, entries = asyncio.run(run())
+
+    assert first_diary == {'2025-01-01': 300}
+    assert diary == get_user_diary('u1') == {'2025-01-01': 500}
+    assert entries == get_food_entries('u1', '2025-01-01') == [FoodEntry('Каша', 300, 10), FoodEntry('Суп', 200)]
+    assert get_food_entries('u1', '2025-01-02') == [FoodEntry('Чай', 5)]
+    assert get_user_saved_meals('u1')['омлет']['calories'] == 250
+
+
+def test_disk_writes_run_outside_event_loop_thread(monkeypatch):
+    """fsync журнала и документов выполняется в потоке хранилища"""
+    threads = set()
+    real_fsync = os.fsync
+
+    def recording_fsync(fd):
+        threads.add(threading.current_thread().name)
+        return real_fsync(fd)
+
+    monkeypatch.setattr(os, 'fsync', recording_fsync)
+
+    async def run():
+        await log_meal_async('u2', '2025-01-01', ['Каша', 300])  # дневник сбрасывается вместе с журналом
+        await add_saved_meal_async('u2', 'Омлет', {'calories': 250})
+        assert await flush_user_data_async() == 1
+
+    asyncio.run(run())
+
+    assert threads
+    assert all(name.startswith('user-data') for name in threads)
+
+
+def test_slow_disk_does_not_block_event_loop(monkeypatch):
+    """Пока запись ждет медленный диск, event loop продолжает обслуживать других"""
+    def slow_log_meal(user_id, date, entry):
+        time.sleep(0.2)
+        return {date: entry[1]}
+
+    monkeypatch.setattr(user_data, 'log_meal', slow_log_meal)
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        await asyncio.gather(*[log_meal_async(str(i), '2025-01-01', ['Каша', 300]) for i in range(4)])
+        task.cancel()
+        return ticks
+
+    # 4 записи по 200 мс в пуле потоков: loop успевает сделать много тиков
+    assert asyncio.run(run()) >= 5
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
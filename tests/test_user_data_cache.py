@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+Тесты write-back кэша пользовательских данных
+"""
+import os
+import json
+import threading
+import pytest
+
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import user_data
+from utils.user_data import (
+    UserDataCache, get_user_diary, save_user_diary, get_user_profile,
+    flush_user_data, clear_user_data_cache, get_user_files, get_user_data_cache_stats,
+    save_user_document, log_meal, get_food_entries
+)
+
+
+pytestmark = pytest.mark.usefixtures('temp_data_dir')
+
+
+def test_reads_are_served_from_cache(monkeypatch):
+    """Повторные геттеры не читают диск"""
+    get_user_profile('cache_user')
+
+    def fail_read(user_id):
+        raise AssertionError('диск не должен читаться повторно')
+
+    monkeypatch.setattr(user_data._cache, '_loader', fail_read)
+
+    get_user_profile('cache_user')
+    get_user_diary('cache_user')
+    assert get_user_data_cache_stats()['hits'] >= 2
+
+
+def test_write_back_until_flush():
+    """Сеттер пишет в кэш, на диск данные попадают при flush"""
+    save_user_diary('wb_user', {'2025-01-01': 500})
+    diary_path = get_user_files('wb_user')['diary']
+
+    assert get_user_diary('wb_user') == {'2025-01-01': 500}
+    assert not os.path.exists(diary_path)
+
+    assert flush_user_data() == 1
+    with open(diary_path, encoding='utf-8') as f:
+        assert json.load(f) == {'2025-01-01': 500}
+
+    # Повторный flush ничего не пишет - запись уже чистая
+    assert flush_user_data() == 0
+
+
+def test_log_meal_writes_diary_with_food_log():
+    """Прием пищи сбрасывает дневник сразу, а не через USER_CACHE_FLUSH_INTERVAL"""
+    save_user_diary('meal_user', {'2025-01-01': 100})
+    log_meal('meal_user', '2025-01-01', ['Каша', 300])
+
+    with open(get_user_files('meal_user')['diary'], encoding='utf-8') as f:
+        assert json.load(f) == {'2025-01-01': 400}
+    assert flush_user_data() == 0
+
+    # После сбоя (кэш потерян без сброса) дневник и лог еды совпадают
+    clear_user_data_cache(flush=False)
+    assert get_user_diary('meal_user') == {'2025-01-01': 400}
+    assert [entry.name for entry in get_food_entries('meal_user', '2025-01-01')] == ['Каша']
+
+
+def test_only_changed_document_is_written(monkeypatch):
+    """save_user_document перезаписывает один файл, а не все шесть"""
+    written = []
+    original_writer = user_data._cache._writer
+    monkeypatch.setattr(user_data._cache, '_writer',
+                        lambda uid, data_type, data: written.append(data_type) or original_writer(uid, data_type, data))
+
+    save_user_document('doc_user', 'diary', {'2025-01-01': 300})
+    save_user_document('doc_user', 'food_log', {'2025-01-01': [['Каша', 300]]})
+    flush_user_data()
+
+    # Лог еды пишется в журнал сразу, минуя кэш документов
+    assert written == ['diary']
+    files = get_user_files('doc_user')
+    assert os.path.exists(files['diary'])
+    assert os.path.exists(os.path.join(os.path.dirname(files['food_log']), 'food_log', '2025-01.jsonl'))
+    assert not os.path.exists(files['profile'])
+
+
+def test_unknown_document_type_rejected():
+    """Опечатка в типе документа - ошибка, а не новый файл"""
+    with pytest.raises(ValueError):
+        save_user_document('doc_user', 'diaries', {})
+
+
+def test_failed_write_stays_dirty():
+    """Ошибка файловой системы не теряет изменения - повторим при следующем flush"""
+    failures = [OSError('disk full')]
+    written = []
+
+    def flaky_writer(uid, data_type, data):
+        if failures:
+            raise failures.pop()
+        written.append(data_type)
+
+    cache = UserDataCache(loader=lambda uid: {}, writer=flaky_writer, max_users=10, ttl=0)
+    cache.put('u1', {'diary': {'d': 1}})
+
+    cache.flush()
+    assert written == []
+
+    assert cache.flush() == 1
+    assert written == ['diary']
+
+
+def test_flush_writes_outside_cache_lock():
+    """Пока документ пишется на диск, get/put других потоков не ждут"""
+    started, release = threading.Event(), threading.Event()
+    written = []
+
+    def slow_writer(uid, data_type, data):
+        started.set()
+        release.wait(5)
+        written.append((uid, data))
+
+    cache = UserDataCache(loader=lambda uid: {}, writer=slow_writer, max_users=10, ttl=0)
+    cache.put('u1', {'diary': {'d': 1}})
+    flusher = threading.Thread(target=cache.flush)
+    flusher.start()
+    assert started.wait(5)
+
+    cache.put('u1', {'diary': {'d': 2}})
+    cache.put('u2', {'diary': {'d': 3}})
+    assert cache.get('u2')['diary'] == {'d': 3}
+    assert written == []  # запись еще идет
+
+    release.set()
+    flusher.join()
+    assert written == [('u1', {'d': 1})]
+    # Изменение, сделанное во время записи, не потеряно
+    assert cache.flush() == 2
+    assert written[1:] == [('u1', {'d': 2}), ('u2', {'d': 3})]
+
+
+def test_returned_documents_are_copies():
+    """Изменение полученного словаря без сохранения не портит кэш"""
+    save_user_diary('copy_user', {'2025-01-01': 100})
+
+    diary = get_user_diary('copy_user')
+    diary['2025-01-01'] = 999
+
+    assert get_user_diary('copy_user') == {'2025-01-01': 100}
+
+
+def test_lru_eviction_flushes_dirty_entries():
+    """Вытесненный грязный пользователь сохраняется на диск"""
+    written = {}
+    cache = UserDataCache(
+        loader=lambda uid: {'diary': {}},
+        writer=lambda uid, data_type, data: written.__setitem__(uid, data),
+        max_users=2, ttl=0
+    )
+
+    cache.put('u1', {'diary': {'d': 1}})
+    cache.put('u2', {'diary': {'d': 2}})
+    cache.get('u1')  # u1 становится самым свежим
+    cache.put('u3', {'diary': {'d': 3}})
+
+    assert len(cache) == 2
+    assert written == {'u2': {'d': 2}}
+    assert cache.stats['evictions'] == 1
+
+
+def test_ttl_reloads_clean_entries(monkeypatch):
+    """Чистая запись старше TTL перечитывается с диска"""
+    loads = []
+    cache = UserDataCache(
+        loader=lambda uid: loads.append(uid) or {'diary': {}},
+        writer=lambda uid, data_type, data: None,
+        max_users=10, ttl=60
+    )
+
+    clock = [1000.0]
+    monkeypatch.setattr(user_data.time, 'monotonic', lambda: clock[0])
+
+    cache.get('u1')
+    cache.get('u1')
+    assert loads == ['u1']
+
+    clock[0] += 61
+    cache.get('u1')
+    assert loads == ['u1', 'u1']
+
+    clock[0] += 61
+    assert cache.evict_expired() == 1
+    assert len(cache) == 0
+
+
+def test_documents_are_compact_and_legacy_files_load():
+    """Документы пишутся без отступов, старые файлы с indent=2 и NaN читаются"""
+    profile_path = get_user_files('legacy')['profile']
+    with open(profile_path, 'w', encoding='utf-8') as f:
+        f.write('{\n  "name": "Иван",\n  "weight": 80.5,\n  "bmr": NaN\n}')
+
+    profile = get_user_profile('legacy')
+    assert profile['name'] == 'Иван' and profile['weight'] == 80.5
+
+    profile['weight'] = 79.0
+    save_user_document('legacy', 'profile', profile)
+    flush_user_data('legacy')
+
+    with open(profile_path, 'rb') as f:
+        raw = f.read()
+    assert b'\n' not in raw and b': ' not in raw
+    assert 'Иван'.encode('utf-8') in raw  # Без \uXXXX
+
+    clear_user_data_cache(flush=False)
+    assert get_user_profile('legacy')['weight'] == 79.0
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
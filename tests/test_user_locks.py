@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Тесты поочередной записи данных одного пользователя
+"""
+import os
+import random
+import asyncio
+import datetime
+import pytest
+from types import SimpleNamespace
+
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.mock_gpt import MockGPTResponses
+from utils import gpt_cache
+from utils.gpt_cache import NutritionCache
+from utils.user_data import get_user_diary, get_food_entries
+from utils.user_locks import user_lock, get_lock_metrics, reset_lock_metrics
+from handlers import text_handler
+
+CONCURRENT_MEALS = 100
+
+
+@pytest.fixture(autouse=True)
+def temp_data_dir(temp_data_dir, monkeypatch):
+    """Отдельный кэш оценок GPT и метрики блокировок каждого теста"""
+    monkeypatch.setattr(gpt_cache, 'nutrition_cache', NutritionCache(str(temp_data_dir / 'gpt_cache.sqlite3'), 3600, 100))
+    reset_lock_metrics()
+    yield temp_data_dir
+
+
+def test_concurrent_food_logs_are_not_lost(monkeypatch, make_update):
+    """100 одновременных сообщений о еде: каждое попадает в дневник и лог"""
+    response = MockGPTResponses.TEXT_RESPONSES['борщ']  # 350 ккал
+
+    async def slow_gpt(messages, max_retries=3, **kwargs):
+        # Ответы приходят в случайном порядке, как от настоящего API
+        await asyncio.sleep(random.uniform(0, 0.01))
+        return response
+
+    monkeypatch.setattr(text_handler, 'ask_gpt', slow_gpt)
+    replies = []
+
+    async def run():
+        await asyncio.gather(*[
+            text_handler.handle_text_message(make_update(42, 'борщ', replies), SimpleNamespace(user_data={}))
+            for _ in range(CONCURRENT_MEALS)
+        ])
+
+    asyncio.run(run())
+
+    today = datetime.date.today().isoformat()
+    assert len(replies) == CONCURRENT_MEALS
+    assert len(get_food_entries('42', today)) == CONCURRENT_MEALS
+    assert get_user_diary('42')[today] == 350 * CONCURRENT_MEALS
+
+
+def test_lock_serializes_async_read_modify_write():
+    """Чтение и запись с await между ними не теряют обновления под блокировкой"""
+    counter = {'value': 0}
+
+    async def increment():
+        async with user_lock('7'):
+            value = counter['value']
+            await asyncio.sleep(0)
+            counter['value'] = value + 1
+
+    async def run():
+        await asyncio.gather(*[increment() for _ in range(50)])
+
+    asyncio.run(run())
+
+    assert counter['value'] == 50
+    metrics = get_lock_metrics()
+    assert metrics['acquisitions'] == 50
+    assert metrics['contended'] > 0
+    assert metrics['wait_max_ms'] >= metrics['wait_p95_ms'] >= 0
+
+
+def test_different_users_do_not_wait_for_each_other():
+    async def hold(user_id, started, release):
+        async with user_lock(user_id):
+            started.set()
+            await release.wait()
+
+    async def run():
+        started, release = asyncio.Event(), asyncio.Event()
+        holder = asyncio.create_task(hold('1', started, release))
+        await started.wait()
+        # Блокировка другого пользователя берется сразу
+        other_release = asyncio.Event()
+        other_release.set()
+        await asyncio.wait_for(hold('2', asyncio.Event(), other_release), timeout=1)
+        release.set()
+        await holder
+
+    asyncio.run(run())
+    assert get_lock_metrics()['contended'] == 0
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
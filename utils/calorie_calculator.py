@@ -2,9 +2,9 @@
 """
 Утилиты для расчета и обработки калорий
 """
-import re
+import asyncio
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable, Awaitable, AsyncIterator
 import datetime
 
 # Исправляем импорты для работы из main.py
@@ -15,24 +15,20 @@ sys.path.append(str(Path(__file__).parent.parent))
 # КРИТИЧЕСКОЕ ИСПРАВЛЕНИЕ: Блокируем старые методы OpenAI
 import openai_safe
 
-from data.calorie_database import CALORIE_DATABASE, LOW_CAL_KEYWORDS, HIGH_CAL_KEYWORDS
-from config import VALIDATION_LIMITS, ACTIVITY_MULTIPLIER, GOAL_MULTIPLIERS, OPENAI_API_KEY
-from .user_data import get_user_profile, get_user_food_log
-
-# Настройка OpenAI API - только новая версия (1.0+)
-try:
-    from openai import AsyncOpenAI
-    client = AsyncOpenAI(api_key=OPENAI_API_KEY)
-    OPENAI_AVAILABLE = True
-    logging.info("OpenAI client инициализирован (безопасная версия)")
-except ImportError:
-    OPENAI_AVAILABLE = False
-    client = None
+from data.calorie_database import LOW_CAL_KEYWORDS, HIGH_CAL_KEYWORDS
+from config import VALIDATION_LIMITS, ACTIVITY_MULTIPLIER, GOAL_MULTIPLIERS, GPT_STRUCTURED_OUTPUT
+from .user_data import get_user_profile, get_food_entries
+from .prompt_builder import (
+    build_food_text_messages, record_usage, estimate_request_tokens, JSON_ANSWER_FORMAT
+)
+from .gpt_scheduler import gpt_scheduler
+from .nutrition_extractor import extract_nutrition
+from .retry_policy import RetryPolicy, DeadlineExceeded, get_breaker
+# Клиенты OpenAI (только новая версия 1.0+) с отдельными пулами для текста и фото
+from .openai_pool import OPENAI_AVAILABLE, get_pool
+
+if not OPENAI_AVAILABLE:
     logging.warning("OpenAI library not available. GPT features will be disabled.")
-except Exception as e:
-    OPENAI_AVAILABLE = False
-    client = None
-    logging.error(f"Ошибка инициализации OpenAI: {e}")
 
 
 def calculate_bmr_tdee(weight: float, height: float, age: int, sex: str, goal: str = 'deficit') -> Dict[str, Any]:
@@ -59,54 +55,21 @@ def calculate_bmr_tdee(weight: float, height: float, age: int, sex: str, goal: s
     }
 
 
-def create_calorie_prompt(description: str, is_clarification: bool = False) -> str:
-    """Создает улучшенный промпт для определения калорий и белка"""
-    base_prompt = f"""
-Рассчитай калорийность и белок блюда: "{description}"
-
-Используй следующие справочные данные:
-{CALORIE_DATABASE}
-
-ПРАВИЛА РАСЧЕТА:
-1. Оценивай реальные порции: стандартная тарелка ~200-300г, столовая ложка ~15г, чайная ~5г
-2. Учитывай способ приготовления: жареное +20-30% калорий, вареное без изменений
-3. Если не указан вес, используй стандартные порции взрослого человека
-4. При сомнениях в размере порции, бери средние значения
-
-РАСПОЗНАВАНИЕ ЖАРЕНЫХ ИЗДЕЛИЙ:
-- Если видишь золотистое полукруглое жареное изделие - это ЧЕБУРЕК (120г = 300 ккал)
-- Сразу давай точный расчет: "Это чебурек. 300 ккал, 10г белка, 15г жиров, 25г углеводов"
-- НЕ спрашивай про начинку и вес - используй стандартные значения
-
-ОСОБОЕ ВНИМАНИЕ К ВЫСОКОКАЛОРИЙНЫМ ПРОДУКТАМ:
-- Арахисовая паста: 588 ккал/100г (1 ст.л. = ~15г = ~90 ккал)
-- Масла: 750+ ккал/100г (1 ст.л. = ~15г = ~115 ккал)
-- Орехи: 550-650 ккал/100г
-- Сыры: 300-400 ккал/100г
-- Не недооценивай количество этих продуктов на фото!
-
-РАСПОЗНАВАНИЕ ПОПУЛЯРНЫХ БЛЮД:
-- ШАУРМА: обычно в лаваше с мясом, овощами, соусом. Средняя порция 300-400г = 750-1200 ккал
-- Если видишь лаваш с начинкой или завернутое блюдо в фольге - скорее всего шаурма
-- ЧЕБУРЕК: жареный полукруглый пирожок золотистого цвета с хрустящим тестом
-- Если видишь золотистое жареное изделие полукруглой формы - это чебурек (средний 120г = 300 ккал)
-- БЕЛЯШ: круглый жареный пирожок с открытой серединкой
-- ПИРОЖОК ЖАРЕНЫЙ: любой жареный пирожок золотистого цвета
-- ПИЦЦА: треугольный кусок = ~1/8 пиццы (~150г), целая пицца = ~1200г
-- БУРГЕРЫ: стандартный = 200-250г, большой = 300-400г
-- РОЛЛЫ/СУШИ: 1 ролл = 20-30г, порция обычно 6-8 роллов
-
-"""
-
-    if is_clarification:
-        base_prompt += "ВАЖНО: Информации достаточно для расчета. Ответь в формате: X ккал, Y г белка, Z г жиров, W г углеводов"
+def create_calorie_messages(description: str, is_clarification: bool = False) -> list:
+    """Сообщения для определения калорий и БЖУ блюда по описанию"""
+    if GPT_STRUCTURED_OUTPUT:
+        # Ответ в JSON (utils/structured_output.py)
+        answer_format = JSON_ANSWER_FORMAT
+        if is_clarification:
+            answer_format += "ВАЖНО: Информации достаточно для расчета, question - null\n"
+    elif is_clarification:
+        answer_format = "ВАЖНО: Информации достаточно для расчета. Ответь в формате: X ккал, Y г белка, Z г жиров, W г углеводов"
     else:
-        base_prompt += """
-Если информации достаточно для точного расчета - ответь в формате: X ккал, Y г белка, Z г жиров, W г углеводов
+        answer_format = """Если информации достаточно для точного расчета - ответь в формате: X ккал, Y г белка, Z г жиров, W г углеводов
 Если нужны критически важные уточнения (размер порции, способ приготовления), задай ОДИН конкретный вопрос и добавь "ВОПРОС:".
 """
 
-    return base_prompt
+    return build_food_text_messages(description, answer_format)
 
 
 def validate_calorie_result(description: str, kcal: int) -> int:
@@ -152,342 +115,142 @@ def validate_calorie_result(description: str, kcal: int) -> int:
     return kcal
 
 
-def extract_calories_smart(response_text: str) -> Optional[int]:
-    """Умное извлечение калорий из ответа GPT"""
-    response_text = response_text.strip()
-    logging.info(f"Extracting calories from: {response_text}")
-
-    # Если это просто число
-    if response_text.replace('.', '').replace(',', '').isdigit():
-        return int(float(response_text.replace(',', '.')))
-
-    # Ищем число после ключевых слов (в порядке приоритета)
-    patterns = [
-        r'итого:?\s*(\d+(?:[.,]\d+)?)\s*ккал',  # итого: 450 ккал
-        r'всего\s+(\d+(?:[.,]\d+)?)\s*ккал',  # всего 450 ккал
-        r'итого:?\s*(\d+(?:[.,]\d+)?)',  # итого: 450
-        r'всего:?\s*(\d+(?:[.,]\d+)?)',  # всего: 450
-        r'общая\s+калорийность:?\s*(\d+(?:[.,]\d+)?)',
-        r'калорийность:?\s*(\d+(?:[.,]\d+)?)',
-        r'калории:?\s*(\d+(?:[.,]\d+)?)',  # калории: 450
-        r'(\d+(?:[.,]\d+)?)\s*ккал',  # 450 ккал
-        r'(\d+(?:[.,]\d+)?)\s*калори[йяе]',  # 450 калорий
-        r'=\s*(\d+(?:[.,]\d+)?)',
-        r'составляет?\s*(\d+(?:[.,]\d+)?)',
-        r'примерно\s*(\d+(?:[.,]\d+)?)',
-        r'около\s*(\d+(?:[.,]\d+)?)'
-    ]
-
-    for pattern in patterns:
-        matches = re.findall(pattern, response_text, re.IGNORECASE)
-        if matches:
-            # Берем последнее найденное значение (обычно итоговое)
-            result = int(float(matches[-1].replace(',', '.')))
-            logging.info(f"Found calories using pattern '{pattern}': {result}")
-            return result
-
-    # Если ничего не нашли в паттернах, берем все числа
-    numbers = [int(x) for x in re.findall(r'\d+', response_text) if int(x) > 10]
-    if numbers:
-        # Выбираем наиболее вероятное итоговое значение
-        result = max(numbers) if len(numbers) == 1 else numbers[-1]
-        logging.info(f"Using fallback number extraction: {result}")
-        return result
-
-    logging.warning(f"Could not extract calories from: {response_text}")
-    return None
-
-
-def extract_protein_smart(response_text: str) -> Optional[float]:
-    """Умное извлечение белка из ответа GPT"""
-    response_text = response_text.strip()
-    logging.info(f"Extracting protein from: {response_text[:200]}")
-
-    # Ищем белок в различных форматах (от более специфичных к менее специфичным)
-    # ВАЖНО: [ \t] вместо \s чтобы НЕ матчить через переносы строк
-    patterns = [
-        r'белки:?[ \t]*(\d+(?:[.,]\d+)?)[ \t]*г',  # белки: 30г или Белки: 30 г
-        r'белок[а-я]*:?[ \t]*(\d+(?:[.,]\d+)?)[ \t]*г',
-        r'(\d+(?:[.,]\d+)?)г[ \t]*белка',  # 32.5г белка (без пробела)
-        r'(\d+(?:[.,]\d+)?)[ \t]+г[ \t]*белка',  # 30 г белка (с пробелом)
-        r'(\d+(?:[.,]\d+)?)[ \t]+г[ \t]*белк',
-        r'белк[а-я]*[ \t]+(\d+(?:[.,]\d+)?)[ \t]*г',  # более строгий паттерн
-        r'(\d+(?:[.,]\d+)?)[ \t]*грамм[ \t]*белка',  # 25 грамм белка
-        r'(?:^|[,.\s])[ \t]*б:?[ \t]*(\d+(?:[.,]\d+)?)[ \t]*г',  # б: 35г (с началом строки или разделителем)
-        r'protein:?[ \t]*(\d+(?:[.,]\d+)?)',
-        r'(\d+(?:[.,]\d+)?)[ \t]*g[ \t]*protein'
-    ]
-
-    all_matches = []
-    for pattern in patterns:
-        matches = re.findall(pattern, response_text, re.IGNORECASE)
-        if matches:
-            all_matches.extend([(float(m.replace(',', '.')), pattern) for m in matches])
-
-    if all_matches:
-        # Берем ПОСЛЕДНЕЕ найденное значение (обычно это итоговое)
-        result, pattern = all_matches[-1]
-        logging.info(f"Found protein using pattern '{pattern}': {result}г (из {len(all_matches)} найденных)")
-        return result
-
-    logging.warning(f"Could not extract protein from: {response_text[:200]}")
-    return None
-
-
-def extract_fat_smart(response_text: str) -> Optional[float]:
-    """Умное извлечение жиров из ответа GPT"""
-    if not response_text:
-        logging.info("📊 ЖИРЫ: Пустой текст")
-        return None
-
-    logging.info(f"📊 ЖИРЫ: Поиск в тексте длиной {len(response_text)}")
-
-    # Ищем жиры в различных форматах (от более специфичных к менее специфичным)
-    # ВАЖНО: [ \t] вместо \s чтобы НЕ матчить через переносы строк
-    patterns = [
-        r'жиры:?[ \t]*(\d+(?:[.,]\d+)?)[ \t]*г',  # жиры: 18г или Жиры: 18 г
-        r'жир[а-я]*:?[ \t]*(\d+(?:[.,]\d+)?)[ \t]*г',
-        r'(\d+(?:[.,]\d+)?)г[ \t]*жир[а-я]*',  # 26.4г жира (без пробела между числом и г)
-        r'(\d+(?:[.,]\d+)?)[ \t]+г[ \t]*жир[а-я]*',  # 18 г жиров (с пробелом)
-        r'жир[а-я]*[ \t]+(\d+(?:[.,]\d+)?)[ \t]*г',  # жиры 18 г
-        r'жирность[ \t]+(\d+(?:[.,]\d+)?)[ \t]*грамм',  # жирность 10 грамм
-        r'(?:^|[,.\s])[ \t]*ж:?[ \t]*(\d+(?:[.,]\d+)?)[ \t]*г',  # ж: 16г (с началом строки или разделителем)
-        r'fat:?[ \t]*(\d+(?:[.,]\d+)?)',
-        r'(\d+(?:[.,]\d+)?)[ \t]*g[ \t]*fat',
-        r'липид[а-я]*:?[ \t]*(\d+(?:[.,]\d+)?)'
-    ]
-
-    all_matches = []
-    for pattern in patterns:
-        matches = re.findall(pattern, response_text, re.IGNORECASE)
-        if matches:
-            all_matches.extend([(float(m.replace(',', '.')), pattern) for m in matches])
-
-    if all_matches:
-        # Берем ПОСЛЕДНЕЕ найденное значение (обычно это итоговое)
-        result, pattern = all_matches[-1]
-        logging.info(f"📊 ЖИРЫ: Найдено {result}г по паттерну '{pattern}' (из {len(all_matches)} найденных)")
-        return result
-
-    logging.warning(f"📊 ЖИРЫ: НЕ НАЙДЕНО в тексте")
-    return None
-
-
-def extract_carbs_smart(response_text: str) -> Optional[float]:
-    """Умное извлечение углеводов из ответа GPT"""
-    if not response_text:
-        logging.info("📊 УГЛЕВОДЫ: Пустой текст")
-        return None
-
-    logging.info(f"📊 УГЛЕВОДЫ: Поиск в тексте длиной {len(response_text)}")
-
-    # Ищем углеводы в различных форматах (от более специфичных к менее специфичным)
-    # ВАЖНО: [ \t] вместо \s чтобы НЕ матчить через переносы строк
-    patterns = [
-        r'углеводы:?[ \t]*(\d+(?:[.,]\d+)?)[ \t]*г',  # углеводы: 6г или Углеводы: 6 г
-        r'углевод[а-я]*:?[ \t]*(\d+(?:[.,]\d+)?)[ \t]*г',
-        r'(\d+(?:[.,]\d+)?)г[ \t]*углеводов?',  # 29.2г углеводов (без пробела)
-        r'(\d+(?:[.,]\d+)?)[ \t]+г[ \t]*углеводов?',  # 6 г углеводов (с пробелом)
-        r'углевод[а-я]*[ \t]+(\d+(?:[.,]\d+)?)[ \t]*г',  # углеводы 6 г
-        r'углеводов[ \t]+(\d+(?:[.,]\d+)?)[ \t]*грамм',  # углеводов 20 грамм
-        r'(?:^|[,.\s])[ \t]*у:?[ \t]*(\d+(?:[.,]\d+)?)[ \t]*г',  # у: 45г (с началом строки или разделителем)
-        r'carbs?:?[ \t]*(\d+(?:[.,]\d+)?)',
-        r'(\d+(?:[.,]\d+)?)[ \t]*g[ \t]*carbs?',
-        r'carbohydrates?:?[ \t]*(\d+(?:[.,]\d+)?)',
-        r'(\d+(?:[.,]\d+)?)[ \t]*g[ \t]*carbohydrates?',
-        r'сахар[а-я]*:?[ \t]*(\d+(?:[.,]\d+)?)'
-    ]
-
-    all_matches = []
-    for pattern in patterns:
-        matches = re.findall(pattern, response_text, re.IGNORECASE)
-        if matches:
-            all_matches.extend([(float(m.replace(',', '.')), pattern) for m in matches])
-
-    if all_matches:
-        # Берем ПОСЛЕДНЕЕ найденное значение (обычно это итоговое)
-        result, pattern = all_matches[-1]
-        logging.info(f"📊 УГЛЕВОДЫ: Найдено {result}г по паттерну '{pattern}' (из {len(all_matches)} найденных)")
-        return result
-
-    logging.warning(f"📊 УГЛЕВОДЫ: НЕ НАЙДЕНО в тексте")
-    return None
-
-
 def extract_nutrition_smart(response_text: str) -> Dict[str, Optional[float]]:
-    """Извлекает полные БЖУ и калории из ответа GPT"""
-    logging.info(f"📊 ИЗВЛЕЧЕНИЕ БЖУ из ответа длиной {len(response_text)} символов")
-    logging.info(f"📊 Первые 500 символов ответа: {response_text[:500]}")
-
-    # КРИТИЧНО: Ищем секцию "ИТОГО" для извлечения финальных значений
-    itogo_match = re.search(r'ИТОГО:?\s*(.+?)(?=\n\n|\Z)', response_text, re.IGNORECASE | re.DOTALL)
-    
-    if itogo_match:
-        itogo_text = itogo_match.group(1)
-        logging.info(f"📊 Найдена секция ИТОГО: {itogo_text[:200]}")
-        
-        # Пытаемся извлечь полный формат из секции ИТОГО
-        # ИСПРАВЛЕНО: учитываем что между числом и "г" может не быть пробела (13.5г белка)
-        full_patterns = [
-            # Формат: 1016 ккал, 13.5г белка, 72г жира, 47г углеводов
-            r'(\d+(?:[.,]\d+)?)\s*ккал.*?(\d+(?:[.,]\d+)?)г?\s*белка.*?(\d+(?:[.,]\d+)?)г?\s*жир.*?(\d+(?:[.,]\d+)?)г?\s*углевод',
-            # Формат с пробелами: 1016 ккал, 13.5 г белка, 72 г жиров, 47 г углеводов
-            r'(\d+(?:[.,]\d+)?)\s*ккал.*?(\d+(?:[.,]\d+)?)\s*г\s*белка.*?(\d+(?:[.,]\d+)?)\s*г\s*жиров?.*?(\d+(?:[.,]\d+)?)\s*г\s*углеводов?',
-        ]
-        
-        for full_pattern in full_patterns:
-            full_match = re.search(full_pattern, itogo_text, re.IGNORECASE | re.DOTALL)
-            if full_match:
-                logging.info(f"📊 Найден полный формат БЖУ в ИТОГО: {full_match.groups()}")
-                result = {
-                    'calories': int(float(full_match.group(1).replace(',', '.'))),
-                    'protein': float(full_match.group(2).replace(',', '.')),
-                    'fat': float(full_match.group(3).replace(',', '.')),
-                    'carbs': float(full_match.group(4).replace(',', '.'))
-                }
-                logging.info(f"📊 Результат из ИТОГО: {result}")
-                return result
-        
-        # Извлекаем из секции ИТОГО по отдельности
-        logging.info(f"📊 Полный формат не найден в ИТОГО, извлекаем по отдельности")
-        calories = extract_calories_smart(itogo_text)
-        protein = extract_protein_smart(itogo_text)
-        fat = extract_fat_smart(itogo_text)
-        carbs = extract_carbs_smart(itogo_text)
-        
-        if calories:  # Если хоть калории нашли в ИТОГО
-            logging.info(f"📊 Извлечено из ИТОГО: калории={calories}, белки={protein}, жиры={fat}, углеводы={carbs}")
-            result = {
-                'calories': calories,
-                'protein': protein,
-                'fat': fat,
-                'carbs': carbs
-            }
-            logging.info(f"📊 Финальный результат из ИТОГО: {result}")
-            return result
-
-    # Если секции ИТОГО нет, ищем полный формат по всему тексту
-    logging.info(f"📊 Секция ИТОГО не найдена, ищем полный формат по всему тексту")
-    full_patterns = [
-        # Формат без пробела перед г: 1016 ккал, 13.5г белка
-        r'(\d+(?:[.,]\d+)?)\s*ккал.*?(\d+(?:[.,]\d+)?)г?\s*белка.*?(\d+(?:[.,]\d+)?)г?\s*жир.*?(\d+(?:[.,]\d+)?)г?\s*углевод',
-        # Формат с пробелом перед г: 1016 ккал, 13.5 г белка
-        r'(\d+(?:[.,]\d+)?)\s*ккал.*?(\d+(?:[.,]\d+)?)\s*г\s*белка.*?(\d+(?:[.,]\d+)?)\s*г\s*жиров?.*?(\d+(?:[.,]\d+)?)\s*г\s*углеводов?',
-    ]
-    
-    # Ищем ВСЕ вхождения полного формата по всем паттернам
-    all_matches = []
-    for full_pattern in full_patterns:
-        matches = list(re.finditer(full_pattern, response_text, re.IGNORECASE | re.DOTALL))
-        all_matches.extend(matches)
-    
-    if all_matches:
-        # Берем ПОСЛЕДНЕЕ вхождение (обычно это итоговое значение)
-        last_match = all_matches[-1]
-        logging.info(f"📊 Найдено {len(all_matches)} полных форматов, берем последний: {last_match.groups()}")
-        result = {
-            'calories': int(float(last_match.group(1).replace(',', '.'))),
-            'protein': float(last_match.group(2).replace(',', '.')),
-            'fat': float(last_match.group(3).replace(',', '.')),
-            'carbs': float(last_match.group(4).replace(',', '.'))
-        }
-        logging.info(f"📊 Результат последнего полного формата: {result}")
-        return result
-
-    # Если полный формат не найден, извлекаем по отдельности
-    logging.info(f"📊 Полный формат не найден, извлекаем по частям")
-    calories = extract_calories_smart(response_text)
-    protein = extract_protein_smart(response_text)
-    fat = extract_fat_smart(response_text)
-    carbs = extract_carbs_smart(response_text)
-
-    logging.info(f"📊 Извлечение по отдельности: калории={calories}, белки={protein}, жиры={fat}, углеводы={carbs}")
-
-    result = {
-        'calories': calories,
-        'protein': protein,
-        'fat': fat,
-        'carbs': carbs
-    }
-    logging.info(f"📊 Финальный результат извлечения: {result}")
+    """Извлекает полные БЖУ и калории из ответа GPT (за один проход, см. nutrition_extractor)"""
+    result = extract_nutrition(response_text)
+    logging.debug(f"📊 Извлечение БЖУ из ответа длиной {len(response_text)} символов: {result}")
     return result
 
 
-async def ask_gpt(messages: list, max_retries: int = 3) -> str:
-    """
-    Отправляет запрос к OpenAI GPT с автоматическими повторными попытками при таймауте
-    
-    Args:
-        messages: Список сообщений для GPT
-        max_retries: Максимальное количество повторных попыток (по умолчанию 3)
-    
-    Returns:
-        str: Ответ от GPT
-    
-    Raises:
-        Exception: Если все попытки исчерпаны или произошла критическая ошибка
+async def _gpt_chunks(messages: list, max_retries: int, user_id: Optional[str],
+                      on_queued: Optional[Callable[[int], Awaitable[None]]],
+                      stream: bool, response_format: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+    """Текст ответа GPT частями (stream=True) или целиком одной частью
+
+    Когда и через сколько повторять, решает RetryPolicy (utils/retry_policy.py):
+    Retry-After сервера, джиттер, общий дедлайн GPT_REQUEST_DEADLINE. Пока API
+    недоступен, предохранитель модели отказывает сразу (CircuitOpenError).
+    Поток повторяется, только пока из него ничего не получено.
     """
     if not OPENAI_AVAILABLE:
         raise Exception("OpenAI library not available")
 
-    if 'client' not in globals() or client is None:
-        raise Exception("OpenAI client not initialized")
-
-    # Определяем модель: используем gpt-4o для vision задач, gpt-4o-mini для текста
+    # Определяем пул и модель: GPT_VISION_MODEL для фото, GPT_TEXT_MODEL для текста
     has_image = any(
         isinstance(msg.get('content'), list) and
         any(item.get('type') == 'image_url' for item in msg.get('content', []))
         for msg in messages
     )
-    model = "gpt-4o" if has_image else "gpt-4o-mini"
-
-    # Повторные попытки с экспоненциальной задержкой
-    import asyncio
-    for attempt in range(max_retries):
+    pool = get_pool(has_image)
+    model = pool.model
+    max_tokens = 500
+    tokens = estimate_request_tokens(messages, max_tokens)
+    policy = RetryPolicy(max_attempts=max_retries)
+    breaker = get_breaker(model)
+
+    attempt = 0
+    while True:
+        attempt += 1
+        breaker.before_request(model)
+        received = False
         try:
-            logging.info(f"🔄 Попытка {attempt + 1}/{max_retries} отправки запроса к GPT ({model})")
-            
-            response = await client.chat.completions.create(
-                model=model,
-                messages=messages,
-                max_tokens=500,
-                temperature=0.1,
-                timeout=60.0  # Устанавливаем таймаут 60 секунд
-            )
-            
-            logging.info(f"✅ Успешный ответ от GPT на попытке {attempt + 1}")
-            return response.choices[0].message.content.strip()
-            
+            logging.info(f"🔄 Попытка {attempt}/{max_retries} отправки запроса к GPT ({model})")
+
+            # Ждем места и квоты модели (GPT_MAX_CONCURRENT, GPT_RATE_LIMITS);
+            # о месте в очереди сообщаем только при первой попытке
+            notify = on_queued if attempt == 1 else None
+            async with gpt_scheduler.slot(model, tokens, user_id, notify) as ticket:
+                # Попытка не выходит за общий дедлайн запроса (с учетом очереди)
+                timeout = min(pool.timeout, policy.remaining())
+                if timeout <= 0:
+                    raise DeadlineExceeded(f"GPT request deadline exceeded ({policy.deadline:.0f} s)")
+                async with pool.acquire() as client:
+                    request = dict(model=model, messages=messages, max_tokens=max_tokens,
+                                   temperature=0.1, timeout=timeout)
+                    if response_format is not None:
+                        request['response_format'] = response_format
+                    if stream:
+                        response = await client.chat.completions.create(
+                            stream=True, stream_options={'include_usage': True}, **request
+                        )
+                        usage = None
+                        async for chunk in response:
+                            # usage приходит отдельной последней частью без choices
+                            usage = getattr(chunk, 'usage', None) or usage
+                            delta = chunk.choices[0].delta.content if chunk.choices else None
+                            if delta:
+                                received = True
+                                yield delta
+                    else:
+                        response = await client.chat.completions.create(**request)
+                        usage = getattr(response, 'usage', None)
+                        received = True
+                        # content пуст, если модель отказалась отвечать по схеме (refusal)
+                        yield response.choices[0].message.content or ''
+                ticket.settle(getattr(usage, 'total_tokens', None))
+
         except Exception as e:
-            error_type = type(e).__name__
-            error_msg = str(e)
-            
-            # Проверяем, является ли это ошибкой таймаута
-            is_timeout = ('timeout' in error_msg.lower() or 
-                         'timed out' in error_msg.lower() or
-                         error_type in ['Timeout', 'TimedOut', 'TimeoutError'])
-            
-            # Проверяем, является ли это ошибкой перегрузки сервера
-            is_overloaded = ('overloaded' in error_msg.lower() or
-                           'rate limit' in error_msg.lower() or
-                           error_type == 'RateLimitError')
-            
-            if attempt < max_retries - 1 and (is_timeout or is_overloaded):
-                # Экспоненциальная задержка: 2, 4, 8 секунд
-                wait_time = 2 ** (attempt + 1)
-                logging.warning(
-                    f"⚠️ {error_type}: {error_msg}. "
-                    f"Повторная попытка через {wait_time} сек... "
-                    f"(попытка {attempt + 1}/{max_retries})"
-                )
-                await asyncio.sleep(wait_time)
-            else:
-                # Последняя попытка или критическая ошибка
-                logging.error(f"❌ OpenAI API error после {attempt + 1} попыток: {error_type} - {error_msg}")
+            breaker.record_failure(e)
+            # Часть ответа уже показана пользователю - повтор начал бы его заново
+            delay = None if received else policy.next_delay(e, attempt)
+            if delay is None:
+                # Последняя попытка, постоянная ошибка или не успеваем до дедлайна
+                logging.error(f"❌ OpenAI API error после {attempt} попыток: {type(e).__name__} - {e}")
                 raise
-    
-    # Если все попытки исчерпаны
-    raise Exception(f"Не удалось получить ответ от GPT после {max_retries} попыток")
+
+            logging.warning(
+                f"⚠️ {type(e).__name__}: {e}. "
+                f"Повторная попытка через {delay:.1f} сек... "
+                f"(попытка {attempt}/{max_retries})"
+            )
+            await asyncio.sleep(delay)
+            continue
+
+        breaker.record_success()
+        logging.info(f"✅ Успешный ответ от GPT на попытке {attempt}")
+        record_usage(model, usage)
+        return
+
+
+async def ask_gpt_stream(messages: list, max_retries: int = 3, user_id: Optional[str] = None,
+                         on_queued: Optional[Callable[[int], Awaitable[None]]] = None,
+                         response_format: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+    """Ответ GPT по мере генерации: части текста в порядке поступления"""
+    async for chunk in _gpt_chunks(messages, max_retries, user_id, on_queued, stream=True,
+                                   response_format=response_format):
+        yield chunk
+
+
+async def ask_gpt(messages: list, max_retries: int = 3, user_id: Optional[str] = None,
+                  on_queued: Optional[Callable[[int], Awaitable[None]]] = None,
+                  on_text: Optional[Callable[[str], Awaitable[None]]] = None,
+                  response_format: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Отправляет запрос к OpenAI GPT с повторными попытками при временных ошибках
+
+    Args:
+        messages: Список сообщений для GPT
+        max_retries: Максимальное количество попыток (по умолчанию 3)
+        user_id: Пользователь, для которого запрос (честная очередь при нехватке квоты)
+        on_queued: Вызывается с местом в очереди, если запросу пришлось ждать квоту
+        on_text: Если задан - ответ запрашивается потоком, и on_text получает
+            весь полученный к этому моменту текст после каждой части
+        response_format: Формат ответа API, например RESPONSE_FORMAT из
+            utils/structured_output.py (JSON по схеме)
+
+    Returns:
+        str: Ответ от GPT
+
+    Raises:
+        Exception: Если все попытки исчерпаны или произошла критическая ошибка
+    """
+    text = ''
+    async for chunk in _gpt_chunks(messages, max_retries, user_id, on_queued, stream=on_text is not None,
+                                   response_format=response_format):
+        text += chunk
+        if on_text is not None:
+            await on_text(text)
+    return text.strip()
 
 
 def get_calories_left_message(profile: Dict[str, Any], diary: Dict[str, int],
@@ -598,8 +361,7 @@ def analyze_daily_nutrition(user_id: str, date: str = None) -> Dict[str, Any]:
     if not date:
         date = datetime.date.today().isoformat()
 
-    food_log = get_user_food_log(user_id)
-    daily_foods = food_log.get(date, [])
+    daily_foods = get_food_entries(user_id, date)
 
     if not daily_foods:
         return {
@@ -616,25 +378,15 @@ def analyze_daily_nutrition(user_id: str, date: str = None) -> Dict[str, Any]:
     total_fat = 0
     total_carbs = 0
 
+    # Записи уже приведены к FoodEntry: незаполненные БЖУ - None
     for food_entry in daily_foods:
-        if len(food_entry) >= 2:
-            calories = food_entry[1]
-            total_calories += calories
-
-            # Если есть информация о белке
-            if len(food_entry) >= 3 and food_entry[2] is not None:
-                protein = food_entry[2]
-                total_protein += protein
-
-            # Если есть информация о жирах
-            if len(food_entry) >= 4 and food_entry[3] is not None:
-                fat = food_entry[3]
-                total_fat += fat
-
-            # Если есть информация об углеводах
-            if len(food_entry) >= 5 and food_entry[4] is not None:
-                carbs = food_entry[4]
-                total_carbs += carbs
+        total_calories += food_entry.kcal
+        if food_entry.protein is not None:
+            total_protein += food_entry.protein
+        if food_entry.fat is not None:
+            total_fat += food_entry.fat
+        if food_entry.carbs is not None:
+            total_carbs += food_entry.carbs
 
     return {
         'total_calories': total_calories,
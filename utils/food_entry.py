@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Запись лога еды: FoodEntry вместо списков трех форматов хранилища
+"""
+import sys
+import logging
+from typing import NamedTuple, Optional, Sequence, Iterable, List
+
+
+class FoodEntry(NamedTuple):
+    """Прием пищи: блюдо, калории и (если известны) БЖУ в граммах"""
+    name: str
+    kcal: int
+    protein: Optional[float] = None
+    fat: Optional[float] = None
+    carbs: Optional[float] = None
+
+    @classmethod
+    def from_raw(cls, raw: Sequence) -> 'FoodEntry':
+        """Из записи хранилища любого формата (2, 3 или 5 полей)
+
+        Raises:
+            TypeError, IndexError: запись короче двух полей
+        """
+        # Названия блюд повторяются из дня в день - храним одну копию строки
+        return cls(sys.intern(raw[0]), *raw[1:5])
+
+
+def decode_entries(raw_entries: Iterable[Sequence]) -> List[FoodEntry]:
+    """Приводим записи хранилища к FoodEntry, пропуская поврежденные"""
+    entries = []
+    for raw in raw_entries:
+        try:
+            entries.append(FoodEntry.from_raw(raw))
+        except (TypeError, IndexError):
+            logging.warning(f"⚠️ Пропущена поврежденная запись лога еды: {raw}")
+    return entries
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Поиск строк справочника калорийности по описанию блюда (индекс по основам слов)
+"""
+import re
+import math
+from collections import defaultdict
+from typing import Iterable, List, Dict, Set
+
+# Исправляем импорты для работы из main.py
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from data.calorie_database import FoodRow, CALORIE_ROWS
+
+_WORD = re.compile(r'[а-яa-z]+')
+_ENDINGS = sorted([
+    'иями', 'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ой', 'ей', 'ый', 'ий', 'ая', 'яя',
+    'ое', 'ее', 'ые', 'ие', 'ом', 'ем', 'ам', 'ям', 'ах', 'ях', 'ов', 'ев', 'ью', 'ия', 'ья', 'ию',
+    'ье', 'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+], key=len, reverse=True)
+_STOP_WORDS = {'без', 'для', 'или', 'при', 'под', 'над', 'еще', 'все', 'как', 'это', 'шт'}
+_MIN_STEM = 3
+_PREFIX = 4
+_PREFIX_WEIGHT = 0.5
+
+
+def russian_stem(word: str) -> str:
+    """Основа слова: без окончания, с сокращенной беглой гласной"""
+    word = word.lower().replace('ё', 'е')
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= _MIN_STEM:
+            word = word[:-len(ending)]
+            break
+    if len(word) > _MIN_STEM and word[-2:] in ('ец', 'ок'):
+        word = word[:-2] + word[-1]
+    return word
+
+
+def stem_words(text: str) -> Set[str]:
+    """Основы значимых слов текста"""
+    return {
+        russian_stem(word) for word in _WORD.findall(text.lower().replace('ё', 'е'))
+        if len(word) >= _MIN_STEM and word not in _STOP_WORDS
+    }
+
+
+class FoodIndex:
+    """Инвертированный индекс строк справочника по основам слов в названиях"""
+
+    def __init__(self, rows: Iterable[FoodRow]):
+        self.rows = list(rows)
+        self._by_stem: Dict[str, Set[int]] = defaultdict(set)
+        self._by_prefix: Dict[str, Set[int]] = defaultdict(set)
+        for position, row in enumerate(self.rows):
+            for stem in stem_words(row.name):
+                self._by_stem[stem].add(position)
+                self._by_prefix[stem[:_PREFIX]].add(position)
+
+    def _idf(self, matches: Set[int]) -> float:
+        return math.log(1 + len(self.rows) / len(matches))
+
+    def search(self, query: str, k: int) -> List[FoodRow]:
+        """До k строк, больше всего похожих на описание, в порядке справочника
+
+        Строки без единого совпадения не возвращаются.
+        """
+        scores: Dict[int, float] = defaultdict(float)
+        for stem in stem_words(query):
+            exact = self._by_stem.get(stem, set())
+            related = self._by_prefix.get(stem[:_PREFIX], set()) - exact
+            if exact:
+                weight = self._idf(exact)
+                for position in exact:
+                    scores[position] += weight
+            if related:
+                weight = self._idf(related) * _PREFIX_WEIGHT
+                for position in related:
+                    scores[position] += weight
+
+        best = sorted(scores, key=lambda position: (-scores[position], position))[:k]
+        return [self.rows[position] for position in sorted(best)]
+
+
+# Индекс встроенного справочника строится один раз при импорте
+food_index = FoodIndex(CALORIE_ROWS)
@@ -0,0 +1,596 @@
+# -*- coding: utf-8 -*-
+"""
+Журнал приемов пищи: append-only JSONL, партиции по месяцам
+"""
+import os
+import re
+import gzip
+import logging
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from functools import partial
+from typing import Dict, List, Callable, Optional, Tuple, Iterator
+
+from utils import json_codec
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Компактируем, когда строк в журнале заметно больше, чем дней в снимке
+COMPACT_MIN_GARBAGE = 64
+
+_PARTITION_FILE = re.compile(r'^(\d{4}-\d{2})\.jsonl(\.gz|\.zst)?$')
+
+# Сжатие замороженных партиций: имя -> (суффикс файла, сжатие, распаковка)
+COLD_CODECS: Dict[str, Tuple[str, Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {
+    'gzip': ('.gz', partial(gzip.compress, mtime=0), gzip.decompress),
+}
+if zstandard is not None:
+    COLD_CODECS['zstd'] = ('.zst', lambda data: zstandard.ZstdCompressor(level=10).compress(data),
+                           lambda data: zstandard.ZstdDecompressor().decompress(data))
+_DECOMPRESS = {suffix: decompress for suffix, _, decompress in COLD_CODECS.values()}
+
+
+def partition_key(date: str) -> str:
+    """Партиция дня: '2025-01-15' -> '2025-01'"""
+    return date[:7]
+
+
+# Строка журнала: {"d": "2025-01-01", "op": "add", "e": [...]} дописывает прием пищи к дню,
+# {"d": ..., "op": "set", "e": [[...], ...]} заменяет все записи дня (пустой список - день удален)
+def _encode_record(date: str, op: str, entries) -> bytes:
+    return json_codec.dumps({'d': date, 'op': op, 'e': entries}) + b'\n'
+
+
+def _frozen_variants(path: str) -> List[str]:
+    """Сжатые варианты партиции, которые умеем читать"""
+    return [path + suffix for suffix in _DECOMPRESS]
+
+
+def _read_partition_bytes(path: str) -> bytes:
+    """Содержимое партиции (.jsonl или сжатой .jsonl.gz / .jsonl.zst)"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    suffix = os.path.splitext(path)[1]
+    return _DECOMPRESS[suffix](data) if suffix in _DECOMPRESS else data
+
+
+def _apply_record(entries: List[list], record: dict) -> List[list]:
+    if record['op'] == 'add':
+        entries.append(record['e'])
+        return entries
+    return list(record['e'])
+
+
+class FoodJournal:
+    """Журнал одной партиции (месяца) с индексом смещений по дням"""
+
+    def __init__(self, path: str, sync: Optional[Callable[..., None]] = None):
+        self.path = path
+        # sync(*paths) делает пути надежными на диске; None - fsync сразу после записи
+        self._sync = sync
+        self._lock = threading.RLock()
+        # День -> [(смещение, длина)] строк журнала, начиная с последнего set
+        self._index: Dict[str, List[Tuple[int, int]]] = {}
+        self._records = 0
+        self._size = 0
+        # Замороженная партиция: сжатый файл и его распакованное содержимое
+        self.frozen_path: Optional[str] = None
+        self._buffer: Optional[bytes] = None
+        self._build_index()
+
+    # --- чтение ---
+
+    def dates(self) -> List[str]:
+        """Дни, в которых есть записи"""
+        with self._lock:
+            return sorted(self._index)
+
+    def __contains__(self, date: str) -> bool:
+        return date in self._index
+
+    def get(self, date: str) -> List[list]:
+        """Записи одного дня (читаются с диска по индексу)"""
+        with self._lock:
+            locations = self._index.get(date)
+            if not locations:
+                return []
+
+            entries: List[list] = []
+            if self._buffer is not None:
+                for offset, length in locations:
+                    entries = _apply_record(entries, json_codec.loads(self._buffer[offset:offset + length]))
+                return entries
+
+            with open(self.path, 'rb') as f:
+                for offset, length in locations:
+                    f.seek(offset)
+                    entries = _apply_record(entries, json_codec.loads(f.read(length)))
+            return entries
+
+    def to_dict(self) -> Dict[str, List[list]]:
+        """Весь лог в старом формате {день: [записи]}"""
+        with self._lock:
+            return {date: self.get(date) for date in self.dates()}
+
+    @property
+    def garbage(self) -> int:
+        """Сколько строк уйдет при компакции"""
+        return self._records - len(self._index)
+
+    # --- запись ---
+
+    def append(self, date: str, entry: list) -> None:
+        """Дописываем прием пищи к дню"""
+        self._write_record(date, 'add', entry)
+
+    def set(self, date: str, entries: List[list]) -> None:
+        """Заменяем записи дня (пустой список удаляет день)"""
+        self._write_record(date, 'set', list(entries))
+
+    def replace(self, food_log: Dict[str, List[list]]) -> None:
+        """Заменяем весь лог (атомарная перезапись файла)"""
+        with self._lock:
+            self._rewrite(food_log)
+
+    def compact(self) -> bool:
+        """Переписываем журнал снимком: одна строка set на день"""
+        with self._lock:
+            if not self.garbage or self.frozen_path:
+                return False
+            before = self._size
+            self._rewrite(self.to_dict())
+            logging.debug(f"🗜️ Компакция {self.path}: {before} -> {self._size} байт")
+            return True
+
+    def freeze(self, codec: str = 'gzip') -> bool:
+        """Сжимаем снимок партиции в path + .gz/.zst и удаляем несжатый файл"""
+        suffix, compress, _ = COLD_CODECS[codec]
+        with self._lock:
+            if self.frozen_path or not os.path.exists(self.path):
+                return False
+            snapshot = b''.join(_encode_record(date, 'set', entries) for date, entries in self.to_dict().items())
+            frozen_path = self.path + suffix
+            _write_atomic(frozen_path, compress(snapshot))
+            os.remove(self.path)
+            for stale in _frozen_variants(self.path):
+                if stale != frozen_path and os.path.exists(stale):
+                    os.remove(stale)
+            logging.debug(f"🧊 Партиция {self.path} заморожена: {len(snapshot)} -> "
+                          f"{os.path.getsize(frozen_path)} байт")
+            self._build_index()
+            return True
+
+    def delete(self) -> None:
+        """Удаляем партицию со всеми сжатыми вариантами"""
+        with self._lock:
+            for path in [self.path] + _frozen_variants(self.path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._build_index()
+
+    def _thaw(self) -> None:
+        """Разворачиваем замороженную партицию обратно в .jsonl перед записью"""
+        if self.frozen_path is not None:
+            self._rewrite(self.to_dict())  # Сжатую копию удаляет _rewrite
+
+    def _write_record(self, date: str, op: str, entries) -> None:
+        data = _encode_record(date, op, entries)
+        with self._lock:
+            self._thaw()
+            with open(self.path, 'ab') as f:
+                offset = f.tell()
+                f.write(data)
+                f.flush()
+                if self._sync is None:
+                    os.fsync(f.fileno())
+            self._index_record(date, op, bool(entries), offset, len(data))
+
+        # Синхронизация - вне блокировки: записи в тот же файл попадают в одну группу
+        if self._sync is not None:
+            if offset == 0:
+                # Новый файл: запись в каталоге тоже должна пережить сбой
+                self._sync(self.path, os.path.dirname(self.path))
+            else:
+                self._sync(self.path)
+
+    def _rewrite(self, food_log: Dict[str, List[list]]) -> None:
+        _write_atomic(self.path, b''.join(_encode_record(date, 'set', list(food_log[date]))
+                                          for date in sorted(food_log) if food_log[date]))
+        # Несжатый файл теперь актуален - сжатая копия устарела
+        for stale in _frozen_variants(self.path):
+            if os.path.exists(stale):
+                os.remove(stale)
+        self._build_index()
+
+    # --- индекс ---
+
+    def _index_record(self, date: str, op: str, non_empty: bool, offset: int, length: int) -> None:
+        self._records += 1
+        self._size = offset + length
+        if op == 'set':
+            if non_empty:
+                self._index[date] = [(offset, length)]
+            else:
+                self._index.pop(date, None)
+        else:
+            self._index.setdefault(date, []).append((offset, length))
+
+    def _build_index(self) -> None:
+        self._index = {}
+        self._records = 0
+        self._size = 0
+        self.frozen_path = None
+        self._buffer = None
+
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                offset = self._index_lines(f)
+            if offset != os.path.getsize(self.path):
+                with open(self.path, 'r+b') as f:
+                    f.truncate(offset)
+            return
+
+        # Несжатого файла нет - партиция могла быть заморожена
+        for frozen_path in _frozen_variants(self.path):
+            if os.path.exists(frozen_path):
+                self._buffer = _read_partition_bytes(frozen_path)
+                self.frozen_path = frozen_path
+                self._index_lines(self._buffer.splitlines(keepends=True))
+                return
+
+    def _index_lines(self, lines) -> int:
+        """Индексируем строки журнала. Возвращает смещение конца последней целой строки"""
+        offset = 0
+        for line in lines:
+            if not line.endswith(b'\n'):
+                # Хвост, оборванный при сбое во время записи
+                logging.warning(f"⚠️ Журнал {self.path} обрезан по смещению {offset}")
+                break
+            try:
+                record = json_codec.loads(line)
+                self._index_record(record['d'], record['op'], bool(record['e']), offset, len(line))
+            except (ValueError, KeyError, TypeError) as e:
+                # Битую строку пропускаем - она уйдет при компакции
+                logging.warning(f"⚠️ Пропущена поврежденная строка {self.path}:{offset}: {e}")
+                self._records += 1
+            offset += len(line)
+        self._size = offset
+        return offset
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    """Атомарная запись файла: tmp + fsync + os.replace"""
+    temp_path = path + '.tmp'
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except OSError:
+        if os.path.exists(temp_path):
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+        raise
+
+
+def read_food_log(*paths: str) -> Dict[str, List[list]]:
+    """Читаем лог без создания и конвертации файлов (для утилит переноса)
+
+    paths - источники по приоритету: каталог партиций, одиночный журнал
+    food_log.jsonl, старый food_log.json. Читается первый существующий.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            food_log: Dict[str, List[list]] = {}
+            for name in sorted(_partition_files(path).values()):
+                food_log.update(_read_journal_file(os.path.join(path, name)))
+            return food_log
+        if os.path.exists(path):
+            return _read_journal_file(path) if path.endswith('.jsonl') else _read_json_log(path)
+    return {}
+
+
+def _split_by_month(food_log: Dict[str, List[list]]) -> Dict[str, Dict[str, List[list]]]:
+    by_month: Dict[str, Dict[str, List[list]]] = {}
+    for date, entries in food_log.items():
+        if isinstance(entries, list) and entries:
+            by_month.setdefault(partition_key(date), {})[date] = entries
+    return by_month
+
+
+def _partition_files(partition_dir: str) -> Dict[str, str]:
+    """Месяц -> файл партиции; несжатый файл важнее сжатой копии"""
+    files: Dict[str, str] = {}
+    for name in os.listdir(partition_dir):
+        match = _PARTITION_FILE.match(name)
+        if match and (match.group(1) not in files or not match.group(2)):
+            files[match.group(1)] = name
+    return files
+
+
+def _read_journal_file(path: str) -> Dict[str, List[list]]:
+    food_log: Dict[str, List[list]] = {}
+    for line in _read_partition_bytes(path).splitlines():
+        try:
+            record = json_codec.loads(line)
+            food_log[record['d']] = _apply_record(food_log.get(record['d'], []), record)
+        except (ValueError, KeyError, TypeError):
+            continue
+    return {date: entries for date, entries in food_log.items() if entries}
+
+
+def _read_json_log(path: str) -> Dict[str, List[list]]:
+    try:
+        with open(path, 'rb') as f:
+            food_log = json_codec.loads(f.read())
+    except (OSError, ValueError) as e:
+        logging.warning(f"⚠️ Не удалось прочитать {path}: {e}")
+        return {}
+    return food_log if isinstance(food_log, dict) else {}
+
+
+class FoodJournalStore:
+    """Партиции журналов пользователей (открытые - в LRU, не больше max_open)
+
+    Журнал, с которым сейчас работает какой-либо поток, не вытесняется: иначе
+    следующий вызов открыл бы второй FoodJournal того же файла со своей
+    блокировкой и индексом, и компакция одного потеряла бы записи другого.
+    """
+
+    def __init__(self, paths: Callable[[str], Tuple[str, Tuple[str, ...]]], max_open: int = 1000,
+                 sync: Optional[Callable[..., None]] = None):
+        # user_id -> (каталог партиций, старые файлы лога для переноса)
+        self._paths = paths
+        self._sync = sync
+        self.max_open = max_open
+        self._journals: 'OrderedDict[Tuple[str, str], FoodJournal]' = OrderedDict()
+        self._in_use: Dict[Tuple[str, str], int] = {}  # Партиция -> число работающих с ней потоков
+        self._ready: 'OrderedDict[str, str]' = OrderedDict()  # user_id -> каталог партиций, не больше max_open
+        self._lock = threading.RLock()
+        self.stats = {'appends': 0, 'sets': 0, 'compactions': 0, 'partitions_opened': 0, 'frozen': 0}
+
+    @contextmanager
+    def journal(self, user_id: str, month: str) -> Iterator[FoodJournal]:
+        """Журнал одной партиции пользователя; внутри with он не вытесняется"""
+        key = (user_id, month)
+        with self._lock:
+            journal = self._journals.get(key)
+            if journal is None:
+                journal = FoodJournal(os.path.join(self._partition_dir(user_id), f'{month}.jsonl'), sync=self._sync)
+                self._journals[key] = journal
+                self.stats['partitions_opened'] += 1
+            else:
+                self._journals.move_to_end(key)
+            self._in_use[key] = self._in_use.get(key, 0) + 1
+            self._evict()
+        try:
+            yield journal
+        finally:
+            with self._lock:
+                self._in_use[key] -= 1
+                if not self._in_use[key]:
+                    del self._in_use[key]
+                self._evict()
+
+    def months(self, user_id: str) -> List[str]:
+        """Партиции пользователя, существующие на диске (в том числе замороженные)"""
+        return sorted(_partition_files(self._partition_dir(user_id)))
+
+    def get_dates(self, user_id: str) -> List[str]:
+        """Все дни с записями (открывает все партиции пользователя)"""
+        dates = []
+        for month in self.months(user_id):
+            with self.journal(user_id, month) as journal:
+                dates.extend(journal.dates())
+        return dates
+
+    def get_entries(self, user_id: str, date: str) -> List[list]:
+        partition_dir = self._partition_dir(user_id)
+        month = partition_key(date)
+        with self._lock:
+            opened = (user_id, month) in self._journals
+        # Не создаем пустой журнал ради чтения несуществующего месяца
+        path = os.path.join(partition_dir, f'{month}.jsonl')
+        if not opened and not any(os.path.exists(p) for p in [path] + _frozen_variants(path)):
+            return []
+        with self.journal(user_id, month) as journal:
+            return journal.get(date)
+
+    def append(self, user_id: str, date: str, entry: list) -> None:
+        with self.journal(user_id, partition_key(date)) as journal:
+            journal.append(date, entry)
+        self.stats['appends'] += 1
+
+    def set_entries(self, user_id: str, date: str, entries: List[list]) -> None:
+        with self.journal(user_id, partition_key(date)) as journal:
+            journal.set(date, entries)
+        self.stats['sets'] += 1
+
+    def replace(self, user_id: str, food_log: Dict[str, List[list]]) -> None:
+        """Заменяем весь лог: переписываем партиции, лишние удаляем"""
+        by_month = _split_by_month(food_log)
+        for month in set(self.months(user_id)) | set(by_month):
+            with self.journal(user_id, month) as journal:
+                if month in by_month:
+                    journal.replace(by_month[month])
+                else:
+                    journal.delete()
+                    with self._lock:
+                        self._journals.pop((user_id, month), None)
+
+    def compact(self, min_garbage: int = COMPACT_MIN_GARBAGE) -> int:
+        """Компактируем открытые партиции с накопившимся мусором. Возвращает их число"""
+        with self._lock:
+            keys = list(self._journals)
+
+        compacted = 0
+        for user_id, month in keys:
+            with self._lock:
+                if (user_id, month) not in self._journals:
+                    continue  # Уже вытеснена - мусор соберем, когда партицию снова откроют
+            with self.journal(user_id, month) as journal:
+                if journal.garbage >= min_garbage and journal.garbage >= len(journal.dates()):
+                    try:
+                        if journal.compact():
+                            compacted += 1
+                    except OSError as e:
+                        logging.error(f"❌ Ошибка компакции {journal.path}: {e}")
+        self.stats['compactions'] += compacted
+        return compacted
+
+    def freeze(self, user_id: str, before_month: str, codec: str = 'gzip') -> int:
+        """Замораживаем партиции пользователя старше before_month. Возвращает их число"""
+        frozen = 0
+        for month in self.months(user_id):
+            if month >= before_month:
+                continue
+            path = os.path.join(self._partition_dir(user_id), f'{month}.jsonl')
+            if not os.path.exists(path):
+                continue  # Уже заморожена
+            with self.journal(user_id, month) as journal:
+                if journal.freeze(codec):
+                    frozen += 1
+                # Распакованная копия в памяти больше не нужна
+                with self._lock:
+                    self._journals.pop((user_id, month), None)
+        self.stats['frozen'] += frozen
+        return frozen
+
+    def clear(self) -> None:
+        with self._lock:
+            self._journals.clear()
+            self._ready.clear()
+
+    def _evict(self) -> None:
+        """Вытесняем давно не использованные журналы, с которыми никто не работает"""
+        overflow = len(self._journals) - self.max_open
+        for key in list(self._journals) if overflow > 0 else ():
+            if not overflow:
+                break
+            if key not in self._in_use:
+                del self._journals[key]
+                overflow -= 1
+
+    def _partition_dir(self, user_id: str) -> str:
+        """Каталог партиций; при первом обращении переносим в него старый лог"""
+        partition_dir = self._ready.get(user_id)
+        if partition_dir is not None:
+            return partition_dir
+
+        with self._lock:
+            partition_dir, legacy_paths = self._paths(user_id)
+            if not os.path.isdir(partition_dir):
+                self._convert_legacy(partition_dir, legacy_paths)
+            self._ready[user_id] = partition_dir
+            if len(self._ready) > self.max_open:
+                self._ready.popitem(last=False)  # Вытесненному пользователю снова проверим каталог
+            return partition_dir
+
+    def _convert_legacy(self, partition_dir: str, legacy_paths: Tuple[str, ...]) -> None:
+        """Раскладываем food_log.jsonl / food_log.json по месячным партициям (один раз)"""
+        existing = [path for path in legacy_paths if os.path.exists(path)]
+        food_log = read_food_log(*existing)
+
+        # Пишем партиции во временный каталог и подменяем его целиком
+        temp_dir = partition_dir + '.tmp'
+        os.makedirs(temp_dir, exist_ok=True)
+        for month, days in _split_by_month(food_log).items():
+            FoodJournal(os.path.join(temp_dir, f'{month}.jsonl')).replace(days)
+        os.replace(temp_dir, partition_dir)
+
+        for path in existing:
+            os.replace(path, path + '.migrated')
+            logging.info(f"📦 {path} перенесен в {partition_dir}")
+
+
+class FoodLogView(MutableMapping):
+    """Ленивое представление лога {день: [записи]} для старого кода
+
+    Обращение к дню читает только этот день; полный список дней
+    запрашивается лишь при переборе. Изменения копятся в представлении
+    и записываются через commit(): дописанные в конец дня записи уходят
+    в журнал как add, остальные изменения дня - одним set.
+    """
+
+    def __init__(self, get_dates: Callable[[], List[str]],
+                 get_entries: Callable[[str], List[list]],
+                 append: Callable[[str, list], None],
+                 set_entries: Callable[[str, List[list]], None]):
+        self._get_dates = get_dates
+        self._get_entries = get_entries
+        self._append = append
+        self._set_entries = set_entries
+        self._days: Dict[str, List[list]] = {}    # Выданные наружу списки дней
+        self._stored: Dict[str, List[list]] = {}  # Их состояние в хранилище
+        self._removed: set = set()
+
+    def __getitem__(self, date: str) -> List[list]:
+        if date in self._days:
+            return self._days[date]
+        if date in self._removed:
+            raise KeyError(date)
+        entries = self._get_entries(date)
+        if not entries:
+            # Пустых дней в хранилище не бывает - set [] удаляет день
+            raise KeyError(date)
+        self._stored[date] = [list(entry) for entry in entries]
+        self._days[date] = entries
+        return entries
+
+    def __setitem__(self, date: str, entries: List[list]) -> None:
+        if date not in self._stored:
+            self._stored[date] = self._get_entries(date)
+        self._days[date] = entries
+        self._removed.discard(date)
+
+    def __delitem__(self, date: str) -> None:
+        if date not in self:
+            raise KeyError(date)
+        self._days.pop(date, None)
+        self._stored.pop(date, None)
+        self._removed.add(date)
+
+    def __contains__(self, date) -> bool:
+        try:
+            self[date]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self) -> Iterator[str]:
+        dates = (set(self._get_dates()) | set(self._days)) - self._removed
+        return iter(sorted(dates))
+
+    def __len__(self) -> int:
+        return len((set(self._get_dates()) | set(self._days)) - self._removed)
+
+    def __repr__(self) -> str:
+        return f'FoodLogView({len(self)} days)'
+
+    def commit(self) -> None:
+        """Записываем изменения представления в хранилище"""
+        for date in sorted(self._removed):
+            self._set_entries(date, [])
+        self._removed.clear()
+
+        for date, entries in list(self._days.items()):
+            stored = self._stored.get(date, [])
+            entries = [list(entry) for entry in entries]
+            if entries == stored:
+                continue
+            if entries[:len(stored)] == stored:
+                for entry in entries[len(stored):]:
+                    self._append(date, entry)
+            else:
+                self._set_entries(date, entries)
+            # Перечитаем день из хранилища при следующем обращении
+            del self._days[date]
+            del self._stored[date]
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+Общий кэш оценок GPT по описанию блюда (SQLite)
+"""
+import os
+import re
+import time
+import logging
+import sqlite3
+import threading
+from typing import Dict, Any, Optional
+
+# Исправляем импорт для работы из main.py
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import GPT_CACHE_PATH, GPT_CACHE_TTL, GPT_CACHE_MAX_ENTRIES, GPT_CACHE_USE_HISTORY, GPT_TEXT_MODEL
+from utils.prompt_builder import TEXT_PROMPT_VERSION
+from utils.user_data import run_in_storage_thread
+
+# Ключ (модель, версия промпта) оценок из истории приемов пищи (warm_gpt_cache.py):
+# источник записи неизвестен, поэтому они не смешиваются с ответами GPT на текущий промпт
+HISTORY_KEY = ('history', 'history')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nutrition_cache (
+    description TEXT NOT NULL,
+    model TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    calories REAL NOT NULL,
+    protein REAL,
+    fat REAL,
+    carbs REAL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (description, model, prompt_version)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_nutrition_cache_accessed ON nutrition_cache (accessed);
+"""
+
+_SQL_SELECT = ("SELECT calories, protein, fat, carbs, created, accessed FROM nutrition_cache "
+               "WHERE description = ? AND model = ? AND prompt_version = ?")
+_SQL_TOUCH = ("UPDATE nutrition_cache SET accessed = ? "
+              "WHERE description = ? AND model = ? AND prompt_version = ?")
+_SQL_DELETE = "DELETE FROM nutrition_cache WHERE description = ? AND model = ? AND prompt_version = ?"
+_SQL_UPSERT = ("INSERT OR REPLACE INTO nutrition_cache "
+               "(description, model, prompt_version, calories, protein, fat, carbs, created, accessed) "
+               "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)")
+_SQL_COUNT = "SELECT COUNT(*) FROM nutrition_cache"
+_SQL_EVICT_KEYS = ("SELECT description, model, prompt_version FROM nutrition_cache "
+                   "ORDER BY accessed LIMIT ?")
+_SQL_DELETE_EXPIRED = "DELETE FROM nutrition_cache WHERE created < ?"
+
+# Время обращения обновляем не чаще раза в минуту - LRU не требует точности,
+# а запись на каждое попадание дороже самого чтения
+_TOUCH_INTERVAL = 60
+# При переполнении освобождаем 10% места, чтобы не вытеснять на каждой вставке
+_EVICT_FRACTION = 0.1
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_description(description: str) -> str:
+    """Описание блюда в форме ключа: "Гречка  с котлетой. " -> "гречка с котлетой\""""
+    text = _WHITESPACE.sub(' ', description.lower().replace('ё', 'е'))
+    return text.strip(' .,!;')
+
+
+class NutritionCache:
+    """Кэш оценок калорий и БЖУ в SQLite с TTL и LRU-вытеснением"""
+
+    def __init__(self, path: str, ttl: float, max_entries: int):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'writes': 0, 'errors': 0}
+        self._connection: Optional[sqlite3.Connection] = None
+        self._connection_pid: Optional[int] = None
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _connect(self) -> sqlite3.Connection:
+        """Соединение процесса (создается лениво, заново - после fork)"""
+        if self._connection is not None and self._connection_pid == os.getpid():
+            return self._connection
+
+        db_dir = os.path.dirname(self.path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        # Потеря последних записей кэша при отключении питания не страшна
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(SCHEMA)
+        self._connection = connection
+        self._connection_pid = os.getpid()
+        self._size = connection.execute(_SQL_COUNT).fetchone()[0]
+        logging.info(f"🗄️ Кэш оценок GPT открыт: {self.path} ({self._size} записей)")
+        return connection
+
+    def get(self, description: str, model: str, prompt_version: str) -> Optional[Dict[str, Any]]:
+        """Калории и БЖУ из кэша или None"""
+        if not self.enabled:
+            return None
+
+        key = (normalize_description(description), model, prompt_version)
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute(_SQL_SELECT, key).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+
+            calories, protein, fat, carbs, created, accessed = row
+            if now - created > self.ttl:
+                with connection:
+                    connection.execute(_SQL_DELETE, key)
+                self._size -= 1
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+                return None
+
+            if now - accessed > _TOUCH_INTERVAL:
+                with connection:
+                    connection.execute(_SQL_TOUCH, (now,) + key)
+            self.stats['hits'] += 1
+
+        return {'calories': calories, 'protein': protein, 'fat': fat, 'carbs': carbs}
+
+    def put(self, description: str, model: str, prompt_version: str,
+            nutrition: Dict[str, Any], created: Optional[float] = None) -> None:
+        """Сохраняем оценку; при переполнении вытесняем давно не запрошенные"""
+        if not self.enabled or not nutrition.get('calories'):
+            return
+
+        now = time.time()
+        key = (normalize_description(description), model, prompt_version)
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(_SQL_UPSERT, key + (
+                    nutrition['calories'], nutrition.get('protein'), nutrition.get('fat'),
+                    nutrition.get('carbs'), created or now, now
+                ))
+            self._size += 1  # при замене существующей записи - с запасом, пересчитаем при вытеснении
+            self.stats['writes'] += 1
+
+            if self._size > self.max_entries:
+                self._evict(connection)
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        with connection:
+            connection.execute(_SQL_DELETE_EXPIRED, (time.time() - self.ttl,))
+            size = connection.execute(_SQL_COUNT).fetchone()[0]
+            excess = size - int(self.max_entries * (1 - _EVICT_FRACTION))
+            if size > self.max_entries and excess > 0:
+                keys = connection.execute(_SQL_EVICT_KEYS, (excess,)).fetchall()
+                connection.executemany(_SQL_DELETE, keys)
+                size -= len(keys)
+                self.stats['evictions'] += len(keys)
+        self._size = size
+
+    def contains(self, description: str, model: str, prompt_version: str) -> bool:
+        """Есть ли свежая запись (без учета в статистике и без обновления LRU)"""
+        key = (normalize_description(description), model, prompt_version)
+        with self._lock:
+            row = self._connect().execute(_SQL_SELECT, key).fetchone()
+        return row is not None and time.time() - row[4] <= self.ttl
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._connect()
+            return self._size
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None and self._connection_pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+            self._connection_pid = None
+
+
+nutrition_cache = NutritionCache(GPT_CACHE_PATH, GPT_CACHE_TTL, GPT_CACHE_MAX_ENTRIES)
+
+
+def get_cached_nutrition(description: str) -> Optional[Dict[str, Any]]:
+    """Оценка текущей модели и промпта для описания (или из истории, GPT_CACHE_USE_HISTORY) или None"""
+    try:
+        nutrition = nutrition_cache.get(description, GPT_TEXT_MODEL, TEXT_PROMPT_VERSION)
+        if nutrition is None and GPT_CACHE_USE_HISTORY:
+            nutrition = nutrition_cache.get(description, *HISTORY_KEY)
+        return nutrition
+    except sqlite3.Error as e:
+        nutrition_cache.stats['errors'] += 1
+        logging.warning(f"⚠️ Кэш оценок GPT недоступен: {e}")
+        return None
+
+
+def cache_nutrition(description: str, nutrition: Dict[str, Any]) -> None:
+    """Запоминаем оценку GPT для описания"""
+    try:
+        nutrition_cache.put(description, GPT_TEXT_MODEL, TEXT_PROMPT_VERSION, nutrition)
+    except sqlite3.Error as e:
+        nutrition_cache.stats['errors'] += 1
+        logging.warning(f"⚠️ Не удалось сохранить оценку в кэш GPT: {e}")
+
+
+def get_gpt_cache_stats() -> Dict[str, Any]:
+    """Попадания, промахи, вытеснения и доля попаданий кэша оценок"""
+    stats = dict(nutrition_cache.stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+    return stats
+
+
+async def get_cached_nutrition_async(description: str) -> Optional[Dict[str, Any]]:
+    return await run_in_storage_thread(get_cached_nutrition, description)
+
+
+async def cache_nutrition_async(description: str, nutrition: Dict[str, Any]) -> None:
+    await run_in_storage_thread(cache_nutrition, description, nutrition)
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+Планировщик запросов к GPT: лимиты моделей и очередь по кругу между пользователями
+"""
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional, Callable, Awaitable
+
+# Исправляем импорты для работы из main.py
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import GPT_MAX_CONCURRENT, GPT_TEXT_MODEL, GPT_VISION_MODEL, GPT_RATE_LIMITS
+
+
+class TokenBucket:
+    """Ведро с непрерывным пополнением: per_minute единиц в минуту, не больше per_minute"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Через сколько секунд в ведре будет amount (0 - уже есть)"""
+        self._refill()
+        # Запрос больше ведра ждет полного ведра, а не вечность
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.level -= amount
+
+    def give_back(self, amount: float) -> None:
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+
+class Ticket:
+    """Запрос в очереди планировщика"""
+
+    __slots__ = ('model', 'user_id', 'tokens', 'future', 'queued_at', '_token_bucket')
+
+    def __init__(self, model: str, user_id: str, tokens: int, token_bucket: TokenBucket):
+        self.model = model
+        self.user_id = user_id
+        self.tokens = tokens
+        self.future = asyncio.get_running_loop().create_future()
+        self.queued_at = time.monotonic()
+        self._token_bucket = token_bucket
+
+    def settle(self, actual_tokens: Optional[int]) -> None:
+        """Фактический расход токенов по usage ответа: излишек оценки возвращается в ведро"""
+        if actual_tokens is None:
+            return
+        if actual_tokens < self.tokens:
+            self._token_bucket.give_back(self.tokens - actual_tokens)
+        else:
+            self._token_bucket.take(actual_tokens - self.tokens)
+        self.tokens = actual_tokens
+
+
+class GPTScheduler:
+    """Общий для процесса планировщик запросов к GPT"""
+
+    def __init__(self, max_concurrent: int, limits: Dict[str, Dict[str, int]]):
+        self.max_concurrent = max_concurrent
+        self.limits = limits
+        self.in_flight = 0
+        self.stats = {'admitted': 0, 'queued': 0, 'wait_total': 0.0, 'wait_max': 0.0, 'max_queue': 0}
+        self._buckets: Dict[str, tuple] = {}
+        # Пользователь -> его ожидающие запросы; порядок ключей - очередь обхода по кругу
+        self._waiting: 'OrderedDict[str, deque]' = OrderedDict()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def buckets(self, model: str) -> tuple:
+        """Ведра (запросы, токены) модели"""
+        if model not in self._buckets:
+            # Модель без своих лимитов считаем текстовой
+            limits = self.limits.get(model) or self.limits[GPT_TEXT_MODEL]
+            self._buckets[model] = (TokenBucket(limits['rpm']), TokenBucket(limits['tpm']))
+        return self._buckets[model]
+
+    @property
+    def queue_length(self) -> int:
+        return sum(len(tickets) for tickets in self._waiting.values())
+
+    def position(self, ticket: Ticket) -> int:
+        """Сколько ожидающих запросов будет пропущено раньше ticket при обходе по кругу"""
+        users = list(self._waiting)
+        turn = users.index(ticket.user_id)
+        index = self._waiting[ticket.user_id].index(ticket)
+        ahead = index
+        for position, user_id in enumerate(users):
+            if user_id != ticket.user_id:
+                # В каждом круге пользователь получает одно место; те, кто в круге
+                # раньше нас, успеют на один запрос больше
+                ahead += min(len(self._waiting[user_id]), index + (position < turn))
+        return ahead
+
+    def _dispatch(self) -> None:
+        """Пропускаем ожидающих по кругу, пока хватает мест и квоты"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        retry_in = None
+        while self._waiting and self.in_flight < self.max_concurrent:
+            exhausted = set()  # модели без квоты: их запросы ждут, остальные проходят
+            for user_id in list(self._waiting):
+                ticket = self._waiting[user_id][0]
+                if ticket.future.done():  # отменен, пока ждал
+                    self._pop(user_id)
+                    break
+                if ticket.model in exhausted:
+                    continue
+
+                requests, tokens = self.buckets(ticket.model)
+                wait = max(requests.wait_time(1), tokens.wait_time(ticket.tokens))
+                if wait > 0:
+                    exhausted.add(ticket.model)
+                    retry_in = wait if retry_in is None else min(retry_in, wait)
+                    continue
+
+                self._pop(user_id)
+                requests.take(1)
+                tokens.take(ticket.tokens)
+                self.in_flight += 1
+                ticket.future.set_result(None)
+                break
+            else:
+                break  # никого нельзя пропустить
+
+        if retry_in is not None and self._waiting:
+            # Проверим снова, когда ведро пополнится
+            self._timer = asyncio.get_running_loop().call_later(retry_in, self._dispatch)
+
+    def _pop(self, user_id: str) -> None:
+        """Убираем первый запрос пользователя; пользователь уходит в конец круга"""
+        tickets = self._waiting.pop(user_id)
+        tickets.popleft()
+        if tickets:
+            self._waiting[user_id] = tickets
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, model: str, tokens: int, user_id: Optional[str] = None,
+                   on_queued: Optional[Callable[[int], Awaitable[None]]] = None):
+        """Место для одного запроса к GPT; ждем его в очереди, если лимиты исчерпаны"""
+        ticket = Ticket(model, user_id or '', tokens, self.buckets(model)[1])
+        self._waiting.setdefault(ticket.user_id, deque()).append(ticket)
+        self._dispatch()
+
+        if not ticket.future.done():
+            self.stats['queued'] += 1
+            self.stats['max_queue'] = max(self.stats['max_queue'], self.queue_length)
+            position = self.position(ticket)
+            logging.info(f"⏳ Запрос к {model} в очереди: перед ним {position}, выполняется {self.in_flight}")
+            if on_queued is not None:
+                try:
+                    await on_queued(position)
+                except Exception as e:
+                    logging.warning(f"⚠️ Не удалось сообщить о месте в очереди: {e}")
+
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            if ticket.future.done() and not ticket.future.cancelled():
+                self._release()  # место выдано одновременно с отменой
+            else:
+                ticket.future.cancel()
+                self._dispatch()
+            raise
+
+        wait = time.monotonic() - ticket.queued_at
+        self.stats['admitted'] += 1
+        self.stats['wait_total'] += wait
+        self.stats['wait_max'] = max(self.stats['wait_max'], wait)
+        try:
+            yield ticket
+        finally:
+            self._release()
+
+
+gpt_scheduler = GPTScheduler(GPT_MAX_CONCURRENT, GPT_RATE_LIMITS)
+
+
+def get_gpt_scheduler_stats() -> Dict[str, Any]:
+    """Очередь и ожидание запросов к GPT (время - в миллисекундах), остаток квоты моделей"""
+    stats = gpt_scheduler.stats
+    admitted = stats['admitted']
+    quota = {}
+    for model in (GPT_TEXT_MODEL, GPT_VISION_MODEL):
+        requests, tokens = gpt_scheduler.buckets(model)
+        requests.give_back(0)  # пополняем перед чтением
+        tokens.give_back(0)
+        quota[model] = {'requests': int(requests.level), 'tokens': int(tokens.level)}
+
+    return {
+        'admitted': admitted,
+        'queued': stats['queued'],
+        'max_queue': stats['max_queue'],
+        'wait_avg_ms': stats['wait_total'] / admitted * 1000 if admitted else 0.0,
+        'wait_max_ms': stats['wait_max'] * 1000,
+        'in_flight': gpt_scheduler.in_flight,
+        'queue_length': gpt_scheduler.queue_length,
+        'quota': quota,
+    }
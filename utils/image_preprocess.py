@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Подготовка фото еды перед GPT Vision: скачивание, уменьшение, detail
+"""
+import io
+import time
+import logging
+from contextlib import contextmanager
+from typing import NamedTuple, Optional, Sequence, Tuple, Any, Dict, Iterator, Union
+
+# Исправляем импорты для работы из main.py
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import PHOTO_MAX_EDGE, PHOTO_FORMAT, PHOTO_QUALITY, PHOTO_DETAIL, PHOTO_MAX_BYTES
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # без Pillow - фото как есть
+    Image = ImageOps = None
+
+DETAIL_LEVELS = ('low', 'high', 'auto')
+FORMATS = {'jpeg': ('JPEG', 'image/jpeg'), 'webp': ('WEBP', 'image/webp')}
+
+if PHOTO_DETAIL not in DETAIL_LEVELS:
+    logging.warning(f"⚠️ Неизвестный PHOTO_DETAIL={PHOTO_DETAIL}, используем auto")
+    PHOTO_DETAIL = 'auto'
+if PHOTO_FORMAT not in FORMATS:
+    logging.warning(f"⚠️ Неизвестный PHOTO_FORMAT={PHOTO_FORMAT}, используем jpeg")
+    PHOTO_FORMAT = 'jpeg'
+
+# detail=low: GPT Vision сам сжимает фото до 512x512
+_LOW_DETAIL_EDGE = 512
+
+_stats = {'photos': 0, 'resized': 0, 'passthrough': 0, 'bytes_in': 0, 'bytes_out': 0, 'seconds': 0.0,
+          'rejected': 0, 'in_flight': 0, 'in_flight_photos': 0, 'peak_in_flight': 0, 'max_photo_bytes': 0}
+
+
+class PhotoTooLarge(ValueError):
+    """Фото больше PHOTO_MAX_BYTES - не скачиваем"""
+
+
+class PreparedImage(NamedTuple):
+    """Фото для запроса: байты, MIME-тип, размер (0 - неизвестен) и detail"""
+    data: Union[bytes, bytearray]
+    mime_type: str
+    width: int
+    height: int
+    detail: str
+
+
+def target_edge() -> int:
+    """Длинная сторона фото для GPT Vision, 0 - без ограничения"""
+    if PHOTO_DETAIL == 'low':
+        return min(PHOTO_MAX_EDGE, _LOW_DETAIL_EDGE) if PHOTO_MAX_EDGE else _LOW_DETAIL_EDGE
+    return PHOTO_MAX_EDGE
+
+
+def choose_detail(width: int, height: int) -> str:
+    """detail запроса: PHOTO_DETAIL или (auto) low для фото не больше 512px"""
+    if PHOTO_DETAIL != 'auto':
+        return PHOTO_DETAIL
+    return 'low' if 0 < max(width, height) <= _LOW_DETAIL_EDGE else 'high'
+
+
+def pick_photo_size(photos: Sequence[Any], min_edge: Optional[int] = None) -> Any:
+    """Наименьший PhotoSize не меньше min_edge по длинной стороне
+
+    Telegram отдает размеры фото по возрастанию; если подходящего нет (или
+    ограничения нет) - самый большой.
+    """
+    min_edge = target_edge() if min_edge is None else min_edge
+    if min_edge:
+        for photo in photos:
+            if max(getattr(photo, 'width', 0) or 0, getattr(photo, 'height', 0) or 0) >= min_edge:
+                return photo
+    return photos[-1]
+
+
+async def download_photo(photo: Any, max_bytes: Optional[int] = None) -> bytearray:
+    """Фото из Telegram (PhotoSize) в память, без временного файла
+
+    Raises:
+        PhotoTooLarge: фото больше max_bytes (по умолчанию PHOTO_MAX_BYTES)
+    """
+    max_bytes = PHOTO_MAX_BYTES if max_bytes is None else max_bytes
+    # Размер известен заранее - большое фото даже не начинаем скачивать
+    _check_size(getattr(photo, 'file_size', None) or 0, max_bytes)
+    file = await photo.get_file()
+    _check_size(getattr(file, 'file_size', None) or 0, max_bytes)
+    data = await file.download_as_bytearray()
+    _check_size(len(data), max_bytes)
+    return data
+
+
+def _check_size(size: int, max_bytes: int) -> None:
+    if size > max_bytes:
+        _stats['rejected'] += 1
+        raise PhotoTooLarge(f"фото {size // 1024} КБ больше {max_bytes // 1024} КБ")
+
+
+@contextmanager
+def hold_photo(nbytes: int) -> Iterator[None]:
+    """Учитываем память фото, пока оно анализируется"""
+    _stats['in_flight'] += nbytes
+    _stats['in_flight_photos'] += 1
+    _stats['peak_in_flight'] = max(_stats['peak_in_flight'], _stats['in_flight'])
+    _stats['max_photo_bytes'] = max(_stats['max_photo_bytes'], nbytes)
+    try:
+        yield
+    finally:
+        _stats['in_flight'] -= nbytes
+        _stats['in_flight_photos'] -= 1
+
+
+def prepare_image(image_bytes: Union[bytes, bytearray], size: Tuple[int, int] = (0, 0)) -> PreparedImage:
+    """Уменьшенное и перекодированное без EXIF фото для GPT Vision
+
+    size - размер из Telegram, если известен: без Pillow по нему выбирается detail.
+    Фото, которое не удалось разобрать, отправляется как есть.
+    """
+    started = time.perf_counter()
+    prepared = _reencode(image_bytes) if Image is not None else None
+    if prepared is None:
+        _stats['passthrough'] += 1
+        # Без копии: скачанный буфер сразу идет в base64
+        prepared = PreparedImage(image_bytes, 'image/jpeg', size[0], size[1], choose_detail(*size))
+
+    _stats['photos'] += 1
+    _stats['bytes_in'] += len(image_bytes)
+    _stats['bytes_out'] += len(prepared.data)
+    _stats['seconds'] += time.perf_counter() - started
+    logging.info(
+        f"🖼 Фото для GPT: {len(image_bytes) // 1024} КБ -> {len(prepared.data) // 1024} КБ, "
+        f"{prepared.width}x{prepared.height}, detail={prepared.detail}"
+    )
+    return prepared
+
+
+def _reencode(image_bytes: Union[bytes, bytearray]) -> Optional[PreparedImage]:
+    edge = target_edge()
+    pil_format, mime_type = FORMATS[PHOTO_FORMAT]
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as source:
+            if edge:
+                # JPEG декодируется сразу в уменьшенном виде (не меньше edge) - в разы быстрее
+                source.draft('RGB', (edge, edge))
+            image = ImageOps.exif_transpose(source).convert('RGB')
+        if edge and max(image.size) > edge:
+            image.thumbnail((edge, edge), Image.LANCZOS)
+            _stats['resized'] += 1
+
+        buffer = io.BytesIO()
+        # exif не передаем - метаданные в новый файл не попадают
+        image.save(buffer, pil_format, quality=PHOTO_QUALITY)
+    except Exception as e:
+        logging.warning(f"⚠️ Не удалось подготовить фото, отправляем как есть: {e}")
+        return None
+
+    width, height = image.size
+    return PreparedImage(buffer.getvalue(), mime_type, width, height, choose_detail(width, height))
+
+
+def get_image_stats() -> Dict[str, Any]:
+    """Сколько фото подготовлено, объем до и после, время подготовки и память фото в анализе"""
+    photos = _stats['photos']
+    return {
+        **_stats,
+        'saved_ratio': 1 - _stats['bytes_out'] / _stats['bytes_in'] if _stats['bytes_in'] else 0.0,
+        'avg_ms': _stats['seconds'] / photos * 1000 if photos else 0.0,
+    }
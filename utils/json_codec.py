@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Компактная сериализация JSON для хранилища (orjson/msgspec, если установлены)
+"""
+import json
+from typing import Any, Union
+
+_json_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+try:
+    import orjson
+
+    BACKEND = 'orjson'
+    _fast_dumps = orjson.dumps
+    _fast_loads = orjson.loads
+    _fast_errors = (orjson.JSONDecodeError,)
+except ImportError:
+    try:
+        import msgspec
+
+        BACKEND = 'msgspec'
+        _fast_dumps = msgspec.json.Encoder().encode
+        _fast_loads = msgspec.json.Decoder().decode
+        _fast_errors = (msgspec.DecodeError,)
+    except ImportError:
+        BACKEND = 'json'
+        _fast_dumps = _fast_loads = None
+        _fast_errors = ()
+
+
+def dumps(obj: Any) -> bytes:
+    """Компактный JSON в UTF-8
+
+    Raises:
+        TypeError, ValueError: данные не сериализуются в JSON
+    """
+    if _fast_dumps is not None:
+        try:
+            return _fast_dumps(obj)
+        except (TypeError, ValueError, OverflowError):
+            pass  # Повторяем стандартным json: он сообщит настоящую ошибку
+    return _json_encoder.encode(obj).encode('utf-8')
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Разбор JSON (компактного или с отступами)
+
+    Raises:
+        json.JSONDecodeError: данные не являются JSON
+    """
+    if _fast_loads is not None:
+        try:
+            return _fast_loads(data)
+        except _fast_errors:
+            pass
+    return json.loads(data)
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Локальный расчет калорий для простых сообщений без запроса к GPT
+"""
+import re
+import logging
+from typing import Optional, Dict, Any, List, Set, Tuple
+
+# Исправляем импорты для работы из main.py
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from data.calorie_database import CALORIE_ROWS, TYPICAL_PORTIONS, FoodRow
+from utils.food_index import stem_words
+
+_MULTIPLE_ITEMS = re.compile(r'(?<!\d),|,(?!\d)|[+;/&]|\b(?:и|с|со|плюс)\b')  # "0,5 л" - не перечисление
+_NEGATION = re.compile(r'\b(?:не|нет|ни|без|безо|кроме|вместо)\b')
+_ABBREVIATIONS = ((re.compile(r'\bст\.?\s*л\.?'), ' столовая ложка '), (re.compile(r'\bч\.?\s*л\.?'), ' чайная ложка '))
+_MASS = re.compile(
+    r'(\d+(?:[.,]\d+)?)\s*(кг|килограмм\w*|грамм\w*|гр|г|миллилитр\w*|мл|литр\w*|л)(?![а-я])'
+)
+_MASS_UNITS = {'кг': 1000, 'килограмм': 1000, 'грамм': 1, 'гр': 1, 'г': 1,
+               'миллилитр': 1, 'мл': 1, 'литр': 1000, 'л': 1000}
+_PERCENT = re.compile(r'(\d+(?:[.,]\d+)?)\s*%')
+_NUMBER = re.compile(r'\d+(?:[.,]\d+)?')
+_NUMBER_WORDS = {'пол': 0.5, 'половина': 0.5, 'половинка': 0.5, 'один': 1, 'одна': 1, 'одно': 1,
+                 'два': 2, 'две': 2, 'три': 3, 'четыре': 4, 'пять': 5}
+_RANGE_KCAL = re.compile(r'=\s*\d+(?:[.,]\d+)?\s*-\s*\d')
+_MAX_COUNT = 20
+_MAX_GRAMS = 3000
+
+
+def _percent_tokens(text: str) -> Set[str]:
+    return {f"{value.replace(',', '.')}%" for value in _PERCENT.findall(text)}
+
+
+def _row_tokens(row: FoodRow) -> Set[str]:
+    return stem_words(row.name) | _percent_tokens(row.name)
+
+
+# Справочник и порции разбираются один раз при импорте. Строки с диапазоном
+# калорийности ("250-350ккал") локально не считаем - точность не та
+_ROWS: List[Tuple[FoodRow, Set[str]]] = [
+    (row, _row_tokens(row)) for row in CALORIE_ROWS if not _RANGE_KCAL.search(row.text)
+]
+_FOOD_STEMS = set().union(*(stem_words(row.name) for row in CALORIE_ROWS))
+_PORTIONS: List[Tuple[Set[str], Set[str], int]] = []
+for _key, _grams in TYPICAL_PORTIONS.items():
+    _stems = stem_words(_key.replace('_', ' '))
+    # "стакан", "бокал" - единицы измерения, "сока", "пива" - часть описания продукта
+    _PORTIONS.append((_stems, _stems - _FOOD_STEMS, _grams))
+
+_stats = {'local': 0, 'gpt': 0}
+
+
+def _parse_quantity(text: str) -> Tuple[Optional[float], Optional[float], str]:
+    """Вес в граммах (мл), количество штук и текст без них
+
+    Returns:
+        (граммы или None, штуки или None, остаток текста); штуки = -1,
+        если чисел несколько и количество неоднозначно
+    """
+    grams = None
+    mass = _MASS.search(text)
+    if mass:
+        unit = next(key for key in _MASS_UNITS if mass.group(2).startswith(key))
+        grams = float(mass.group(1).replace(',', '.')) * _MASS_UNITS[unit]
+        text = text[:mass.start()] + ' ' + text[mass.end():]
+
+    text = _PERCENT.sub(' ', text)
+    numbers = _NUMBER.findall(text)
+    words = [word for word in re.findall(r'[а-яa-z]+', text) if word in _NUMBER_WORDS]
+    if len(numbers) + len(words) > 1 or (mass and _MASS.search(text)):
+        return grams, -1, text
+
+    count = None
+    if numbers:
+        count = float(numbers[0].replace(',', '.'))
+        text = _NUMBER.sub(' ', text)
+    elif words:
+        count = _NUMBER_WORDS[words[0]]
+        text = re.sub(rf'\b{words[0]}\b', ' ', text)
+    return grams, count, text
+
+
+def _find_portion(stems: Set[str]) -> Tuple[Set[str], Optional[int]]:
+    """Типичная порция, все слова которой есть в описании
+
+    При нескольких подходящих берем ту, что покрывает больше слов, а при
+    равенстве - с явной единицей ("порция салата" важнее "греческий салат").
+    """
+    best = None
+    for key_stems, unit_stems, grams in _PORTIONS:
+        if key_stems <= stems:
+            rank = (len(key_stems), bool(unit_stems))
+            if best is None or rank > best[0]:
+                best = (rank, unit_stems, grams)
+    if best is None:
+        return set(), None
+    return best[1], best[2]
+
+
+def _find_row(tokens: Set[str]) -> Optional[FoodRow]:
+    """Единственная строка справочника, в названии которой есть все слова описания"""
+    candidates = [(row, row_tokens) for row, row_tokens in _ROWS if tokens <= row_tokens]
+    if len(candidates) > 1:
+        candidates = [(row, row_tokens) for row, row_tokens in candidates if row_tokens == tokens]
+    return candidates[0][0] if len(candidates) == 1 else None
+
+
+def _resolve(text: str) -> Optional[Dict[str, Any]]:
+    text = text.lower().replace('ё', 'е').strip()
+    if not text or _MULTIPLE_ITEMS.search(text) or _NEGATION.search(text):
+        return None
+    for pattern, replacement in _ABBREVIATIONS:
+        text = pattern.sub(replacement, text)
+
+    percents = _percent_tokens(text)
+    grams, count, rest = _parse_quantity(text)
+    # "2 банана 100г" - непонятно, 100г всего или на штуку
+    if count == -1 or (count is not None and (grams is not None or not 0 < count <= _MAX_COUNT)):
+        return None
+
+    stems = stem_words(rest)
+    if not stems:
+        return None
+    unit_stems, portion = _find_portion(stems)
+    row = _find_row((stems - unit_stems) | percents)
+    if row is None:
+        return None
+
+    if grams is None:
+        if portion is None:
+            return None
+        grams = portion * (count or 1)
+    if not 0 < grams <= _MAX_GRAMS:
+        return None
+
+    factor = grams / 100
+    return {
+        'product': row.name,
+        'grams': round(grams),
+        'calories': round(row.kcal * factor),
+        'protein': round(row.protein * factor, 1) if row.protein is not None else None,
+        'fat': round(row.fat * factor, 1) if row.fat is not None else None,
+        'carbs': round(row.carbs * factor, 1) if row.carbs is not None else None,
+    }
+
+
+def resolve_locally(text: str) -> Optional[Dict[str, Any]]:
+    """Калории и БЖУ по справочнику или None, если нужен GPT
+
+    Returns:
+        dict: product, grams, calories, protein, fat, carbs (БЖУ могут быть None)
+    """
+    result = _resolve(text)
+    _stats['local' if result else 'gpt'] += 1
+    if result:
+        logging.info(
+            f"⚡ Без GPT: '{text}' -> {result['product']} {result['grams']}г, {result['calories']} ккал "
+            f"(без GPT {get_local_resolver_stats()['bypass_ratio']:.0%} сообщений)"
+        )
+    return result
+
+
+def get_local_resolver_stats() -> Dict[str, Any]:
+    """Сколько описаний еды посчитано локально и какая доля обошлась без GPT"""
+    total = _stats['local'] + _stats['gpt']
+    return {**_stats, 'bypass_ratio': _stats['local'] / total if total else 0.0}
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Извлечение калорий и БЖУ из текстового ответа GPT за один проход
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+# "1 200" - с разделителем тысяч (пробел или неразрывный пробел)
+_NUM = r'\d+(?:(?<!\d{4})[ \u00a0]\d{3}(?!\d))*(?:[.,]\d+)?'
+
+
+def _cased(*words: str) -> str:
+    """Слова в нижнем регистре, с заглавной буквы и капсом
+
+    Вместо re.IGNORECASE: альтернативы, начинающиеся с обычной буквы, regex
+    отбрасывает по первому символу - разбор заметно быстрее.
+    """
+    variants = []
+    for word in words:
+        variants += [word, word[0].upper() + word[1:], word.upper()]
+    return '(?:' + '|'.join(dict.fromkeys(variants)) + ')'
+
+
+_MACROS = ('белк', 'белок', 'жир', 'углевод')
+
+# Величины ответа; альтернативы проверяются по порядку в каждой позиции.
+# Группы findall: граммы/ккал после числа, итог, подпись перед числом
+_TOKEN = re.compile(
+    # Число и единица после него: "450 ккал", "30 г белка", "13.5г жира", "25 грамм белка"
+    rf'({_NUM})(?:\s*({_cased("ккал", "калори")})'
+    rf'|[ \t]*(?:грамм|гр|г|g)?\.?[ \t]*({_cased(*_MACROS, "protein", "fat", "carb")}))'
+    # Подписи начинаются только с этих букв - в остальных позициях текста
+    # альтернативы ниже отбрасываются одной проверкой
+    r'|(?=[иИвВоОкКбБжЖуУpPfFcCлЛсС])(?:'
+    # "ИТОГО: 450" - число сразу после итога без единиц БЖУ считается калориями
+    rf'{_cased("итого")}:?\s*({_NUM})(?!\s*(?:г\b|гр\b|грамм|g\b|{_cased(*_MACROS)}))'
+    # Калории с подписью перед числом: "Всего 480 ккал", "Калории: 420"
+    rf'|{_cased("всего", "общая калорийность", "калорийность", "калории")}:?\s*({_NUM})'
+    # Название перед граммами: "Белки: 22 г", "жирность 10 грамм", "б: 35г"
+    rf'|({_cased(*_MACROS)}|[бжуБЖУ](?<![а-яёА-ЯЁa-zA-Z].)(?![а-яё]))[а-яё]*:?[ \t]*({_NUM})[ \t]*(?:грамм|г)'
+    # Без единиц: "protein: 30", "липиды 12"
+    rf'|({_cased("protein", "fat", "carb", "липид", "сахар")})[a-zа-яё]*:?[ \t]*({_NUM}))'
+)
+
+# Вид величины по первой букве названия
+_KINDS = {'б': 'protein', 'p': 'protein', 'ж': 'fat', 'f': 'fat', 'л': 'fat',
+          'у': 'carbs', 'c': 'carbs', 'с': 'carbs'}
+_GROUP_ORDER = ('calories', 'protein', 'fat', 'carbs')
+
+# Калории, когда ни одной величины с единицами нет (редкие формулировки)
+_KCAL_FALLBACK = [re.compile(pattern, re.IGNORECASE) for pattern in (
+    rf'=\s*({_NUM})', rf'составляет?\s*({_NUM})', rf'примерно\s*({_NUM})', rf'около\s*({_NUM})'
+)]
+_INTEGER = re.compile(r'\d+')
+
+# (вид, число как в тексте, подпись-итог) по порядку в ответе; в float
+# переводятся только выбранные значения
+Token = Tuple[str, str, bool]
+
+
+def _number(text: str) -> float:
+    return float(text.replace(' ', '').replace('\u00a0', '').replace(',', '.'))
+
+
+def tokenize(text: str) -> List[Token]:
+    """Все величины текста по порядку"""
+    tokens: List[Token] = []
+    for amount, unit, after, total, label_kcal, before, labeled, plain, plain_amount in _TOKEN.findall(text):
+        if amount:
+            tokens.append(('calories' if unit else _KINDS[after[0].lower()], amount, False))
+        elif total or label_kcal:
+            tokens.append(('calories', total or label_kcal, True))
+        elif labeled:
+            tokens.append((_KINDS[before[0].lower()], labeled, False))
+        else:
+            tokens.append((_KINDS[plain[0].lower()], plain_amount, False))
+    return tokens
+
+
+def _total_section(text: str) -> Optional[str]:
+    """Секция ИТОГО: от первого "итого" до пустой строки"""
+    start = text.lower().find('итого')
+    if start < 0:
+        return None
+    end = text.find('\n\n', start)
+    return text[start:] if end < 0 else text[start:end]
+
+
+def _groups(tokens: List[Token]) -> List[Dict[str, str]]:
+    """Полные группы "ккал, белок, жиры, углеводы" по порядку, без перекрытий"""
+    groups = []
+    current: Dict[str, str] = {}
+    for kind, value, _ in tokens:
+        if kind == _GROUP_ORDER[len(current)]:
+            current[kind] = value
+            if len(current) == len(_GROUP_ORDER):
+                groups.append(current)
+                current = {}
+    return groups
+
+
+def _last_values(tokens: List[Token]) -> Dict[str, Optional[str]]:
+    """Последняя величина каждого вида; для калорий подписанное итоговое значение важнее"""
+    result: Dict[str, Optional[str]] = dict.fromkeys(_GROUP_ORDER)
+    labeled_kcal = None
+    for kind, value, labeled in tokens:
+        result[kind] = value
+        if labeled:
+            labeled_kcal = value
+    if labeled_kcal is not None:
+        result['calories'] = labeled_kcal
+    return result
+
+
+def _fallback_calories(text: str) -> Optional[str]:
+    text = text.strip()
+    if text.replace('.', '').replace(',', '').isdigit():
+        return text
+    for pattern in _KCAL_FALLBACK:
+        matches = pattern.findall(text)
+        if matches:
+            return matches[-1]
+    numbers = [x for x in _INTEGER.findall(text) if int(x) > 10]
+    return numbers[-1] if numbers else None
+
+
+def _result(values: Dict[str, Optional[str]]) -> Dict[str, Optional[float]]:
+    result = {kind: _number(value) if value is not None else None for kind, value in values.items()}
+    if result['calories'] is not None:
+        result['calories'] = int(result['calories'])
+    return result
+
+
+def extract_nutrition(response_text: str) -> Dict[str, Optional[float]]:
+    """Калории и БЖУ из ответа GPT: {'calories', 'protein', 'fat', 'carbs'}, None - не найдено"""
+    section = _total_section(response_text)
+    if section is not None:
+        tokens = tokenize(section)
+        groups = _groups(tokens)
+        if groups:
+            return _result(groups[0])
+        values = _last_values(tokens)
+        if not tokens:
+            values['calories'] = _fallback_calories(section[len('итого'):].lstrip(':'))
+        if values['calories'] and _number(values['calories']):
+            return _result(values)
+
+    tokens = tokenize(response_text)
+    groups = _groups(tokens)
+    if groups:
+        return _result(groups[-1])
+
+    values = _last_values(tokens)
+    if values['calories'] is None:
+        values['calories'] = _fallback_calories(response_text)
+    return _result(values)
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Пулы HTTP-соединений с OpenAI: отдельные клиенты для текста и фото
+"""
+import sys
+import time
+import logging
+import importlib.util
+from contextlib import asynccontextmanager
+from typing import Dict, Any
+
+# Исправляем импорты для работы из main.py
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import (
+    OPENAI_API_KEY, GPT_TEXT_MODEL, GPT_VISION_MODEL, OPENAI_HTTP2, OPENAI_POOL_KEEPALIVE,
+    OPENAI_CONNECT_TIMEOUT, OPENAI_TEXT_MAX_CONNECTIONS, OPENAI_TEXT_TIMEOUT,
+    OPENAI_VISION_MAX_CONNECTIONS, OPENAI_VISION_TIMEOUT
+)
+
+try:
+    import httpx  # Зависимость openai
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient, Timeout
+    OPENAI_AVAILABLE = True
+except ImportError:
+    OPENAI_AVAILABLE = False
+
+HTTP2_ENABLED = OPENAI_HTTP2 == 'on' or (OPENAI_HTTP2 == 'auto' and importlib.util.find_spec('h2') is not None)
+
+
+class OpenAIPool:
+    """Клиент AsyncOpenAI со своим пулом соединений и счетчиками занятости"""
+
+    def __init__(self, name: str, model: str, max_connections: int, timeout: float):
+        self.name = name
+        self.model = model
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.in_flight = 0
+        self.stats = {'requests': 0, 'saturated': 0, 'peak_in_flight': 0, 'prewarm_ms': None}
+        self._client = None
+
+    @property
+    def client(self):
+        """Клиент создается при первом обращении"""
+        if self._client is None:
+            if not OPENAI_AVAILABLE:
+                raise Exception("OpenAI library not available")
+            http_client = DefaultAsyncHttpxClient(
+                http2=HTTP2_ENABLED,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=OPENAI_POOL_KEEPALIVE
+                )
+            )
+            # Повторы делает ask_gpt (utils/retry_policy.py) - у SDK свои отключены
+            self._client = AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=http_client, max_retries=0,
+                                       timeout=Timeout(self.timeout, connect=OPENAI_CONNECT_TIMEOUT))
+            logging.info(
+                f"🔌 Пул OpenAI '{self.name}': до {self.max_connections} соединений, "
+                f"keep-alive {OPENAI_POOL_KEEPALIVE} с, HTTP/2 {'✅' if HTTP2_ENABLED else '❌'}"
+            )
+        return self._client
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Клиент на время запроса; учитываем занятость пула"""
+        client = self.client
+        if self.in_flight >= self.max_connections:
+            # Все соединения заняты - запрос ждет освободившееся
+            self.stats['saturated'] += 1
+        self.in_flight += 1
+        self.stats['requests'] += 1
+        self.stats['peak_in_flight'] = max(self.stats['peak_in_flight'], self.in_flight)
+        try:
+            yield client
+        finally:
+            self.in_flight -= 1
+
+    async def prewarm(self) -> bool:
+        """Открываем соединение заранее бесплатным запросом описания модели"""
+        started = time.perf_counter()
+        try:
+            async with self.acquire() as client:
+                await client.models.retrieve(self.model, timeout=OPENAI_CONNECT_TIMEOUT * 2)
+        except Exception as e:
+            logging.warning(f"⚠️ Не удалось прогреть пул OpenAI '{self.name}': {type(e).__name__} - {e}")
+            return False
+
+        self.stats['prewarm_ms'] = (time.perf_counter() - started) * 1000
+        logging.info(f"🔥 Пул OpenAI '{self.name}' прогрет за {self.stats['prewarm_ms']:.0f} мс")
+        return True
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+text_pool = OpenAIPool('text', GPT_TEXT_MODEL, OPENAI_TEXT_MAX_CONNECTIONS, OPENAI_TEXT_TIMEOUT)
+vision_pool = OpenAIPool('vision', GPT_VISION_MODEL, OPENAI_VISION_MAX_CONNECTIONS, OPENAI_VISION_TIMEOUT)
+_pools = (text_pool, vision_pool)
+
+
+def get_pool(has_image: bool) -> OpenAIPool:
+    """Пул для запроса: с фото - vision, иначе - text"""
+    return vision_pool if has_image else text_pool
+
+
+async def prewarm_openai_pools() -> int:
+    """Прогреваем все пулы при запуске бота. Возвращает число прогретых"""
+    warmed = 0
+    for pool in _pools:
+        warmed += await pool.prewarm()
+    return warmed
+
+
+async def close_openai_pools() -> None:
+    for pool in _pools:
+        await pool.close()
+
+
+def get_openai_pool_stats() -> Dict[str, Dict[str, Any]]:
+    """Занятость пулов: запросы в полете, пик, насыщение (доля запросов, ждавших соединение)"""
+    stats = {}
+    for pool in _pools:
+        pool_stats = dict(pool.stats)
+        pool_stats['in_flight'] = pool.in_flight
+        pool_stats['max_connections'] = pool.max_connections
+        pool_stats['utilization'] = pool.in_flight / pool.max_connections if pool.max_connections else 0.0
+        requests = pool_stats['requests']
+        pool_stats['saturation'] = pool_stats['saturated'] / requests if requests else 0.0
+        pool_stats['http2'] = HTTP2_ENABLED
+        stats[pool.name] = pool_stats
+    return stats
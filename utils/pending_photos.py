@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+Фото, ожидающие подтверждения или уточнения
+"""
+import os
+import time
+import secrets
+import logging
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Dict, Any, Optional
+
+# Исправляем импорты для работы из main.py
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import PENDING_PHOTO_TTL, PENDING_PHOTO_MAX_ENTRIES, PENDING_PHOTO_MAX_MEMORY, PENDING_PHOTO_DIR
+from utils.user_data import run_in_storage_thread
+
+
+class PendingPhoto(NamedTuple):
+    """Фото, ожидающее ответа пользователя (без самого изображения)"""
+    user_id: str
+    created: float
+    mime_type: str
+    detail: Optional[str]
+    analysis: Dict[str, Any]
+
+
+class _Entry:
+    __slots__ = ('photo', 'image', 'size')
+
+    def __init__(self, photo: PendingPhoto, image: str):
+        self.photo = photo
+        self.image: Optional[str] = image  # None - сброшено на диск
+        self.size = len(image)
+
+
+class PendingPhotoStore:
+    """Фото пользователей до подтверждения: TTL, лимит числа и памяти, сброс на диск"""
+
+    def __init__(self, ttl: float, max_entries: int, max_memory: int, spill_dir: str):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_memory = max_memory
+        self.spill_dir = spill_dir
+        self.stats = {'stores': 0, 'spilled': 0, 'loaded': 0, 'expired': 0, 'evicted': 0}
+        self._entries: 'OrderedDict[str, _Entry]' = OrderedDict()  # по времени добавления
+        self._memory = 0
+        self._spill_ready = False
+        self._lock = threading.Lock()
+
+    def put(self, user_id: str, image_base64: str, mime_type: str = 'image/jpeg',
+            detail: Optional[str] = None, analysis: Optional[Dict[str, Any]] = None) -> str:
+        """Сохраняем фото и возвращаем его короткий id для user_data"""
+        photo_id = secrets.token_urlsafe(6)
+        photo = PendingPhoto(user_id, time.time(), mime_type, detail, dict(analysis or {}))
+        with self._lock:
+            self._purge(photo.created)
+            entry = self._entries[photo_id] = _Entry(photo, image_base64)
+            self._memory += entry.size
+            self.stats['stores'] += 1
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.stats['evicted'] += 1
+            self._spill()
+        return photo_id
+
+    def get(self, photo_id: Optional[str], user_id: Optional[str] = None) -> Optional[PendingPhoto]:
+        """Данные фото (без изображения) или None: нет, истекло или чужое"""
+        with self._lock:
+            entry = self._live_entry(photo_id, user_id)
+            return entry.photo if entry else None
+
+    def image(self, photo_id: Optional[str], user_id: Optional[str] = None) -> Optional[str]:
+        """base64 фото - из памяти или с диска"""
+        with self._lock:
+            entry = self._live_entry(photo_id, user_id)
+            if entry is None:
+                return None
+            if entry.image is not None:
+                return entry.image
+            try:
+                with open(self._path(photo_id), 'r', encoding='ascii') as f:
+                    self.stats['loaded'] += 1
+                    return f.read()
+            except OSError as e:
+                logging.warning(f"⚠️ Не удалось прочитать отложенное фото {photo_id}: {e}")
+                return None
+
+    def update_analysis(self, photo_id: Optional[str], analysis: Dict[str, Any]) -> None:
+        """Новый результат анализа того же фото (после уточнения)"""
+        with self._lock:
+            entry = self._entries.get(photo_id) if photo_id else None
+            if entry is not None:
+                entry.photo = entry.photo._replace(analysis=dict(analysis))
+
+    def discard(self, photo_id: Optional[str]) -> None:
+        """Забываем фото (подтверждено, уточнено или заменено новым)"""
+        if photo_id is None:
+            return
+        with self._lock:
+            if photo_id in self._entries:
+                self._remove(photo_id)
+
+    # Сброс на диск, чтение и удаление файлов - в пуле потоков хранилища, не в event loop
+
+    async def put_async(self, user_id: str, image_base64: str, mime_type: str = 'image/jpeg',
+                        detail: Optional[str] = None, analysis: Optional[Dict[str, Any]] = None) -> str:
+        return await run_in_storage_thread(self.put, user_id, image_base64, mime_type, detail, analysis)
+
+    async def get_async(self, photo_id: Optional[str], user_id: Optional[str] = None) -> Optional[PendingPhoto]:
+        return await run_in_storage_thread(self.get, photo_id, user_id)
+
+    async def image_async(self, photo_id: Optional[str], user_id: Optional[str] = None) -> Optional[str]:
+        return await run_in_storage_thread(self.image, photo_id, user_id)
+
+    async def discard_async(self, photo_id: Optional[str]) -> None:
+        if photo_id is not None:
+            await run_in_storage_thread(self.discard, photo_id)
+
+    def memory_bytes(self) -> int:
+        return self._memory
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            for photo_id in list(self._entries):
+                self._remove(photo_id)
+
+    def _live_entry(self, photo_id: Optional[str], user_id: Optional[str]) -> Optional[_Entry]:
+        self._purge(time.time())
+        entry = self._entries.get(photo_id) if photo_id else None
+        if entry is None or (user_id is not None and entry.photo.user_id != user_id):
+            return None
+        return entry
+
+    def _purge(self, now: float) -> None:
+        # Записи упорядочены по времени добавления - истекшие в начале
+        while self._entries:
+            photo_id, entry = next(iter(self._entries.items()))
+            if now - entry.photo.created <= self.ttl:
+                break
+            self._remove(photo_id)
+            self.stats['expired'] += 1
+
+    def _spill(self) -> None:
+        """Самые старые фото - на диск, пока память не в пределах лимита"""
+        for photo_id, entry in self._entries.items():
+            if self._memory <= self.max_memory:
+                return
+            if entry.image is None:
+                continue
+            try:
+                self._prepare_spill_dir()
+                with open(self._path(photo_id), 'w', encoding='ascii') as f:
+                    f.write(entry.image)
+            except OSError as e:
+                logging.warning(f"⚠️ Не удалось сбросить фото на диск, держим в памяти: {e}")
+                return
+            entry.image = None
+            self._memory -= entry.size
+            self.stats['spilled'] += 1
+
+    def _remove(self, photo_id: str) -> None:
+        entry = self._entries.pop(photo_id)
+        if entry.image is not None:
+            self._memory -= entry.size
+            return
+        try:
+            os.remove(self._path(photo_id))
+        except OSError:
+            pass
+
+    def _prepare_spill_dir(self) -> None:
+        if self._spill_ready:
+            return
+        os.makedirs(self.spill_dir, exist_ok=True)
+        # Файлы прошлого запуска недостижимы: их id жили только в памяти
+        for name in os.listdir(self.spill_dir):
+            if name.endswith('.b64'):
+                os.remove(os.path.join(self.spill_dir, name))
+        self._spill_ready = True
+
+    def _path(self, photo_id: str) -> str:
+        return os.path.join(self.spill_dir, f'{photo_id}.b64')
+
+
+pending_photos = PendingPhotoStore(PENDING_PHOTO_TTL, PENDING_PHOTO_MAX_ENTRIES,
+                                   PENDING_PHOTO_MAX_MEMORY, PENDING_PHOTO_DIR)
+
+
+def get_pending_photo_stats() -> Dict[str, Any]:
+    """Сколько фото ждут ответа, сколько из них в памяти и на диске"""
+    return {**pending_photos.stats, 'entries': len(pending_photos), 'memory_bytes': pending_photos.memory_bytes()}
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Кэш результатов анализа фото по перцептивному хэшу
+"""
+import io
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, Any, Optional
+
+# Исправляем импорты для работы из main.py
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import PHOTO_CACHE_WINDOW, PHOTO_CACHE_MAX_DISTANCE, PHOTO_CACHE_PER_USER, PHOTO_CACHE_MAX_USERS
+
+try:
+    from PIL import Image
+except ImportError:  # без Pillow - только точные повторы
+    Image = None
+
+_HASH_SIZE = 8
+
+
+def dhash(image_bytes: bytes) -> Optional[int]:
+    """64-битный dHash изображения или None (нет Pillow, битый файл)"""
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            # JPEG декодируется сразу в уменьшенном виде - в разы быстрее полного
+            image.draft('L', (_HASH_SIZE * 4, _HASH_SIZE * 4))
+            pixels = list(image.convert('L').resize((_HASH_SIZE + 1, _HASH_SIZE)).getdata())
+    except Exception as e:
+        logging.warning(f"⚠️ Не удалось посчитать хэш фото: {e}")
+        return None
+
+    value = 0
+    for row in range(_HASH_SIZE):
+        offset = row * (_HASH_SIZE + 1)
+        for col in range(_HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(first: int, second: int) -> int:
+    """Число различающихся бит двух хэшей (int.bit_count есть только с Python 3.10)"""
+    return bin(first ^ second).count('1')
+
+
+class PhotoAnalysisCache:
+    """Последние результаты анализа фото каждого пользователя"""
+
+    def __init__(self, window: float, max_distance: int, per_user: int, max_users: int):
+        self.window = window
+        self.max_distance = max_distance
+        self.per_user = per_user
+        self.max_users = max_users
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        self._users: 'OrderedDict[str, deque]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.per_user > 0
+
+    def get(self, user_id: str, photo_hash: Optional[int],
+            file_unique_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Результат анализа похожего фото пользователя или None"""
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        with self._lock:
+            photos = self._users.get(user_id, ())
+            for stored_at, stored_hash, stored_file_id, result in reversed(photos):
+                if now - stored_at > self.window:
+                    break  # дальше только более старые
+                same_file = file_unique_id is not None and file_unique_id == stored_file_id
+                similar = (photo_hash is not None and stored_hash is not None
+                           and hamming_distance(photo_hash, stored_hash) <= self.max_distance)
+                if same_file or similar:
+                    self._users.move_to_end(user_id)
+                    self.stats['hits'] += 1
+                    return dict(result)
+
+            self.stats['misses'] += 1
+            return None
+
+    def put(self, user_id: str, photo_hash: Optional[int], file_unique_id: Optional[str],
+            result: Dict[str, Any]) -> None:
+        """Запоминаем успешный анализ фото"""
+        if not self.enabled or (photo_hash is None and file_unique_id is None):
+            return
+
+        with self._lock:
+            photos = self._users.get(user_id)
+            if photos is None:
+                photos = self._users[user_id] = deque(maxlen=self.per_user)
+            self._users.move_to_end(user_id)
+            photos.append((time.time(), photo_hash, file_unique_id, dict(result)))
+            self.stats['stores'] += 1
+
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._users.clear()
+
+
+photo_cache = PhotoAnalysisCache(PHOTO_CACHE_WINDOW, PHOTO_CACHE_MAX_DISTANCE,
+                                 PHOTO_CACHE_PER_USER, PHOTO_CACHE_MAX_USERS)
+
+
+def get_photo_cache_stats() -> Dict[str, Any]:
+    """Попадания, промахи и доля попаданий кэша анализа фото"""
+    stats = dict(photo_cache.stats)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+    stats['perceptual'] = Image is not None
+    return stats
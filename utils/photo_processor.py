@@ -4,7 +4,7 @@
 """
 import re
 import logging
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Callable, Awaitable
 
 # Исправляем импорты для работы из main.py
 import sys
@@ -13,133 +13,154 @@ sys.path.append(str(Path(__file__).parent.parent))
 
 from utils.calorie_calculator import ask_gpt, extract_nutrition_smart, validate_calorie_result
 from utils.nutrition_validator import validate_nutrition_data
-from data.calorie_database import CALORIE_DATABASE
+from utils.prompt_builder import build_food_photo_messages, build_photo_correction_messages
+from utils.structured_output import RESPONSE_FORMAT, parse_nutrition_json, nutrition_totals, describe_items
+from config import GPT_STRUCTURED_OUTPUT
 
 
-async def analyze_food_photo(image_base64: str) -> Dict[str, Any]:
-    """Анализирует фото еды через GPT Vision"""
-    prompt = f"""Проанализируй фото еды и рассчитай калорийность.
+async def analyze_food_photo(image_base64: str, user_id: Optional[str] = None,
+                             on_queued: Optional[Callable[[int], Awaitable[None]]] = None,
+                             on_text: Optional[Callable[[str], Awaitable[None]]] = None,
+                             mime_type: str = 'image/jpeg', detail: Optional[str] = None) -> Dict[str, Any]:
+    """Анализирует фото еды через GPT Vision
 
-⚠️ ВАЖНО: 
-- Если на фото НЕСКОЛЬКО блюд - посчитай КАЖДОЕ ОТДЕЛЬНО
-- Игнорируй посторонние предметы (таблетки, салфетки). Анализируй ТОЛЬКО ЕДУ
+    on_text получает разбор по мере генерации (см. ask_gpt); итог извлекается
+    из полного ответа, как и без потока. С GPT_STRUCTURED_OUTPUT ответ - JSON
+    (utils/structured_output.py), текстовый ответ разбирается как раньше.
+    mime_type и detail - фото после utils/image_preprocess.py.
+    """
+    messages = build_food_photo_messages(image_base64, mime_type=mime_type, detail=detail)
 
-📋 ФОРМАТ ОТВЕТА:
-
-Если НЕСКОЛЬКО блюд:
-На фото:
-1. [Название блюда 1] ~[вес]г - [ккал] ккал, [Б]г белка, [Ж]г жира, [У]г углеводов
-2. [Название блюда 2] ~[вес]г - [ккал] ккал, [Б]г белка, [Ж]г жира, [У]г углеводов
-
-ИТОГО: [сумма ккал] ккал, [сумма Б]г белка, [сумма Ж]г жира, [сумма У]г углеводов
-
-Если ОДНО блюдо:
-На фото [название блюда] ~[вес]г
-
-ИТОГО: [ккал] ккал, [Б]г белка, [Ж]г жира, [У]г углеводов
-
-📊 СПРАВОЧНИК КАЛОРИЙНОСТИ (на 100г):
-{CALORIE_DATABASE}
-
-🔴 ДОПОЛНИТЕЛЬНО:
-• Макароны вареные: 112 ккал, 3.5г Б, 0.4г Ж, 23г У
-• Котлета мясная жареная: 250 ккал, 17г Б, 18г Ж, 5г У  
-• Салат с майонезом: 180-220 ккал, 5г Б, 15г Ж, 8г У
-• Пиво 500мл: 210 ккал, 1.5г Б, 0г Ж, 17г У
+    try:
+        response = await ask_gpt(messages, user_id=user_id, on_queued=on_queued, on_text=on_text,
+                                 response_format=RESPONSE_FORMAT if GPT_STRUCTURED_OUTPUT else None)
+        logging.info(f"GPT photo analysis response: {response}")
+        return photo_result_from_response(response)
 
-⚠️ ТИПИЧНЫЕ ПОРЦИИ:
-• Тарелка салата: 200-300г
-• Порция гарнира: 150-200г
-• Котлета: 80-100г (2 шт = 160-200г)
-• Бокал пива: 500мл
+    except Exception as e:
+        logging.error(f"Error analyzing photo: {e}")
+        return {'error': f'Ошибка анализа фото: {str(e)}'}
 
-🚨 ОБЯЗАТЕЛЬНО укажи ИТОГО с ПОЛНЫМИ БЖУ в формате:
-ИТОГО: XXX ккал, XXг белка, XXг жира, XXг углеводов
 
-Если что-то неясно - задай ОДИН вопрос с "ВОПРОС:".
-"""
+async def reanalyze_food_photo(analysis: Dict[str, Any], correction: str, image_base64: Optional[str] = None,
+                               user_id: Optional[str] = None,
+                               on_queued: Optional[Callable[[int], Awaitable[None]]] = None,
+                               on_text: Optional[Callable[[str], Awaitable[None]]] = None,
+                               mime_type: str = 'image/jpeg', detail: Optional[str] = None) -> Dict[str, Any]:
+    """Пересчитывает прошлый разбор фото с уточнением пользователя
 
-    messages = [{
-        'role': 'user',
-        'content': [
-            {'type': 'text', 'text': prompt},
-            {'type': 'image_url', 'image_url': {'url': f'data:image/jpeg;base64,{image_base64}'}}
-        ]
-    }]
+    Короткий запрос: прошлый разбор (analysis - результат analyze_food_photo)
+    и уточнение, без полного справочника; фото (image_base64) нужно, только
+    если разбора нет. Результат - в формате analyze_food_photo.
+    """
+    messages = build_photo_correction_messages(analysis, correction, image_base64,
+                                               mime_type=mime_type, detail=detail)
 
     try:
-        response = await ask_gpt(messages)
-        logging.info(f"GPT photo analysis response: {response}")
+        response = await ask_gpt(messages, user_id=user_id, on_queued=on_queued, on_text=on_text,
+                                 response_format=RESPONSE_FORMAT if GPT_STRUCTURED_OUTPUT else None)
+        logging.info(f"GPT photo correction response: {response}")
+        return photo_result_from_response(response)
 
-        # Проверяем на отказ GPT (только если явный отказ без расчетов)
-        refusal_phrases = ['извините', 'не могу', 'невозможно', 'не в состоянии']
-        has_refusal = any(phrase in response.lower() for phrase in refusal_phrases)
-        has_calculations = 'ккал' in response.lower() or 'калор' in response.lower()
-        
-        # Возвращаем ошибку только если есть отказ И нет расчетов
-        if has_refusal and not has_calculations:
-            logging.warning(f"GPT refused to analyze photo: {response[:200]}")
-            return {'error': 'GPT не может проанализировать фото'}
-
-        # Проверяем, задал ли GPT вопрос
-        if "ВОПРОС:" in response:
-            question = response.replace("ВОПРОС:", "").strip()
-            return {'question': question}
-
-        # Извлекаем калории, белок и описание
-        nutrition = extract_nutrition_smart(response)
-        description = extract_description_from_photo_response(response)
-
-        # Логируем извлеченные данные
-        logging.info(f"📊 Извлечено из GPT: калории={nutrition['calories']}, белки={nutrition['protein']}, жиры={nutrition['fat']}, углеводы={nutrition['carbs']}")
-        logging.info(f"📝 Описание: {description}")
-
-        # Если не удалось извлечь калории, но есть текст - пробуем альтернативные методы
-        if not nutrition['calories'] and response:
-            logging.warning(f"❌ Не удалось извлечь калории стандартным способом. Полный ответ GPT:\n{response}")
-            # Пробуем найти ИТОГО вручную
-            itogo_match = re.search(r'ИТОГО[:\s]+(\d+)\s*ккал', response, re.IGNORECASE)
-            if itogo_match:
-                nutrition['calories'] = int(itogo_match.group(1))
-                logging.info(f"✅ Нашли калории через ИТОГО: {nutrition['calories']}")
-
-        # Валидируем данные
-        logging.info(f"🔍 НАЧАЛО ВАЛИДАЦИИ для '{description}'")
-        logging.info(f"🔍 Исходные данные: {nutrition}")
-
-        if nutrition['calories'] or nutrition['protein']:
-            nutrition = validate_nutrition_data(nutrition, description)
-            logging.info(f"🔍 После валидации: {nutrition}")
-
-        if nutrition['calories'] and description:
-            # validate_nutrition_data уже проверил и исправил калории на основе БЖУ
-            # Дополнительная валидация НЕ нужна, она может испортить правильное значение
-            logging.info(f"🔍 Финальная калорийность: {nutrition['calories']} ккал")
-            result = {
-                'description': description,
-                'calories': nutrition['calories'],  # Используем откалиброванное значение
-                'success': True
-            }
-
-            # Добавляем все БЖУ если найдены
-            if nutrition['protein'] is not None:
-                result['protein'] = round(nutrition['protein'], 1)
-            if nutrition['fat'] is not None:
-                result['fat'] = round(nutrition['fat'], 1)
-            if nutrition['carbs'] is not None:
-                result['carbs'] = round(nutrition['carbs'], 1)
+    except Exception as e:
+        logging.error(f"Error re-analyzing photo: {e}")
+        return {'error': f'Ошибка уточнения фото: {str(e)}'}
 
-            return result
-        else:
-            logging.error(f"❌ КРИТИЧЕСКАЯ ОШИБКА: Не удалось извлечь данные.\nОтвет GPT:\n{response}")
-            return {
-                'error': 'Не удалось распознать блюдо. Попробуйте описать его текстом.',
-                'debug_response': response[:500]  # Для отладки
-            }
 
-    except Exception as e:
-        logging.error(f"Error analyzing photo: {e}")
-        return {'error': f'Ошибка анализа фото: {str(e)}'}
+def photo_result_from_response(response: str) -> Dict[str, Any]:
+    """Результат анализа фото из ответа GPT: JSON по схеме или текст"""
+    data = parse_nutrition_json(response)
+    if data is not None:
+        return _photo_result_from_json(data)
+
+    # Проверяем на отказ GPT (только если явный отказ без расчетов)
+    refusal_phrases = ['извините', 'не могу', 'невозможно', 'не в состоянии']
+    has_refusal = any(phrase in response.lower() for phrase in refusal_phrases)
+    has_calculations = 'ккал' in response.lower() or 'калор' in response.lower()
+    
+    # Возвращаем ошибку только если есть отказ И нет расчетов
+    if has_refusal and not has_calculations:
+        logging.warning(f"GPT refused to analyze photo: {response[:200]}")
+        return {'error': 'GPT не может проанализировать фото'}
+
+    # Проверяем, задал ли GPT вопрос
+    if "ВОПРОС:" in response:
+        question = response.replace("ВОПРОС:", "").strip()
+        return {'question': question}
+
+    # Извлекаем калории, белок и описание
+    nutrition = extract_nutrition_smart(response)
+    description = extract_description_from_photo_response(response)
+
+    # Логируем извлеченные данные
+    logging.info(f"📊 Извлечено из GPT: калории={nutrition['calories']}, белки={nutrition['protein']}, жиры={nutrition['fat']}, углеводы={nutrition['carbs']}")
+    logging.info(f"📝 Описание: {description}")
+
+    # Если не удалось извлечь калории, но есть текст - пробуем альтернативные методы
+    if not nutrition['calories'] and response:
+        logging.warning(f"❌ Не удалось извлечь калории стандартным способом. Полный ответ GPT:\n{response}")
+        # Пробуем найти ИТОГО вручную
+        itogo_match = re.search(r'ИТОГО[:\s]+(\d+)\s*ккал', response, re.IGNORECASE)
+        if itogo_match:
+            nutrition['calories'] = int(itogo_match.group(1))
+            logging.info(f"✅ Нашли калории через ИТОГО: {nutrition['calories']}")
+
+    # Валидируем данные
+    logging.info(f"🔍 НАЧАЛО ВАЛИДАЦИИ для '{description}'")
+    logging.info(f"🔍 Исходные данные: {nutrition}")
+
+    if nutrition['calories'] or nutrition['protein']:
+        nutrition = validate_nutrition_data(nutrition, description)
+        logging.info(f"🔍 После валидации: {nutrition}")
+
+    if nutrition['calories'] and description:
+        # validate_nutrition_data уже проверил и исправил калории на основе БЖУ
+        # Дополнительная валидация НЕ нужна, она может испортить правильное значение
+        logging.info(f"🔍 Финальная калорийность: {nutrition['calories']} ккал")
+        result = {
+            'description': description,
+            'calories': nutrition['calories'],  # Используем откалиброванное значение
+            'success': True
+        }
+
+        # Добавляем все БЖУ если найдены
+        if nutrition['protein'] is not None:
+            result['protein'] = round(nutrition['protein'], 1)
+        if nutrition['fat'] is not None:
+            result['fat'] = round(nutrition['fat'], 1)
+        if nutrition['carbs'] is not None:
+            result['carbs'] = round(nutrition['carbs'], 1)
+
+        return result
+    else:
+        logging.error(f"❌ КРИТИЧЕСКАЯ ОШИБКА: Не удалось извлечь данные.\nОтвет GPT:\n{response}")
+        return {
+            'error': 'Не удалось распознать блюдо. Попробуйте описать его текстом.',
+            'debug_response': response[:500]  # Для отладки
+        }
+
+
+def _photo_result_from_json(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Результат анализа фото из JSON-ответа GPT (тот же формат, что у текстового разбора)"""
+    if data['question']:
+        return {'question': data['question']}
+
+    nutrition = nutrition_totals(data)
+    if not data['items'] or not nutrition['calories']:
+        logging.warning(f"GPT не нашел еду на фото: {data}")
+        return {'error': 'GPT не может проанализировать фото'}
+
+    description = describe_items(data['items'])
+    nutrition = validate_nutrition_data(nutrition, description)
+    logging.info(f"📊 Из JSON-ответа GPT: {description} - {nutrition}")
+
+    # items - разбор по блюдам, основа для уточнения (reanalyze_food_photo)
+    result = {'description': description, 'calories': nutrition['calories'], 'success': True,
+              'items': data['items']}
+    for key in ('protein', 'fat', 'carbs'):
+        if nutrition[key] is not None:
+            result[key] = round(nutrition[key], 1)
+    return result
 
 
 def extract_calories_from_photo_response(response: str) -> Optional[int]:
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Сообщение Telegram, которое показывает ответ GPT по мере генерации
+"""
+import time
+import logging
+from collections import deque
+from typing import Dict, Any, Optional, Callable, Awaitable
+
+# Исправляем импорты для работы из main.py
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import STREAM_EDIT_INTERVAL
+
+# Сообщение Telegram - до 4096 символов; показываем конец ответа
+_MAX_SHOWN = 3500
+_RECENT = 1000
+
+_stats = {'streams': 0, 'edits': 0, 'skipped': 0, 'edit_errors': 0}
+_first_feedback: deque = deque(maxlen=_RECENT)
+
+
+class ProgressMessage:
+    """Обновляемое сообщение с текстом ответа GPT"""
+
+    def __init__(self, header: str, message=None,
+                 reply: Optional[Callable[[str], Awaitable[Any]]] = None,
+                 started: Optional[float] = None, interval: float = STREAM_EDIT_INTERVAL,
+                 min_delay: float = 0.0, render: Optional[Callable[[str], str]] = None):
+        """
+        Args:
+            header: Первая строка сообщения ("🔍 Анализирую фото...")
+            message: Уже отправленное сообщение, которое будем править
+            reply: Если message нет - отправляет сообщение при первой части ответа
+            started: time.monotonic() получения сообщения пользователя
+            interval: Минимальный интервал между правками, секунды
+            min_delay: Не показываем ответ раньше (быстрый ответ обойдется
+                без промежуточного сообщения), секунды от started
+            render: Приводит полученный текст к виду для показа (например,
+                недописанный JSON - к списку блюд)
+        """
+        self.header = header
+        self.message = message
+        self.reply = reply
+        self.started = time.monotonic() if started is None else started
+        self.interval = interval
+        self.min_delay = min_delay
+        self.render = render
+        self.first_feedback: Optional[float] = None
+        self._shown_at = 0.0
+        self._shown_text = ''
+        _stats['streams'] += 1
+
+    def _render(self, text: str) -> str:
+        text = text.strip()
+        if len(text) > _MAX_SHOWN:
+            text = '…' + text[-_MAX_SHOWN:]
+        return f'{self.header}\n\n{text} ▌'
+
+    async def update(self, text: str) -> None:
+        """Новый текст ответа; показываем, если с прошлой правки прошло interval секунд"""
+        now = time.monotonic()
+        if self.first_feedback is None and now - self.started < self.min_delay:
+            return
+        if self.first_feedback is not None and now - self._shown_at < self.interval:
+            _stats['skipped'] += 1
+            return
+        if self.render is not None:
+            text = self.render(text)
+        if not text.strip() or text == self._shown_text:
+            return
+
+        rendered = self._render(text)
+        self._shown_at = now
+        self._shown_text = text
+        try:
+            if self.message is None:
+                self.message = await self.reply(rendered)
+            else:
+                await self.message.edit_text(rendered)
+        except Exception as e:
+            # Лимит правок или сообщение удалено - ответ все равно придет целиком
+            _stats['edit_errors'] += 1
+            logging.debug(f"Не удалось обновить сообщение с ответом GPT: {e}")
+            return
+
+        _stats['edits'] += 1
+        if self.first_feedback is None:
+            self.first_feedback = now - self.started
+            _first_feedback.append(self.first_feedback)
+            logging.info(f"⚡ Первая часть ответа GPT показана через {self.first_feedback:.2f} с")
+
+    async def delete(self) -> None:
+        """Убираем промежуточное сообщение (итог отправляется отдельно)"""
+        if self.message is None:
+            return
+        try:
+            await self.message.delete()
+        except Exception as e:
+            logging.debug(f"Не удалось удалить сообщение с ответом GPT: {e}")
+        self.message = None
+
+
+def get_stream_stats() -> Dict[str, Any]:
+    """Правки сообщений и время до первой части ответа (секунды; p50/p95 по последним)"""
+    recent = sorted(_first_feedback)
+
+    def percentile(q: float) -> Optional[float]:
+        return recent[min(len(recent) - 1, int(len(recent) * q))] if recent else None
+
+    return {**_stats, 'first_feedback_p50': percentile(0.5), 'first_feedback_p95': percentile(0.95)}
@@ -0,0 +1,364 @@
+# -*- coding: utf-8 -*-
+"""
+Сборка промптов для GPT
+"""
+import math
+import hashlib
+import logging
+from typing import Dict, Any, List, Optional
+
+# Исправляем импорты для работы из main.py
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from data.calorie_database import CALORIE_DATABASE
+from config import PROMPT_REFERENCE_MODE, PROMPT_TOP_K, GPT_STRUCTURED_OUTPUT, PHOTO_MAX_EDGE
+from utils.food_index import food_index
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding('o200k_base')
+except Exception:  # пакета нет или нет словаря - считаем приблизительно
+    _ENCODING = None
+
+REFERENCE_MODES = ('full', 'retrieval')
+
+if PROMPT_REFERENCE_MODE not in REFERENCE_MODES:
+    logging.warning(f"⚠️ Неизвестный PROMPT_REFERENCE_MODE={PROMPT_REFERENCE_MODE}, используем retrieval")
+    PROMPT_REFERENCE_MODE = 'retrieval'
+
+CALORIE_RULES = """ПРАВИЛА РАСЧЕТА:
+1. Оценивай реальные порции: стандартная тарелка ~200-300г, столовая ложка ~15г, чайная ~5г
+2. Учитывай способ приготовления: жареное +20-30% калорий, вареное без изменений
+3. Если не указан вес, используй стандартные порции взрослого человека
+4. При сомнениях в размере порции, бери средние значения
+
+РАСПОЗНАВАНИЕ ЖАРЕНЫХ ИЗДЕЛИЙ:
+- Если видишь золотистое полукруглое жареное изделие - это ЧЕБУРЕК (120г = 300 ккал)
+- Сразу давай точный расчет: "Это чебурек. 300 ккал, 10г белка, 15г жиров, 25г углеводов"
+- НЕ спрашивай про начинку и вес - используй стандартные значения
+
+ОСОБОЕ ВНИМАНИЕ К ВЫСОКОКАЛОРИЙНЫМ ПРОДУКТАМ:
+- Арахисовая паста: 588 ккал/100г (1 ст.л. = ~15г = ~90 ккал)
+- Масла: 750+ ккал/100г (1 ст.л. = ~15г = ~115 ккал)
+- Орехи: 550-650 ккал/100г
+- Сыры: 300-400 ккал/100г
+- Не недооценивай количество этих продуктов на фото!
+
+РАСПОЗНАВАНИЕ ПОПУЛЯРНЫХ БЛЮД:
+- ШАУРМА: обычно в лаваше с мясом, овощами, соусом. Средняя порция 300-400г = 750-1200 ккал
+- Если видишь лаваш с начинкой или завернутое блюдо в фольге - скорее всего шаурма
+- ЧЕБУРЕК: жареный полукруглый пирожок золотистого цвета с хрустящим тестом
+- Если видишь золотистое жареное изделие полукруглой формы - это чебурек (средний 120г = 300 ккал)
+- БЕЛЯШ: круглый жареный пирожок с открытой серединкой
+- ПИРОЖОК ЖАРЕНЫЙ: любой жареный пирожок золотистого цвета
+- ПИЦЦА: треугольный кусок = ~1/8 пиццы (~150г), целая пицца = ~1200г
+- БУРГЕРЫ: стандартный = 200-250г, большой = 300-400г
+- РОЛЛЫ/СУШИ: 1 ролл = 20-30г, порция обычно 6-8 роллов
+"""
+
+PHOTO_INSTRUCTIONS = """Проанализируй фото еды и рассчитай калорийность.
+
+⚠️ ВАЖНО:
+- Если на фото НЕСКОЛЬКО блюд - посчитай КАЖДОЕ ОТДЕЛЬНО
+- Игнорируй посторонние предметы (таблетки, салфетки). Анализируй ТОЛЬКО ЕДУ
+
+{answer_format}
+📊 СПРАВОЧНИК КАЛОРИЙНОСТИ (на 100г):
+{reference}
+
+🔴 ДОПОЛНИТЕЛЬНО:
+• Макароны вареные: 112 ккал, 3.5г Б, 0.4г Ж, 23г У
+• Котлета мясная жареная: 250 ккал, 17г Б, 18г Ж, 5г У
+• Салат с майонезом: 180-220 ккал, 5г Б, 15г Ж, 8г У
+• Пиво 500мл: 210 ккал, 1.5г Б, 0г Ж, 17г У
+
+⚠️ ТИПИЧНЫЕ ПОРЦИИ:
+• Тарелка салата: 200-300г
+• Порция гарнира: 150-200г
+• Котлета: 80-100г (2 шт = 160-200г)
+• Бокал пива: 500мл
+{answer_reminder}"""
+
+PHOTO_TEXT_FORMAT = """📋 ФОРМАТ ОТВЕТА:
+
+Если НЕСКОЛЬКО блюд:
+На фото:
+1. [Название блюда 1] ~[вес]г - [ккал] ккал, [Б]г белка, [Ж]г жира, [У]г углеводов
+2. [Название блюда 2] ~[вес]г - [ккал] ккал, [Б]г белка, [Ж]г жира, [У]г углеводов
+
+ИТОГО: [сумма ккал] ккал, [сумма Б]г белка, [сумма Ж]г жира, [сумма У]г углеводов
+
+Если ОДНО блюдо:
+На фото [название блюда] ~[вес]г
+
+ИТОГО: [ккал] ккал, [Б]г белка, [Ж]г жира, [У]г углеводов
+"""
+
+PHOTO_TEXT_REMINDER = """
+🚨 ОБЯЗАТЕЛЬНО укажи ИТОГО с ПОЛНЫМИ БЖУ в формате:
+ИТОГО: XXX ккал, XXг белка, XXг жира, XXг углеводов
+
+Если что-то неясно - задай ОДИН вопрос с "ВОПРОС:".
+"""
+
+# Ответ в JSON (GPT_STRUCTURED_OUTPUT): схему задает response_format,
+# здесь - смысл полей
+JSON_ANSWER_FORMAT = """📋 ФОРМАТ ОТВЕТА - JSON:
+- items: каждое блюдо или продукт отдельно - name (название по-русски), grams (вес порции),
+  kcal, protein, fat, carbs (граммы белка, жиров, углеводов в этой порции)
+- total: сумма kcal, protein, fat, carbs по всем items
+- question: null; если без уточнения расчет невозможен - ОДИН конкретный вопрос
+  пользователю, items пустой
+"""
+
+PHOTO_JSON_REMINDER = """
+🚨 ОБЯЗАТЕЛЬНО заполни total с ПОЛНЫМИ БЖУ.
+"""
+
+# Системные префиксы собираются один раз: байт в байт одинаковы во всех запросах
+_TEXT_INTRO = "Ты рассчитываешь калорийность и БЖУ блюд по описанию пользователя.\n\n"
+TEXT_SYSTEM_PROMPT_FULL = (
+    _TEXT_INTRO
+    + f"Используй следующие справочные данные:\n{CALORIE_DATABASE}\n"
+    + CALORIE_RULES
+)
+TEXT_SYSTEM_PROMPT_RETRIEVAL = _TEXT_INTRO + CALORIE_RULES
+PHOTO_SYSTEM_PROMPT = PHOTO_INSTRUCTIONS.format(
+    answer_format=PHOTO_TEXT_FORMAT, reference=CALORIE_DATABASE, answer_reminder=PHOTO_TEXT_REMINDER
+)
+PHOTO_SYSTEM_PROMPT_JSON = PHOTO_INSTRUCTIONS.format(
+    answer_format=JSON_ANSWER_FORMAT, reference=CALORIE_DATABASE, answer_reminder=PHOTO_JSON_REMINDER
+)
+
+# Версия текстового промпта: меняется вместе с инструкциями, справочником
+# и режимом, поэтому закэшированные по старому промпту оценки не используются
+TEXT_PROMPT_VERSION = hashlib.sha1('\n'.join([
+    PROMPT_REFERENCE_MODE, str(PROMPT_TOP_K), TEXT_SYSTEM_PROMPT_FULL,
+    JSON_ANSWER_FORMAT if GPT_STRUCTURED_OUTPUT else ''
+]).encode('utf-8')).hexdigest()[:12]
+
+
+def image_tokens(detail: str, width: int, height: int) -> int:
+    """Токены фото в запросе к GPT Vision
+
+    detail=low - 85 токенов (фото сжимается до 512x512). detail=high - фото
+    вписывается в 2048x2048, короткая сторона уменьшается до 768, и каждый
+    тайл 512x512 стоит 170 токенов плюс 85 за запрос.
+    """
+    if detail == 'low':
+        return 85
+    if max(width, height) > 2048:
+        scale = 2048 / max(width, height)
+        width, height = width * scale, height * scale
+    if min(width, height) > 768:
+        scale = 768 / min(width, height)
+        width, height = width * scale, height * scale
+    tiles = math.ceil(round(width) / 512) * math.ceil(round(height) / 512)
+    return 85 + 170 * tiles
+
+
+# Токены фото по detail для оценки запроса: фото из Telegram 4:3 после
+# подготовки (utils/image_preprocess.py) - длинная сторона PHOTO_MAX_EDGE,
+# без уменьшения - 1280x960
+_PHOTO_EDGE = PHOTO_MAX_EDGE or 1280
+IMAGE_TOKENS = {
+    'low': image_tokens('low', _PHOTO_EDGE, _PHOTO_EDGE * 3 // 4),
+    'high': image_tokens('high', _PHOTO_EDGE, _PHOTO_EDGE * 3 // 4),
+}
+
+
+def select_reference_lines(description: str, k: Optional[int] = None) -> str:
+    """До k строк справочника, относящихся к блюду, под заголовками их разделов
+
+    Пустая строка - в справочнике нет ничего похожего.
+    """
+    sections: Dict[str, List[str]] = {}
+    for row in food_index.search(description, k or PROMPT_TOP_K):
+        sections.setdefault(row.category, []).append(f"- {row.text}")
+    return '\n\n'.join(f"{category}:\n" + '\n'.join(lines) for category, lines in sections.items())
+
+
+def estimate_tokens(text: str) -> int:
+    """Число токенов текста: точно при установленном tiktoken, иначе оценка"""
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    # Русский текст - в среднем около трех символов на токен
+    return len(text) // 3 + 1
+
+
+def estimate_request_tokens(messages: List[Dict[str, Any]], max_tokens: int) -> int:
+    """Оценка токенов запроса для лимита TPM: текст сообщений, фото и max_tokens ответа"""
+    tokens = max_tokens
+    for message in messages:
+        content = message.get('content')
+        if isinstance(content, str):
+            tokens += estimate_tokens(content)
+            continue
+        for part in content or ():
+            if part.get('type') == 'image_url':
+                tokens += IMAGE_TOKENS.get(part['image_url'].get('detail'), IMAGE_TOKENS['high'])
+            else:
+                tokens += estimate_tokens(part.get('text', ''))
+    return tokens
+
+
+def _log_prompt_size(kind: str, system: str, user: str) -> None:
+    logging.info(
+        f"📏 Промпт {kind}: префикс ~{estimate_tokens(system)} токенов, "
+        f"переменная часть ~{estimate_tokens(user)} токенов"
+    )
+
+
+def build_food_text_messages(description: str, answer_format: str,
+                             mode: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Сообщения для расчета калорий по описанию блюда
+
+    Args:
+        description: Описание блюда от пользователя
+        answer_format: Требования к формату ответа (зависят от шага диалога)
+        mode: full или retrieval, по умолчанию PROMPT_REFERENCE_MODE
+    """
+    mode = mode or PROMPT_REFERENCE_MODE
+    user_prompt = f'Рассчитай калорийность и белок блюда: "{description}"\n'
+
+    if mode == 'retrieval':
+        system_prompt = TEXT_SYSTEM_PROMPT_RETRIEVAL
+        reference = select_reference_lines(description)
+        if reference:
+            user_prompt += f"\nСправочные данные (на 100г):\n{reference}\n"
+    else:
+        system_prompt = TEXT_SYSTEM_PROMPT_FULL
+
+    user_prompt += f"\n{answer_format}"
+    _log_prompt_size(f"текст/{mode}", system_prompt, user_prompt)
+
+    return [
+        {'role': 'system', 'content': system_prompt},
+        {'role': 'user', 'content': [{'type': 'text', 'text': user_prompt}]},
+    ]
+
+
+def build_food_photo_messages(image_base64: str, structured: Optional[bool] = None,
+                              mime_type: str = 'image/jpeg', detail: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Сообщения для анализа фото: справочник в кэшируемом префиксе, фото после него
+
+    structured - ответ в JSON (utils/structured_output.py), по умолчанию GPT_STRUCTURED_OUTPUT;
+    mime_type и detail - формат фото и detail GPT Vision (utils/image_preprocess.py)
+    """
+    structured = GPT_STRUCTURED_OUTPUT if structured is None else structured
+    system_prompt = PHOTO_SYSTEM_PROMPT_JSON if structured else PHOTO_SYSTEM_PROMPT
+    user_prompt = "Проанализируй еду на этом фото."
+    _log_prompt_size("фото", system_prompt, user_prompt)
+    image_url = {'url': f'data:{mime_type};base64,{image_base64}'}
+    if detail:
+        image_url['detail'] = detail
+
+    return [
+        {'role': 'system', 'content': system_prompt},
+        {
+            'role': 'user',
+            'content': [
+                {'type': 'text', 'text': user_prompt},
+                {'type': 'image_url', 'image_url': image_url}
+            ]
+        },
+    ]
+
+
+# Уточнение разбора фото: вместо нового анализа с полным справочником - прошлый
+# разбор и поправка пользователя; фото прикладывается, только если разбора нет
+PHOTO_CORRECTION_PROMPT = """Ты уже рассчитал калорийность еды на фото, пользователь уточнил расчет.
+Исправь только то, чего касается уточнение (продукт, вес, способ приготовления, добавки),
+остальные позиции оставь как были и пересчитай итог. Если прошлого расчета нет - рассчитай по фото с учетом уточнения.
+
+"""
+PHOTO_CORRECTION_SYSTEM_PROMPT = PHOTO_CORRECTION_PROMPT + PHOTO_TEXT_FORMAT + PHOTO_TEXT_REMINDER
+PHOTO_CORRECTION_SYSTEM_PROMPT_JSON = PHOTO_CORRECTION_PROMPT + JSON_ANSWER_FORMAT
+
+
+def _format_grams(value: Any) -> str:
+    return f"{value:g}" if isinstance(value, (int, float)) else "?"
+
+
+def describe_photo_breakdown(analysis: Dict[str, Any]) -> str:
+    """Прошлый разбор фото строками "блюдо ~вес - ккал, БЖУ"; пустая строка - разбора нет"""
+    items = analysis.get('items') or []
+    if items:
+        return '\n'.join(
+            f"- {item['name']} ~{_format_grams(item.get('grams'))}г - {_format_grams(item.get('kcal'))} ккал, "
+            f"Б {_format_grams(item.get('protein'))}, Ж {_format_grams(item.get('fat'))}, "
+            f"У {_format_grams(item.get('carbs'))}"
+            for item in items
+        )
+    if analysis.get('calories'):
+        description = ' '.join(analysis.get('description', 'Блюдо с фото').replace('•', '').split())
+        return (f"- {description} - {analysis['calories']} ккал, Б {_format_grams(analysis.get('protein'))}, "
+                f"Ж {_format_grams(analysis.get('fat'))}, У {_format_grams(analysis.get('carbs'))}")
+    return ''
+
+
+def build_photo_correction_messages(analysis: Dict[str, Any], correction: str,
+                                    image_base64: Optional[str] = None, mime_type: str = 'image/jpeg',
+                                    detail: Optional[str] = None,
+                                    structured: Optional[bool] = None) -> List[Dict[str, Any]]:
+    """Сообщения для уточнения разбора фото: прошлый разбор + поправка пользователя
+
+    Без справочника целиком и без фото - текстовой моделью; фото (image_base64)
+    передается, только когда прошлого разбора нет (GPT вместо расчета задал вопрос).
+    Справочник - строки, относящиеся к уточнению.
+    """
+    structured = GPT_STRUCTURED_OUTPUT if structured is None else structured
+    system_prompt = PHOTO_CORRECTION_SYSTEM_PROMPT_JSON if structured else PHOTO_CORRECTION_SYSTEM_PROMPT
+
+    breakdown = describe_photo_breakdown(analysis)
+    user_prompt = f"Прошлый расчет:\n{breakdown}\n\n" if breakdown else ""
+    if analysis.get('question'):
+        user_prompt += f"Твой вопрос: {analysis['question']}\n"
+    user_prompt += f'Уточнение пользователя: "{correction}"\n'
+    reference = select_reference_lines(correction)
+    if reference:
+        user_prompt += f"\nСправочные данные (на 100г):\n{reference}\n"
+    _log_prompt_size("уточнение фото", system_prompt, user_prompt)
+
+    content: List[Dict[str, Any]] = [{'type': 'text', 'text': user_prompt}]
+    if image_base64 is not None:
+        image_url = {'url': f'data:{mime_type};base64,{image_base64}'}
+        if detail:
+            image_url['detail'] = detail
+        content.append({'type': 'image_url', 'image_url': image_url})
+
+    return [
+        {'role': 'system', 'content': system_prompt},
+        {'role': 'user', 'content': content},
+    ]
+
+
+_usage_stats = {'calls': 0, 'prompt_tokens': 0, 'cached_tokens': 0, 'completion_tokens': 0}
+
+
+def record_usage(model: str, usage: Any) -> None:
+    """Учитываем токены ответа API: сколько отправлено и сколько взято из кэша"""
+    if usage is None:
+        return
+
+    prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+    completion_tokens = getattr(usage, 'completion_tokens', 0) or 0
+    details = getattr(usage, 'prompt_tokens_details', None)
+    cached_tokens = getattr(details, 'cached_tokens', 0) or 0
+
+    _usage_stats['calls'] += 1
+    _usage_stats['prompt_tokens'] += prompt_tokens
+    _usage_stats['cached_tokens'] += cached_tokens
+    _usage_stats['completion_tokens'] += completion_tokens
+
+    logging.info(
+        f"🧮 Токены {model}: запрос {prompt_tokens} (из кэша {cached_tokens}), "
+        f"ответ {completion_tokens}"
+    )
+
+
+def get_prompt_usage_stats() -> Dict[str, int]:
+    """Суммарные токены всех запросов к GPT с запуска бота"""
+    return dict(_usage_stats)
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+Повторные запросы к OpenAI и предохранитель модели
+"""
+import time
+import random
+import asyncio
+import logging
+import email.utils
+from typing import Dict, Any, Optional
+
+# Исправляем импорты для работы из main.py
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import (
+    GPT_RETRY_BASE_DELAY, GPT_RETRY_MAX_DELAY, GPT_REQUEST_DEADLINE,
+    GPT_BREAKER_THRESHOLD, GPT_BREAKER_RESET
+)
+
+try:
+    import openai
+    _CONNECTION_ERRORS = (openai.APIConnectionError,)  # в т.ч. APITimeoutError
+    _STATUS_ERROR = openai.APIStatusError
+except ImportError:
+    _CONNECTION_ERRORS = ()
+    _STATUS_ERROR = None
+
+_RETRYABLE_STATUSES = {408, 409, 429}
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """Запрос не уложился в GPT_REQUEST_DEADLINE (вместе с ожиданием в очереди)"""
+
+
+class CircuitOpenError(Exception):
+    """OpenAI недоступен: предохранитель открыт, запрос не отправлялся"""
+
+    def __init__(self, model: str, retry_in: float):
+        # "overloaded" - обработчики показывают пользователю сообщение о перегрузке
+        super().__init__(f"OpenAI API overloaded: {model} недоступен, повтор через {retry_in:.0f} с")
+        self.retry_in = retry_in
+
+
+def status_code(error: BaseException) -> Optional[int]:
+    if _STATUS_ERROR is not None and isinstance(error, _STATUS_ERROR):
+        return error.status_code
+    return None
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Временная ли ошибка: имеет ли смысл повторить тот же запрос"""
+    if isinstance(error, _CONNECTION_ERRORS + (asyncio.TimeoutError,)):
+        return True
+    status = status_code(error)
+    if status is None:
+        return False
+    if status == 429 and getattr(error, 'code', None) == 'insufficient_quota':
+        return False  # закончились деньги на счете - повтор не поможет
+    return status in _RETRYABLE_STATUSES or status >= 500
+
+
+def is_outage(error: BaseException) -> bool:
+    """Ошибка, говорящая о недоступности API (429 - это лимит, а не недоступность)"""
+    if isinstance(error, _CONNECTION_ERRORS + (asyncio.TimeoutError,)):
+        return True
+    status = status_code(error)
+    return status is not None and status >= 500
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Пауза, которую просит сервер (заголовки retry-after-ms / Retry-After), в секундах"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+
+    value = headers.get('retry-after-ms')
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parsed = email.utils.parsedate_tz(value)  # HTTP-дата
+        return max(0.0, email.utils.mktime_tz(parsed) - time.time()) if parsed else None
+
+
+class RetryPolicy:
+    """Когда и через сколько повторять запрос"""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = GPT_RETRY_BASE_DELAY,
+                 max_delay: float = GPT_RETRY_MAX_DELAY, deadline: float = GPT_REQUEST_DEADLINE):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.started = time.monotonic()
+        self._previous_delay = base_delay
+
+    def remaining(self) -> float:
+        """Сколько секунд осталось до дедлайна запроса"""
+        return self.deadline - (time.monotonic() - self.started)
+
+    def next_delay(self, error: BaseException, attempt: int) -> Optional[float]:
+        """Пауза перед следующей попыткой или None, если повторять не нужно
+
+        attempt - номер неудавшейся попытки, с 1.
+        """
+        if attempt >= self.max_attempts or not is_retryable(error):
+            return None
+
+        delay = retry_after(error)
+        if delay is None:
+            # Decorrelated jitter: min(max, random(base, 3 * предыдущая))
+            delay = min(self.max_delay, random.uniform(self.base_delay, self._previous_delay * 3))
+            self._previous_delay = delay
+
+        if delay >= self.remaining():
+            return None  # после паузы не останется времени на запрос
+        return delay
+
+
+class CircuitBreaker:
+    """Предохранитель модели: быстрый отказ, пока API недоступен"""
+
+    def __init__(self, threshold: int = GPT_BREAKER_THRESHOLD, reset_after: float = GPT_BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        # Пробный запрос после паузы; если он так и не завершился (отмена),
+        # через reset_after пропускаем следующий
+        self._probe_started: Optional[float] = None
+        self.stats = {'opened': 0, 'rejected': 0}
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if time.monotonic() - self.opened_at >= self.reset_after else 'open'
+
+    def before_request(self, model: str) -> None:
+        """Пропускаем запрос или сразу отказываем CircuitOpenError"""
+        state = self.state
+        if state == 'closed':
+            return
+        now = time.monotonic()
+        if state == 'half_open' and (self._probe_started is None or now - self._probe_started >= self.reset_after):
+            self._probe_started = now
+            return
+        self.stats['rejected'] += 1
+        raise CircuitOpenError(model, max(0.0, self.reset_after - (now - self.opened_at)))
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logging.info("✅ OpenAI снова отвечает - предохранитель закрыт")
+        self.failures = 0
+        self.opened_at = None
+        self._probe_started = None
+
+    def record_failure(self, error: BaseException) -> None:
+        if isinstance(error, DeadlineExceeded):
+            self._probe_started = None  # запрос не дошел до API - о его состоянии ничего не знаем
+            return
+        if not is_outage(error):
+            # Ответ пришел (4xx, лимит) - API работает
+            self.record_success()
+            return
+
+        self.failures += 1
+        if self._probe_started is not None or (self.opened_at is None and self.failures >= self.threshold):
+            self.opened_at = time.monotonic()
+            self.stats['opened'] += 1
+            logging.error(f"🔌 OpenAI недоступен ({self.failures} ошибок подряд) - "
+                          f"предохранитель открыт на {self.reset_after:.0f} с")
+        self._probe_started = None
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(model: str) -> CircuitBreaker:
+    """Предохранитель модели (создается при первом запросе)"""
+    breaker = _breakers.get(model)
+    if breaker is None:
+        breaker = _breakers[model] = CircuitBreaker()
+    return breaker
+
+
+def get_retry_stats() -> Dict[str, Any]:
+    """Состояние предохранителей моделей"""
+    return {
+        model: {'state': breaker.state, 'failures': breaker.failures, **breaker.stats}
+        for model, breaker in _breakers.items()
+    }
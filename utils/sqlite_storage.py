@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""
+SQLite-хранилище пользовательских данных
+"""
+import os
+import json
+import logging
+import sqlite3
+import threading
+from typing import Dict, Any, List, Optional
+
+# Исправляем импорт для работы из main.py
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import SQLITE_PATH, STORAGE_DURABILITY
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS profiles (
+    user_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS diary (
+    user_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    calories INTEGER NOT NULL,
+    PRIMARY KEY (user_id, date)
+);
+CREATE TABLE IF NOT EXISTS weights (
+    user_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    weight REAL NOT NULL,
+    PRIMARY KEY (user_id, date)
+);
+CREATE TABLE IF NOT EXISTS food_entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    name TEXT NOT NULL,
+    calories REAL NOT NULL,
+    protein REAL,
+    fat REAL,
+    carbs REAL
+);
+CREATE INDEX IF NOT EXISTS idx_food_entries_user_date ON food_entries (user_id, date);
+CREATE TABLE IF NOT EXISTS burned (
+    user_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    calories INTEGER NOT NULL,
+    PRIMARY KEY (user_id, date)
+);
+CREATE TABLE IF NOT EXISTS saved_meals (
+    user_id TEXT NOT NULL,
+    meal_key TEXT NOT NULL,
+    name TEXT NOT NULL,
+    calories REAL NOT NULL,
+    protein REAL,
+    fat REAL,
+    carbs REAL,
+    PRIMARY KEY (user_id, meal_key)
+);
+"""
+
+# Документы "дата -> число" хранятся в одинаковых таблицах
+_DATED_TABLES = {
+    'diary': ('diary', 'calories'),
+    'weights': ('weights', 'weight'),
+    'burned': ('burned', 'calories'),
+}
+
+_SQL_REGISTER_USER = "INSERT OR IGNORE INTO users (user_id) VALUES (?)"
+_SQL_SELECT_USERS = "SELECT user_id FROM users ORDER BY user_id"
+_SQL_SELECT_PROFILE = "SELECT data FROM profiles WHERE user_id = ?"
+_SQL_UPSERT_PROFILE = "INSERT OR REPLACE INTO profiles (user_id, data) VALUES (?, ?)"
+_SQL_SELECT_FOOD = ("SELECT date, name, calories, protein, fat, carbs FROM food_entries "
+                    "WHERE user_id = ? ORDER BY date, id")
+_SQL_SELECT_FOOD_DATES = "SELECT DISTINCT date FROM food_entries WHERE user_id = ? ORDER BY date"
+_SQL_SELECT_FOOD_DAY = ("SELECT name, calories, protein, fat, carbs FROM food_entries "
+                        "WHERE user_id = ? AND date = ? ORDER BY id")
+_SQL_DELETE_FOOD = "DELETE FROM food_entries WHERE user_id = ?"
+_SQL_DELETE_FOOD_DAY = "DELETE FROM food_entries WHERE user_id = ? AND date = ?"
+_SQL_INSERT_FOOD = ("INSERT INTO food_entries (user_id, date, name, calories, protein, fat, carbs) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)")
+_SQL_SELECT_MEALS = "SELECT meal_key, name, calories, protein, fat, carbs FROM saved_meals WHERE user_id = ?"
+_SQL_DELETE_MEALS = "DELETE FROM saved_meals WHERE user_id = ?"
+_SQL_INSERT_MEAL = ("INSERT INTO saved_meals (user_id, meal_key, name, calories, protein, fat, carbs) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)")
+
+# STORAGE_DURABILITY -> PRAGMA synchronous. В WAL-режиме NORMAL синхронизирует
+# журнал только на checkpoint - коммиты группируются самим SQLite
+_SYNCHRONOUS = {'strict': 'FULL', 'group': 'NORMAL', 'relaxed': 'OFF'}
+
+_connection: Optional[sqlite3.Connection] = None
+_connection_pid: Optional[int] = None
+_lock = threading.RLock()
+
+
+def get_connection() -> sqlite3.Connection:
+    """Соединение процесса (создается лениво, заново - после fork)"""
+    global _connection, _connection_pid
+
+    with _lock:
+        if _connection is not None and _connection_pid == os.getpid():
+            return _connection
+
+        db_dir = os.path.dirname(SQLITE_PATH)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        connection = sqlite3.connect(SQLITE_PATH, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(f"PRAGMA synchronous={_SYNCHRONOUS.get(STORAGE_DURABILITY, 'FULL')}")
+        connection.executescript(SCHEMA)
+
+        _connection = connection
+        _connection_pid = os.getpid()
+        logging.info(f"🗄️ SQLite хранилище открыто: {SQLITE_PATH}")
+        return connection
+
+
+def close_connection() -> None:
+    """Закрываем соединение процесса"""
+    global _connection, _connection_pid
+
+    with _lock:
+        if _connection is not None and _connection_pid == os.getpid():
+            _connection.close()
+        _connection = None
+        _connection_pid = None
+
+
+def load_user_data(user_id: str, include_food_log: bool = True) -> Dict[str, Any]:
+    """Загружаем все документы пользователя в формате JSON-хранилища
+
+    include_food_log=False - без лога еды (его читают по дням через FoodLogStore)
+    """
+    with _lock:
+        conn = get_connection()
+        with conn:
+            conn.execute(_SQL_REGISTER_USER, (user_id,))
+
+        row = conn.execute(_SQL_SELECT_PROFILE, (user_id,)).fetchone()
+        user_data = {'profile': json.loads(row[0]) if row else {}}
+
+        for data_type, (table, column) in _DATED_TABLES.items():
+            rows = conn.execute(f"SELECT date, {column} FROM {table} WHERE user_id = ?", (user_id,))
+            user_data[data_type] = {date: value for date, value in rows}
+
+        if include_food_log:
+            food_log: Dict[str, List[list]] = {}
+            for date, name, calories, protein, fat, carbs in conn.execute(_SQL_SELECT_FOOD, (user_id,)):
+                food_log.setdefault(date, []).append(_food_row_to_entry(name, calories, protein, fat, carbs))
+            user_data['food_log'] = food_log
+
+        saved_meals = {}
+        for meal_key, name, calories, protein, fat, carbs in conn.execute(_SQL_SELECT_MEALS, (user_id,)):
+            saved_meals[meal_key] = {
+                'name': name,
+                'calories': _int_if_whole(calories),
+                'protein': protein,
+                'fat': fat,
+                'carbs': carbs
+            }
+        user_data['saved_meals'] = saved_meals
+
+        return user_data
+
+
+def save_user_document(user_id: str, data_type: str, data: Any) -> None:
+    """Заменяем один документ пользователя (одна транзакция)"""
+    with _lock:
+        conn = get_connection()
+        with conn:
+            _replace_document(conn, user_id, data_type, data or {})
+
+
+def save_user_data(user_id: str, user_data: Dict[str, Any]) -> None:
+    """Заменяем все документы пользователя одной транзакцией"""
+    with _lock:
+        conn = get_connection()
+        with conn:
+            for data_type in ('profile', 'diary', 'weights', 'food_log', 'burned', 'saved_meals'):
+                _replace_document(conn, user_id, data_type, user_data.get(data_type) or {})
+
+
+def get_food_dates(user_id: str) -> List[str]:
+    """Дни, в которых у пользователя есть записи еды"""
+    with _lock:
+        return [row[0] for row in get_connection().execute(_SQL_SELECT_FOOD_DATES, (user_id,))]
+
+
+def get_food_entries(user_id: str, date: str) -> List[list]:
+    """Записи еды за один день"""
+    with _lock:
+        rows = get_connection().execute(_SQL_SELECT_FOOD_DAY, (user_id, date))
+        return [_food_row_to_entry(*row) for row in rows]
+
+
+def append_food_entry(user_id: str, date: str, entry: list) -> None:
+    """Добавляем одну запись еды (одна строка, без перезаписи дня)"""
+    with _lock:
+        conn = get_connection()
+        with conn:
+            conn.execute(_SQL_REGISTER_USER, (user_id,))
+            conn.execute(_SQL_INSERT_FOOD, _food_entry_row(user_id, date, entry))
+
+
+def set_food_entries(user_id: str, date: str, entries: List[list]) -> None:
+    """Заменяем записи еды за один день"""
+    with _lock:
+        conn = get_connection()
+        with conn:
+            conn.execute(_SQL_REGISTER_USER, (user_id,))
+            conn.execute(_SQL_DELETE_FOOD_DAY, (user_id, date))
+            conn.executemany(_SQL_INSERT_FOOD, [_food_entry_row(user_id, date, entry) for entry in entries])
+
+
+class FoodLogStore:
+    """Лог еды в SQLite с интерфейсом food_journal.FoodJournalStore"""
+
+    def __init__(self):
+        self.stats = {'appends': 0, 'sets': 0, 'compactions': 0}
+
+    def get_dates(self, user_id: str) -> List[str]:
+        return get_food_dates(user_id)
+
+    def get_entries(self, user_id: str, date: str) -> List[list]:
+        return get_food_entries(user_id, date)
+
+    def append(self, user_id: str, date: str, entry: list) -> None:
+        append_food_entry(user_id, date, entry)
+        self.stats['appends'] += 1
+
+    def set_entries(self, user_id: str, date: str, entries: List[list]) -> None:
+        set_food_entries(user_id, date, entries)
+        self.stats['sets'] += 1
+
+    def replace(self, user_id: str, food_log: Dict[str, List[list]]) -> None:
+        save_user_document(user_id, 'food_log', food_log)
+
+    def compact(self) -> int:
+        # Строки таблицы не накапливают мусор - компакция не нужна
+        return 0
+
+    def clear(self) -> None:
+        pass
+
+
+def get_all_users() -> list:
+    """Получаем список всех пользователей"""
+    with _lock:
+        return [row[0] for row in get_connection().execute(_SQL_SELECT_USERS)]
+
+
+def _replace_document(conn: sqlite3.Connection, user_id: str, data_type: str, data: Any) -> None:
+    conn.execute(_SQL_REGISTER_USER, (user_id,))
+
+    if data_type == 'profile':
+        conn.execute(_SQL_UPSERT_PROFILE, (user_id, json.dumps(data, ensure_ascii=False)))
+
+    elif data_type in _DATED_TABLES:
+        table, column = _DATED_TABLES[data_type]
+        conn.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+        conn.executemany(
+            f"INSERT INTO {table} (user_id, date, {column}) VALUES (?, ?, ?)",
+            [(user_id, date, value) for date, value in data.items()]
+        )
+
+    elif data_type == 'food_log':
+        conn.execute(_SQL_DELETE_FOOD, (user_id,))
+        rows = []
+        for date, entries in data.items():
+            for entry in entries:
+                rows.append(_food_entry_row(user_id, date, entry))
+        conn.executemany(_SQL_INSERT_FOOD, rows)
+
+    elif data_type == 'saved_meals':
+        conn.execute(_SQL_DELETE_MEALS, (user_id,))
+        conn.executemany(_SQL_INSERT_MEAL, [
+            (user_id, meal_key, meal.get('name', meal_key), meal.get('calories', 0),
+             meal.get('protein'), meal.get('fat'), meal.get('carbs'))
+            for meal_key, meal in data.items()
+        ])
+
+    else:
+        raise ValueError(f"Неизвестный тип документа: {data_type}")
+
+
+def _food_entry_row(user_id: str, date: str, entry: list) -> tuple:
+    """Запись food_log -> строка таблицы (короткие записи дополняются NULL)"""
+    padded = list(entry) + [None] * (5 - len(entry))
+    return (user_id, date, *padded[:5])
+
+
+def _food_row_to_entry(name: str, calories: float, protein, fat, carbs) -> list:
+    """Восстанавливаем запись food_log в том виде, в котором она была сохранена"""
+    entry = [name, _int_if_whole(calories), _int_if_whole(protein), _int_if_whole(fat), _int_if_whole(carbs)]
+    # Старые записи короче пяти полей - не дописываем им пустые БЖУ
+    while len(entry) > 2 and entry[-1] is None:
+        entry.pop()
+    return entry
+
+
+def _int_if_whole(value):
+    """REAL-колонки возвращают float - целые значения отдаем как int, как в JSON"""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
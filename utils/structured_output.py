@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Структурированный ответ GPT: калории и БЖУ в JSON по схеме
+"""
+import re
+from typing import Dict, Any, List, Optional
+
+# Исправляем импорты для работы из main.py
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from utils.json_codec import loads
+from utils.nutrition_extractor import extract_nutrition
+
+_NUMBER = {'type': 'number'}
+_MACROS = ('kcal', 'protein', 'fat', 'carbs')
+
+NUTRITION_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'items': {
+            'type': 'array',
+            'items': {
+                'type': 'object',
+                'properties': {'name': {'type': 'string'}, 'grams': _NUMBER,
+                               **{key: _NUMBER for key in _MACROS}},
+                'required': ['name', 'grams', *_MACROS],
+                'additionalProperties': False,
+            },
+        },
+        'total': {
+            'type': 'object',
+            'properties': {key: _NUMBER for key in _MACROS},
+            'required': list(_MACROS),
+            'additionalProperties': False,
+        },
+        'question': {'type': ['string', 'null']},
+    },
+    'required': ['items', 'total', 'question'],
+    'additionalProperties': False,
+}
+
+# response_format для chat.completions.create
+RESPONSE_FORMAT = {
+    'type': 'json_schema',
+    'json_schema': {'name': 'nutrition', 'strict': True, 'schema': NUTRITION_SCHEMA},
+}
+
+# Законченные блюда в недописанном JSON - для показа ответа по мере генерации
+_ITEM_PREVIEW = re.compile(r'"name"\s*:\s*"((?:[^"\\]|\\.)*)"[^{}]*?"kcal"\s*:\s*(\d+(?:\.\d+)?)')
+_TOTAL_PREVIEW = re.compile(r'"total"\s*:\s*\{\s*"kcal"\s*:\s*(\d+(?:\.\d+)?)\s*[,}]')
+
+_stats = {'structured': 0, 'fallback': 0}
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value)
+
+
+def parse_nutrition_json(response: str) -> Optional[Dict[str, Any]]:
+    """Ответ GPT по схеме NUTRITION_SCHEMA или None, если это не такой JSON"""
+    text = response.strip()
+    if not text.startswith('{'):
+        return None
+    try:
+        data = loads(text)
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get('items'), list):
+        return None
+
+    items: List[Dict[str, Any]] = []
+    for item in data['items']:
+        if not isinstance(item, dict) or not str(item.get('name', '')).strip():
+            continue
+        items.append({'name': str(item['name']).strip(), 'grams': _number(item.get('grams')),
+                      **{key: _number(item.get(key)) for key in _MACROS}})
+
+    total = data.get('total') if isinstance(data.get('total'), dict) else {}
+    question = data.get('question')
+    return {
+        'items': items,
+        'total': {key: _number(total.get(key)) for key in _MACROS},
+        'question': question.strip() if isinstance(question, str) and question.strip() else None,
+    }
+
+
+def nutrition_totals(data: Dict[str, Any]) -> Dict[str, Optional[float]]:
+    """Калории и БЖУ блюда в формате extract_nutrition
+
+    Берем total; если модель его не заполнила - суммируем блюда.
+    """
+    result: Dict[str, Optional[float]] = {}
+    for key in _MACROS:
+        value = data['total'][key]
+        if not value:
+            parts = [item[key] for item in data['items'] if item[key] is not None]
+            value = sum(parts) if parts else value
+        result['calories' if key == 'kcal' else key] = value
+
+    if result['calories'] is not None:
+        result['calories'] = int(round(result['calories'])) or None
+    return result
+
+
+def describe_items(items: List[Dict[str, Any]]) -> str:
+    """Описание блюд с фото: одно название или список (как у текстового разбора)"""
+    names = [item['name'] for item in items[:3]]
+    if len(names) >= 2:
+        return "\n".join(f"  • {name}" for name in names)
+    return names[0] if names else "Блюдо с фото"
+
+
+def read_nutrition_answer(response: str) -> Dict[str, Any]:
+    """Калории, БЖУ и вопрос из ответа GPT: JSON по схеме, иначе разбор текста
+
+    Returns:
+        {'calories', 'protein', 'fat', 'carbs', 'question', 'items'};
+        items - блюда из JSON или None для текстового ответа
+    """
+    data = parse_nutrition_json(response)
+    if data is not None:
+        _stats['structured'] += 1
+        return {**nutrition_totals(data), 'question': data['question'], 'items': data['items']}
+
+    _stats['fallback'] += 1
+    if "ВОПРОС:" in response:
+        return {'calories': None, 'protein': None, 'fat': None, 'carbs': None,
+                'question': response.replace("ВОПРОС:", "").strip(), 'items': None}
+    return {**extract_nutrition(response), 'question': None, 'items': None}
+
+
+def preview_nutrition_json(partial: str) -> str:
+    """Читаемый вид недописанного JSON-ответа: готовые блюда и итог
+
+    Обычный текстовый ответ возвращается как есть.
+    """
+    if not partial.lstrip().startswith('{'):
+        return partial
+    lines = [f"• {name} - {float(kcal):.0f} ккал" for name, kcal in _ITEM_PREVIEW.findall(partial)]
+    total = _TOTAL_PREVIEW.search(partial)
+    if total:
+        lines.append(f"ИТОГО: {float(total.group(1)):.0f} ккал")
+    return '\n'.join(lines)
+
+
+def get_structured_output_stats() -> Dict[str, Any]:
+    """Сколько ответов GPT разобрано из JSON и сколько - регулярными выражениями"""
+    total = _stats['structured'] + _stats['fallback']
+    return {**_stats, 'structured_ratio': _stats['structured'] / total if total else None}
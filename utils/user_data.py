@@ -3,17 +3,34 @@
 Утилиты для работы с пользовательскими данными
 """
 import os
-import json
+import time
+import atexit
+import asyncio
+import ctypes
+import platform
 import logging
+import threading
 import traceback
-from typing import Dict, Any
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Any, Callable, List, Optional
 
 # Исправляем импорт для работы из main.py
 import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 
-from config import DATA_DIR
+from config import (
+    DATA_DIR, USER_CACHE_MAX_USERS, USER_CACHE_TTL, STORAGE_BACKEND, STORAGE_THREADS,
+    STORAGE_DURABILITY, GROUP_COMMIT_WINDOW_MS, FOOD_LOG_COLD_COMPRESSION
+)
+from utils import json_codec
+from utils.food_entry import FoodEntry, decode_entries
+from utils.food_journal import FoodJournalStore, FoodLogView, COLD_CODECS, partition_key, read_food_log
+
+# Типы документов, из которых состоят данные пользователя
+DOCUMENT_TYPES = ('profile', 'diary', 'weights', 'food_log', 'burned', 'saved_meals')
 
 
 def get_user_files(user_id: str) -> Dict[str, str]:
@@ -31,77 +48,668 @@ def get_user_files(user_id: str) -> Dict[str, str]:
     }
 
 
-def load_user_data(user_id: str) -> Dict[str, Any]:
-    """Загружаем данные конкретного пользователя"""
+def _read_user_data_from_disk(user_id: str) -> Dict[str, Any]:
+    """Читаем все документы пользователя с диска (в обход кэша)"""
     files = get_user_files(user_id)
     user_data = {}
 
     for data_type, file_path in files.items():
+        if data_type == 'food_log':
+            continue  # Лог еды читается по дням из журнала, см. _food_store
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                user_data[data_type] = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
+            # Понимает и компактные файлы, и старые с indent=2
+            with open(file_path, 'rb') as f:
+                user_data[data_type] = json_codec.loads(f.read())
+        except (FileNotFoundError, ValueError):
             user_data[data_type] = {}
             logging.info(f"Initialized empty {data_type} for user {user_id}")
 
     return user_data
 
 
-def save_user_data(user_id: str, user_data: Dict[str, Any]) -> None:
-    """Сохраняем данные конкретного пользователя"""
-    files = get_user_files(user_id)
+def _write_document_to_disk(user_id: str, data_type: str, data: Any) -> None:
+    """Атомарно записываем один документ пользователя на диск (в обход кэша)
+
+    Raises:
+        OSError: ошибка файловой системы - документ нужно записать повторно
+    """
+    file_path = get_user_files(user_id)[data_type]
+
+    # Сначала пробуем сериализовать в память (компактно, без отступов)
+    try:
+        json_bytes = json_codec.dumps(data)
+    except (TypeError, ValueError) as e:
+        # Повторная запись не поможет - такие данные не сохранятся никогда
+        logging.error(f"JSON serialization error for {data_type} (user {user_id}): {e}")
+        logging.error(f"Problematic data: {data}")
+        return
+
+    # Сохраняем во временный файл, затем атомарно переименовываем
+    temp_file_path = file_path + '.tmp'
+    try:
+        with open(temp_file_path, 'wb') as f:
+            f.write(json_bytes)
+        _durable_sync(temp_file_path)  # Данные на диске до переименования
+
+        os.replace(temp_file_path, file_path)
+        _durable_sync(os.path.dirname(file_path))  # Переименование тоже переживает сбой
+        logging.debug(f"Successfully saved {data_type} for user {user_id}")
+
+    except OSError as e:
+        logging.error(f"File system error saving {data_type} for user {user_id}: {e}")
+        # Удаляем временный файл если остался
+        if os.path.exists(temp_file_path):
+            try:
+                os.remove(temp_file_path)
+            except OSError:
+                pass
+        raise
+
+
+def _fsync_path(path: str) -> None:
+    """fsync файла или каталога по пути"""
+    if os.name == 'nt' and os.path.isdir(path):
+        return  # Windows не умеет fsync каталогов
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _syncfs_reports_errors(release: str) -> bool:
+    """syncfs(2) возвращает ошибки записи на диск только с Linux 5.8"""
+    try:
+        major, minor = (int(part) for part in release.split('-')[0].split('.')[:2])
+    except ValueError:
+        return False
+    return (major, minor) >= (5, 8)
+
+
+def _load_syncfs() -> Optional[Callable[[int], int]]:
+    """syncfs(2) из libc: один вызов сбрасывает все файлы файловой системы
+
+    Только Linux 5.8+: на старых ядрах syncfs не сообщает об ошибках записи,
+    и group commit синхронизирует каждый путь через fsync.
+    """
+    if not sys.platform.startswith('linux') or not _syncfs_reports_errors(platform.release()):
+        return None
+    try:
+        return ctypes.CDLL(None, use_errno=True).syncfs
+    except (OSError, AttributeError):
+        return None
 
-    for data_type, file_path in files.items():
-        try:
-            # Проверяем что данные можно сериализовать
-            data_to_save = user_data.get(data_type, {})
 
-            # Валидация данных перед сохранением
-            if data_type == 'food_log':
-                data_to_save = _validate_food_log_data(data_to_save)
+_libc_syncfs = _load_syncfs()
 
-            # Создаем директорию если не существует
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
 
-            # Сначала пробуем сериализовать в память
+def _syncfs_path(path: str) -> None:
+    """Сбрасываем на диск всю файловую систему, на которой лежит path"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        if _libc_syncfs(fd) != 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+    finally:
+        os.close(fd)
+
+
+class _CommitGroup:
+    """Пути, ожидающие одного группового fsync"""
+    __slots__ = ('paths', 'writes', 'done', 'error')
+
+    def __init__(self):
+        self.paths = set()
+        self.writes = 0
+        self.done = threading.Event()
+        self.error: Optional[OSError] = None
+
+
+class GroupCommitWriter:
+    """Group commit: общая синхронизация с диском для записей многих пользователей.
+
+    Одновременно выполняется одна группа. Поток, открывший группу, ждет
+    завершения предыдущей и еще window секунд - за это время к группе
+    присоединяются записи других потоков, - затем синхронизирует все файлы
+    и каталоги группы разом. На Linux 5.8+ это один syncfs(2) на файловую
+    систему вместо fsync каждого файла: записи сотни пользователей в разные
+    журналы стоят одного сброса диска, но syncfs сбрасывает и все остальные
+    измененные файлы этой файловой системы (кэш GPT, логи). На других
+    системах и старых ядрах fsync делается для каждого различного пути группы.
+    Остальные потоки ждут завершения своей группы: после возврата из sync()
+    пути группы на диске, а ошибка записи любого из них поднимается в каждом
+    потоке группы.
+
+    Если в прошлой группе была одна запись, окно не выдерживается - без
+    нагрузки group commit не добавляет задержки.
+    """
+
+    def __init__(self, window: float = 0.002, fsync: Callable[[str], None] = _fsync_path,
+                 syncfs: Optional[Callable[[str], None]] = _syncfs_path if _libc_syncfs else None):
+        self.window = window
+        self._fsync = fsync
+        self._syncfs = syncfs
+        self._lock = threading.Lock()
+        self._commit_lock = threading.Lock()  # Один групповой fsync за раз
+        self._group: Optional[_CommitGroup] = None
+        self._last_group_writes = 0
+        self.stats = {'writes': 0, 'groups': 0, 'fsyncs': 0}
+
+    def sync(self, *paths: str) -> None:
+        """Ждем, пока пути будут синхронизированы с диском
+
+        Raises:
+            OSError: fsync группы не удался - запись нужно повторить
+        """
+        with self._lock:
+            group = self._group
+            leader = group is None
+            if leader:
+                group = self._group = _CommitGroup()
+            group.paths.update(paths)
+            group.writes += 1
+            self.stats['writes'] += 1
+
+        if leader:
+            self._commit(group)
+        else:
+            group.done.wait()
+
+        if group.error is not None:
+            raise group.error
+
+    def _commit(self, group: _CommitGroup) -> None:
+        with self._commit_lock:
+            # Пока идет fsync предыдущей группы, к этой присоединяются новые записи
+            if self.window and self._last_group_writes > 1:
+                time.sleep(self.window)
+            with self._lock:
+                self._group = None  # Следующие записи открывают новую группу
+                self._last_group_writes = group.writes
+
+            calls = 0
             try:
-                json_str = json.dumps(data_to_save, ensure_ascii=False, indent=2)
-            except (TypeError, ValueError) as e:
-                logging.error(f"JSON serialization error for {data_type} (user {user_id}): {e}")
-                logging.error(f"Problematic data: {data_to_save}")
-                continue
+                for sync, path in self._plan(group.paths):
+                    try:
+                        sync(path)
+                    except FileNotFoundError:
+                        # Путь переименован или удален после записи (компакция, заморозка) -
+                        # синхронизируем каталог, в котором было переименование
+                        if not os.path.isdir(os.path.dirname(path)):
+                            continue
+                        self._fsync(os.path.dirname(path))
+                    calls += 1
+            except OSError as e:
+                group.error = e
+            finally:
+                with self._lock:
+                    self.stats['groups'] += 1
+                    self.stats['fsyncs'] += calls
+                group.done.set()
+
+    def _plan(self, paths: set) -> list:
+        """Вызовы синхронизации группы: syncfs на устройство или fsync на путь"""
+        if self._syncfs is None or len(paths) == 1:
+            return [(self._fsync, path) for path in paths]
+        devices, plan = {}, []
+        for path in paths:
+            try:
+                devices.setdefault(os.stat(path).st_dev, path)
+            except OSError:
+                plan.append((self._fsync, path))  # Устройство неизвестно - fsync этого пути
+        return [(self._syncfs, path) for path in devices.values()] + plan
 
-            # Сохраняем во временный файл, затем переименовываем
-            temp_file_path = file_path + '.tmp'
+
+def _durable_sync(*paths: str) -> None:
+    """Синхронизируем записанные пути с диском по режиму STORAGE_DURABILITY"""
+    if STORAGE_DURABILITY == 'group':
+        _group_commit.sync(*paths)
+    elif STORAGE_DURABILITY != 'relaxed':
+        for path in paths:
+            _fsync_path(path)
+
+
+def _food_journal_paths(user_id: str):
+    """Каталог месячных партиций лога еды и старые файлы, из которых он создается"""
+    legacy_path = get_user_files(user_id)['food_log']
+    user_dir = os.path.dirname(legacy_path)
+    return os.path.join(user_dir, 'food_log'), (os.path.join(user_dir, 'food_log.jsonl'), legacy_path)
+
+
+def _clone(value: Any) -> Any:
+    """Глубокая копия JSON-совместимых данных.
+
+    Заметно быстрее copy.deepcopy: не ведет memo-словарь и не разбирает
+    произвольные объекты - в документах пользователя только dict/list/скаляры.
+    """
+    if isinstance(value, dict):
+        return {key: _clone(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_clone(item) for item in value]
+    return value
+
+
+class _CacheEntry:
+    """Документы одного пользователя в кэше"""
+    __slots__ = ('documents', 'dirty', 'flushing', 'write_lock', 'loaded_at', 'last_access')
+
+    def __init__(self, documents: Dict[str, Any]):
+        now = time.monotonic()
+        self.documents = documents
+        self.dirty = set()  # Типы документов, не сброшенные на диск
+        self.flushing = False  # Снимок документов пишется на диск
+        self.write_lock = threading.Lock()  # Снимки одного пользователя пишутся по порядку
+        self.loaded_at = now
+        self.last_access = now
+
+
+class UserDataCache:
+    """In-process write-back кэш пользовательских данных.
+
+    Хранит разобранные документы пользователя в памяти, чтобы обработка
+    сообщения не перечитывала JSON-файлы на каждый геттер. Измененные
+    документы помечаются грязными и сбрасываются на диск по одному
+    (только то, что изменилось) периодически, при вытеснении и при
+    завершении процесса.
+
+    Вытеснение:
+    - LRU: при превышении max_users вытесняется давно не использованный пользователь
+    - TTL: чистые записи старше ttl секунд перечитываются с диска,
+      простаивающие дольше ttl - удаляются при evict_expired()
+
+    Запись, которую сейчас сбрасывает flush, не вытесняется и не перечитывается:
+    на диске еще нет ее последних изменений.
+    """
+
+    def __init__(self, loader: Callable[[str], Dict[str, Any]],
+                 writer: Callable[[str, str, Any], None],
+                 max_users: int = 1000, ttl: float = 3600):
+        self._loader = loader
+        self._writer = writer
+        self.max_users = max_users
+        self.ttl = ttl
+        self._entries: 'OrderedDict[str, _CacheEntry]' = OrderedDict()
+        self._lock = threading.RLock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'flushes': 0, 'writes': 0}
+
+    def get(self, user_id: str) -> Dict[str, Any]:
+        """Возвращает документы пользователя (без копирования!)"""
+        with self._lock:
+            now = time.monotonic()
+            entry = self._entries.get(user_id)
+
+            # Чистую устаревшую запись перечитываем с диска
+            if (entry is not None and not entry.dirty and not entry.flushing
+                    and self.ttl and now - entry.loaded_at > self.ttl):
+                del self._entries[user_id]
+                entry = None
+
+            if entry is None:
+                self.stats['misses'] += 1
+                entry = _CacheEntry(self._loader(user_id))
+                self._entries[user_id] = entry
+                self._enforce_limit()
+            else:
+                self.stats['hits'] += 1
+                self._entries.move_to_end(user_id)
+
+            entry.last_access = now
+            return entry.documents
+
+    def put(self, user_id: str, documents: Dict[str, Any]) -> None:
+        """Обновляет документы пользователя и помечает запись грязной"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                entry = _CacheEntry(self._loader(user_id))
+                self._entries[user_id] = entry
+            else:
+                self._entries.move_to_end(user_id)
+
+            entry.documents.update(documents)
+            entry.dirty.update(documents)
+            entry.last_access = time.monotonic()
+            self._enforce_limit()
+
+    def flush(self, user_id: Optional[str] = None) -> int:
+        """Сбрасывает грязные документы на диск. Возвращает число записанных пользователей
+
+        Под блокировкой кэша берется только снимок грязных документов, запись
+        на диск и fsync идут без нее - get/put других потоков не ждут диск.
+        """
+        with self._lock:
+            if user_id is not None:
+                entry = self._entries.get(user_id)
+                targets = [(user_id, entry)] if entry is not None and entry.dirty else []
+            else:
+                targets = [(uid, entry) for uid, entry in self._entries.items() if entry.dirty]
+
+        flushed = sum(self._flush_entry(uid, entry) for uid, entry in targets)
+        with self._lock:
+            self.stats['flushes'] += flushed
+        return flushed
+
+    def evict_expired(self) -> int:
+        """Удаляет из кэша пользователей, простаивающих дольше ttl"""
+        if not self.ttl:
+            return 0
+
+        with self._lock:
+            now = time.monotonic()
+            expired = [uid for uid, entry in self._entries.items() if now - entry.last_access > self.ttl]
+            for uid in expired:
+                self._evict(uid)
+            return len(expired)
+
+    def clear(self, flush: bool = True) -> None:
+        """Очищает кэш (по умолчанию предварительно сбросив грязные записи)"""
+        if flush:
+            self.flush()
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _enforce_limit(self) -> None:
+        overflow = len(self._entries) - self.max_users
+        if overflow <= 0:
+            return
+        # Не более одного прохода: пользователей, которых не удалось записать, пропускаем
+        for user_id in list(self._entries)[:overflow]:
+            self._evict(user_id)
+
+    def _evict(self, user_id: str) -> None:
+        entry = self._entries[user_id]
+        # Запись сбрасывает другой поток - не ждем его под блокировкой кэша
+        busy = entry.flushing or not entry.write_lock.acquire(blocking=False)
+        if not busy:
+            try:
+                if entry.dirty:
+                    documents = {data_type: entry.documents.get(data_type, {}) for data_type in entry.dirty}
+                    entry.dirty.clear()
+                    self._write_documents(user_id, documents, entry)
+                    self.stats['flushes'] += 1
+            finally:
+                entry.write_lock.release()
+        if busy or entry.dirty:
+            # Не смогли записать - держим запись в кэше, чтобы не потерять данные
+            self._entries.move_to_end(user_id)
+            return
+        del self._entries[user_id]
+        self.stats['evictions'] += 1
+
+    def _flush_entry(self, user_id: str, entry: _CacheEntry) -> bool:
+        """Записывает снимок грязных документов пользователя вне блокировки кэша"""
+        with entry.write_lock:
+            with self._lock:
+                if not entry.dirty:
+                    return False  # Уже записал другой поток
+                snapshot = {data_type: _clone(entry.documents.get(data_type, {})) for data_type in entry.dirty}
+                entry.dirty.clear()
+                entry.flushing = True
             try:
-                with open(temp_file_path, 'w', encoding='utf-8') as f:
-                    f.write(json_str)
-                    f.flush()  # Принудительно записываем на диск
-                    os.fsync(f.fileno())  # Синхронизируем с диском
+                self._write_documents(user_id, snapshot, entry)
+            finally:
+                with self._lock:
+                    entry.flushing = False
+        return True
 
-                # Атомарно заменяем старый файл
-                if os.path.exists(file_path):
-                    os.replace(temp_file_path, file_path)
-                else:
-                    os.rename(temp_file_path, file_path)
+    def _write_documents(self, user_id: str, documents: Dict[str, Any], entry: _CacheEntry) -> None:
+        """Записывает документы пользователя; не записанные снова помечаются грязными"""
+        written = set()
+        try:
+            for data_type in sorted(documents):
+                try:
+                    self._writer(user_id, data_type, documents[data_type])
+                except OSError as e:
+                    logging.error(f"❌ Не удалось сбросить {data_type} пользователя {user_id}, повторим позже: {e}")
+                    continue
+                written.add(data_type)
+        finally:
+            with self._lock:
+                entry.dirty.update(documents.keys() - written)
+                self.stats['writes'] += len(written)
+
+
+if STORAGE_DURABILITY not in ('strict', 'group', 'relaxed'):
+    logging.warning(f"⚠️ Неизвестный STORAGE_DURABILITY={STORAGE_DURABILITY!r}, используем strict")
+    STORAGE_DURABILITY = 'strict'
+
+_group_commit = GroupCommitWriter(window=GROUP_COMMIT_WINDOW_MS / 1000)
+
+if FOOD_LOG_COLD_COMPRESSION not in ('none', *COLD_CODECS):
+    logging.warning(f"⚠️ Сжатие {FOOD_LOG_COLD_COMPRESSION!r} недоступно (zstd требует пакет zstandard), "
+                    f"используем gzip")
+    FOOD_LOG_COLD_COMPRESSION = 'gzip'
+
+
+# Хранилище под кэшем: JSON-файлы в DATA_DIR или SQLite (STORAGE_BACKEND в config.py).
+# Лог еды в кэш не попадает: он растет с возрастом аккаунта, поэтому пишется
+# по одной записи и читается по дням через _food_store.
+if STORAGE_BACKEND == 'sqlite':
+    from utils import sqlite_storage
+    _backend_load = partial(sqlite_storage.load_user_data, include_food_log=False)
+    _backend_write = sqlite_storage.save_user_document
+    _food_store = sqlite_storage.FoodLogStore()
+else:
+    if STORAGE_BACKEND != 'json':
+        logging.warning(f"⚠️ Неизвестный STORAGE_BACKEND={STORAGE_BACKEND!r}, используем JSON-файлы")
+    _backend_load, _backend_write = _read_user_data_from_disk, _write_document_to_disk
+    _food_store = FoodJournalStore(_food_journal_paths, max_open=USER_CACHE_MAX_USERS, sync=_durable_sync)
+
+_cache = UserDataCache(
+    loader=_backend_load,
+    writer=_backend_write,
+    max_users=USER_CACHE_MAX_USERS,
+    ttl=USER_CACHE_TTL
+)
+
+# Пул потоков для *_async функций: open/write/fsync выполняются вне event loop.
+# Кэш и журналы защищены своими блокировками, поэтому вызовы из разных потоков безопасны.
+_storage_executor = ThreadPoolExecutor(max_workers=STORAGE_THREADS, thread_name_prefix='user-data')
 
-                logging.debug(f"Successfully saved {data_type} for user {user_id}")
 
-            except OSError as e:
-                logging.error(f"File system error saving {data_type} for user {user_id}: {e}")
-                # Удаляем временный файл если остался
-                if os.path.exists(temp_file_path):
-                    try:
-                        os.remove(temp_file_path)
-                    except:
-                        pass
+def load_user_data(user_id: str) -> Dict[str, Any]:
+    """Загружаем данные конкретного пользователя (из кэша)
+
+    Лог еды материализуется целиком - для работы с отдельными днями
+    используйте get_user_food_log или append_food_entry.
+    """
+    user_data = _clone(_cache.get(user_id))
+    user_data['food_log'] = dict(get_user_food_log(user_id))
+    return user_data
+
+
+def save_user_data(user_id: str, user_data: Dict[str, Any]) -> None:
+    """Сохраняем все документы пользователя (отсутствующие - как пустые)
+
+    Перезаписывает все шесть документов - для изменения одного
+    используйте save_user_document.
+    """
+    documents = {data_type: _clone(user_data.get(data_type, {}))
+                 for data_type in DOCUMENT_TYPES if data_type != 'food_log'}
+    _cache.put(user_id, documents)
+    _save_food_log(user_id, user_data.get('food_log', {}))
+
+
+def get_user_document(user_id: str, data_type: str) -> Any:
+    """Получаем копию одного документа пользователя ('diary', 'food_log', ...)
+
+    Для 'food_log' возвращается ленивое представление FoodLogView.
+    """
+    _check_document_type(data_type)
+    if data_type == 'food_log':
+        return FoodLogView(
+            get_dates=partial(_food_store.get_dates, user_id),
+            get_entries=partial(_food_store.get_entries, user_id),
+            append=partial(append_food_entry, user_id),
+            set_entries=partial(set_food_entries, user_id)
+        )
+    return _clone(_cache.get(user_id).get(data_type, {}))
+
+
+def save_user_document(user_id: str, data_type: str, data: Any) -> None:
+    """Сохраняем один документ пользователя
+
+    На диск атомарно записывается только файл этого документа - остальные
+    пять не перечитываются и не перезаписываются. Для лога еды, полученного
+    через get_user_food_log, записываются только измененные дни.
+
+    Документ (кроме лога еды) попадает на диск при периодическом сбросе
+    (USER_CACHE_FLUSH_INTERVAL), вытеснении из кэша или завершении процесса:
+    при аварийном завершении теряются изменения за последний интервал,
+    и STORAGE_DURABILITY для них ничего не гарантирует. Дневник приема пищи
+    log_meal сбрасывает сразу.
+    """
+    _check_document_type(data_type)
+    if data_type == 'food_log':
+        _save_food_log(user_id, data)
+    else:
+        _cache.put(user_id, {data_type: _clone(data)})
+
+
+def _save_food_log(user_id: str, food_log: Any) -> None:
+    if isinstance(food_log, FoodLogView):
+        food_log.commit()
+    else:
+        _food_store.replace(user_id, _validate_food_log_data(food_log))
+
+
+def get_food_entries(user_id: str, date: str) -> List[FoodEntry]:
+    """Записи лога еды за один день
+
+    Читается только партиция этого дня - стоимость не зависит
+    от длины истории пользователя. Записи старых форматов (2 и 3 поля)
+    приводятся к FoodEntry здесь же.
+    """
+    return decode_entries(_food_store.get_entries(user_id, date))
+
+
+def read_user_food_log(user_id: str) -> Dict[str, List[FoodEntry]]:
+    """Весь лог еды пользователя только для чтения (утилиты вроде warm_gpt_cache.py)
+
+    В отличие от get_user_food_log не переносит старый food_log.json в партиции,
+    не открывает журналы и ничего не пишет в каталог данных.
+    """
+    if STORAGE_BACKEND == 'sqlite':
+        food_log = {date: _food_store.get_entries(user_id, date) for date in _food_store.get_dates(user_id)}
+    else:
+        # Не get_user_files: тот создает каталог пользователя
+        user_dir = os.path.join(DATA_DIR, f'user_{user_id}')
+        food_log = read_food_log(*(os.path.join(user_dir, name)
+                                   for name in ('food_log', 'food_log.jsonl', 'food_log.json')))
+    return {date: decode_entries(entries) for date, entries in food_log.items()}
+
+
+def append_food_entry(user_id: str, date: str, entry: list) -> bool:
+    """Добавляем прием пищи в лог дня (дописывается одна строка журнала)
+
+    Returns:
+        False, если запись не прошла валидацию и не сохранена
+    """
+    validated = _validate_food_log_data({date: [list(entry)]}).get(date)
+    if not validated:
+        logging.warning(f"⚠️ Запись еды пользователя {user_id} не сохранена: {entry}")
+        return False
+    _food_store.append(user_id, date, validated[0])
+    return True
+
+
+def set_food_entries(user_id: str, date: str, entries: list) -> None:
+    """Заменяем записи лога за один день (пустой список - очистить день)"""
+    validated = _validate_food_log_data({date: [list(entry) for entry in entries]})
+    _food_store.set_entries(user_id, date, validated.get(date, []))
+
+
+def log_meal(user_id: str, date: str, entry: list) -> Dict[str, int]:
+    """Записываем прием пищи: калории в дневник и запись в лог еды
+
+    Дневник перечитывается здесь же, поэтому вызывать функцию нужно
+    под user_lock(user_id), а не с дневником, прочитанным до запроса к GPT.
 
-        except Exception as e:
-            logging.error(f"Unexpected error saving {data_type} for user {user_id}: {e}")
-            logging.error(f"Data type: {type(user_data.get(data_type))}")
-            if hasattr(e, '__traceback__'):
-                import traceback
-                logging.error(f"Traceback: {traceback.format_exc()}")
+    Запись в журнал и измененные документы пользователя сбрасываются на диск
+    в этом же вызове, поэтому дневник и лог еды не расходятся после сбоя.
+    Остается окно между двумя записями: при аварии в нем прием пищи будет
+    в логе еды без калорий в дневнике.
+
+    Returns:
+        Обновленный дневник пользователя
+    """
+    diary = get_user_diary(user_id)
+    diary[date] = diary.get(date, 0) + entry[1]
+    save_user_document(user_id, 'diary', diary)
+    append_food_entry(user_id, date, entry)
+    _cache.flush(user_id)
+    return diary
+
+
+def compact_food_logs() -> int:
+    """Компактируем журналы еды с накопившимися перезаписанными строками"""
+    try:
+        return _food_store.compact()
+    except Exception as e:
+        logging.error(f"❌ Ошибка компакции журналов еды: {e}")
+        logging.error(f"Traceback: {traceback.format_exc()}")
+        return 0
+
+
+def freeze_cold_food_logs(today: Optional[str] = None) -> int:
+    """Сжимаем партиции лога еды за прошлые месяцы (FOOD_LOG_COLD_COMPRESSION)
+
+    Returns:
+        Число замороженных партиций
+    """
+    if STORAGE_BACKEND == 'sqlite' or FOOD_LOG_COLD_COMPRESSION == 'none':
+        return 0
+
+    current_month = partition_key(today or time.strftime('%Y-%m-%d'))
+    frozen = 0
+    for user_id in get_all_users():
+        try:
+            frozen += _food_store.freeze(user_id, current_month, FOOD_LOG_COLD_COMPRESSION)
+        except OSError as e:
+            logging.error(f"❌ Не удалось сжать лог еды пользователя {user_id}: {e}")
+    return frozen
+
+
+def _check_document_type(data_type: str) -> None:
+    if data_type not in DOCUMENT_TYPES:
+        raise ValueError(f"Неизвестный тип документа: {data_type}")
+
+
+def flush_user_data(user_id: Optional[str] = None) -> int:
+    """Сбрасываем несохраненные изменения на диск (для всех или одного пользователя)"""
+    try:
+        return _cache.flush(user_id)
+    except Exception as e:
+        logging.error(f"❌ Ошибка сброса кэша пользовательских данных: {e}")
+        logging.error(f"Traceback: {traceback.format_exc()}")
+        return 0
+
+
+def evict_expired_user_data() -> int:
+    """Вытесняем из кэша давно неактивных пользователей"""
+    return _cache.evict_expired()
+
+
+def clear_user_data_cache(flush: bool = True) -> None:
+    """Полностью очищаем кэш пользовательских данных"""
+    _cache.clear(flush=flush)
+    _food_store.clear()
+
+
+def get_user_data_cache_stats() -> Dict[str, int]:
+    """Статистика кэша: попадания, промахи, вытеснения, сбросы на диск"""
+    stats = dict(_cache.stats)
+    stats['users'] = len(_cache)
+    stats.update({f'food_log_{key}': value for key, value in _food_store.stats.items()})
+    stats.update({f'group_commit_{key}': value for key, value in _group_commit.stats.items()})
+    return stats
+
+
+# Не теряем несохраненные изменения при завершении процесса
+atexit.register(flush_user_data)
 
 
 def _validate_food_log_data(food_log_data: Any) -> Dict[str, list]:
@@ -162,28 +770,13 @@ def _validate_food_log_data(food_log_data: Any) -> Dict[str, list]:
                 logging.warning(f"Invalid calories for {food_name}: {food_entry[1]} ({e})")
                 continue
 
-            # Валидируем белок (если есть)
-            protein = None
-            if len(food_entry) >= 3 and food_entry[2] is not None:
-                try:
-                    protein = float(food_entry[2])
-                    if not (0 <= protein <= 1000):  # Разумные пределы
-                        logging.warning(f"Protein out of range: {protein} for {food_name}")
-                        protein = None
-                    elif not (protein == protein):  # NaN check
-                        logging.warning(f"Protein is NaN for {food_name}")
-                        protein = None
-                    elif protein == float('inf') or protein == float('-inf'):
-                        logging.warning(f"Protein is infinite for {food_name}")
-                        protein = None
-                except (ValueError, TypeError):
-                    logging.warning(f"Invalid protein for {food_name}: {food_entry[2]}")
-                    protein = None
-
-            # Добавляем валидированную запись
-            validated_entry = [food_name, int(calories)]  # Округляем калории до целого
-            if protein is not None:
-                validated_entry.append(int(protein))  # Округляем белок до целого
+            # Валидируем БЖУ (если есть): [название, калории, белки, жиры, углеводы]
+            macros = [_validate_macro(food_entry, index, food_name) for index in (2, 3, 4)]
+
+            # Добавляем валидированную запись (калории и БЖУ округляем до целого)
+            validated_entry = [food_name, int(calories)] + [None if m is None else int(m) for m in macros]
+            while validated_entry[-1] is None:
+                validated_entry.pop()  # Незаполненные поля в конце не храним
 
             validated_foods.append(validated_entry)
 
@@ -193,50 +786,59 @@ def _validate_food_log_data(food_log_data: Any) -> Dict[str, list]:
     return validated_data
 
 
+def _validate_macro(food_entry: list, index: int, food_name: str) -> Optional[float]:
+    """Граммы белков/жиров/углеводов из записи или None, если их нет или они некорректны"""
+    names = {2: 'Protein', 3: 'Fat', 4: 'Carbs'}
+    if len(food_entry) <= index or food_entry[index] is None:
+        return None
+    try:
+        value = float(food_entry[index])
+    except (ValueError, TypeError):
+        logging.warning(f"Invalid {names[index].lower()} for {food_name}: {food_entry[index]}")
+        return None
+    if not (value == value) or value in (float('inf'), float('-inf')):  # NaN / бесконечность
+        logging.warning(f"{names[index]} is not finite for {food_name}")
+        return None
+    if not (0 <= value <= 1000):  # Разумные пределы
+        logging.warning(f"{names[index]} out of range: {value} for {food_name}")
+        return None
+    return value
+
+
 # Удобные функции для работы с отдельными типами данных
 def get_user_profile(user_id: str) -> Dict[str, Any]:
     """Получаем профиль пользователя"""
-    user_data = load_user_data(user_id)
-    return user_data.get('profile', {})
+    return get_user_document(user_id, 'profile')
 
 
 def save_user_profile(user_id: str, profile: Dict[str, Any]) -> None:
     """Сохраняем профиль пользователя"""
-    user_data = load_user_data(user_id)
-    user_data['profile'] = profile
-    save_user_data(user_id, user_data)
+    save_user_document(user_id, 'profile', profile)
 
 
 def get_user_diary(user_id: str) -> Dict[str, int]:
     """Получаем дневник пользователя"""
-    user_data = load_user_data(user_id)
-    return user_data.get('diary', {})
+    return get_user_document(user_id, 'diary')
 
 
 def save_user_diary(user_id: str, diary: Dict[str, int]) -> None:
     """Сохраняем дневник пользователя"""
-    user_data = load_user_data(user_id)
-    user_data['diary'] = diary
-    save_user_data(user_id, user_data)
+    save_user_document(user_id, 'diary', diary)
 
 
 def get_user_weights(user_id: str) -> Dict[str, float]:
     """Получаем веса пользователя"""
-    user_data = load_user_data(user_id)
-    return user_data.get('weights', {})
+    return get_user_document(user_id, 'weights')
 
 
 def save_user_weights(user_id: str, weights: Dict[str, float]) -> None:
     """Сохраняем веса пользователя"""
-    user_data = load_user_data(user_id)
-    user_data['weights'] = weights
-    save_user_data(user_id, user_data)
+    save_user_document(user_id, 'weights', weights)
 
 
-def get_user_food_log(user_id: str) -> Dict[str, list]:
-    """Получаем лог еды пользователя"""
-    user_data = load_user_data(user_id)
-    return user_data.get('food_log', {})
+def get_user_food_log(user_id: str) -> FoodLogView:
+    """Получаем лог еды пользователя (дни читаются с диска по мере обращения)"""
+    return get_user_document(user_id, 'food_log')
 
 
 def save_user_food_log(user_id: str, food_log: Dict[str, list]) -> None:
@@ -245,9 +847,7 @@ def save_user_food_log(user_id: str, food_log: Dict[str, list]) -> None:
         logging.debug(f"🍽️ Сохраняем food_log для пользователя {user_id}")
         logging.debug(f"Данные: {food_log}")
 
-        user_data = load_user_data(user_id)
-        user_data['food_log'] = food_log
-        save_user_data(user_id, user_data)
+        save_user_document(user_id, 'food_log', food_log)
 
         logging.info(f"✅ Food_log успешно сохранен для пользователя {user_id}")
 
@@ -261,28 +861,22 @@ def save_user_food_log(user_id: str, food_log: Dict[str, list]) -> None:
 
 def get_user_burned(user_id: str) -> Dict[str, int]:
     """Получаем потраченные калории пользователя"""
-    user_data = load_user_data(user_id)
-    return user_data.get('burned', {})
+    return get_user_document(user_id, 'burned')
 
 
 def save_user_burned(user_id: str, burned: Dict[str, int]) -> None:
     """Сохраняем потраченные калории пользователя"""
-    user_data = load_user_data(user_id)
-    user_data['burned'] = burned
-    save_user_data(user_id, user_data)
+    save_user_document(user_id, 'burned', burned)
 
 
 def get_user_saved_meals(user_id: str) -> Dict[str, Dict[str, Any]]:
     """Получаем сохраненные блюда пользователя"""
-    user_data = load_user_data(user_id)
-    return user_data.get('saved_meals', {})
+    return get_user_document(user_id, 'saved_meals')
 
 
 def save_user_saved_meals(user_id: str, saved_meals: Dict[str, Dict[str, Any]]) -> None:
     """Сохраняем избранные блюда пользователя"""
-    user_data = load_user_data(user_id)
-    user_data['saved_meals'] = saved_meals
-    save_user_data(user_id, user_data)
+    save_user_document(user_id, 'saved_meals', saved_meals)
 
 
 def add_saved_meal(user_id: str, meal_name: str, meal_data: Dict[str, Any]) -> bool:
@@ -324,6 +918,9 @@ def remove_saved_meal(user_id: str, meal_key: str) -> bool:
 
 def get_all_users() -> list:
     """Получаем список всех пользователей"""
+    if STORAGE_BACKEND == 'sqlite':
+        return sqlite_storage.get_all_users()
+
     if not os.path.exists(DATA_DIR):
         return []
 
@@ -334,3 +931,102 @@ def get_all_users() -> list:
             users.append(user_id)
 
     return users
+
+
+# Асинхронный API для обработчиков Telegram.
+# Синхронные функции выше делают open/write/os.fsync прямо в вызывающем потоке:
+# в event loop медленный диск задерживает ответы всем пользователям сразу.
+# Обработчики await-ят версии ниже - та же логика в пуле потоков _storage_executor.
+async def run_in_storage_thread(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Выполняем синхронную функцию хранилища в пуле потоков, не блокируя event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_storage_executor, partial(func, *args, **kwargs))
+
+
+async def load_user_data_async(user_id: str) -> Dict[str, Any]:
+    return await run_in_storage_thread(load_user_data, user_id)
+
+
+async def save_user_data_async(user_id: str, user_data: Dict[str, Any]) -> None:
+    await run_in_storage_thread(save_user_data, user_id, user_data)
+
+
+async def get_user_document_async(user_id: str, data_type: str) -> Any:
+    return await run_in_storage_thread(get_user_document, user_id, data_type)
+
+
+async def save_user_document_async(user_id: str, data_type: str, data: Any) -> None:
+    await run_in_storage_thread(save_user_document, user_id, data_type, data)
+
+
+async def get_food_entries_async(user_id: str, date: str) -> List[FoodEntry]:
+    return await run_in_storage_thread(get_food_entries, user_id, date)
+
+
+async def append_food_entry_async(user_id: str, date: str, entry: list) -> bool:
+    return await run_in_storage_thread(append_food_entry, user_id, date, entry)
+
+
+async def set_food_entries_async(user_id: str, date: str, entries: list) -> None:
+    await run_in_storage_thread(set_food_entries, user_id, date, entries)
+
+
+async def log_meal_async(user_id: str, date: str, entry: list) -> Dict[str, int]:
+    """Асинхронный log_meal - вызывать под user_lock(user_id)"""
+    return await run_in_storage_thread(log_meal, user_id, date, entry)
+
+
+async def flush_user_data_async(user_id: Optional[str] = None) -> int:
+    return await run_in_storage_thread(flush_user_data, user_id)
+
+
+async def compact_food_logs_async() -> int:
+    return await run_in_storage_thread(compact_food_logs)
+
+
+async def freeze_cold_food_logs_async() -> int:
+    return await run_in_storage_thread(freeze_cold_food_logs)
+
+
+async def get_user_profile_async(user_id: str) -> Dict[str, Any]:
+    return await get_user_document_async(user_id, 'profile')
+
+
+async def save_user_profile_async(user_id: str, profile: Dict[str, Any]) -> None:
+    await save_user_document_async(user_id, 'profile', profile)
+
+
+async def get_user_diary_async(user_id: str) -> Dict[str, int]:
+    return await get_user_document_async(user_id, 'diary')
+
+
+async def save_user_diary_async(user_id: str, diary: Dict[str, int]) -> None:
+    await save_user_document_async(user_id, 'diary', diary)
+
+
+async def get_user_weights_async(user_id: str) -> Dict[str, float]:
+    return await get_user_document_async(user_id, 'weights')
+
+
+async def save_user_weights_async(user_id: str, weights: Dict[str, float]) -> None:
+    await save_user_document_async(user_id, 'weights', weights)
+
+
+async def get_user_burned_async(user_id: str) -> Dict[str, int]:
+    return await get_user_document_async(user_id, 'burned')
+
+
+async def save_user_burned_async(user_id: str, burned: Dict[str, int]) -> None:
+    await save_user_document_async(user_id, 'burned', burned)
+
+
+async def get_user_saved_meals_async(user_id: str) -> Dict[str, Dict[str, Any]]:
+    return await get_user_document_async(user_id, 'saved_meals')
+
+
+async def add_saved_meal_async(user_id: str, meal_name: str, meal_data: Dict[str, Any]) -> bool:
+    return await run_in_storage_thread(add_saved_meal, user_id, meal_name, meal_data)
+
+
+async def remove_saved_meal_async(user_id: str, meal_key: str) -> bool:
+    return await run_in_storage_thread(remove_saved_meal, user_id, meal_key)
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Поочередное изменение данных одного пользователя
+"""
+import time
+import asyncio
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Any
+
+# Сколько последних ожиданий хранить для перцентилей
+_RECENT_WAITS = 1000
+
+# Блокировка живет, пока ее кто-то держит или ждет
+_locks: 'weakref.WeakValueDictionary[str, asyncio.Lock]' = weakref.WeakValueDictionary()
+
+_metrics = {'acquisitions': 0, 'contended': 0, 'wait_total': 0.0, 'wait_max': 0.0}
+_recent_waits: deque = deque(maxlen=_RECENT_WAITS)
+
+
+def get_user_lock(user_id: str) -> asyncio.Lock:
+    """Блокировка данных пользователя"""
+    lock = _locks.get(user_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        _locks[user_id] = lock
+    return lock
+
+
+@asynccontextmanager
+async def user_lock(user_id: str):
+    """Эксклюзивный доступ к данным пользователя на время блока"""
+    lock = get_user_lock(user_id)
+    contended = lock.locked()
+    started = time.perf_counter()
+
+    await lock.acquire()
+    try:
+        _record_wait(time.perf_counter() - started, contended)
+        yield
+    finally:
+        lock.release()
+
+
+def _record_wait(wait: float, contended: bool) -> None:
+    _metrics['acquisitions'] += 1
+    if contended:
+        _metrics['contended'] += 1
+    _metrics['wait_total'] += wait
+    _metrics['wait_max'] = max(_metrics['wait_max'], wait)
+    _recent_waits.append(wait)
+
+
+def get_lock_metrics() -> Dict[str, Any]:
+    """Метрики ожидания блокировок пользователей (время - в миллисекундах)"""
+    acquisitions = _metrics['acquisitions']
+    recent = sorted(_recent_waits)
+    p95 = recent[min(len(recent) - 1, int(len(recent) * 0.95))] if recent else 0.0
+
+    return {
+        'acquisitions': acquisitions,
+        'contended': _metrics['contended'],
+        'wait_avg_ms': _metrics['wait_total'] / acquisitions * 1000 if acquisitions else 0.0,
+        'wait_p95_ms': p95 * 1000,
+        'wait_max_ms': _metrics['wait_max'] * 1000,
+        'active_locks': len(_locks),
+    }
+
+
+def reset_lock_metrics() -> None:
+    """Сбрасываем метрики (например, после выгрузки в лог)"""
+    _metrics.update({'acquisitions': 0, 'contended': 0, 'wait_total': 0.0, 'wait_max': 0.0})
+    _recent_waits.clear()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Прогрев кэша оценок GPT из истории приемов пищи
+
+Описания блюд, которые пользователи уже записывали с полными БЖУ, кладутся
+в кэш с медианными значениями. Записи, введенные вручную ("шоколадка 205 ккал"),
+пропускаются: у них нет БЖУ.
+
+Записи истории могли оценить старые промпты, анализ фото или локальный расчет,
+поэтому они хранятся под отдельным ключом gpt_cache.HISTORY_KEY, а не как ответ
+GPT на текущий промпт. Бот берет их, только если GPT_CACHE_USE_HISTORY=1.
+
+Запуск:
+    python warm_gpt_cache.py [--min-count 2] [--db bot_data/gpt_cache.sqlite3]
+
+Данные пользователей только читаются: старые логи еды не переносятся в партиции.
+Существующие записи кэша не перезаписываются; повторный запуск безопасен.
+"""
+import os
+import sys
+import argparse
+from collections import defaultdict
+from statistics import median
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import config
+from utils import gpt_cache
+from utils.gpt_cache import normalize_description
+from utils.user_data import get_all_users, read_user_food_log
+
+
+def collect_estimates() -> dict:
+    """Нормализованное описание -> список записей с полными БЖУ"""
+    estimates = defaultdict(list)
+    for user_id in get_all_users():
+        for entries in read_user_food_log(user_id).values():
+            for entry in entries:
+                if None in (entry.protein, entry.fat, entry.carbs):
+                    continue
+                estimates[normalize_description(entry.name)].append(entry)
+    return estimates
+
+
+def warm(min_count: int) -> int:
+    """Кладем в кэш описания, встреченные не меньше min_count раз. Возвращает число новых записей"""
+    added = 0
+    for description, entries in sorted(collect_estimates().items()):
+        if len(entries) < min_count or not description:
+            continue
+        if gpt_cache.nutrition_cache.contains(description, *gpt_cache.HISTORY_KEY):
+            continue
+
+        gpt_cache.nutrition_cache.put(description, *gpt_cache.HISTORY_KEY, {
+            'calories': median(entry.kcal for entry in entries),
+            'protein': median(entry.protein for entry in entries),
+            'fat': median(entry.fat for entry in entries),
+            'carbs': median(entry.carbs for entry in entries),
+        })
+        added += 1
+    return added
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Прогрев кэша оценок GPT из истории приемов пищи')
+    parser.add_argument('--min-count', type=int, default=2,
+                        help='сколько раз описание должно встретиться в истории')
+    parser.add_argument('--db', default=config.GPT_CACHE_PATH, help='путь к файлу кэша')
+    args = parser.parse_args()
+
+    gpt_cache.nutrition_cache.path = args.db
+    if not gpt_cache.nutrition_cache.enabled:
+        print("❌ Кэш оценок GPT отключен (GPT_CACHE_MAX_ENTRIES=0)")
+        return
+
+    print(f"🔥 Прогрев {args.db} из истории приемов пищи")
+    added = warm(args.min_count)
+    print(f"\n🎉 Добавлено описаний: {added}, всего в кэше: {len(gpt_cache.nutrition_cache)}")
+    if not config.GPT_CACHE_USE_HISTORY:
+        print("ℹ️ Бот использует их только с GPT_CACHE_USE_HISTORY=1")
+    gpt_cache.nutrition_cache.close()
+
+
+if __name__ == '__main__':
+    main()